@@ -0,0 +1,377 @@
+import json
+import os
+from dataclasses import dataclass, field
+from typing import Iterator, Optional, Union
+
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+from src.adapters.fxcm_connect.candle_parser import (
+    CANDLE_COLUMNS,
+    parse_candle_arrays,
+)
+from src.config import ForexPairEnum, PeriodEnum
+from src.logger import get_logger
+
+logger = get_logger(__name__)
+
+PERIOD_SECONDS = {
+    PeriodEnum.MINUTE_1: 60,
+    PeriodEnum.MINUTE_5: 300,
+    PeriodEnum.MINUTE_15: 900,
+    PeriodEnum.MINUTE_30: 1800,
+    PeriodEnum.HOUR_1: 3600,
+    PeriodEnum.HOUR_2: 7200,
+    PeriodEnum.HOUR_3: 10800,
+    PeriodEnum.HOUR_4: 14400,
+    PeriodEnum.HOUR_6: 21600,
+    PeriodEnum.HOUR_8: 28800,
+    PeriodEnum.DAY: 86400,
+    PeriodEnum.WEEK: 604800,
+    PeriodEnum.MONTH: 31 * 86400,
+}
+
+NANOSECONDS = 1_000_000_000
+DAY_NS = 86400 * NANOSECONDS
+
+TimeLike = Union[str, np.datetime64, pd.Timestamp, None]
+
+
+def to_nanoseconds(value: TimeLike) -> Optional[int]:
+    """Converts a time into UTC nanoseconds since the epoch"""
+    if value is None:
+        return None
+    timestamp = pd.Timestamp(value)
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.tz_convert("UTC").tz_localize(None)
+    return timestamp.value
+
+
+def instrument_key(instrument: Union[ForexPairEnum, str]) -> str:
+    """EUR/USD or EUR_USD as the directory name EUR_USD"""
+    if isinstance(instrument, ForexPairEnum):
+        instrument = instrument.value
+    return instrument.replace("/", "_")
+
+
+@dataclass
+class Gap:
+    """Candles missing between two stored candles"""
+
+    after: np.datetime64
+    before: np.datetime64
+    missing: int
+
+
+@dataclass
+class AppendResult:
+    appended: int = 0
+    duplicates: int = 0
+    rewritten: bool = False
+    gaps: list[Gap] = field(default_factory=list)
+
+
+class ArchivedSeries:
+    """The candles of one instrument and period, one file per column
+
+    Times are int64 nanoseconds and prices float64, written raw so
+    they can be memory mapped. The number of committed rows lives in
+    meta.json, which is replaced atomically after the columns are
+    written, so a torn append is truncated away on the next write.
+    """
+
+    def __init__(self, path: str, period: PeriodEnum) -> None:
+        self.path = path
+        self.period = period
+        self.step = PERIOD_SECONDS[period] * NANOSECONDS
+        os.makedirs(path, exist_ok=True)
+        self.count = self._read_meta().get("count", 0)
+
+    def _column_path(self, column: str) -> str:
+        return os.path.join(self.path, column + ".bin")
+
+    def _read_meta(self) -> dict:
+        try:
+            with open(os.path.join(self.path, "meta.json")) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def _write_meta(self, count: int) -> None:
+        meta_path = os.path.join(self.path, "meta.json")
+        with open(meta_path + ".tmp", "w") as f:
+            json.dump(
+                {
+                    "period": self.period.value,
+                    "columns": ["date", *CANDLE_COLUMNS],
+                    "count": count,
+                },
+                f,
+            )
+        os.replace(meta_path + ".tmp", meta_path)
+        self.count = count
+
+    def _map(self, column: str) -> np.ndarray:
+        """Memory maps the committed rows of a column"""
+        dtype = np.int64 if column == "date" else np.float64
+        if self.count == 0:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(
+            self._column_path(column),
+            dtype=dtype,
+            mode="r",
+            shape=(self.count,),
+        )
+
+    @property
+    def first_time(self) -> Optional[np.datetime64]:
+        if self.count == 0:
+            return None
+        return np.datetime64(int(self._map("date")[0]), "ns")
+
+    @property
+    def last_time(self) -> Optional[np.datetime64]:
+        if self.count == 0:
+            return None
+        return np.datetime64(int(self._map("date")[-1]), "ns")
+
+    def _bounds(self, start: TimeLike, end: TimeLike) -> tuple[int, int]:
+        """Row range of the candles with start <= time < end"""
+        times = self._map("date")
+        start_ns, end_ns = to_nanoseconds(start), to_nanoseconds(end)
+        # binary search on the mapped column only touches a few pages
+        lo = 0 if start_ns is None else np.searchsorted(times, start_ns)
+        hi = (
+            self.count
+            if end_ns is None
+            else np.searchsorted(times, end_ns, side="left")
+        )
+        return int(lo), int(hi)
+
+    def read(
+        self,
+        start: TimeLike = None,
+        end: TimeLike = None,
+        columns: Optional[list[str]] = None,
+    ) -> DataFrame:
+        """Returns the candles with start <= time < end, shaped like the
+        refined candle data"""
+        lo, hi = self._bounds(start, end)
+        return self._frame(lo, hi, columns)
+
+    def tail(self, number: int) -> DataFrame:
+        """Returns the newest number of candles"""
+        return self._frame(max(0, self.count - number), self.count)
+
+    def _frame(
+        self, lo: int, hi: int, columns: Optional[list[str]] = None
+    ) -> DataFrame:
+        data = {"date": self._map("date")[lo:hi].astype("datetime64[ns]")}
+        for column in columns or CANDLE_COLUMNS:
+            data[column] = np.array(self._map(column)[lo:hi])
+        return DataFrame(data)
+
+    def iter_chunks(
+        self,
+        size: int,
+        start: TimeLike = None,
+        end: TimeLike = None,
+    ) -> Iterator[DataFrame]:
+        """Yields the range in frames of at most size candles"""
+        lo, hi = self._bounds(start, end)
+        for offset in range(lo, hi, size):
+            yield self._frame(offset, min(offset + size, hi))
+
+    def append(self, times: np.ndarray, values: np.ndarray) -> AppendResult:
+        """Stores candles, dropping the ones already in the archive
+
+        Candles after the last stored one are appended to the column
+        files, older ones that are missing are merged in by rewriting
+        the series.
+        """
+        times = np.asarray(times, dtype="datetime64[ns]").astype(np.int64)
+        values = np.asarray(values, dtype=np.float64)
+        result = AppendResult()
+        if len(times) == 0:
+            return result
+        received = len(times)
+        times, first = np.unique(times, return_index=True)
+        values = values[first]
+        result.duplicates = received - len(times)
+
+        existing = self._map("date")
+        positions = np.searchsorted(existing, times)
+        present = np.zeros(len(times), dtype=bool)
+        inside = positions < self.count
+        present[inside] = existing[positions[inside]] == times[inside]
+        result.duplicates += int(present.sum())
+        times, values = times[~present], values[~present]
+        if len(times) == 0:
+            return result
+
+        if self.count == 0 or times[0] > existing[-1]:
+            self._append_rows(times, values)
+        else:
+            self._merge_rows(existing, times, values)
+            result.rewritten = True
+        result.appended = len(times)
+        # include the stored candles either side of the new ones
+        stored = self._map("date")
+        lo = max(0, int(np.searchsorted(stored, times[0])) - 1)
+        hi = int(np.searchsorted(stored, times[-1])) + 2
+        result.gaps = self._find_gaps(lo, min(hi, self.count))
+        for gap in result.gaps:
+            logger.warning(
+                "%s candles missing in %s between %s and %s"
+                % (gap.missing, self.path, gap.after, gap.before)
+            )
+        return result
+
+    def _append_rows(self, times: np.ndarray, values: np.ndarray) -> None:
+        columns = {"date": times}
+        columns.update(zip(CANDLE_COLUMNS, values.T))
+        for column, data in columns.items():
+            with open(self._column_path(column), "ab") as f:
+                # drop whatever a torn append left after the last commit
+                f.truncate(self.count * 8)
+                f.write(np.ascontiguousarray(data).tobytes())
+        self._write_meta(self.count + len(times))
+
+    def _merge_rows(
+        self, existing: np.ndarray, times: np.ndarray, values: np.ndarray
+    ) -> None:
+        merged_times = np.concatenate([np.array(existing), times])
+        order = np.argsort(merged_times, kind="stable")
+        columns = {"date": merged_times[order]}
+        for index, column in enumerate(CANDLE_COLUMNS):
+            columns[column] = np.concatenate(
+                [np.array(self._map(column)), values[:, index]]
+            )[order]
+        for column, data in columns.items():
+            path = self._column_path(column)
+            with open(path + ".tmp", "wb") as f:
+                f.write(data.tobytes())
+            os.replace(path + ".tmp", path)
+        self._write_meta(len(merged_times))
+
+    def find_gaps(
+        self,
+        start: TimeLike = None,
+        end: TimeLike = None,
+        skip_weekends: bool = True,
+    ) -> list[Gap]:
+        """Finds the candles missing between stored ones
+
+        The market closes from Friday evening to Sunday evening, with
+        skip_weekends such gaps are not reported.
+        """
+        lo, hi = self._bounds(start, end)
+        return self._find_gaps(lo, hi, skip_weekends)
+
+    def _find_gaps(
+        self, lo: int, hi: int, skip_weekends: bool = True
+    ) -> list[Gap]:
+        times = np.array(self._map("date")[lo:hi])
+        if len(times) < 2:
+            return []
+        deltas = np.diff(times)
+        indices = np.flatnonzero(deltas > self.step)
+        if skip_weekends and len(indices):
+            # 1970-01-01 was a Thursday, shift so Monday is 0
+            weekday = (times // DAY_NS + 3) % 7
+            after, before = weekday[indices], weekday[indices + 1]
+            weekend = (
+                ((after == 4) | (after == 5)) & ((before == 6) | (before == 0))
+            ) & (deltas[indices] < 3 * DAY_NS)
+            indices = indices[~weekend]
+        return [
+            Gap(
+                after=np.datetime64(int(times[i]), "ns"),
+                before=np.datetime64(int(times[i + 1]), "ns"),
+                missing=int(deltas[i] // self.step) - 1,
+            )
+            for i in indices
+        ]
+
+
+class CandleArchive:
+    """Append only on disk store of historical candles
+
+    One directory per instrument and period under root, read back as
+    frames with the same columns as the refined broker data so the
+    indicators and signals can run straight over the history.
+    """
+
+    def __init__(self, root: str) -> None:
+        self.root = root
+        self._series: dict[tuple[str, PeriodEnum], ArchivedSeries] = {}
+
+    def series(
+        self, instrument: Union[ForexPairEnum, str], period: PeriodEnum
+    ) -> ArchivedSeries:
+        """Returns the archived series of an instrument and period"""
+        key = (instrument_key(instrument), period)
+        if key not in self._series:
+            self._series[key] = ArchivedSeries(
+                os.path.join(self.root, key[0], period.value), period
+            )
+        return self._series[key]
+
+    def append(
+        self,
+        instrument: Union[ForexPairEnum, str],
+        period: PeriodEnum,
+        times: np.ndarray,
+        values: np.ndarray,
+    ) -> AppendResult:
+        """Stores candles given as times and an (n, 5) array of open,
+        high, low, close and volume"""
+        return self.series(instrument, period).append(times, values)
+
+    def append_candles(
+        self,
+        instrument: Union[ForexPairEnum, str],
+        period: PeriodEnum,
+        data: dict,
+    ) -> AppendResult:
+        """Stores the completed candles of a v20 candles response"""
+        times, values, complete = parse_candle_arrays(data["candles"])
+        return self.append(
+            instrument, period, times[complete], values[complete]
+        )
+
+    def read(
+        self,
+        instrument: Union[ForexPairEnum, str],
+        period: PeriodEnum,
+        start: TimeLike = None,
+        end: TimeLike = None,
+    ) -> DataFrame:
+        """Returns the candles with start <= time < end"""
+        return self.series(instrument, period).read(start, end)
+
+    def find_gaps(
+        self,
+        instrument: Union[ForexPairEnum, str],
+        period: PeriodEnum,
+        start: TimeLike = None,
+        end: TimeLike = None,
+    ) -> list[Gap]:
+        """Finds the candles missing from the archive"""
+        return self.series(instrument, period).find_gaps(start, end)
+
+    def list_series(self) -> list[tuple[str, PeriodEnum]]:
+        """Returns the instrument and period of every stored series"""
+        if not os.path.isdir(self.root):
+            return []
+        periods = {period.value: period for period in PeriodEnum}
+        stored = []
+        for instrument in sorted(os.listdir(self.root)):
+            directory = os.path.join(self.root, instrument)
+            for name in sorted(os.listdir(directory)):
+                if name in periods and os.path.exists(
+                    os.path.join(directory, name, "meta.json")
+                ):
+                    stored.append((instrument, periods[name]))
+        return stored
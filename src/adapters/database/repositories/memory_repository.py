@@ -0,0 +1,194 @@
+"""Repositories kept in memory, for replays that run the handlers
+without a database
+
+They answer the queries of the mongo repositories the same way. Saving
+and reading go through copies, so a handler changing a trade it read
+only changes what is stored once it saves it, as with mongo.
+"""
+
+import copy
+import datetime
+from typing import Optional
+
+from src.config import CurrencyEnum, ForexPairEnum, PositionEnum
+from src.domain.fundamental import FundamentalData
+from src.domain.trade import Trade
+
+
+class InMemoryTradeRepository:
+    def __init__(self) -> None:
+        self.trades: dict[str, Trade] = {}
+
+    def _find(self, predicate) -> list[Trade]:
+        return [
+            copy.deepcopy(trade)
+            for trade in self.trades.values()
+            if predicate(trade)
+        ]
+
+    async def save(self, obj: Trade) -> Trade:
+        """Add an object"""
+        self.trades[str(obj.trade_id)] = copy.deepcopy(obj)
+        return obj
+
+    async def get_all(self, **kwargs) -> list[Trade]:
+        """Get all trade objects"""
+        date = kwargs.pop("last_updated", None)
+        if date is None:
+            return self._find(lambda trade: True)
+        next_day = date + datetime.timedelta(days=1)
+        return self._find(
+            lambda trade: date <= trade.initiated_date <= next_day
+        )
+
+    async def get_trade_by_trade_id(self, trade_id: str) -> Optional[Trade]:
+        """Get a single trade"""
+        trade = self.trades.get(str(trade_id))
+        return copy.deepcopy(trade) if trade is not None else None
+
+    async def get_bullish_trades(self, currency: CurrencyEnum) -> list[Trade]:
+        """Get all bullish trades"""
+        return self._find(
+            lambda trade: trade.position == PositionEnum.OPEN
+            and (
+                (trade.is_buy and trade.base_currency == currency)
+                or (not trade.is_buy and trade.quote_currency == currency)
+            )
+        )
+
+    async def get_bearish_trades(self, currency: CurrencyEnum) -> list[Trade]:
+        """Get all bearish trades"""
+        return self._find(
+            lambda trade: trade.position == PositionEnum.OPEN
+            and (
+                (not trade.is_buy and trade.base_currency == currency)
+                or (trade.is_buy and trade.quote_currency == currency)
+            )
+        )
+
+    async def get_open_trades_by_forex_pair_for_buy_or_sell(
+        self, forex_pair: ForexPairEnum, is_buy: bool
+    ) -> list[Trade]:
+        """Get all open trades by forex pair"""
+        return self._find(
+            lambda trade: trade.forex_currency_pair == forex_pair
+            and trade.position == PositionEnum.OPEN
+            and trade.is_buy == is_buy
+        )
+
+    async def get_open_trades_by_forex_pair(
+        self, forex_pair: ForexPairEnum
+    ) -> list[Trade]:
+        """Get all open trades by forex pair"""
+        return self._find(
+            lambda trade: trade.forex_currency_pair == forex_pair
+            and trade.position == PositionEnum.OPEN
+        )
+
+    async def get_open_trades(self) -> list[Trade]:
+        """Get all open trades"""
+        return self._find(
+            lambda trade: trade.position == PositionEnum.OPEN
+            or trade.realised_pl is None
+        )
+
+    async def get_distinct_forex_pairs(self) -> list[ForexPairEnum]:
+        """Get all distinct forex pairs"""
+        return list(
+            dict.fromkeys(
+                trade.forex_currency_pair for trade in self.trades.values()
+            )
+        )
+
+    async def get_sum_of_realised_pl(self) -> float:
+        """Get sum of realised pl"""
+        return sum(
+            trade.realised_pl
+            for trade in self.trades.values()
+            if trade.realised_pl is not None
+        )
+
+    async def get_history_version(self) -> str:
+        """Changes whenever a trade is closed or its realised pl is"""
+        closed = [
+            trade.realised_pl
+            for trade in self.trades.values()
+            if trade.realised_pl is not None
+        ]
+        return "%s:%.8f" % (len(closed), sum(closed))
+
+    async def bulk_update_closed_trades(self, trades: list[Trade]) -> int:
+        """Write the position and realised pl of many trades at once"""
+        modified = 0
+        for trade in trades:
+            stored = self.trades.get(str(trade.trade_id))
+            if stored is None:
+                continue
+            update = (trade.position, trade.realised_pl, trade.is_winner)
+            if (stored.position, stored.realised_pl, stored.is_winner) != (
+                update
+            ):
+                stored.position, stored.realised_pl, stored.is_winner = update
+                modified += 1
+        return modified
+
+
+class InMemoryFundamentalDataRepository:
+    def __init__(self) -> None:
+        self.data: dict[tuple, FundamentalData] = {}
+
+    def _find(self, predicate) -> list[FundamentalData]:
+        return [
+            copy.deepcopy(data)
+            for data in self.data.values()
+            if predicate(data)
+        ]
+
+    async def save(self, obj: FundamentalData) -> FundamentalData:
+        """Add an object"""
+        self.data[(obj.currency, obj.last_updated)] = copy.deepcopy(obj)
+        return obj
+
+    async def get_all(self, **kwargs) -> list[FundamentalData]:
+        date = kwargs.pop("last_updated", None)
+        next_day = date + datetime.timedelta(days=1) if date else None
+        return self._find(
+            lambda data: all(
+                getattr(data, name) == value for name, value in kwargs.items()
+            )
+            and (date is None or date <= data.last_updated <= next_day)
+        )
+
+    async def get_all_data_older_than_given_date(
+        self, date_: datetime.datetime
+    ) -> list[FundamentalData]:
+        return self._find(
+            lambda data: data.last_updated <= date_ and not data.processed
+        )
+
+    async def get_fundamental_data(
+        self, currency: CurrencyEnum, last_updated: datetime.datetime
+    ) -> Optional[FundamentalData]:
+        data = self.data.get((currency, last_updated))
+        return copy.deepcopy(data) if data is not None else None
+
+    async def get_latest_fundamental_data(
+        self, currency: CurrencyEnum
+    ) -> Optional[FundamentalData]:
+        """Gets the latest fundamental data for a currency"""
+        data = [
+            data for data in self.data.values() if data.currency == currency
+        ]
+        if not data:
+            return None
+        return copy.deepcopy(max(data, key=lambda data: data.last_updated))
+
+    async def get_fundamental_data_for_unprocessed_events(
+        self,
+    ) -> list[FundamentalData]:
+        """Gets fundamental data for unprocessed events"""
+        return self._find(lambda data: not data.processed)
+
+    async def delete_all(self) -> None:
+        """Deletes all fundamental data"""
+        self.data.clear()
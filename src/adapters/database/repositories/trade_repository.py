@@ -6,6 +6,7 @@ from src.adapters.database.mongo.trade_model import (
     map_to_domain_model,
 )
 from mongoengine import Q
+from pymongo import UpdateOne
 from datetime import timedelta
 
 
@@ -98,3 +99,32 @@ class TradeRepository:
     async def get_sum_of_realised_pl(self) -> float:
         """Get sum of realised pl"""
         return TradeModel.objects().sum("realised_pl")
+
+    async def get_history_version(self) -> str:
+        """Changes whenever a trade is closed or its realised pl is"""
+        closed = TradeModel.objects(realised_pl__ne=None)
+        return "%s:%.8f" % (closed.count(), closed.sum("realised_pl"))
+
+    async def bulk_update_closed_trades(
+        self, trades: list[TradeDomain]
+    ) -> int:
+        """Write the position and realised pl of many trades at once"""
+        if not trades:
+            return 0
+        operations = [
+            UpdateOne(
+                {"_id": trade.trade_id},
+                {
+                    "$set": {
+                        "position": trade.position.value,
+                        "realised_pl": trade.realised_pl,
+                        "is_winner": trade.is_winner,
+                    }
+                },
+            )
+            for trade in trades
+        ]
+        result = TradeModel._get_collection().bulk_write(
+            operations, ordered=False
+        )
+        return result.modified_count
@@ -0,0 +1,169 @@
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+from oandapyV20.endpoints.accounts import AccountChanges, AccountDetails
+from oandapyV20.exceptions import V20Error
+
+from src.adapters.fxcm_connect.async_transport import AsyncV20API
+from src.logger import get_logger
+
+logger = get_logger(__name__)
+
+# fields of the account and of the AccountChanges state kept in memory
+ACCOUNT_FIELDS = {
+    "balance": "balance",
+    "NAV": "nav",
+    "unrealizedPL": "unrealized_pl",
+    "marginUsed": "margin_used",
+    "marginAvailable": "margin_available",
+    "positionValue": "position_value",
+    "withdrawalLimit": "withdrawal_limit",
+}
+
+
+@dataclass
+class AccountSnapshot:
+    balance: float = 0.0
+    nav: float = 0.0
+    unrealized_pl: float = 0.0
+    margin_used: float = 0.0
+    margin_available: float = 0.0
+    position_value: float = 0.0
+    withdrawal_limit: float = 0.0
+    open_trade_count: int = 0
+    pending_order_count: int = 0
+    last_transaction_id: Optional[str] = None
+
+
+class AccountStateCache:
+    """In memory view of the account kept current with AccountChanges
+
+    The full account is downloaded once, after that only the changes
+    since the last seen transaction are requested, and only once the
+    state is older than max_age. A failed incremental poll falls back
+    to a full reload.
+    """
+
+    def __init__(
+        self, client: AsyncV20API, account_id: str, max_age: float = 5.0
+    ) -> None:
+        self.client = client
+        self.account_id = account_id
+        self.max_age = max_age
+        self.snapshot = AccountSnapshot()
+        self._trades: dict[str, dict] = {}
+        self._orders: dict[str, dict] = {}
+        self._synced_at: Optional[float] = None
+        self._lock = asyncio.Lock()
+        self.full_loads = 0
+        self.polls = 0
+
+    @property
+    def loaded(self) -> bool:
+        return self.snapshot.last_transaction_id is not None
+
+    def is_stale(self) -> bool:
+        """Whether the state is older than max_age"""
+        return (
+            self._synced_at is None
+            or time.monotonic() - self._synced_at >= self.max_age
+        )
+
+    def invalidate(self) -> None:
+        """Make the next lookup fetch the latest changes"""
+        self._synced_at = None
+
+    async def get_snapshot(self) -> AccountSnapshot:
+        """Returns the account state, at most max_age seconds old"""
+        if self.is_stale():
+            async with self._lock:
+                if self.is_stale():
+                    await self._sync()
+        return self.snapshot
+
+    async def get_balance(self) -> float:
+        """Returns the account balance"""
+        return (await self.get_snapshot()).balance
+
+    async def get_nav(self) -> float:
+        """Returns the net asset value"""
+        return (await self.get_snapshot()).nav
+
+    async def get_margin_available(self) -> float:
+        """Returns the margin available"""
+        return (await self.get_snapshot()).margin_available
+
+    async def get_open_trade_count(self) -> int:
+        """Returns the number of open trades"""
+        return (await self.get_snapshot()).open_trade_count
+
+    async def _sync(self) -> None:
+        if not self.loaded:
+            await self.load()
+            return
+        try:
+            await self.poll()
+        except V20Error as e:
+            logger.warning("Account changes failed, reloading: %r" % e)
+            await self.load()
+
+    async def load(self) -> None:
+        """Download the full account"""
+        response = await self.client.request(AccountDetails(self.account_id))
+        account = response["account"]
+        self._apply_state(account)
+        self._trades = {str(t["id"]): t for t in account.get("trades", [])}
+        self._orders = {str(o["id"]): o for o in account.get("orders", [])}
+        self._update_counts()
+        self.snapshot.last_transaction_id = str(
+            response["lastTransactionID"]
+        )
+        self._synced_at = time.monotonic()
+        self.full_loads += 1
+
+    async def poll(self) -> None:
+        """Apply the changes since the last seen transaction"""
+        response = await self.client.request(
+            AccountChanges(
+                self.account_id,
+                params={
+                    "sinceTransactionID": self.snapshot.last_transaction_id
+                },
+            )
+        )
+        changes = response.get("changes", {})
+        for trade in changes.get("tradesOpened", []):
+            self._trades[str(trade["id"])] = trade
+        for trade in changes.get("tradesReduced", []):
+            self._trades[str(trade["id"])] = trade
+        for trade in changes.get("tradesClosed", []):
+            self._trades.pop(str(trade["id"]), None)
+        for order in changes.get("ordersCreated", []):
+            self._orders[str(order["id"])] = order
+        for key in ("ordersCancelled", "ordersFilled", "ordersTriggered"):
+            for order in changes.get(key, []):
+                self._orders.pop(str(order["id"]), None)
+
+        # the balance is only part of the state on newer api versions,
+        # otherwise the last transaction that moved it carries it
+        for transaction in changes.get("transactions", []):
+            if "accountBalance" in transaction:
+                self.snapshot.balance = float(transaction["accountBalance"])
+        self._apply_state(response.get("state", {}))
+        self._update_counts()
+        self.snapshot.last_transaction_id = str(
+            response["lastTransactionID"]
+        )
+        self._synced_at = time.monotonic()
+        self.polls += 1
+
+    def _apply_state(self, state: dict) -> None:
+        for key, name in ACCOUNT_FIELDS.items():
+            if key in state:
+                setattr(self.snapshot, name, float(state[key]))
+
+    def _update_counts(self) -> None:
+        self.snapshot.open_trade_count = len(self._trades)
+        self.snapshot.pending_order_count = len(self._orders)
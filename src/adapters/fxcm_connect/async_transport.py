@@ -0,0 +1,371 @@
+import asyncio
+import json
+import ssl
+import time
+import zlib
+from collections import deque
+from typing import Any, AsyncIterator, Optional, Union
+from urllib.parse import urlencode, urlsplit
+
+from oandapyV20.exceptions import V20Error
+from oandapyV20.oandapyV20 import TRADING_ENVIRONMENTS
+
+from src.logger import get_logger
+
+logger = get_logger(__name__)
+
+CRLF = b"\r\n"
+
+
+class _Connection:
+    """A single keep-alive connection to a host"""
+
+    def __init__(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        self.reader = reader
+        self.writer = writer
+        self.last_used = time.monotonic()
+        self.requests = 0
+
+    def is_usable(self, keepalive_expiry: float) -> bool:
+        """Whether the connection can be reused for another request"""
+        if self.writer.is_closing() or self.reader.at_eof():
+            return False
+        return time.monotonic() - self.last_used < keepalive_expiry
+
+    def close(self) -> None:
+        """Closes the underlying socket"""
+        self.writer.close()
+
+
+class HostConnectionPool:
+    """Pool of keep-alive connections to a single host
+
+    The number of connections open at the same time is bounded by
+    max_connections, requests above that wait for a free connection.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        use_ssl: bool,
+        max_connections: int = 10,
+        connect_timeout: float = 5.0,
+        keepalive_expiry: float = 60.0,
+    ) -> None:
+        self.host = host
+        self.port = port
+        self.ssl_context = ssl.create_default_context() if use_ssl else None
+        self.max_connections = max_connections
+        self.connect_timeout = connect_timeout
+        self.keepalive_expiry = keepalive_expiry
+        self._semaphore = asyncio.Semaphore(max_connections)
+        self._idle: deque[_Connection] = deque()
+        self.connections_opened = 0
+
+    @property
+    def idle_connections(self) -> int:
+        """Number of idle connections waiting to be reused"""
+        return len(self._idle)
+
+    async def acquire(self) -> tuple[_Connection, bool]:
+        """Acquire a connection, returns the connection and whether it
+        was reused from the pool"""
+        await self._semaphore.acquire()
+        try:
+            while self._idle:
+                connection = self._idle.pop()
+                if connection.is_usable(self.keepalive_expiry):
+                    return connection, True
+                connection.close()
+            return await self._open(), False
+        except BaseException:
+            self._semaphore.release()
+            raise
+
+    def release(self, connection: _Connection, reusable: bool) -> None:
+        """Return a connection to the pool"""
+        connection.last_used = time.monotonic()
+        if reusable:
+            self._idle.append(connection)
+        else:
+            connection.close()
+        self._semaphore.release()
+
+    async def _open(self) -> _Connection:
+        """Open a new connection to the host"""
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(
+                self.host,
+                self.port,
+                ssl=self.ssl_context,
+                limit=2**20,
+            ),
+            timeout=self.connect_timeout,
+        )
+        self.connections_opened += 1
+        return _Connection(reader, writer)
+
+    async def close(self) -> None:
+        """Close all idle connections"""
+        while self._idle:
+            self._idle.pop().close()
+
+
+class _Response:
+    def __init__(
+        self, status: int, headers: dict[str, str], body: bytes = b""
+    ) -> None:
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+    @property
+    def keep_alive(self) -> bool:
+        return self.headers.get("connection", "").lower() != "close"
+
+    @property
+    def chunked(self) -> bool:
+        return (
+            "chunked" in self.headers.get("transfer-encoding", "").lower()
+        )
+
+    def text(self) -> str:
+        encoding = self.headers.get("content-encoding", "").lower()
+        body = self.body
+        if encoding == "gzip":
+            body = zlib.decompress(body, 16 + zlib.MAX_WBITS)
+        elif encoding == "deflate":
+            body = zlib.decompress(body)
+        return body.decode("utf-8")
+
+
+class AsyncV20API:
+    """Non blocking client for the Oanda v20 REST api
+
+    Takes the same APIRequest endpoint objects as oandapyV20.API and
+    mirrors its request semantics (endpoint.response is populated and a
+    V20Error is raised for responses >= 400), but performs the request
+    on the event loop over a pool of keep-alive connections per host.
+    """
+
+    def __init__(
+        self,
+        access_token: str,
+        environment: str = "practice",
+        api_url: Optional[str] = None,
+        stream_url: Optional[str] = None,
+        headers: Optional[dict[str, str]] = None,
+        max_connections_per_host: int = 10,
+        timeout: float = 10.0,
+        connect_timeout: float = 5.0,
+        stream_timeout: float = 30.0,
+        keepalive_expiry: float = 60.0,
+    ) -> None:
+        if environment not in TRADING_ENVIRONMENTS and not api_url:
+            raise KeyError("Unknown environment: %s" % environment)
+        urls = TRADING_ENVIRONMENTS.get(environment, {})
+        if api_url:
+            urls = {"api": api_url, "stream": api_url}
+        self.api_url = urls["api"]
+        self.stream_url = stream_url or urls["stream"]
+        self.access_token = access_token
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.stream_timeout = stream_timeout
+        self.keepalive_expiry = keepalive_expiry
+        self.max_connections_per_host = max_connections_per_host
+        self.headers = {"Accept-Encoding": "gzip, deflate"}
+        if access_token:
+            self.headers["Authorization"] = "Bearer " + access_token
+        if headers:
+            self.headers.update(headers)
+        self._pools: dict[tuple[str, int, bool], HostConnectionPool] = {}
+
+    def get_pool(self, url: str) -> HostConnectionPool:
+        """Returns the connection pool for the host of a url"""
+        parts = urlsplit(url)
+        use_ssl = parts.scheme == "https"
+        port = parts.port or (443 if use_ssl else 80)
+        key = (parts.hostname, port, use_ssl)
+        if key not in self._pools:
+            self._pools[key] = HostConnectionPool(
+                host=parts.hostname,
+                port=port,
+                use_ssl=use_ssl,
+                max_connections=self.max_connections_per_host,
+                connect_timeout=self.connect_timeout,
+                keepalive_expiry=self.keepalive_expiry,
+            )
+        return self._pools[key]
+
+    async def request(self, endpoint) -> Union[dict, AsyncIterator[dict]]:
+        """Perform a request for the APIRequest instance endpoint"""
+        method = endpoint.method.upper()
+        params = getattr(endpoint, "params", None) or {}
+        headers = dict(getattr(endpoint, "HEADERS", {}))
+        body = None
+        if method != "GET" and getattr(endpoint, "data", None):
+            body = json.dumps(endpoint.data).encode("utf-8")
+            headers.setdefault("Content-Type", "application/json")
+
+        is_stream = getattr(endpoint, "STREAM", False) is True
+        base_url = self.stream_url if is_stream else self.api_url
+        url = "%s/%s" % (base_url, endpoint)
+        if method == "GET" and params:
+            url = "%s?%s" % (url, urlencode(params))
+
+        if is_stream:
+            endpoint.response = self._stream(method, url, headers, body)
+            return endpoint.response
+
+        async with asyncio.timeout(self.timeout):
+            response = await self._send(method, url, headers, body)
+        content = json.loads(response.text()) if response.body else {}
+        endpoint.response = content
+        endpoint.status_code = response.status
+        return content
+
+    async def _send(
+        self,
+        method: str,
+        url: str,
+        headers: dict[str, str],
+        body: Optional[bytes],
+    ) -> _Response:
+        """Send a request and read the full response"""
+        pool = self.get_pool(url)
+        while True:
+            connection, reused = await pool.acquire()
+            reusable = False
+            try:
+                await self._write_request(
+                    connection, method, url, headers, body
+                )
+                response = await self._read_head(connection)
+                response.body = await self._read_body(connection, response)
+                reusable = response.keep_alive
+            except (asyncio.IncompleteReadError, ConnectionError) as e:
+                # the server may have dropped an idle keep-alive
+                # connection, retry reads once on a fresh connection
+                if reused and method == "GET":
+                    logger.info("Retrying %s on a new connection" % url)
+                    continue
+                raise e
+            finally:
+                pool.release(connection, reusable)
+            break
+
+        if response.status >= 400:
+            logger.error(
+                "request %s failed [%s,%s]"
+                % (url, response.status, response.text())
+            )
+            raise V20Error(response.status, response.text())
+        return response
+
+    async def _stream(
+        self,
+        method: str,
+        url: str,
+        headers: dict[str, str],
+        body: Optional[bytes],
+    ) -> AsyncIterator[dict]:
+        """Yield the json lines of a streaming endpoint"""
+        pool = self.get_pool(url)
+        connection, _ = await pool.acquire()
+        try:
+            async with asyncio.timeout(self.timeout):
+                await self._write_request(
+                    connection, method, url, headers, body
+                )
+                response = await self._read_head(connection)
+            if response.status >= 400:
+                response.body = await self._read_body(connection, response)
+                raise V20Error(response.status, response.text())
+
+            buffer = b""
+            async for chunk in self._iter_body(connection, response):
+                buffer += chunk
+                *lines, buffer = buffer.split(b"\n")
+                for line in lines:
+                    if line.strip():
+                        yield json.loads(line)
+        finally:
+            # a stream connection is never handed back for reuse
+            pool.release(connection, False)
+
+    async def _write_request(
+        self,
+        connection: _Connection,
+        method: str,
+        url: str,
+        headers: dict[str, str],
+        body: Optional[bytes],
+    ) -> None:
+        parts = urlsplit(url)
+        target = parts.path + ("?" + parts.query if parts.query else "")
+        lines = [
+            "%s %s HTTP/1.1" % (method, target),
+            "Host: %s" % parts.netloc,
+            "Connection: keep-alive",
+        ]
+        for key, value in {**self.headers, **headers}.items():
+            lines.append("%s: %s" % (key, value))
+        if body is not None or method in ("POST", "PUT", "PATCH"):
+            lines.append("Content-Length: %s" % len(body or b""))
+        payload = ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+        connection.writer.write(payload + (body or b""))
+        connection.requests += 1
+        await connection.writer.drain()
+
+    async def _read_head(self, connection: _Connection) -> _Response:
+        status_line = await connection.reader.readuntil(CRLF)
+        status = int(status_line.split(b" ", 2)[1])
+        headers: dict[str, str] = {}
+        while True:
+            line = await connection.reader.readuntil(CRLF)
+            if line == CRLF:
+                break
+            key, _, value = line.decode("latin-1").partition(":")
+            headers[key.strip().lower()] = value.strip()
+        return _Response(status, headers)
+
+    async def _read_body(
+        self, connection: _Connection, response: _Response
+    ) -> bytes:
+        chunks = [c async for c in self._iter_body(connection, response)]
+        return b"".join(chunks)
+
+    async def _iter_body(
+        self, connection: _Connection, response: _Response
+    ) -> AsyncIterator[bytes]:
+        reader = connection.reader
+        if response.chunked:
+            while True:
+                size_line = await self._read_stream(reader.readuntil(CRLF))
+                size = int(size_line.split(b";")[0], 16)
+                if size == 0:
+                    await reader.readuntil(CRLF)
+                    return
+                data = await self._read_stream(reader.readexactly(size + 2))
+                yield data[:-2]
+        elif "content-length" in response.headers:
+            length = int(response.headers["content-length"])
+            if length:
+                yield await reader.readexactly(length)
+        else:
+            response.headers["connection"] = "close"
+            while chunk := await self._read_stream(reader.read(65536)):
+                yield chunk
+
+    async def _read_stream(self, awaitable: Any) -> Any:
+        """Reads from the socket, bounded by the stream timeout"""
+        return await asyncio.wait_for(awaitable, timeout=self.stream_timeout)
+
+    async def close(self) -> None:
+        """Close all pooled connections"""
+        for pool in self._pools.values():
+            await pool.close()
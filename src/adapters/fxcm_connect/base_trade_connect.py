@@ -1,7 +1,13 @@
 from abc import ABC, abstractmethod
+from typing import Optional
 
 from pandas import DataFrame
-from src.config import ForexPairEnum, OrderTypeEnum, PeriodEnum
+from src.config import (
+    ForexPairEnum,
+    GBPConversionMapEnum,
+    OrderTypeEnum,
+    PeriodEnum,
+)
 
 from src.domain.errors.errors import InvalidTradeParameter
 
@@ -102,10 +108,27 @@ class BaseTradeConnect(ABC):
         """returns the account details"""
         raise NotImplementedError
 
+    async def start_price_stream(self) -> None:
+        """Streams prices in the background, connections without a
+        stream serve prices on request"""
+
+    async def start_transaction_stream(self, publish) -> None:
+        """Publishes the domain events of account transactions as they
+        happen, connections without a stream rely on polling"""
+
     async def get_latest_close(self, instrument: ForexPairEnum) -> float:
         """returns the latest close"""
         raise NotImplementedError
 
+    async def get_prices(
+        self, instruments: list[GBPConversionMapEnum]
+    ) -> dict[str, float]:
+        """returns the latest close of each instrument keyed by name"""
+        return {
+            instrument.value: await self.get_latest_close(instrument)
+            for instrument in instruments
+        }
+
     async def modify_trade(
         self, trade_id: str, stop: float, limit: float = None
     ) -> str:
@@ -116,6 +139,22 @@ class BaseTradeConnect(ABC):
         """Gets the trade details"""
         raise NotImplementedError
 
+    async def get_trades_by_ids(
+        self, trade_ids: list[str]
+    ) -> dict[str, tuple[str, float]]:
+        """Gets the state and realised pl of each trade the broker knows"""
+        trades = {}
+        for trade_id in trade_ids:
+            state, realised_pl = await self.get_trade_state(trade_id)
+            if state is not None:
+                trades[trade_id] = (state, realised_pl)
+        return trades
+
+    async def get_open_trade_ids(self) -> Optional[set[str]]:
+        """Gets the ids of every trade open at the broker, None when the
+        connection can not list them"""
+        return None
+
     async def get_pending_orders(self):
         """Gets the pending orders"""
         raise NotImplementedError
@@ -0,0 +1,182 @@
+import asyncio
+from typing import Awaitable, Callable, Optional
+
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+from src.adapters.fxcm_connect.candle_parser import (
+    CANDLE_COLUMNS,
+    parse_candle_arrays,
+)
+from src.config import ForexPairEnum, PeriodEnum
+from src.logger import get_logger
+
+logger = get_logger(__name__)
+
+FetchCandles = Callable[
+    [ForexPairEnum, PeriodEnum, dict], Awaitable[dict]
+]
+
+
+def to_rfc3339(time: np.datetime64) -> str:
+    """Formats a timestamp the way the v20 api expects it"""
+    return str(time.astype("datetime64[ns]")) + "Z"
+
+
+class CandleRingBuffer:
+    """Fixed size ring buffer of candles ordered by time"""
+
+    def __init__(self, capacity: int) -> None:
+        self.capacity = capacity
+        self._times = np.zeros(capacity, dtype="datetime64[ns]")
+        self._values = np.zeros((capacity, len(CANDLE_COLUMNS)))
+        self._start = 0
+        self.size = 0
+
+    @property
+    def last_time(self) -> Optional[np.datetime64]:
+        """The time of the newest candle in the buffer"""
+        if self.size == 0:
+            return None
+        return self._times[(self._start + self.size - 1) % self.capacity]
+
+    def append(self, time: np.datetime64, values: np.ndarray) -> None:
+        """Appends a candle, a candle with the same time as the newest
+        one replaces it"""
+        last_time = self.last_time
+        if last_time is not None and time < last_time:
+            return
+        if last_time is not None and time == last_time:
+            index = (self._start + self.size - 1) % self.capacity
+        elif self.size < self.capacity:
+            index = (self._start + self.size) % self.capacity
+            self.size += 1
+        else:
+            index = self._start
+            self._start = (self._start + 1) % self.capacity
+        self._times[index] = time
+        self._values[index] = values
+
+    def extend(self, times: np.ndarray, values: np.ndarray) -> None:
+        """Appends candles in time order"""
+        for time, row in zip(times, values):
+            self.append(time, row)
+
+    def window(self, number: int) -> DataFrame:
+        """Returns the newest number of candles oldest first"""
+        number = min(number, self.size)
+        indices = (
+            self._start + self.size - number + np.arange(number)
+        ) % self.capacity
+        data = DataFrame(self._values[indices], columns=CANDLE_COLUMNS)
+        data.insert(0, "date", pd.to_datetime(self._times[indices]))
+        return data
+
+
+class _CandleSeries:
+    def __init__(self, capacity: int) -> None:
+        self.buffer = CandleRingBuffer(capacity)
+        self.last_complete_time: Optional[np.datetime64] = None
+        # the broker had fewer candles than the window, there is no
+        # older history to download
+        self.exhausted = False
+        self.lock = asyncio.Lock()
+
+
+class CandleCache:
+    """In process store of candles per instrument and period
+
+    The first request for an instrument and period downloads the full
+    window, later requests only ask the broker for the candles after the
+    last completed one and replace the still forming candle.
+    """
+
+    def __init__(
+        self, fetch_candles: FetchCandles, capacity: int = 500
+    ) -> None:
+        self.fetch_candles = fetch_candles
+        self.capacity = capacity
+        self._series: dict[tuple[str, PeriodEnum], _CandleSeries] = {}
+        self.candles_downloaded = 0
+
+    async def get_candle_data(
+        self, instrument: ForexPairEnum, period: PeriodEnum, number: int
+    ) -> DataFrame:
+        """Returns the newest number of candles for an instrument"""
+        if number > self.capacity:
+            response = await self.fetch_candles(
+                instrument, period, {"count": number}
+            )
+            series = _CandleSeries(number)
+            self._store(series, response["candles"])
+            return series.buffer.window(number)
+
+        key = (instrument.value, period)
+        if key not in self._series:
+            self._series[key] = _CandleSeries(self.capacity)
+        series = self._series[key]
+
+        async with series.lock:
+            if series.last_complete_time is None or (
+                series.buffer.size < number and not series.exhausted
+            ):
+                await self._refresh(instrument, period, series)
+            else:
+                await self._update(instrument, period, series)
+            return series.buffer.window(number)
+
+    async def _refresh(
+        self,
+        instrument: ForexPairEnum,
+        period: PeriodEnum,
+        series: _CandleSeries,
+    ) -> None:
+        """Download the full window for a series"""
+        response = await self.fetch_candles(
+            instrument, period, {"count": self.capacity}
+        )
+        series.buffer = CandleRingBuffer(self.capacity)
+        series.last_complete_time = None
+        series.exhausted = len(response["candles"]) < self.capacity
+        self._store(series, response["candles"])
+
+    async def _update(
+        self,
+        instrument: ForexPairEnum,
+        period: PeriodEnum,
+        series: _CandleSeries,
+    ) -> None:
+        """Download the candles after the last completed one"""
+        response = await self.fetch_candles(
+            instrument,
+            period,
+            {
+                "from": to_rfc3339(series.last_complete_time),
+                "count": self.capacity,
+                "includeFirst": "false",
+            },
+        )
+        candles = response["candles"]
+        if len(candles) >= self.capacity:
+            # the gap is wider than the buffer, start again from scratch
+            logger.info(
+                "Candle cache for %s %s is too far behind, refreshing"
+                % (instrument.value, period.value)
+            )
+            await self._refresh(instrument, period, series)
+            return
+        self._store(series, candles)
+
+    def _store(self, series: _CandleSeries, candles: list[dict]) -> None:
+        if not candles:
+            return
+        times, values, complete = parse_candle_arrays(candles)
+        series.buffer.extend(times, values)
+        if complete.any():
+            series.last_complete_time = times[complete].max()
+        self.candles_downloaded += len(candles)
+
+    def clear(self) -> None:
+        """Drop every cached series"""
+        self._series.clear()
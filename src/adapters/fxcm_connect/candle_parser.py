@@ -0,0 +1,64 @@
+from operator import itemgetter
+
+import numpy as np
+from pandas import DataFrame
+
+CANDLE_COLUMNS = ["open", "high", "low", "close", "volume"]
+
+_PRICE_KEYS = ("o", "h", "l", "c")
+
+
+def parse_times(times: list[str]) -> np.ndarray:
+    """Parses v20 candle times into datetime64[ns]
+
+    Handles both the RFC3339 format, by dropping the trailing Z so numpy
+    can parse the strings directly, and the UNIX format.
+    """
+    if not times:
+        return np.empty(0, dtype="datetime64[ns]")
+    if "T" not in times[0]:
+        seconds = np.array(times, dtype=np.float64)
+        return (seconds * 1e9).astype("datetime64[ns]")
+    return np.array(
+        [time[:-1] if time[-1] == "Z" else time for time in times],
+        dtype="datetime64[ns]",
+    )
+
+
+def parse_candle_arrays(
+    candles: list[dict], price: str = "mid"
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Decodes the candles of a v20 response into columns
+
+    Returns the times as datetime64[ns], an (n, 5) float64 array of
+    open, high, low, close and volume, and the complete flags.
+    """
+    number = len(candles)
+    values = np.empty((number, len(CANDLE_COLUMNS)), dtype=np.float64)
+    prices = list(map(itemgetter(price), candles))
+    for column, key in enumerate(_PRICE_KEYS):
+        values[:, column] = np.array(
+            list(map(itemgetter(key), prices)), dtype=np.float64
+        )
+    values[:, 4] = np.fromiter(
+        map(itemgetter("volume"), candles), dtype=np.float64, count=number
+    )
+    complete = np.fromiter(
+        (candle.get("complete", True) for candle in candles),
+        dtype=bool,
+        count=number,
+    )
+    times = parse_times(list(map(itemgetter("time"), candles)))
+    return times, values, complete
+
+
+def parse_candles(
+    data: dict, price: str = "mid", complete_only: bool = False
+) -> DataFrame:
+    """Builds the refined candle frame straight from the v20 payload"""
+    times, values, complete = parse_candle_arrays(data["candles"], price)
+    if complete_only:
+        times, values = times[complete], values[complete]
+    columns = {"date": times}
+    columns.update(zip(CANDLE_COLUMNS, values.T))
+    return DataFrame(columns)
@@ -7,8 +7,8 @@ import dotenv
 from fxcmpy import fxcmpy
 from pandas import DataFrame
 from src.adapters.fxcm_connect.base_trade_connect import BaseTradeConnect
+from src.adapters.fxcm_connect.candle_parser import parse_candles
 from src.config import ForexPairEnum, PeriodEnum, OrderTypeEnum
-import pandas as pd
 
 env = os.path.abspath(os.curdir) + "/src/.env"
 config = dotenv.dotenv_values(env)
@@ -46,20 +46,7 @@ class MockTradeConnect(BaseTradeConnect):
 
     async def get_refined_data(self, data):
         """Refine the data that we get from FXCM"""
-        list_of_candles = []
-        for i in data["candles"]:
-            list_of_candles.append(
-                {
-                    "date": i["time"],
-                    "open": float(i["mid"]["o"]),
-                    "high": float(i["mid"]["h"]),
-                    "low": float(i["mid"]["l"]),
-                    "close": float(i["mid"]["c"]),
-                    "volume": float(i["volume"]),
-                }
-            )
-
-        return pd.DataFrame(list_of_candles)
+        return parse_candles(data)
 
     async def get_open_positions(self, **kwargs):
         """returns the open positions"""
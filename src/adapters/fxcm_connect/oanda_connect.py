@@ -8,15 +8,33 @@ from src.domain.schema.trades import (
     StopLossOrder,
 )
 from src.domain.schema.transaction import OrderSchema, OrderTransaction
+from src.adapters.fxcm_connect.account_state import AccountStateCache
+from src.adapters.fxcm_connect.async_transport import AsyncV20API
 from src.adapters.fxcm_connect.base_trade_connect import BaseTradeConnect
-from src.config import ForexPairEnum, OrderTypeEnum, PeriodEnum
-import oandapyV20
+from src.adapters.fxcm_connect.candle_cache import CandleCache
+from src.adapters.fxcm_connect.candle_parser import parse_candles
+from src.adapters.fxcm_connect.transaction_stream import (
+    Publish,
+    TransactionStreamSubscriber,
+)
+from src.adapters.fxcm_connect.request_governor import RequestGovernor
+from src.adapters.fxcm_connect.price_stream import (
+    PriceBook,
+    PricingStreamSubscriber,
+    to_oanda_instrument,
+)
+from src.config import (
+    ForexPairEnum,
+    GBPConversionMapEnum,
+    OrderTypeEnum,
+    PeriodEnum,
+)
 import oandapyV20.endpoints.instruments as instruments
-import pandas as pd
 import oandapyV20.endpoints.orders as orders
 from oandapyV20.endpoints.accounts import AccountDetails
 from src.domain.schema.account import AccountDetailsSchema
 from oandapyV20.endpoints.trades import (
+    OpenTrades,
     TradeClose,
     TradesList,
     TradeCRCDO,
@@ -30,6 +48,8 @@ from src.utils import get_secret
 
 logger = get_logger(__name__)
 
+MAX_TRADES_PER_REQUEST = 500
+
 
 def error_handler(func):
     async def wrapper(*args, **kwargs):
@@ -68,51 +88,97 @@ class OandaConnect(BaseTradeConnect):
     @error_handler
     async def close_connection(self) -> None:
         """Closes the connection"""
-        raise NotImplementedError
+        await self.price_stream.stop()
+        if self.transaction_stream is not None:
+            await self.transaction_stream.stop()
+        await self.client.close()
 
     def open_connection(self) -> None:
         """Open the connection"""
-        self.client = oandapyV20.API(access_token=self.token)
+        self.client = RequestGovernor(
+            AsyncV20API(
+                access_token=self.token,
+                environment=os.environ.get("OANDA_ENVIRONMENT", "practice"),
+                api_url=os.environ.get("OANDA_API_URL"),
+                stream_url=os.environ.get("OANDA_STREAM_URL"),
+                max_connections_per_host=int(
+                    os.environ.get("OANDA_MAX_CONNECTIONS", 10)
+                ),
+                timeout=float(os.environ.get("OANDA_REQUEST_TIMEOUT", 10)),
+            ),
+            rate=float(os.environ.get("OANDA_REQUESTS_PER_SECOND", 20)),
+            max_retries=int(os.environ.get("OANDA_MAX_RETRIES", 3)),
+        )
+        self.candle_cache = CandleCache(
+            self.request_candles,
+            capacity=int(os.environ.get("OANDA_CANDLE_CACHE_SIZE", 500)),
+        )
+        self.account_state = AccountStateCache(
+            self.client,
+            self.account_id,
+            max_age=float(os.environ.get("OANDA_ACCOUNT_MAX_AGE", 5)),
+        )
+        self.price_book = PriceBook(
+            max_age=float(os.environ.get("OANDA_PRICE_MAX_AGE", 10))
+        )
+        self.price_stream = PricingStreamSubscriber(
+            client=self.client,
+            account_id=self.account_id,
+            instruments=[pair.value for pair in ForexPairEnum]
+            + [pair.value for pair in GBPConversionMapEnum],
+            price_book=self.price_book,
+        )
+        self.transaction_stream = None
+
+    async def start_price_stream(self) -> None:
+        """Streams prices for every traded and conversion instrument into
+        the price book"""
+        await self.price_stream.start()
+
+    async def start_transaction_stream(self, publish: Publish) -> None:
+        """Publishes trade closures from the transaction stream"""
+        self.transaction_stream = TransactionStreamSubscriber(
+            client=self.client,
+            account_id=self.account_id,
+            publish=publish,
+        )
+        await self.transaction_stream.start()
 
     @error_handler
     async def get_candle_data(
         self, instrument: ForexPairEnum, period: PeriodEnum, number: int = 100
-    ) -> dict:
+    ) -> DataFrame:
         """get the candle data for an instrument"""
-        instrument = instrument.value.replace("/", "_")
+        return await self.candle_cache.get_candle_data(
+            instrument, period, number
+        )
+
+    @error_handler
+    async def request_candles(
+        self, instrument: ForexPairEnum, period: PeriodEnum, params: dict
+    ) -> dict:
+        """request the raw candles for an instrument"""
         params = {
-            "count": number,  # Number of candles to retrieve
             "granularity": str.upper(
                 period.value
             ),  # Candlestick granularity, M5 means 5 minutes
+            **params,
         }
         r = instruments.InstrumentsCandles(
-            instrument=instrument, params=params
+            instrument=instrument.value.replace("/", "_"), params=params
         )
-        return await self.get_refined_data(self.client.request(r))
+        return await self.client.request(r)
 
     @error_handler
     async def get_refined_data(self, data) -> DataFrame:
         """Refine the data that we get from FXCM"""
-        list_of_candles = []
-        for i in data["candles"]:
-            list_of_candles.append(
-                {
-                    "date": i["time"],
-                    "open": float(i["mid"]["o"]),
-                    "high": float(i["mid"]["h"]),
-                    "low": float(i["mid"]["l"]),
-                    "close": float(i["mid"]["c"]),
-                    "volume": float(i["volume"]),
-                }
-            )
-        return pd.DataFrame(list_of_candles)
+        return parse_candles(data)
 
     @error_handler
     async def get_open_positions(self, **kwargs) -> list[TradeInfo]:
         """returns the open positions"""
         trades_list_endpoint = TradesList(self.account_id)
-        self.client.request(trades_list_endpoint)
+        await self.client.request(trades_list_endpoint)
         trades = trades_list_endpoint.response.get("trades", [])
         retrieved_trades = []
         for trade in trades:
@@ -175,7 +241,7 @@ class OandaConnect(BaseTradeConnect):
         data["order"].update(stops)
 
         r = orders.OrderCreate(self.account_id, data)
-        response = self.client.request(r)
+        response = await self.client.request(r)
         response_model: OrderSchema = parse_obj_as(OrderSchema, response)
         if response_model.orderFillTransaction is not None:
             logger.info(
@@ -196,6 +262,7 @@ class OandaConnect(BaseTradeConnect):
                     response_model.orderFillTransaction.halfSpreadCost,
                 )
             )
+            self.account_state.invalidate()
             return (
                 response_model.orderFillTransaction.id,
                 float(response_model.orderFillTransaction.price),
@@ -219,9 +286,10 @@ class OandaConnect(BaseTradeConnect):
     ) -> tuple[str, float]:
         """closes a trade position"""
         trade_close_endpoint = TradeClose(self.account_id, trade_id)
-        response = self.client.request(trade_close_endpoint)
+        response = await self.client.request(trade_close_endpoint)
         response_model: OrderSchema = parse_obj_as(OrderSchema, response)
         if response_model.orderFillTransaction is not None:
+            self.account_state.invalidate()
             return "CLOSED", float(response_model.orderFillTransaction.pl)
         else:
             if response_model.orderCancelTransaction is not None:
@@ -244,16 +312,14 @@ class OandaConnect(BaseTradeConnect):
     @error_handler
     async def get_account_balance(self) -> str:
         """returns the account balance"""
-        account_details = await self.get_account_details()
-
-        return account_details.account.balance
+        return str(await self.account_state.get_balance())
 
     @error_handler
     async def get_account_details(self) -> AccountDetailsSchema:
         """returns the account details"""
         account_details_endpoint = AccountDetails(self.account_id)
 
-        response = self.client.request(account_details_endpoint)
+        response = await self.client.request(account_details_endpoint)
         response: AccountDetailsSchema = parse_obj_as(
             AccountDetailsSchema, response
         )
@@ -262,11 +328,42 @@ class OandaConnect(BaseTradeConnect):
     @error_handler
     async def get_latest_close(self, instrument: ForexPairEnum) -> float:
         """returns the latest close"""
+        quote = self.price_book.get(instrument.value)
+        if quote is not None:
+            return quote.mid
         data: DataFrame = await self.get_candle_data(
             instrument, PeriodEnum.MINUTE_1, 1
         )
         return float(data.iloc[-1]["close"])
 
+    @error_handler
+    async def get_prices(
+        self, instruments: list[GBPConversionMapEnum]
+    ) -> dict[str, float]:
+        """returns the mid price of each instrument, the ones not in the
+        price book are fetched in a single pricing request"""
+        prices = {}
+        missing = []
+        for instrument in instruments:
+            quote = self.price_book.get(instrument.value)
+            if quote is not None:
+                prices[instrument.value] = quote.mid
+            else:
+                missing.append(to_oanda_instrument(instrument.value))
+        if not missing:
+            return prices
+        r = PricingInfo(
+            accountID=self.account_id,
+            params={"instruments": ",".join(missing)},
+        )
+        response = await self.client.request(r)
+        for price in response["prices"]:
+            bid_price = float(price["bids"][0]["price"])
+            ask_price = float(price["asks"][0]["price"])
+            instrument = price["instrument"].replace("_", "/")
+            prices[instrument] = (bid_price + ask_price) / 2
+        return prices
+
     @error_handler
     async def modify_trade(
         self, trade_id: str, stop: float, limit: float = None
@@ -286,7 +383,7 @@ class OandaConnect(BaseTradeConnect):
         trade_modify_request = TradeCRCDO(
             accountID=self.account_id, tradeID=trade_id, data=data
         )
-        response = self.client.request(trade_modify_request)
+        response = await self.client.request(trade_modify_request)
         response_model: TradeCRDCOSchema = parse_obj_as(
             TradeCRDCOSchema, response
         )
@@ -302,7 +399,7 @@ class OandaConnect(BaseTradeConnect):
                 "state": "OPEN",
             },
         )
-        rv = self.client.request(r)
+        rv = await self.client.request(r)
         trades.extend(rv["trades"])
         r = TradesList(
             self.account_id,
@@ -310,7 +407,7 @@ class OandaConnect(BaseTradeConnect):
                 "state": "CLOSED",
             },
         )
-        rv = self.client.request(r)
+        rv = await self.client.request(r)
         trades.extend(rv["trades"])
         for trade in trades:
             if str(trade["id"]) == str(trade_id):
@@ -319,12 +416,43 @@ class OandaConnect(BaseTradeConnect):
 
         return None, None
 
+    @error_handler
+    async def get_trades_by_ids(
+        self, trade_ids: list[str]
+    ) -> dict[str, tuple[str, float]]:
+        """get the state and realised pl of the given trades, filtered by
+        id on the broker side"""
+        trades = {}
+        for start in range(0, len(trade_ids), MAX_TRADES_PER_REQUEST):
+            ids = trade_ids[start : start + MAX_TRADES_PER_REQUEST]
+            r = TradesList(
+                self.account_id,
+                params={
+                    "ids": ",".join(str(trade_id) for trade_id in ids),
+                    "state": "ALL",
+                    "count": len(ids),
+                },
+            )
+            rv = await self.client.request(r)
+            for trade in rv["trades"]:
+                trades[str(trade["id"])] = (
+                    trade["state"],
+                    float(trade["realizedPL"]),
+                )
+        return trades
+
+    @error_handler
+    async def get_open_trade_ids(self) -> set[str]:
+        """get the ids of every open trade"""
+        rv = await self.client.request(OpenTrades(self.account_id))
+        return {str(trade["id"]) for trade in rv["trades"]}
+
     @error_handler
     async def get_pending_orders(self) -> list[StopLossOrder]:
         r = orders.OrderList(self.account_id)
 
         # Send the request
-        response = self.client.request(r)
+        response = await self.client.request(r)
 
         # Extract and display pending orders
         pending_orders = response["orders"]
@@ -334,7 +462,7 @@ class OandaConnect(BaseTradeConnect):
     @error_handler
     async def cancel_pending_order(self, order_id: str):
         r = orders.OrderCancel(self.account_id, order_id)
-        response = self.client.request(r)
+        response = await self.client.request(r)
         response_model: OrderTransaction = parse_obj_as(
             OrderTransaction, response["orderCancelTransaction"]
         )
@@ -343,11 +471,14 @@ class OandaConnect(BaseTradeConnect):
     @error_handler
     async def get_spread(self, instrument: ForexPairEnum) -> float:
         """returns the spread"""
+        quote = self.price_book.get(instrument.value)
+        if quote is not None:
+            return quote.spread
         instrument = instrument.value.replace("/", "_")
         r = PricingInfo(
             accountID=self.account_id, params={"instruments": instrument}
         )
-        self.client.request(r)
+        await self.client.request(r)
         prices = r.response["prices"][0]
         bid_price = float(prices["bids"][0]["price"])
         ask_price = float(prices["asks"][0]["price"])
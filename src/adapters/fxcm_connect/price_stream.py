@@ -0,0 +1,204 @@
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Iterable, Optional
+
+from oandapyV20.endpoints.pricing import PricingStream
+
+from src.adapters.fxcm_connect.async_transport import AsyncV20API
+from src.logger import get_logger
+from src.service_layer.conversion_rates import get_pip_size
+
+logger = get_logger(__name__)
+
+
+def to_oanda_instrument(instrument: str) -> str:
+    """Converts EUR/USD into the EUR_USD form used by the v20 api"""
+    return instrument.replace("/", "_")
+
+
+@dataclass
+class Quote:
+    instrument: str
+    bid: float
+    ask: float
+    time: str
+    received: float = field(default_factory=time.monotonic)
+
+    @property
+    def mid(self) -> float:
+        return (self.bid + self.ask) / 2
+
+    @property
+    def spread(self) -> float:
+        """The spread in pips"""
+        return (self.ask - self.bid) / get_pip_size(self.instrument)
+
+
+class PriceBook:
+    """Latest bid and ask per instrument, fed by the pricing stream
+
+    The stream only sends a price when it changes, so a quote stays
+    fresh for as long as the stream keeps sending heartbeats. Once both
+    the quote and the last heartbeat are older than max_age the quote
+    is treated as stale and not served.
+    """
+
+    def __init__(self, max_age: float = 10.0) -> None:
+        self.max_age = max_age
+        self.last_heartbeat: Optional[float] = None
+        self._quotes: dict[str, Quote] = {}
+
+    def update(self, instrument: str, bid: float, ask: float, time_: str):
+        """Store the latest price for an instrument"""
+        self._quotes[instrument] = Quote(instrument, bid, ask, time_)
+
+    def heartbeat(self) -> None:
+        """Record that the stream is alive"""
+        self.last_heartbeat = time.monotonic()
+
+    def disconnected(self) -> None:
+        """Record that the stream dropped"""
+        self.last_heartbeat = None
+
+    def is_stale(self, instrument: str) -> bool:
+        """Whether the quote for an instrument can not be trusted"""
+        quote = self._quotes.get(to_oanda_instrument(instrument))
+        if quote is None:
+            return True
+        last_seen = max(quote.received, self.last_heartbeat or 0)
+        return time.monotonic() - last_seen > self.max_age
+
+    def get(self, instrument: str) -> Optional[Quote]:
+        """Returns the quote for an instrument, None when stale"""
+        if self.is_stale(instrument):
+            return None
+        return self._quotes[to_oanda_instrument(instrument)]
+
+    def __len__(self) -> int:
+        return len(self._quotes)
+
+
+class PricingStreamSubscriber:
+    """Keeps a price book up to date from the v20 pricing stream
+
+    Reconnects with an exponential backoff when the stream fails or
+    when no message, not even a heartbeat, arrives in heartbeat_timeout.
+    """
+
+    def __init__(
+        self,
+        client: AsyncV20API,
+        account_id: str,
+        instruments: Iterable[str],
+        price_book: PriceBook,
+        heartbeat_timeout: float = 15.0,
+        reconnect_delay: float = 1.0,
+        max_reconnect_delay: float = 30.0,
+    ) -> None:
+        self.client = client
+        self.account_id = account_id
+        self.instruments = sorted(
+            {to_oanda_instrument(i) for i in instruments}
+        )
+        self.price_book = price_book
+        self.heartbeat_timeout = heartbeat_timeout
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.running = False
+        self.connected = False
+        self.reconnects = 0
+        self.prices_received = 0
+        # the read or reconnect delay stop interrupts, and the end of
+        # start it waits for
+        self._waiting: Optional[asyncio.Future] = None
+        self._done: Optional[asyncio.Event] = None
+
+    async def start(self) -> None:
+        """Consume the stream until stopped"""
+        if self.running:
+            return
+        self.running = True
+        self._done = asyncio.Event()
+        attempt = 0
+        logger.info(
+            "Pricing stream started for %s instruments" % len(self.instruments)
+        )
+        try:
+            while self.running:
+                try:
+                    async for message in self._messages():
+                        attempt = 0
+                        self._handle(message)
+                except asyncio.CancelledError:
+                    break
+                except Exception as e:
+                    logger.error("Pricing stream failed: %r" % e)
+                self.connected = False
+                self.price_book.disconnected()
+                if not self.running:
+                    break
+                delay = min(
+                    self.reconnect_delay * 2**attempt,
+                    self.max_reconnect_delay,
+                )
+                attempt += 1
+                self.reconnects += 1
+                logger.warning("Reconnecting pricing stream in %ss" % delay)
+                try:
+                    await self._interruptible(asyncio.sleep(delay))
+                except asyncio.CancelledError:
+                    break
+        finally:
+            self.running = False
+            self.connected = False
+            self._done.set()
+
+    async def stop(self) -> None:
+        """Stop consuming the stream, interrupting a read or a reconnect
+        delay, and wait until the stream is closed"""
+        self.running = False
+        if self._waiting is not None:
+            self._waiting.cancel()
+        if self._done is not None:
+            await self._done.wait()
+
+    async def _interruptible(self, awaitable):
+        self._waiting = asyncio.ensure_future(awaitable)
+        try:
+            return await self._waiting
+        finally:
+            self._waiting = None
+
+    async def _messages(self):
+        endpoint = PricingStream(
+            accountID=self.account_id,
+            params={"instruments": ",".join(self.instruments)},
+        )
+        stream = await self.client.request(endpoint)
+        try:
+            while self.running:
+                yield await self._interruptible(
+                    asyncio.wait_for(
+                        anext(stream), timeout=self.heartbeat_timeout
+                    )
+                )
+        except StopAsyncIteration:
+            logger.warning("Pricing stream closed by the server")
+        finally:
+            await stream.aclose()
+
+    def _handle(self, message: dict) -> None:
+        self.connected = True
+        if message.get("type") == "HEARTBEAT":
+            self.price_book.heartbeat()
+        elif message.get("type") == "PRICE":
+            if not message.get("bids") or not message.get("asks"):
+                return
+            self.price_book.update(
+                message["instrument"],
+                float(message["bids"][0]["price"]),
+                float(message["asks"][0]["price"]),
+                message["time"],
+            )
+            self.prices_received += 1
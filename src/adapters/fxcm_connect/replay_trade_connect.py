@@ -0,0 +1,323 @@
+import itertools
+from dataclasses import dataclass
+from datetime import timezone
+from typing import Mapping, Optional
+
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+from src.adapters.database.candle_archive import PERIOD_SECONDS
+from src.adapters.fxcm_connect.base_trade_connect import BaseTradeConnect
+from src.adapters.fxcm_connect.candle_parser import CANDLE_COLUMNS
+from src.adapters.fxcm_connect.transaction_stream import Publish
+from src.config import (
+    ForexPairEnum,
+    GBPConversionMapEnum,
+    OrderTypeEnum,
+    PeriodEnum,
+)
+from src.domain.events import TradeClosedEvent
+from src.logger import get_logger
+from src.service_layer.clock import Clock, clock
+from src.service_layer.conversion_rates import (
+    ConversionRateService,
+    get_pip_size,
+)
+
+logger = get_logger(__name__)
+
+STOP_LOSS = "STOP_LOSS_ORDER"
+TAKE_PROFIT = "TAKE_PROFIT_ORDER"
+MARKET = "MARKET_ORDER"
+
+
+@dataclass
+class ReplayTrade:
+    trade_id: str
+    instrument: str
+    is_buy: bool
+    units: int
+    price: float
+    stop: Optional[float]
+    limit: Optional[float]
+    next_bar: int
+    state: str = "OPEN"
+    realised_pl: float = 0.0
+    reason: str = ""
+
+
+class ReplayTradeConnect(BaseTradeConnect):
+    """A broker over archived candles that moves with the replay clock
+
+    The candles complete at the time of the clock are the ones served,
+    whatever the period asked for, so a replay of five minute candles
+    also answers for one minute candles. Orders fill at the close of the
+    latest candle plus or minus half the spread. Stops and limits are
+    checked against every candle completed since, by fill_orders, and
+    the trades they close are published as TradeClosedEvent like the
+    transaction stream does.
+    """
+
+    def __init__(
+        self,
+        history: Mapping[ForexPairEnum, DataFrame],
+        period: PeriodEnum = PeriodEnum.MINUTE_5,
+        spread_pips: float = 1.0,
+        balance: float = 10_000.0,
+        rates: Optional[Mapping[str, float]] = None,
+        clock: Clock = clock,
+    ) -> None:
+        self.times: dict[str, np.ndarray] = {}
+        self.arrays: dict[str, dict[str, np.ndarray]] = {}
+        for forex_pair, frame in history.items():
+            key = forex_pair.value
+            self.times[key] = frame["date"].to_numpy("datetime64[ns]")
+            self.arrays[key] = {
+                name: frame[name].to_numpy(np.float64)
+                for name in CANDLE_COLUMNS
+            }
+        self.period = np.timedelta64(PERIOD_SECONDS[period], "s")
+        self.spread_pips = spread_pips
+        self.balance = balance
+        self.rates = dict(rates or {})
+        self.clock = clock
+        self.trades: dict[str, ReplayTrade] = {}
+        self.publish: Optional[Publish] = None
+        self._ids = itertools.count(1)
+        self.conversion_rates = ConversionRateService(self, ttl=0)
+
+    def completed(self, key: str) -> int:
+        """Number of candles of an instrument complete at the clock's
+        time"""
+        now = pd.Timestamp(self.clock.now(timezone.utc)).tz_localize(None)
+        return int(
+            np.searchsorted(
+                self.times[key],
+                now.to_datetime64() - self.period,
+                side="right",
+            )
+        )
+
+    def half_spread(self, key: str) -> float:
+        return self.spread_pips / 2 * get_pip_size(key)
+
+    def price(self, key: str) -> float:
+        bar = self.completed(key)
+        if bar == 0:
+            raise ValueError(
+                "No %s candles before %s" % (key, self.clock.now())
+            )
+        return float(self.arrays[key]["close"][bar - 1])
+
+    async def get_connection_status(self) -> None:
+        """Get the connection status"""
+
+    async def close_connection(self) -> None:
+        """Closes the connection"""
+
+    def open_connection(self) -> None:
+        """Open the connection"""
+
+    async def get_refined_data(self, data):
+        """Refine the data that we get from FXCM"""
+        return data
+
+    async def get_candle_data(
+        self,
+        instrument: ForexPairEnum,
+        period: PeriodEnum = PeriodEnum.MINUTE_5,
+        number: int = 100,
+    ) -> DataFrame:
+        """The latest number candles complete at the clock's time"""
+        key = instrument.value
+        if key not in self.times:
+            raise ValueError("%s is not replayed" % key)
+        end = self.completed(key)
+        start = max(end - number, 0)
+        columns = {"date": self.times[key][start:end]}
+        columns.update(
+            (name, values[start:end])
+            for name, values in self.arrays[key].items()
+        )
+        return DataFrame(columns)
+
+    async def get_open_positions(self, **kwargs) -> list[ReplayTrade]:
+        """returns the open positions"""
+        return [
+            trade for trade in self.trades.values() if trade.state == "OPEN"
+        ]
+
+    async def open_trade(
+        self,
+        instrument: ForexPairEnum,
+        is_buy: bool,
+        stop: float,
+        limit: float,
+        amount: int,
+        is_pips: bool = False,
+        order_type: OrderTypeEnum = OrderTypeEnum.AT_MARKET,
+        time_in_force: str = "GTC",
+    ) -> tuple[str, float, float]:
+        """Fills at the latest close, returns the trade id, the price and
+        the half spread cost in the account currency"""
+        await self.validate_stops(is_buy, is_pips, stop, limit)
+        key = instrument.value
+        direction = 1 if is_buy else -1
+        half_spread = self.half_spread(key)
+        trade = ReplayTrade(
+            trade_id=str(next(self._ids)),
+            instrument=key,
+            is_buy=is_buy,
+            units=int(amount),
+            price=self.price(key) + direction * half_spread,
+            stop=stop,
+            limit=limit,
+            next_bar=self.completed(key),
+        )
+        self.trades[trade.trade_id] = trade
+        half_spread_cost = (
+            half_spread * trade.units * await self.account_rate(key)
+        )
+        return trade.trade_id, trade.price, half_spread_cost
+
+    async def account_rate(self, key: str) -> float:
+        """Converts an amount in the quote currency of an instrument into
+        the account currency"""
+        return self.conversion_rates.get_conversion_factor(
+            key.split("/")[1], await self.conversion_rates.get_rates()
+        )
+
+    async def settle(
+        self, trade: ReplayTrade, price: float, reason: str
+    ) -> float:
+        """Closes a trade at a mid price, returns its realised pl"""
+        direction = 1 if trade.is_buy else -1
+        price -= direction * self.half_spread(trade.instrument)
+        trade.realised_pl = (
+            direction
+            * (price - trade.price)
+            * trade.units
+            * await self.account_rate(trade.instrument)
+        )
+        trade.state = "CLOSED"
+        trade.reason = reason
+        self.balance += trade.realised_pl
+        return trade.realised_pl
+
+    async def close_trade(
+        self, trade_id: str, amount: int
+    ) -> tuple[Optional[str], Optional[float]]:
+        """Closes a trade at the latest close"""
+        trade = self.trades.get(str(trade_id))
+        if trade is None or trade.state != "OPEN":
+            logger.error("Failed to close trade for id %s" % trade_id)
+            return None, None
+        await self.fill_orders([trade])
+        if trade.state != "OPEN":
+            return None, None
+        pl = await self.settle(trade, self.price(trade.instrument), MARKET)
+        return "CLOSED", pl
+
+    async def fill_orders(
+        self, trades: Optional[list[ReplayTrade]] = None
+    ) -> list[ReplayTrade]:
+        """Closes the open trades whose stop or limit a candle completed
+        since they were last checked reached, the stop first, at the
+        open when the candle gapped through it"""
+        if trades is None:
+            trades = await self.get_open_positions()
+        closed = []
+        for trade in trades:
+            end = self.completed(trade.instrument)
+            if end <= trade.next_bar:
+                continue
+            arrays = self.arrays[trade.instrument]
+            bars = slice(trade.next_bar, end)
+            trade.next_bar = end
+            direction = 1 if trade.is_buy else -1
+            open_ = direction * arrays["open"][bars]
+            adverse = (
+                direction * arrays["low" if trade.is_buy else "high"][bars]
+            )
+            favourable = (
+                direction * arrays["high" if trade.is_buy else "low"][bars]
+            )
+            hits = []
+            if trade.stop is not None:
+                stop = direction * trade.stop
+                stopped = np.flatnonzero(adverse <= stop)
+                if len(stopped):
+                    bar = stopped[0]
+                    hits.append((bar, 0, min(open_[bar], stop), STOP_LOSS))
+            if trade.limit is not None:
+                limit = direction * trade.limit
+                limited = np.flatnonzero(favourable >= limit)
+                if len(limited):
+                    bar = limited[0]
+                    hits.append((bar, 1, max(open_[bar], limit), TAKE_PROFIT))
+            if not hits:
+                continue
+            _, _, price, reason = min(hits)
+            await self.settle(trade, direction * price, reason)
+            closed.append(trade)
+            if self.publish is not None:
+                await self.publish(
+                    TradeClosedEvent(
+                        trade_id=trade.trade_id,
+                        realised_pl=trade.realised_pl,
+                        reason=reason,
+                    )
+                )
+        return closed
+
+    async def start_transaction_stream(self, publish: Publish) -> None:
+        """Trades closed by their stop or limit are published on
+        fill_orders"""
+        self.publish = publish
+
+    async def get_account_balance(self) -> float:
+        """returns the account balance"""
+        return self.balance
+
+    async def get_spread(self, instrument: ForexPairEnum) -> float:
+        """returns the spread in pips"""
+        return self.spread_pips
+
+    async def get_latest_close(self, instrument: ForexPairEnum) -> float:
+        """returns the latest close"""
+        return self.price(instrument.value)
+
+    async def get_prices(
+        self, instruments: list[GBPConversionMapEnum]
+    ) -> dict[str, float]:
+        """The latest close of the replayed instruments, the given rates
+        for the others"""
+        prices = {}
+        for instrument in instruments:
+            key = instrument.value
+            if key in self.times and self.completed(key):
+                prices[key] = self.price(key)
+            elif key in self.rates:
+                prices[key] = self.rates[key]
+        return prices
+
+    async def modify_trade(
+        self, trade_id: str, stop: float, limit: float = None
+    ) -> str:
+        """Modifies the trade"""
+        trade = self.trades[str(trade_id)]
+        trade.stop = stop
+        if limit is not None:
+            trade.limit = limit
+        return trade.trade_id
+
+    async def get_trade_state(self, trade_id: str):
+        """Gets the trade details"""
+        trade = self.trades.get(str(trade_id))
+        if trade is None:
+            return None, None
+        return trade.state, trade.realised_pl
+
+    async def get_open_trade_ids(self) -> set[str]:
+        return {trade.trade_id for trade in await self.get_open_positions()}
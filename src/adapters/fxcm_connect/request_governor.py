@@ -0,0 +1,256 @@
+import asyncio
+import random
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+import numpy as np
+from oandapyV20.exceptions import V20Error
+
+from src.adapters.fxcm_connect.async_transport import AsyncV20API
+from src.logger import get_logger
+
+logger = get_logger(__name__)
+
+RETRYABLE_ERRORS = (
+    asyncio.TimeoutError,
+    asyncio.IncompleteReadError,
+    ConnectionError,
+)
+
+
+class LeaderCancelled(Exception):
+    """The request a coalesced read was waiting on was cancelled, the
+    read is made again rather than cancelled with it"""
+
+
+class TokenBucket:
+    """Allows rate requests per second with bursts of up to capacity"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.updated) * self.rate
+        )
+        self.updated = now
+
+    async def acquire(self) -> float:
+        """Take a token, returns how long we waited for it"""
+        waited = 0.0
+        async with self._lock:
+            self._refill()
+            while self.tokens < 1:
+                delay = (1 - self.tokens) / self.rate
+                await asyncio.sleep(delay)
+                waited += delay
+                self._refill()
+            self.tokens -= 1
+        return waited
+
+
+class RetryBudget:
+    """Caps retries at a fraction of the requests made
+
+    Every request deposits ratio of a retry, a retry withdraws a whole
+    one, so a failing broker sees at most about ratio extra load.
+    """
+
+    def __init__(self, ratio: float = 0.2, reserve: float = 10.0) -> None:
+        self.ratio = ratio
+        self.reserve = reserve
+        self.balance = reserve
+
+    def deposit(self) -> None:
+        self.balance = min(self.reserve, self.balance + self.ratio)
+
+    def withdraw(self) -> bool:
+        """Take a retry from the budget, False when exhausted"""
+        if self.balance < 1:
+            return False
+        self.balance -= 1
+        return True
+
+
+@dataclass
+class EndpointStats:
+    requests: int = 0
+    errors: int = 0
+    retries: int = 0
+    coalesced: int = 0
+    throttled: int = 0
+    rate_limited: int = 0
+    throttled_seconds: float = 0.0
+    latencies: deque = field(default_factory=lambda: deque(maxlen=1000))
+
+    def to_dict(self) -> dict[str, Any]:
+        latencies = np.array(self.latencies) if self.latencies else None
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "retries": self.retries,
+            "coalesced": self.coalesced,
+            "throttled": self.throttled,
+            "rate_limited": self.rate_limited,
+            "throttled_seconds": round(self.throttled_seconds, 4),
+            "latency_p50": float(np.percentile(latencies, 50))
+            if latencies is not None
+            else None,
+            "latency_p95": float(np.percentile(latencies, 95))
+            if latencies is not None
+            else None,
+        }
+
+
+class RequestGovernor:
+    """Sits between the connection and the v20 transport
+
+    Every endpoint class gets its own token bucket, identical GETs that
+    are already in flight share the one request, and failed reads are
+    retried with a jittered exponential backoff for as long as the
+    retry budget allows. Streams pass straight through.
+    """
+
+    def __init__(
+        self,
+        client: AsyncV20API,
+        rate: float = 20.0,
+        burst: Optional[float] = None,
+        rates: Optional[dict[str, float]] = None,
+        max_retries: int = 3,
+        backoff: float = 0.2,
+        max_backoff: float = 5.0,
+        retry_budget: Optional[RetryBudget] = None,
+    ) -> None:
+        self.client = client
+        self.rate = rate
+        self.burst = burst
+        self.rates = rates or {}
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.retry_budget = retry_budget or RetryBudget()
+        self._buckets: dict[str, TokenBucket] = {}
+        self._inflight: dict[tuple, asyncio.Future] = {}
+        self._stats: dict[str, EndpointStats] = {}
+
+    def get_bucket(self, name: str) -> TokenBucket:
+        """Returns the token bucket of an endpoint class"""
+        if name not in self._buckets:
+            rate = self.rates.get(name, self.rate)
+            self._buckets[name] = TokenBucket(rate, self.burst or rate)
+        return self._buckets[name]
+
+    def get_stats(self, name: str) -> EndpointStats:
+        """Returns the counters of an endpoint class"""
+        if name not in self._stats:
+            self._stats[name] = EndpointStats()
+        return self._stats[name]
+
+    def stats(self) -> dict[str, dict[str, Any]]:
+        """Latency and throttle counters per endpoint class"""
+        return {name: s.to_dict() for name, s in self._stats.items()}
+
+    async def request(self, endpoint):
+        """Perform a request for the APIRequest instance endpoint"""
+        if getattr(endpoint, "STREAM", False) is True:
+            return await self.client.request(endpoint)
+
+        name = type(endpoint).__name__
+        stats = self.get_stats(name)
+        if endpoint.method.upper() != "GET":
+            return await self._send(endpoint, name, stats, retry=False)
+
+        params = getattr(endpoint, "params", None) or {}
+        key = (str(endpoint), tuple(sorted(params.items())))
+        if key in self._inflight:
+            stats.coalesced += 1
+        while key in self._inflight:
+            try:
+                response, status_code = await asyncio.shield(
+                    self._inflight[key]
+                )
+            except LeaderCancelled:
+                # the first waiter back finds the key free and leads
+                continue
+            endpoint.response = response
+            endpoint.status_code = status_code
+            return response
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            response = await self._send(endpoint, name, stats, retry=True)
+            future.set_result(
+                (response, getattr(endpoint, "status_code", None))
+            )
+            return response
+        except BaseException as e:
+            # only the leader was cancelled, its waiters make the read
+            # again themselves
+            if isinstance(e, asyncio.CancelledError):
+                future.set_exception(LeaderCancelled())
+            else:
+                future.set_exception(e)
+            # the exception is raised here, waiters see it through the
+            # future, do not log it again as never retrieved
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+
+    async def _send(
+        self, endpoint, name: str, stats: EndpointStats, retry: bool
+    ):
+        bucket = self.get_bucket(name)
+        self.retry_budget.deposit()
+        attempt = 0
+        while True:
+            waited = await bucket.acquire()
+            if waited:
+                stats.throttled += 1
+                stats.throttled_seconds += waited
+            stats.requests += 1
+            started = time.perf_counter()
+            try:
+                response = await self.client.request(endpoint)
+                stats.latencies.append(time.perf_counter() - started)
+                return response
+            except (V20Error, *RETRYABLE_ERRORS) as e:
+                stats.latencies.append(time.perf_counter() - started)
+                stats.errors += 1
+                code = getattr(e, "code", None)
+                if code == 429:
+                    stats.rate_limited += 1
+                if not retry or not self._is_retryable(e):
+                    raise
+                if attempt >= self.max_retries:
+                    raise
+                if not self.retry_budget.withdraw():
+                    logger.warning("Retry budget exhausted for %s" % name)
+                    raise
+                delay = random.uniform(
+                    0, min(self.max_backoff, self.backoff * 2**attempt)
+                )
+                attempt += 1
+                stats.retries += 1
+                logger.info(
+                    "Retrying %s in %.2fs after %r" % (name, delay, e)
+                )
+                await asyncio.sleep(delay)
+
+    def _is_retryable(self, error: Exception) -> bool:
+        if isinstance(error, V20Error):
+            return error.code == 429 or error.code >= 500
+        return True
+
+    async def close(self) -> None:
+        """Close the underlying transport"""
+        await self.client.close()
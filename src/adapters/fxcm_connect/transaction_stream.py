@@ -0,0 +1,188 @@
+import asyncio
+from typing import Awaitable, Callable, Optional
+
+from oandapyV20.endpoints.transactions import (
+    TransactionsSinceID,
+    TransactionsStream,
+)
+
+from src.adapters.fxcm_connect.async_transport import AsyncV20API
+from src.domain.events import Event, TradeClosedEvent
+from src.logger import get_logger
+
+logger = get_logger(__name__)
+
+Publish = Callable[[Event], Awaitable[None]]
+
+
+def to_events(transaction: dict) -> list[Event]:
+    """Translates a v20 transaction into domain events
+
+    Trades closed by a stop loss, a take profit or a market close all
+    arrive as an ORDER_FILL whose reason names the order that filled.
+    """
+    if transaction.get("type") != "ORDER_FILL":
+        return []
+    return [
+        TradeClosedEvent(
+            trade_id=str(closed["tradeID"]),
+            realised_pl=float(closed["realizedPL"]),
+            reason=transaction.get("reason", ""),
+            transaction_id=str(transaction["id"]),
+        )
+        for closed in transaction.get("tradesClosed", [])
+    ]
+
+
+class TransactionStreamSubscriber:
+    """Publishes domain events for the transactions of an account
+
+    Every transaction heartbeat carries the id of the last transaction
+    on the account, when it is ahead of the last one we handled, for
+    example after a reconnect, the missed transactions are fetched
+    with a catch-up query before carrying on with the stream.
+    """
+
+    def __init__(
+        self,
+        client: AsyncV20API,
+        account_id: str,
+        publish: Publish,
+        last_transaction_id: Optional[str] = None,
+        heartbeat_timeout: float = 15.0,
+        reconnect_delay: float = 1.0,
+        max_reconnect_delay: float = 30.0,
+    ) -> None:
+        self.client = client
+        self.account_id = account_id
+        self.publish = publish
+        self.last_transaction_id = last_transaction_id
+        self.heartbeat_timeout = heartbeat_timeout
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.running = False
+        self.connected = False
+        self.reconnects = 0
+        self.transactions_received = 0
+        self.catch_ups = 0
+        # the read or reconnect delay stop interrupts, and the end of
+        # start it waits for
+        self._waiting: Optional[asyncio.Future] = None
+        self._done: Optional[asyncio.Event] = None
+
+    async def start(self) -> None:
+        """Consume the stream until stopped"""
+        if self.running:
+            return
+        self.running = True
+        self._done = asyncio.Event()
+        attempt = 0
+        logger.info("Transaction stream started")
+        try:
+            while self.running:
+                try:
+                    await self.catch_up()
+                    async for message in self._messages():
+                        attempt = 0
+                        await self._handle(message)
+                except asyncio.CancelledError:
+                    break
+                except Exception as e:
+                    logger.error("Transaction stream failed: %r" % e)
+                self.connected = False
+                if not self.running:
+                    break
+                delay = min(
+                    self.reconnect_delay * 2**attempt,
+                    self.max_reconnect_delay,
+                )
+                attempt += 1
+                self.reconnects += 1
+                logger.warning(
+                    "Reconnecting transaction stream in %ss" % delay
+                )
+                try:
+                    await self._interruptible(asyncio.sleep(delay))
+                except asyncio.CancelledError:
+                    break
+        finally:
+            self.running = False
+            self.connected = False
+            self._done.set()
+
+    async def stop(self) -> None:
+        """Stop consuming the stream, interrupting a read or a reconnect
+        delay but not a transaction being handled, and wait until the
+        stream is closed"""
+        self.running = False
+        if self._waiting is not None:
+            self._waiting.cancel()
+        if self._done is not None:
+            await self._done.wait()
+
+    async def _interruptible(self, awaitable):
+        self._waiting = asyncio.ensure_future(awaitable)
+        try:
+            return await self._waiting
+        finally:
+            self._waiting = None
+
+    async def catch_up(self) -> None:
+        """Handle the transactions after the last one we have seen"""
+        if self.last_transaction_id is None:
+            return
+        endpoint = TransactionsSinceID(
+            accountID=self.account_id,
+            params={"id": self.last_transaction_id},
+        )
+        response = await self.client.request(endpoint)
+        transactions = response.get("transactions", [])
+        if transactions:
+            logger.info(
+                "Catching up on %s transactions since %s"
+                % (len(transactions), self.last_transaction_id)
+            )
+        for transaction in transactions:
+            await self._handle_transaction(transaction)
+        self.catch_ups += 1
+
+    async def _messages(self):
+        endpoint = TransactionsStream(accountID=self.account_id)
+        stream = await self.client.request(endpoint)
+        try:
+            while self.running:
+                yield await self._interruptible(
+                    asyncio.wait_for(
+                        anext(stream), timeout=self.heartbeat_timeout
+                    )
+                )
+        except StopAsyncIteration:
+            logger.warning("Transaction stream closed by the server")
+        finally:
+            await stream.aclose()
+
+    def _is_new(self, transaction_id: str) -> bool:
+        if self.last_transaction_id is None:
+            return True
+        return int(transaction_id) > int(self.last_transaction_id)
+
+    async def _handle(self, message: dict) -> None:
+        self.connected = True
+        if message.get("type") == "HEARTBEAT":
+            last_id = message.get("lastTransactionID")
+            if last_id is None:
+                return
+            if self.last_transaction_id is None:
+                self.last_transaction_id = str(last_id)
+            elif self._is_new(last_id):
+                await self.catch_up()
+            return
+        await self._handle_transaction(message)
+
+    async def _handle_transaction(self, transaction: dict) -> None:
+        if not self._is_new(transaction["id"]):
+            return
+        self.transactions_received += 1
+        for event in to_events(transaction):
+            await self.publish(event)
+        self.last_transaction_id = str(transaction["id"])
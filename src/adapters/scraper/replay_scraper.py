@@ -0,0 +1,83 @@
+import copy
+from dataclasses import replace
+from datetime import datetime, timezone
+from typing import Iterable, Optional, Tuple
+
+from src.adapters.scraper.base_scraper import BaseScraper
+from src.config import CurrencyEnum, SentimentEnum
+from src.domain.fundamental import CalendarEvent, FundamentalData
+from src.service_layer.uow import MongoUnitOfWork
+
+
+def as_utc(date_: datetime) -> datetime:
+    """A naive time is taken as utc, as mongo stores them"""
+    if date_.tzinfo is None:
+        return date_.replace(tzinfo=timezone.utc)
+    return date_
+
+
+class ReplayScraper(BaseScraper):
+    """Scrapes stored fundamental data instead of the calendar
+
+    Each stored object is released once the scrape date reaches its
+    last update, as a new unprocessed object whose calendar events are
+    the scraped items, so process_data scores it and raises its events
+    as it did live.
+    """
+
+    def __init__(self, fundamental_data: Iterable[FundamentalData]):
+        self.pending: list[FundamentalData] = sorted(
+            (
+                replace(data, last_updated=as_utc(data.last_updated))
+                for data in fundamental_data
+            ),
+            key=lambda data: data.last_updated,
+        )
+        self.released = 0
+        self.date_: Optional[datetime] = None
+
+    async def load(self, uow: MongoUnitOfWork, date_: datetime) -> int:
+        """Saves the objects last updated before date_ as they were
+        stored, returns how many"""
+        loaded = 0
+        while self.released < len(self.pending) and self.pending[
+            self.released
+        ].last_updated < as_utc(date_):
+            await uow.fundamental_data_repository.save(
+                self.pending[self.released]
+            )
+            self.released += 1
+            loaded += 1
+        return loaded
+
+    async def set_scraper_params(
+        self,
+        date_: datetime = datetime.today(),
+    ) -> None:
+        self.date_ = as_utc(date_)
+
+    async def make_request(self) -> None: ...
+
+    async def get_scraped_calendar_items(
+        self, uow: MongoUnitOfWork
+    ) -> list[Tuple[CalendarEvent, CurrencyEnum, datetime]]:
+        items = []
+        while (
+            self.released < len(self.pending)
+            and self.pending[self.released].last_updated <= self.date_
+        ):
+            data = self.pending[self.released]
+            self.released += 1
+            await uow.fundamental_data_repository.save(
+                FundamentalData(
+                    currency=data.currency,
+                    last_updated=data.last_updated,
+                    processed=False,
+                    aggregate_sentiment=SentimentEnum.FLAT,
+                )
+            )
+            items.extend(
+                (copy.copy(calendar_event), data.currency, data.last_updated)
+                for calendar_event in data.calendar_events
+            )
+        return items
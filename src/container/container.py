@@ -5,7 +5,9 @@ from src.adapters.scraper.forex_factory_scraper import ForexFactoryScraper
 from src.service_layer.fundamental_service import FundamentalDataService
 from src.service_layer.trade_service import TradeService
 from src.service_layer.uow import MongoUnitOfWork
+from src.service_layer.compute_pool import ComputePool
 from src.service_layer.indicators import Indicators
+from src.service_layer.risk_simulation import RiskSimulationService
 
 
 class Container(containers.DeclarativeContainer):
@@ -32,4 +34,10 @@ class Container(containers.DeclarativeContainer):
 
     trade_service = providers.Factory(TradeService, uow=uow)
 
-    indicator_service = providers.Factory(Indicators)
+    compute_pool = providers.Singleton(ComputePool)
+
+    indicator_service = providers.Factory(Indicators, pool=compute_pool)
+
+    risk_service = providers.Singleton(
+        RiskSimulationService, uow=uow, pool=compute_pool
+    )
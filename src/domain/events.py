@@ -37,3 +37,11 @@ class OpenTradeEvent(Event):
 @dataclass
 class TechnicalEvent(Event):
     currency: CurrencyEnum
+
+
+@dataclass
+class TradeClosedEvent(Event):
+    trade_id: str
+    realised_pl: float
+    reason: str = ""
+    transaction_id: str = None
@@ -3,9 +3,19 @@ from src.container.container import Container
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi_restful import Api
-from src.entry_points.routes.debug_routes import DebugResource, EventBusRoute
+from src.entry_points.latency import add_latency_middleware
+from src.entry_points.routes.debug_routes import (
+    DebugResource,
+    EventBusMetricsRoute,
+    EventBusRoute,
+    LatencyRoute,
+)
 from src.entry_points.routes.fundamental_routes import FundamentalResource
-from src.entry_points.routes.trade_routes import TradeResource, TradePl
+from src.entry_points.routes.trade_routes import (
+    TradeResource,
+    TradePl,
+    TradeRisk,
+)
 from src.entry_points.scheduler.scheduler import scheduler
 from src.logger import get_logger
 from src.service_layer.uow import MongoUnitOfWork
@@ -27,6 +37,7 @@ def create_app():
         allow_methods=["*"],
         allow_headers=["*"],
     )
+    add_latency_middleware(app)
 
     api.add_resource(DebugResource(), "/debug", tags=["Debug"])
     api.add_resource(
@@ -34,8 +45,13 @@ def create_app():
     )
     api.add_resource(TradeResource(), "/trades", tags=["Trade Data"])
     api.add_resource(TradePl(), "/trades-pl", tags=["Trade Profit and Loss"])
+    api.add_resource(TradeRisk(), "/trades-risk", tags=["Trade Risk"])
 
     api.add_resource(EventBusRoute(), "/event-bus", tags=["Event Bus"])
+    api.add_resource(
+        EventBusMetricsRoute(), "/event-bus-metrics", tags=["Event Bus"]
+    )
+    api.add_resource(LatencyRoute(), "/latency", tags=["Debug"])
 
     @app.on_event("startup")
     async def start_up():
@@ -43,7 +59,18 @@ def create_app():
         uow: MongoUnitOfWork = app.container.uow()
         # Access event_bus from the uow and start i
         asyncio.create_task(uow.event_bus.start())
+        asyncio.create_task(uow.fxcm_connection.start_price_stream())
+        asyncio.create_task(
+            uow.fxcm_connection.start_transaction_stream(uow.publish)
+        )
         app.state.uow = uow
         app.state.event_bus = uow.event_bus
+        app.state.compute_pool = app.container.compute_pool()
+        await app.state.compute_pool.start()
+
+    @app.on_event("shutdown")
+    async def shut_down():
+        await app.state.compute_pool.shutdown()
+        await app.state.uow.fxcm_connection.close_connection()
 
     return app
@@ -0,0 +1,96 @@
+"""Downloads the candle history of the traded pairs into the archive
+
+python -m src.entry_points.backfill --start 2020-01-01 --periods m5 H1
+
+Interrupted runs carry on from the checkpoint in the archive directory.
+"""
+
+import argparse
+import asyncio
+import os
+
+from src.adapters.database.candle_archive import CandleArchive
+from src.adapters.fxcm_connect.oanda_connect import OandaConnect
+from src.config import ForexPairEnum, PeriodEnum
+from src.logger import get_logger
+from src.service_layer.backfill import (
+    BACKFILL_PERIODS,
+    BackfillCheckpoint,
+    CandleBackfill,
+)
+
+logger = get_logger(__name__)
+
+
+async def backfill(
+    instruments: list[ForexPairEnum],
+    periods: list[PeriodEnum],
+    start: str,
+    end: str,
+    archive_path: str,
+    concurrency: int,
+) -> None:
+    connection = OandaConnect()
+    archive = CandleArchive(archive_path)
+    downloader = CandleBackfill(
+        connection.request_candles,
+        archive,
+        BackfillCheckpoint(os.path.join(archive_path, "checkpoint.json")),
+        concurrency=concurrency,
+    )
+    try:
+        report = await downloader.run(instruments, periods, start, end)
+    finally:
+        await connection.close_connection()
+    for series, candles in report.series.items():
+        print("%-16s %10s candles" % (series, candles))
+    print(
+        "%s candles from %s requests in %.1fs, %.0f candles/s"
+        % (
+            report.candles,
+            report.requests,
+            report.seconds,
+            report.candles_per_second,
+        )
+    )
+    print(
+        "governor %s" % connection.client.stats().get("InstrumentsCandles", {})
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--start", required=True)
+    parser.add_argument("--end", default=None)
+    parser.add_argument(
+        "--pairs",
+        nargs="+",
+        default=[pair.value for pair in ForexPairEnum],
+        help="pairs such as EUR/USD, every traded pair by default",
+    )
+    parser.add_argument(
+        "--periods",
+        nargs="+",
+        default=[PeriodEnum.MINUTE_5.value],
+        choices=[period.value for period in BACKFILL_PERIODS],
+    )
+    parser.add_argument(
+        "--archive",
+        default=os.environ.get("CANDLE_ARCHIVE_PATH", "data/candles"),
+    )
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+    asyncio.run(
+        backfill(
+            [ForexPairEnum(pair) for pair in args.pairs],
+            [PeriodEnum(period) for period in args.periods],
+            args.start,
+            args.end,
+            args.archive,
+            args.concurrency,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""Request latency of the api
+
+Every request's duration goes into a fixed size buffer, the percentiles
+of the whole buffer or of the requests since a mark tell how responsive
+the event loop stayed, for instance during a technical signal cycle.
+"""
+import time
+from typing import Optional
+
+import numpy as np
+from fastapi import FastAPI, Request
+
+
+class LatencyRecorder:
+    """Durations of the latest requests in seconds"""
+
+    def __init__(self, size: int = 10_000) -> None:
+        self._durations = np.zeros(size)
+        self.count = 0
+
+    def record(self, seconds: float) -> None:
+        self._durations[self.count % len(self._durations)] = seconds
+        self.count += 1
+
+    def mark(self) -> int:
+        """A mark to summarise the requests recorded after it"""
+        return self.count
+
+    def durations(self, since: Optional[int] = None) -> np.ndarray:
+        size = len(self._durations)
+        number = min(self.count - (since or 0), self.count, size)
+        indices = np.arange(self.count - number, self.count) % size
+        return self._durations[indices]
+
+    def summary(self, since: Optional[int] = None) -> dict:
+        """Request count and latency percentiles in milliseconds"""
+        durations = self.durations(since) * 1000
+        if len(durations) == 0:
+            return {"count": 0}
+        p50, p99 = np.percentile(durations, [50, 99])
+        return {
+            "count": len(durations),
+            "p50": round(float(p50), 3),
+            "p99": round(float(p99), 3),
+            "max": round(float(durations.max()), 3),
+        }
+
+
+latency = LatencyRecorder()
+
+
+def add_latency_middleware(
+    app: FastAPI, recorder: LatencyRecorder = latency
+) -> None:
+    """Records the duration of every request the app serves"""
+
+    @app.middleware("http")
+    async def record_latency(request: Request, call_next):
+        start = time.perf_counter()
+        try:
+            return await call_next(request)
+        finally:
+            recorder.record(time.perf_counter() - start)
@@ -0,0 +1,99 @@
+"""Replays the archived candles through the scheduler and the handlers
+
+python -m src.entry_points.replay --start 2023-01-02 --end 2023-02-01
+
+The jobs start firing once the signal has its candles after --start.
+The fundamental data stored in the database is released as the replay
+reaches it, --without-fundamentals replays without any. The pairs the
+account currency is converted through have to be replayed too.
+"""
+
+import argparse
+import asyncio
+import os
+
+from src.adapters.database.candle_archive import CandleArchive
+from src.config import ForexPairEnum, PeriodEnum
+from src.entry_points.scheduler.replay import Replay
+from src.logger import get_logger
+from src.service_layer.backtest import load_history
+from src.service_layer.compute_pool import ComputePool
+from src.service_layer.uow import MongoUnitOfWork
+
+logger = get_logger(__name__)
+
+
+async def load_fundamental_data(db_name: str) -> list:
+    uow = MongoUnitOfWork(fxcm_connection=None, scraper=None, db_name=db_name)
+    async with uow:
+        return await uow.fundamental_data_repository.get_all()
+
+
+async def replay(args: argparse.Namespace) -> None:
+    history = load_history(
+        CandleArchive(args.archive),
+        [ForexPairEnum(pair) for pair in args.pairs],
+        PeriodEnum(args.period),
+        args.start,
+        args.end,
+    )
+    fundamental_data = []
+    if not args.without_fundamentals:
+        fundamental_data = await load_fundamental_data(args.db_name)
+    pool = None
+    if args.mode:
+        pool = ComputePool(args.mode, args.workers)
+        await pool.start()
+    try:
+        report = await Replay(
+            history,
+            fundamental_data,
+            end=args.end,
+            period=PeriodEnum(args.period),
+            spread_pips=args.spread,
+            balance=args.balance,
+            jobs=args.jobs,
+            pool=pool,
+        ).run()
+    finally:
+        if pool is not None:
+            await pool.shutdown()
+    print(report.summary())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--start", required=True)
+    parser.add_argument("--end", required=True)
+    parser.add_argument(
+        "--pairs",
+        nargs="+",
+        default=[pair.value for pair in ForexPairEnum],
+        help="pairs such as EUR/USD, every traded pair by default",
+    )
+    parser.add_argument(
+        "--period",
+        default=PeriodEnum.MINUTE_5.value,
+        choices=[period.value for period in PeriodEnum],
+    )
+    parser.add_argument(
+        "--jobs",
+        nargs="+",
+        default=None,
+        help="scheduler jobs, all by default",
+    )
+    parser.add_argument("--spread", type=float, default=1.0)
+    parser.add_argument("--balance", type=float, default=10_000.0)
+    parser.add_argument("--without-fundamentals", action="store_true")
+    parser.add_argument("--db-name", default="my_db")
+    parser.add_argument("--mode", default=None, help="compute pool mode")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument(
+        "--archive",
+        default=os.environ.get("CANDLE_ARCHIVE_PATH", "data/candles"),
+    )
+    asyncio.run(replay(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
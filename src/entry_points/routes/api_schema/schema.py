@@ -1,4 +1,4 @@
-from typing import List
+from typing import Dict, List
 from fastapi_camelcase import CamelModel
 from datetime import datetime
 from pydantic import Field
@@ -64,3 +64,18 @@ class TradeStatistic(Base):
     number_of_losers: int = Field(default=None)
     number_of_trades: int = Field(default=None)
     trades: list[TradeSchema] = Field(default=None)
+
+
+class RiskSchema(Base):
+    paths: int
+    trades: int
+    sampled_trades: int
+    risk: float
+    ruin: float
+    risk_of_ruin: float
+    unrecovered: float
+    max_drawdown: Dict[int, float]
+    recovery_trades: Dict[int, float]
+    final_return: Dict[int, float]
+    recovery_days: Dict[int, float] = Field(default=None)
+    version: str = Field(default=None)
@@ -28,6 +28,7 @@ from src.entry_points.scheduler.get_technical_signal import (
 from dependency_injector.wiring import inject, Provide
 from fastapi import Depends
 from src.container.container import Container
+from src.entry_points.latency import latency
 from src.logger import get_logger
 from src.service_layer.uow import MongoUnitOfWork
 from fastapi import BackgroundTasks
@@ -210,3 +211,26 @@ class EventBusRoute(Resource):
         else:
             background_tasks.add_task(self.uow.event_bus.start)
             return "started"
+
+
+class EventBusMetricsRoute(Resource):
+    @inject
+    def __init__(
+        self,
+        uow: MongoUnitOfWork = Depends(Provide[Container.uow]),
+    ) -> None:
+        super().__init__()
+        self.uow = uow
+
+    @set_responses(Any, 200)
+    async def get(self):
+        """Gets the depth and counts of each partition of the event bus"""
+        logger.info("Getting metrics of event bus")
+        return self.uow.event_bus.metrics()
+
+
+class LatencyRoute(Resource):
+    @set_responses(Any, 200)
+    async def get(self):
+        """Gets the latency percentiles of the latest requests"""
+        return latency.summary()
@@ -2,11 +2,18 @@ from datetime import date
 from typing import Any, List
 from fastapi_restful import set_responses, Resource
 from dependency_injector.wiring import inject, Provide
-from fastapi import Depends
+from fastapi import Depends, HTTPException
 from src.domain.trade import Trade
 from src.container.container import Container
+from src.domain.errors.errors import NotFound
+from src.service_layer.risk_simulation import (
+    MAX_TRADES,
+    RUIN,
+    RiskSimulationService,
+)
 from src.service_layer.trade_service import TradeService
 from src.entry_points.routes.api_schema.schema import (
+    RiskSchema,
     TradeSchema,
     TradeStatistic,
 )
@@ -85,3 +92,47 @@ class TradePl(Resource):
             logger.info(f"")
             data: float = await self.service.get_sum_of_realised_pl()
             return data
+
+
+class TradeRisk(Resource):
+    @inject
+    def __init__(
+        self,
+        risk_service: RiskSimulationService = Depends(
+            Provide[Container.risk_service],
+        ),
+        uow: MongoUnitOfWork = Depends(Provide[Container.uow]),
+    ) -> None:
+        super().__init__()
+        self.service = risk_service
+        self._uow = uow
+
+    @set_responses(RiskSchema, 200)
+    async def get(
+        self,
+        paths: int = 100_000,
+        trades: int = None,
+        ruin: float = RUIN,
+        seed: int = 0,
+    ):
+        """Drawdown, risk of ruin and recovery of the closed trades
+        bootstrapped over paths paths of trades trades"""
+        if not 0 < paths <= 1_000_000 or (
+            trades is not None and not 0 < trades <= MAX_TRADES
+        ):
+            raise HTTPException(400, "Invalid number of paths or trades")
+        if not 0 < ruin <= 1:
+            raise HTTPException(400, "ruin is a fraction of the balance")
+        async with self._uow:
+            logger.info(f"Simulating {paths} paths of the trade history")
+            try:
+                report = await self.service.simulate(
+                    paths=paths, trades=trades, ruin=ruin, seed=seed
+                )
+            except NotFound as e:
+                raise HTTPException(404, e.message)
+            except ValueError as e:
+                # a history the balance cannot be rebuilt from, such as
+                # one with deposits or withdrawals
+                raise HTTPException(422, str(e))
+            return RiskSchema(**report.to_dict())
@@ -1,6 +1,19 @@
+import asyncio
+import os
+import time
+from typing import Optional
+
 from src.container.container import Container
 
+from src.entry_points.latency import latency
+from src.service_layer import indicator_pipeline as pipeline
+from src.service_layer.indicator_panel import CandlePanel
 from src.service_layer.indicators import Indicators
+from src.service_layer.signals import (
+    SIGNAL_BARS,
+    evaluate_signal,
+    signal_indicators,
+)
 from src.service_layer.uow import MongoUnitOfWork
 
 from dependency_injector.wiring import inject, Provide
@@ -18,165 +31,202 @@ pd.set_option("display.max_rows", None)
 pd.set_option("display.max_columns", None)
 logger = get_logger(__name__)
 
+DEFAULT_CONCURRENCY = 8
+
+SIGNAL_INDICATORS = signal_indicators(cache=pipeline.IndicatorCache())
+
 
 @inject
 async def get_technical_signal(
     uow: MongoUnitOfWork = Depends(Provide[Container.uow]),
     indicator: Indicators = Depends(Provide[Container.indicator_service]),
-) -> None:  # type: ignore
-    """Gets the technical signal for the currency"""
-    async with uow:
-        for forex_pair in ForexPairEnum.__members__.values():
-            refined_data: pd.DataFrame = (
-                await uow.fxcm_connection.get_candle_data(
-                    instrument=ForexPairEnum(forex_pair),
-                    period=PeriodEnum.MINUTE_5,
-                    number=250,
+    concurrency: Optional[int] = None,
+) -> dict[ForexPairEnum, float]:  # type: ignore
+    """Gets the technical signal for the currency
+
+    The candles of every forex pair are fetched as their own task, at
+    most concurrency at a time. Whenever candles arrive the indicators
+    are computed on a panel of the pairs fetched so far, and each of
+    them publishes the events of its signal while the slower pairs are
+    still fetching. Returns the time from the start of each pair's fetch
+    until its signal was published, in seconds.
+    """
+    if concurrency is None:
+        concurrency = int(
+            os.environ.get("TECHNICAL_SIGNAL_CONCURRENCY", DEFAULT_CONCURRENCY)
+        )
+    semaphore = asyncio.Semaphore(max(concurrency, 1))
+    fetched: asyncio.Queue = asyncio.Queue()
+    starts: dict[ForexPairEnum, float] = {}
+    timings: dict[ForexPairEnum, float] = {}
+    panel_time = 0.0
+
+    async def fetch(forex_pair: ForexPairEnum) -> None:
+        async with semaphore:
+            starts[forex_pair] = time.perf_counter()
+            try:
+                frame = await fetch_candles(uow, forex_pair)
+            except Exception as e:
+                logger.error(
+                    "Technical signal for %s failed: %s" % (forex_pair, e)
                 )
+                timings[forex_pair] = time.perf_counter() - starts[forex_pair]
+                frame = None
+            fetched.put_nowait((forex_pair, frame))
+
+    async def score(frames: dict[ForexPairEnum, pd.DataFrame]) -> None:
+        nonlocal panel_time
+        panel_start = time.perf_counter()
+        try:
+            panels = [
+                await add_indicators(indicator, panel)
+                for panel in build_panels(frames)
+            ]
+        except Exception as e:
+            logger.error(
+                "Technical signal for %s failed: %s" % (list(frames), e)
             )
-
-            refined_data = await indicator.get_simple_moving_average(
-                refined_data,
-                period=5,
-                col="close",
-                column_name="MA",
-            )
-            refined_data = await indicator.fibonacci_retracements(refined_data)
-
-            refined_data = await indicator.get_rsi(refined_data, period=14)
-
-            refined_data = await indicator.get_macd(refined_data, "close")
-
-            refined_data = await indicator.get_atr(refined_data, period=14)
-
-            refined_data = await indicator.get_adx(refined_data, period=14)
-
-            refined_data["prev_close"] = refined_data["close"].shift(1)
-
-            refined_data = await get_signal(refined_data)
-            if refined_data.iloc[-1]["Signal"] > 0:
-                logger.warning("Bullish Signal generated for %s" % forex_pair)
-                await uow.publish(
-                    CloseForexPairEvent(
-                        forex_pair=forex_pair, sentiment=SentimentEnum.BEARISH
-                    )
-                )
-                await uow.publish(
-                    OpenTradeEvent(
-                        forex_pair=forex_pair,
-                        sentiment=SentimentEnum.BULLISH,
-                        stop=refined_data.iloc[-1]["ATR_Stop"],
-                        close=refined_data.iloc[-1]["close"],
-                        limit=refined_data.iloc[-1]["ATR_Limit"],
-                    )
-                )
-            elif refined_data.iloc[-1]["Signal"] < 0:
-                logger.warning("Bearish Signal generated for %s" % forex_pair)
-                await uow.publish(
-                    CloseForexPairEvent(
-                        forex_pair=forex_pair, sentiment=SentimentEnum.BULLISH
+            panels = []
+        panel_time += time.perf_counter() - panel_start
+        for panel in panels:
+            for forex_pair in panel.pairs:
+                try:
+                    await publish_signal(
+                        uow, forex_pair, panel.frame(forex_pair)
                     )
-                )
-                await uow.publish(
-                    OpenTradeEvent(
-                        forex_pair=forex_pair,
-                        sentiment=SentimentEnum.BEARISH,
-                        stop=refined_data.iloc[-1]["ATR_Stop"],
-                        close=refined_data.iloc[-1]["close"],
-                        limit=refined_data.iloc[-1]["ATR_Limit"],
+                except Exception as e:
+                    logger.error(
+                        "Technical signal for %s failed: %s" % (forex_pair, e)
                     )
-                )
+        for forex_pair in frames:
+            timings[forex_pair] = time.perf_counter() - starts[forex_pair]
 
+    cycle_start = time.perf_counter()
+    latency_mark = latency.mark()
+    async with uow:
+        fetches = [
+            asyncio.create_task(fetch(ForexPairEnum(forex_pair)))
+            for forex_pair in ForexPairEnum.__members__.values()
+        ]
+        try:
+            remaining = len(fetches)
+            while remaining:
+                arrived = [await fetched.get()]
+                while not fetched.empty():
+                    arrived.append(fetched.get_nowait())
+                remaining -= len(arrived)
+                frames = {
+                    forex_pair: frame
+                    for forex_pair, frame in arrived
+                    if frame is not None
+                }
+                if frames:
+                    await score(frames)
+        finally:
+            for task in fetches:
+                task.cancel()
+            await asyncio.gather(*fetches, return_exceptions=True)
+
+    slowest = max(timings, key=timings.get)
+    logger.info(
+        "Technical signal cycle took %.3fs for %s pairs, indicators took "
+        "%.3fs, slowest was %s at %.3fs"
+        % (
+            time.perf_counter() - cycle_start,
+            len(timings),
+            panel_time,
+            slowest,
+            timings[slowest],
+        )
+    )
+    logger.info(
+        "Api latency during the technical signal cycle %s"
+        % latency.summary(since=latency_mark)
+    )
+    return timings
+
+
+def build_panels(
+    frames: dict[ForexPairEnum, pd.DataFrame],
+) -> list[CandlePanel]:
+    """One panel per number of bars, so a pair with a short history does
+    not cut the others"""
+    by_length: dict[int, dict[ForexPairEnum, pd.DataFrame]] = {}
+    for forex_pair, frame in frames.items():
+        by_length.setdefault(len(frame), {})[forex_pair] = frame
+    return [CandlePanel.from_frames(group) for group in by_length.values()]
+
+
+async def fetch_candles(
+    uow: MongoUnitOfWork, forex_pair: ForexPairEnum
+) -> pd.DataFrame:
+    """Fetches the candles the signal is evaluated on"""
+    return await uow.fxcm_connection.get_candle_data(
+        instrument=forex_pair,
+        period=PeriodEnum.MINUTE_5,
+        number=SIGNAL_BARS,
+    )
 
-async def get_signal(refined_data: pd.DataFrame) -> pd.DataFrame:
-    """Gets the signal for the currency"""
 
-    # Define divergence conditions
-    bullish_condition = (
-        (
-            (
-                (refined_data["prev_close"] <= refined_data["Fib_23.6"])
-                & (refined_data["close"] > refined_data["Fib_23.6"])
-            )
-            | (
-                (refined_data["prev_close"] <= refined_data["Fib_38.2"])
-                & (refined_data["close"] > refined_data["Fib_38.2"])
-            )
-            | (
-                (refined_data["prev_close"] <= refined_data["Fib_50.0"])
-                & (refined_data["close"] > refined_data["Fib_50.0"])
-            )
-            | (
-                (refined_data["prev_close"] <= refined_data["Fib_61.8"])
-                & (refined_data["close"] > refined_data["Fib_61.8"])
-            )
-        )
-        & (refined_data["close"] > refined_data["Fib_23.6"])
-        & (refined_data["close"] > refined_data["MA"])
-        & (refined_data["adx"] > 25)
-        & (refined_data["plus_di"] > refined_data["minus_di"])
+async def add_indicators(
+    indicator: Indicators, panel: CandlePanel
+) -> CandlePanel:
+    """Computes the indicators of the signal for every pair at once"""
+    return await indicator.run_pipeline(
+        SIGNAL_INDICATORS, panel, tuple(panel.pairs), PeriodEnum.MINUTE_5
     )
 
-    bearish_condition = (
-        (
-            (
-                (refined_data["prev_close"] >= refined_data["Fib_23.6"])
-                & (refined_data["close"] < refined_data["Fib_23.6"])
+
+async def publish_signal(
+    uow: MongoUnitOfWork,
+    forex_pair: ForexPairEnum,
+    refined_data: pd.DataFrame,
+) -> None:
+    """Evaluates the signal of a pair on its last bar and publishes the
+    resulting events"""
+    if "prev_close" not in refined_data:
+        refined_data["prev_close"] = refined_data["close"].shift(1)
+
+    # scoring one bar costs less than sending the frame to the compute
+    # pool, so it runs inline
+    refined_data = await get_signal(refined_data, 1)
+    if refined_data.iloc[-1]["Signal"] > 0:
+        logger.warning("Bullish Signal generated for %s" % forex_pair)
+        await uow.publish(
+            CloseForexPairEvent(
+                forex_pair=forex_pair, sentiment=SentimentEnum.BEARISH
             )
-            | (
-                (refined_data["prev_close"] >= refined_data["Fib_38.2"])
-                & (refined_data["close"] < refined_data["Fib_38.2"])
+        )
+        await uow.publish(
+            OpenTradeEvent(
+                forex_pair=forex_pair,
+                sentiment=SentimentEnum.BULLISH,
+                stop=refined_data.iloc[-1]["ATR_Stop"],
+                close=refined_data.iloc[-1]["close"],
+                limit=refined_data.iloc[-1]["ATR_Limit"],
             )
-            | (
-                (refined_data["prev_close"] >= refined_data["Fib_50.0"])
-                & (refined_data["close"] < refined_data["Fib_50.0"])
+        )
+    elif refined_data.iloc[-1]["Signal"] < 0:
+        logger.warning("Bearish Signal generated for %s" % forex_pair)
+        await uow.publish(
+            CloseForexPairEvent(
+                forex_pair=forex_pair, sentiment=SentimentEnum.BULLISH
             )
-            | (
-                (refined_data["prev_close"] >= refined_data["Fib_61.8"])
-                & (refined_data["close"] < refined_data["Fib_61.8"])
+        )
+        await uow.publish(
+            OpenTradeEvent(
+                forex_pair=forex_pair,
+                sentiment=SentimentEnum.BEARISH,
+                stop=refined_data.iloc[-1]["ATR_Stop"],
+                close=refined_data.iloc[-1]["close"],
+                limit=refined_data.iloc[-1]["ATR_Limit"],
             )
         )
-        & (refined_data["close"] < refined_data["MA"])
-        & (refined_data["adx"] > 25)
-        & (refined_data["plus_di"] < refined_data["minus_di"])
-    )
 
-    # Create signals
-    refined_data["Buy_Signal"] = bearish_condition
-    refined_data["Sell_Signal"] = bullish_condition
-
-    # Combine the Buy_Signal and Sell_Signal into a single Signal column
-    refined_data["Signal"] = refined_data["Buy_Signal"].replace(
-        {True: 1, False: 0}
-    ) - refined_data["Sell_Signal"].replace({True: 1, False: 0})
-
-    refined_data = refined_data.drop(columns=["Buy_Signal", "Sell_Signal"])
-
-    def calculate_stop(row):
-        if row["Signal"] == 1:  # Buy
-            return (
-                row["close"] - 3 * row["atr"]
-            )  # Adjust the multiplier as needed
-        elif row["Signal"] == -1:  # Sell
-            return (
-                row["close"] + 3 * row["atr"]
-            )  # Adjust the multiplier as needed
-        else:  # No signal
-            return None
-
-    def calculate_limit(row):
-        if row["Signal"] == 1:  # Buy
-            return (
-                row["close"] + 4 * row["atr"]
-            )  # Adjust the multiplier as needed
-        elif row["Signal"] == -1:  # Sell
-            return (
-                row["close"] - 4 * row["atr"]
-            )  # Adjust the multiplier as needed
-        else:  # No signal
-            return None
-
-    refined_data["ATR_Stop"] = refined_data.apply(calculate_stop, axis=1)
-    refined_data["ATR_Limit"] = refined_data.apply(calculate_limit, axis=1)
-
-    return refined_data
+
+async def get_signal(
+    refined_data: pd.DataFrame, tail: Optional[int] = None
+) -> pd.DataFrame:
+    """Gets the signal for the currency, for the last tail bars only
+    when tail is given"""
+    return evaluate_signal(refined_data, tail)
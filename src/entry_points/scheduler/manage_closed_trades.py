@@ -1,10 +1,8 @@
 from dependency_injector.wiring import inject, Provide
 from fastapi import Depends
-from src.config import PositionEnum
 from src.container.container import Container
-from src.domain.trade import Trade
 
-from src.service_layer.indicators import Indicators
+from src.service_layer.trade_reconciliation import TradeReconciler
 from src.service_layer.uow import MongoUnitOfWork
 
 from src.logger import get_logger
@@ -17,26 +15,12 @@ async def manage_closed_trades(
     uow: MongoUnitOfWork = Depends(Provide[Container.uow]),
 ) -> None:  # type: ignore
     async with uow:
-        open_trades: list[Trade] = await uow.trade_repository.get_open_trades()
-        for trade in open_trades:
-            await update_trade_state(uow, trade)
+        try:
+            await TradeReconciler(uow).reconcile()
+        except Exception as e:
+            logger.error(e)
+            logger.error(
+                "Update trade state: Oanda threw an exception while "
+                "reconciling trades"
+            )
 
-
-async def update_trade_state(uow, trade):
-    try:
-        state, realised_pl = await uow.fxcm_connection.get_trade_state(
-            trade.trade_id
-        )
-        if state is not None and state != "OPEN":
-            trade.position = PositionEnum.CLOSED
-            trade.realised_pl = realised_pl
-            trade.is_winner = True if realised_pl > 0 else False
-            logger.warning(f"Trade %s closed" % trade.trade_id)
-            await uow.trade_repository.save(trade)
-
-    except Exception as e:
-        logger.error(e)
-        logger.error(
-            f"Update trade state: Oanda threw and exception, trade %s is not a valid trade"
-            % trade.trade_id
-        )
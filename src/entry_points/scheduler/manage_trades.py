@@ -1,14 +1,14 @@
 import math
 from dependency_injector.wiring import inject, Provide
 from fastapi import Depends
-from src.config import ForexPairEnum, PeriodEnum, PositionEnum, conversion_map
+from src.config import ForexPairEnum, PeriodEnum, PositionEnum
 from src.container.container import Container
 from src.domain.trade import Trade
 from src.service_layer.indicators import Indicators
+from src.service_layer.signals import SPREAD_BUFFER, TRAILING_ATR
 
 from src.service_layer.uow import MongoUnitOfWork
 from src.logger import get_logger
-from src.entry_points.scheduler.manage_closed_trades import update_trade_state
 from src.utils import close_trade_in_oanda_util
 
 logger = get_logger(__name__)
@@ -23,6 +23,15 @@ async def manage_trades_handler(
         forex_pairs: list[
             ForexPairEnum
         ] = await uow.trade_repository.get_distinct_forex_pairs()
+        if not forex_pairs:
+            return
+        # one batched rate lookup covers every traded pair
+        gbp_per_pips = dict(
+            zip(
+                forex_pairs,
+                await uow.conversion_rates.get_pip_values(forex_pairs),
+            )
+        )
         for forex_pair in forex_pairs:
             data = await uow.fxcm_connection.get_candle_data(
                 forex_pair, PeriodEnum.MINUTE_1, 20
@@ -36,19 +45,21 @@ async def manage_trades_handler(
             ] = await uow.trade_repository.get_open_trades_by_forex_pair(
                 forex_pair=forex_pair
             )
-            multiplier = 2
+            multiplier = TRAILING_ATR
 
             pip_value = (
                 0.0001 if "JPY" not in forex_pair.value.split("/") else 0.01
             )
 
-            gbp_per_pip = await calculate_gbp_pips(forex_pair, uow, pip_value)
+            gbp_per_pip = gbp_per_pips[forex_pair]
 
             for trade in trades:
                 modified = False
 
                 half_spread_pips = (
-                    (trade.half_spread_cost / gbp_per_pip) * pip_value * 1.25
+                    (trade.half_spread_cost / gbp_per_pip)
+                    * pip_value
+                    * SPREAD_BUFFER
                 )
 
                 if trade.is_buy:
@@ -98,13 +109,3 @@ async def manage_trades_handler(
                     # there reason this didnt work is because you didnt save
                     await uow.trade_repository.save(trade)
 
-
-async def calculate_gbp_pips(
-    forex_pair: ForexPairEnum, uow: MongoUnitOfWork, pip_value: float
-) -> float:
-    """Calculate the spread pips for a trade"""
-
-    exchange_rate = await uow.fxcm_connection.get_latest_close(
-        conversion_map[forex_pair]
-    )
-    return (100000 * pip_value) / exchange_rate
@@ -0,0 +1,333 @@
+"""Replays archived candles through the scheduler jobs and the handlers
+
+The jobs of the scheduler fire on a virtual clock as fast as they run,
+at the times their triggers give, and publish to the event bus, whose
+handlers run before the next job fires. The units of work are kept in
+memory, the broker fills against the replayed candles and the stored
+fundamental data is released to process_data as the clock reaches it.
+
+The report gives the simulated days per wall clock second and the time
+spent in each job, handler, broker call, indicator and repository call,
+without the time of the calls made inside it.
+
+report = await Replay(history, fundamental_data, start, end).run()
+print(report.summary())
+"""
+
+import contextvars
+import functools
+import heapq
+import inspect
+import itertools
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Iterable, Mapping, Optional, Union
+
+import pandas as pd
+from apscheduler.triggers.interval import IntervalTrigger
+from dependency_injector import containers, providers
+from pandas import DataFrame
+
+from src.adapters.fxcm_connect.replay_trade_connect import (
+    ReplayTradeConnect,
+)
+from src.adapters.scraper.replay_scraper import ReplayScraper
+from src.config import ForexPairEnum, PeriodEnum, PositionEnum
+from src.container.container import Container
+from src.domain.fundamental import FundamentalData
+from src.domain.trade import Trade
+from src.entry_points.scheduler.scheduler import scheduler
+from src.logger import get_logger
+from src.service_layer.clock import clock
+from src.service_layer.compute_pool import ComputePool
+from src.service_layer.handlers import handlers
+from src.service_layer.indicators import Indicators
+from src.service_layer.signals import SIGNAL_BARS
+from src.service_layer.uow import InMemoryUnitOfWork
+
+logger = get_logger(__name__)
+
+TimeLike = Union[str, datetime, pd.Timestamp]
+
+_parent: contextvars.ContextVar = contextvars.ContextVar(
+    "replay_timing", default=None
+)
+
+
+class ReplayContainer(Container):
+    """The container wired into the scheduler jobs only"""
+
+    wiring_config = containers.WiringConfiguration(
+        modules=["src.entry_points.scheduler.scheduler"]
+    )
+
+
+class Timings:
+    """Calls and seconds spent per name, in total and without the time
+    of the timed calls made inside"""
+
+    def __init__(self) -> None:
+        self.calls: dict[str, int] = {}
+        self.seconds: dict[str, float] = {}
+        self.own_seconds: dict[str, float] = {}
+
+    @contextmanager
+    def measure(self, name: str):
+        inner = [0.0]
+        parent = _parent.get()
+        token = _parent.set(inner)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            _parent.reset(token)
+            if parent is not None:
+                parent[0] += elapsed
+            self.calls[name] = self.calls.get(name, 0) + 1
+            self.seconds[name] = self.seconds.get(name, 0.0) + elapsed
+            self.own_seconds[name] = (
+                self.own_seconds.get(name, 0.0) + elapsed - inner[0]
+            )
+
+    def timed(self, name: str, func):
+        """func, a coroutine function, timed under name"""
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with self.measure(name):
+                return await func(*args, **kwargs)
+
+        return wrapper
+
+    def instrument(self, obj, prefix: str) -> None:
+        """Times every public coroutine method of obj as prefix.method"""
+        for name, method in inspect.getmembers(
+            obj, inspect.iscoroutinefunction
+        ):
+            if not name.startswith("_"):
+                setattr(
+                    obj, name, self.timed("%s.%s" % (prefix, name), method)
+                )
+
+    def to_frame(self, wall_seconds: float) -> DataFrame:
+        """One row per name, the most own time first, with the share of
+        the wall time, the time outside every timed call as replay"""
+        frame = DataFrame(
+            {
+                "calls": self.calls,
+                "seconds": self.seconds,
+                "own_seconds": self.own_seconds,
+            }
+        )
+        frame.loc["replay"] = [
+            1,
+            wall_seconds,
+            wall_seconds - sum(self.own_seconds.values()),
+        ]
+        frame["calls"] = frame["calls"].astype(int)
+        frame["share"] = frame["own_seconds"] / wall_seconds
+        frame["mean_ms"] = frame["seconds"] / frame["calls"] * 1000
+        return frame.sort_values("own_seconds", ascending=False)
+
+
+@dataclass
+class ReplayReport:
+    start: datetime
+    end: datetime
+    wall_seconds: float
+    fired: dict[str, int]
+    errors: dict[str, int]
+    timings: DataFrame
+    trades: list[Trade] = field(default_factory=list)
+    balance: float = 0.0
+
+    @property
+    def simulated_days(self) -> float:
+        return (self.end - self.start) / timedelta(days=1)
+
+    @property
+    def days_per_second(self) -> float:
+        return self.simulated_days / self.wall_seconds
+
+    def summary(self) -> str:
+        closed = [
+            trade
+            for trade in self.trades
+            if trade.position == PositionEnum.CLOSED
+        ]
+        lines = [
+            "%.2f simulated days in %.2fs, %.2f days per second"
+            % (self.simulated_days, self.wall_seconds, self.days_per_second),
+            "%s trades, %s closed, realised pl %.2f, balance %.2f"
+            % (
+                len(self.trades),
+                len(closed),
+                sum(trade.realised_pl or 0.0 for trade in closed),
+                self.balance,
+            ),
+            "fired %s"
+            % ", ".join("%s %s" % item for item in self.fired.items()),
+        ]
+        if self.errors:
+            lines.append(
+                "errors %s"
+                % ", ".join("%s %s" % item for item in self.errors.items())
+            )
+        lines.append(self.timings.to_string(float_format="%.4f"))
+        return "\n".join(lines)
+
+
+def replay_trigger(trigger, start: datetime):
+    """The trigger of a job from the start of the replay, an interval
+    runs from when the job was added otherwise"""
+    if isinstance(trigger, IntervalTrigger):
+        return IntervalTrigger(
+            seconds=trigger.interval_length,
+            start_date=start + trigger.interval,
+            timezone=trigger.timezone,
+        )
+    return trigger
+
+
+class Replay:
+    """Drives the scheduler jobs and the handlers over archived candles"""
+
+    def __init__(
+        self,
+        history: Mapping[ForexPairEnum, DataFrame],
+        fundamental_data: Iterable[FundamentalData] = (),
+        start: Optional[TimeLike] = None,
+        end: Optional[TimeLike] = None,
+        period: PeriodEnum = PeriodEnum.MINUTE_5,
+        spread_pips: float = 1.0,
+        balance: float = 10_000.0,
+        rates: Optional[Mapping[str, float]] = None,
+        jobs: Optional[Iterable[str]] = None,
+        pool: Optional[ComputePool] = None,
+    ) -> None:
+        if not history:
+            raise ValueError("No candles to replay")
+        dates = [frame["date"] for frame in history.values()]
+        # by default from when the signal has its candles
+        self.start = self.to_utc(
+            start
+            if start is not None
+            else min(
+                date.iloc[min(SIGNAL_BARS, len(date) - 1)] for date in dates
+            )
+        )
+        self.end = self.to_utc(
+            end if end is not None else max(date.iloc[-1] for date in dates)
+        )
+        if self.end <= self.start:
+            raise ValueError("The replay ends before it starts")
+        self.jobs = [
+            job
+            for job in scheduler.get_jobs()
+            if jobs is None or job.name in set(jobs)
+        ]
+        self.timings = Timings()
+        self.errors: dict[str, int] = {}
+        self.fired: dict[str, int] = {}
+        self.broker = ReplayTradeConnect(
+            history, period, spread_pips, balance, rates
+        )
+        self.scraper = ReplayScraper(fundamental_data)
+        self.uow = InMemoryUnitOfWork(
+            self.broker,
+            self.scraper,
+            handlers={
+                event: self.guarded("handler.%s" % handler.__name__, handler)
+                for event, handler in handlers.items()
+            },
+        )
+        self.indicator = Indicators(pool=pool)
+        self.timings.instrument(self.broker, "broker")
+        self.timings.instrument(self.indicator, "indicators")
+        self.timings.instrument(self.uow.trade_repository, "trade_repository")
+        self.timings.instrument(
+            self.uow.fundamental_data_repository, "fundamental_repository"
+        )
+
+    @staticmethod
+    def to_utc(value: TimeLike) -> datetime:
+        timestamp = pd.Timestamp(value)
+        if timestamp.tzinfo is None:
+            timestamp = timestamp.tz_localize("UTC")
+        return timestamp.tz_convert("UTC").to_pydatetime()
+
+    def guarded(self, name: str, func):
+        """func timed under name, its errors logged and counted as the
+        scheduler and a live event bus would not stop on them"""
+        timed = self.timings.timed(name, func)
+
+        async def wrapper(*args, **kwargs):
+            try:
+                return await timed(*args, **kwargs)
+            except Exception as e:
+                self.errors[name] = self.errors.get(name, 0) + 1
+                logger.error("%s failed in the replay: %r" % (name, e))
+
+        return wrapper
+
+    async def step(self, job) -> None:
+        """Fills the orders the candles since the last step reached, then
+        runs the job and the events they published"""
+        await self.broker.fill_orders()
+        await self.uow.event_bus.drain()
+        await self.guarded("job.%s" % job.name, job.func)(
+            *job.args, **job.kwargs
+        )
+        await self.uow.event_bus.drain()
+        self.fired[job.name] = self.fired.get(job.name, 0) + 1
+
+    async def run(self) -> ReplayReport:
+        logger.info(
+            "Replaying %s jobs from %s to %s"
+            % (len(self.jobs), self.start, self.end)
+        )
+        container = ReplayContainer()
+        container.uow.override(providers.Object(self.uow))
+        container.indicator_service.override(providers.Object(self.indicator))
+        await self.broker.start_transaction_stream(self.uow.publish)
+        order = itertools.count()
+        queue = []
+        for job in self.jobs:
+            trigger = replay_trigger(job.trigger, self.start)
+            fire_time = trigger.get_next_fire_time(None, self.start)
+            if fire_time is not None:
+                queue.append((fire_time, next(order), job, trigger))
+        heapq.heapify(queue)
+        started = time.perf_counter()
+        try:
+            clock.set_time(self.start)
+            await self.scraper.load(self.uow, self.start)
+            while queue and queue[0][0] <= self.end:
+                fire_time, _, job, trigger = heapq.heappop(queue)
+                clock.set_time(fire_time)
+                await self.step(job)
+                fire_time = trigger.get_next_fire_time(
+                    fire_time, fire_time + timedelta(microseconds=1)
+                )
+                if fire_time is not None:
+                    heapq.heappush(
+                        queue, (fire_time, next(order), job, trigger)
+                    )
+        finally:
+            wall_seconds = time.perf_counter() - started
+            clock.reset()
+            container.unwire()
+            container.reset_override()
+        return ReplayReport(
+            start=self.start,
+            end=self.end,
+            wall_seconds=wall_seconds,
+            fired=self.fired,
+            errors=self.errors,
+            timings=self.timings.to_frame(wall_seconds),
+            trades=await self.uow.trade_repository.get_all(),
+            balance=self.broker.balance,
+        )
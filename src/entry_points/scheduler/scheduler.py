@@ -1,4 +1,3 @@
-import asyncio
 from datetime import datetime, timedelta, timezone
 import os
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
@@ -17,6 +16,7 @@ from src.entry_points.scheduler.manage_closed_trades import (
 )
 import pytz
 from src.logger import get_logger
+from src.service_layer.clock import clock
 
 logger = get_logger(__name__)
 
@@ -26,9 +26,9 @@ scheduler = AsyncIOScheduler()
 @scheduler.scheduled_job("interval", seconds=115)
 async def get_fundamental_trend_data():
     date_: datetime = (
-        datetime.now(pytz.timezone("America/New_York"))
+        clock.now(pytz.timezone("America/New_York"))
         if os.environ.get("DEPLOY_ENV", "local") == "aws"
-        else datetime.now(get_localzone())
+        else clock.now(get_localzone())
     )
     if date_.weekday() < 5:
         logger.info(f"Getting fundamental data for {date_}")
@@ -37,8 +37,8 @@ async def get_fundamental_trend_data():
 
 @scheduler.scheduled_job("cron", minute="*/5")
 async def get_fundamental_technical_data():
-    await asyncio.sleep(1)
-    date_: datetime = datetime.now(timezone.utc)
+    await clock.sleep(1)
+    date_: datetime = clock.now(timezone.utc)
     logger.info(f"Getting trading signal for {date_}")
     if date_.weekday() < 5:
         logger.info(f"Getting trading signal for {date_}")
@@ -47,17 +47,19 @@ async def get_fundamental_technical_data():
 
 @scheduler.scheduled_job("cron", minute="*/5")
 async def manage_trades():
-    await asyncio.sleep(1)
-    date_: datetime = datetime.now(timezone.utc)
+    await clock.sleep(1)
+    date_: datetime = clock.now(timezone.utc)
     logger.info(f"Manage trades for date {date_}")
     if date_.weekday() < 5:
         logger.info(f"Manage trades for date {date_}")
         await manage_trades_handler()
 
 
-@scheduler.scheduled_job("interval", seconds=320)
+# trades closed by the broker arrive through the transaction stream,
+# this only reconciles whatever the stream missed
+@scheduler.scheduled_job("interval", seconds=1800)
 async def manage_closed_trades_job():
-    date_: datetime = datetime.now(timezone.utc)
+    date_: datetime = clock.now(timezone.utc)
     if date_.weekday() < 5:
         logger.info(f"Manage closed trades for date {date_}")
         await manage_closed_trades()
@@ -65,7 +67,7 @@ async def manage_closed_trades_job():
 
 @scheduler.scheduled_job("interval", seconds=305)
 async def process_fundamental_events():
-    date_: datetime = datetime.now(timezone.utc)
+    date_: datetime = clock.now(timezone.utc)
     if date_.weekday() < 5:
         logger.info(f"Process fundamental events for date {date_}")
         await process_fundamental_data(date_=date_)
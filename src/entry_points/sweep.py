@@ -0,0 +1,132 @@
+"""Sweeps the strategy parameters over the archived candles
+
+python -m src.entry_points.sweep --start 2021-01-01 --end 2024-01-01 \
+    --parameters adx_trend=20,25,30 stop_atr=2,3,4 \
+    --train 180D --test 30D --output sweeps/adx_stop
+
+A parameter takes a list of values, every combination of them is tried,
+or with --samples a low:high range drawn from at random.
+"""
+
+import argparse
+import asyncio
+import os
+
+from src.adapters.database.candle_archive import CandleArchive
+from src.config import ForexPairEnum, PeriodEnum
+from src.logger import get_logger
+from src.service_layer.backtest import Backtester, load_history
+from src.service_layer.compute_pool import ComputePool
+from src.service_layer.parameter_sweep import (
+    ParameterSweep,
+    grid,
+    random_samples,
+    walk_forward_splits,
+)
+
+logger = get_logger(__name__)
+
+
+def parse_number(text: str):
+    try:
+        return int(text)
+    except ValueError:
+        return float(text)
+
+
+def parse_parameters(specs: list[str], samples: int, seed: int) -> list:
+    """name=v1,v2 lists for a grid, name=low:high ranges or lists for
+    random samples"""
+    values = {}
+    for spec in specs:
+        name, _, text = spec.partition("=")
+        if ":" in text:
+            low, high = text.split(":")
+            values[name] = (parse_number(low), parse_number(high))
+        else:
+            values[name] = [parse_number(value) for value in text.split(",")]
+    if samples:
+        return random_samples(samples, seed, **values)
+    ranges = [
+        name for name, value in values.items() if isinstance(value, tuple)
+    ]
+    if ranges:
+        raise ValueError("Ranges need --samples: %s" % ", ".join(ranges))
+    return grid(**values)
+
+
+async def sweep(args: argparse.Namespace) -> None:
+    parameters = parse_parameters(args.parameters, args.samples, args.seed)
+    history = load_history(
+        CandleArchive(args.archive),
+        [ForexPairEnum(pair) for pair in args.pairs],
+        PeriodEnum(args.period),
+        args.start,
+        args.end,
+    )
+    splits = None
+    if args.train and args.test:
+        splits = walk_forward_splits(
+            args.start, args.end, args.train, args.test, args.step
+        )
+    pool = ComputePool(args.mode, args.workers)
+    await pool.start()
+    try:
+        result = await ParameterSweep(
+            history,
+            parameters,
+            splits,
+            Backtester(spread_pips=args.spread, balance=args.balance),
+            metric=args.metric,
+            pool=pool,
+        ).run()
+    finally:
+        await pool.shutdown()
+    for name, path in result.save(args.output).items():
+        print("saved %s to %s" % (name, path))
+    print(result.ranking.head(10).to_string(index=False))
+    if not result.walk_forward.empty:
+        print(result.walk_forward.to_string(index=False))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--start", required=True)
+    parser.add_argument("--end", required=True)
+    parser.add_argument(
+        "--pairs",
+        nargs="+",
+        default=[pair.value for pair in ForexPairEnum],
+        help="pairs such as EUR/USD, every traded pair by default",
+    )
+    parser.add_argument(
+        "--period",
+        default=PeriodEnum.MINUTE_5.value,
+        choices=[period.value for period in PeriodEnum],
+    )
+    parser.add_argument(
+        "--parameters",
+        nargs="+",
+        required=True,
+        help="name=v1,v2 or with --samples name=low:high",
+    )
+    parser.add_argument("--samples", type=int, default=0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--train", default=None, help="such as 180D")
+    parser.add_argument("--test", default=None, help="such as 30D")
+    parser.add_argument("--step", default=None)
+    parser.add_argument("--spread", type=float, default=1.0)
+    parser.add_argument("--balance", type=float, default=None)
+    parser.add_argument("--metric", default="total_pips")
+    parser.add_argument("--mode", default=None)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument(
+        "--archive",
+        default=os.environ.get("CANDLE_ARCHIVE_PATH", "data/candles"),
+    )
+    parser.add_argument("--output", default="sweeps/latest")
+    asyncio.run(sweep(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+import asyncio
+import json
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Iterable, Optional
+
+import numpy as np
+
+from src.adapters.database.candle_archive import (
+    NANOSECONDS,
+    PERIOD_SECONDS,
+    CandleArchive,
+    TimeLike,
+    instrument_key,
+    to_nanoseconds,
+)
+from src.adapters.fxcm_connect.candle_cache import FetchCandles, to_rfc3339
+from src.config import ForexPairEnum, PeriodEnum
+from src.logger import get_logger
+
+logger = get_logger(__name__)
+
+# the most candles the v20 api returns for one request
+MAX_CANDLES_PER_REQUEST = 5000
+# the periods requested as their upper-cased value that fall on a fixed
+# step, v20 calls days and weeks D and W and a month has no fixed length
+BACKFILL_PERIODS = (
+    PeriodEnum.MINUTE_1,
+    PeriodEnum.MINUTE_5,
+    PeriodEnum.MINUTE_15,
+    PeriodEnum.MINUTE_30,
+    PeriodEnum.HOUR_1,
+    PeriodEnum.HOUR_2,
+    PeriodEnum.HOUR_3,
+    PeriodEnum.HOUR_4,
+    PeriodEnum.HOUR_6,
+    PeriodEnum.HOUR_8,
+)
+
+
+@dataclass
+class Page:
+    instrument: ForexPairEnum
+    period: PeriodEnum
+    index: int
+    start: int
+    end: int
+
+    @property
+    def step(self) -> int:
+        return PERIOD_SECONDS[self.period] * NANOSECONDS
+
+
+@dataclass
+class SeriesProgress:
+    """Pages of one series, written to the archive strictly in order"""
+
+    pages: list[Page]
+    written: int = 0
+    candles: int = 0
+    done: dict[int, dict] = field(default_factory=dict)
+
+
+@dataclass
+class BackfillReport:
+    pages: int = 0
+    requests: int = 0
+    candles: int = 0
+    seconds: float = 0.0
+    series: dict[str, int] = field(default_factory=dict)
+
+    @property
+    def candles_per_second(self) -> float:
+        return self.candles / self.seconds if self.seconds else 0.0
+
+
+class BackfillCheckpoint:
+    """Remembers, per series, up to when the archive is complete"""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.done_until: dict[str, int] = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self.done_until = json.load(f)
+
+    @staticmethod
+    def key(instrument: ForexPairEnum, period: PeriodEnum) -> str:
+        return "%s:%s" % (instrument_key(instrument), period.value)
+
+    def get(
+        self, instrument: ForexPairEnum, period: PeriodEnum
+    ) -> Optional[int]:
+        return self.done_until.get(self.key(instrument, period))
+
+    def set(
+        self, instrument: ForexPairEnum, period: PeriodEnum, until: int
+    ) -> None:
+        self.done_until[self.key(instrument, period)] = until
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path + ".tmp", "w") as f:
+            json.dump(self.done_until, f, indent=2)
+        os.replace(self.path + ".tmp", self.path)
+
+
+class CandleBackfill:
+    """Downloads a candle history into the archive
+
+    Each series is split into pages of at most page_size candles that
+    are requested concurrently, the request governor of the connection
+    keeps them within the broker limits. Pages are written to the
+    archive in order and the checkpoint moves with them, so a new run
+    carries on after the last written page.
+    """
+
+    def __init__(
+        self,
+        fetch_candles: FetchCandles,
+        archive: CandleArchive,
+        checkpoint: BackfillCheckpoint,
+        page_size: int = MAX_CANDLES_PER_REQUEST,
+        concurrency: int = 8,
+        clock=time.time,
+    ) -> None:
+        self.fetch_candles = fetch_candles
+        self.archive = archive
+        self.checkpoint = checkpoint
+        self.page_size = min(page_size, MAX_CANDLES_PER_REQUEST)
+        self.concurrency = concurrency
+        self.clock = clock
+
+    def plan(
+        self,
+        instrument: ForexPairEnum,
+        period: PeriodEnum,
+        start: TimeLike,
+        end: TimeLike = None,
+    ) -> list[Page]:
+        """Splits the range still missing for a series into pages"""
+        if period not in BACKFILL_PERIODS:
+            raise ValueError("Cannot backfill %s candles" % period.value)
+        step = PERIOD_SECONDS[period] * NANOSECONDS
+        start_ns = to_nanoseconds(start) // step * step
+        done_until = self.checkpoint.get(instrument, period)
+        if done_until is not None:
+            start_ns = max(start_ns, done_until)
+        end_ns = to_nanoseconds(end) if end is not None else None
+        now_ns = int(self.clock() * NANOSECONDS)
+        end_ns = min(end_ns or now_ns, now_ns)
+        bounds = np.arange(start_ns, end_ns, step * self.page_size)
+        return [
+            Page(
+                instrument,
+                period,
+                index,
+                int(page_start),
+                int(min(page_start + step * self.page_size, end_ns)),
+            )
+            for index, page_start in enumerate(bounds)
+        ]
+
+    async def run(
+        self,
+        instruments: Iterable[ForexPairEnum],
+        periods: Iterable[PeriodEnum],
+        start: TimeLike,
+        end: TimeLike = None,
+    ) -> BackfillReport:
+        """Backfill every instrument and period from start to end"""
+        report = BackfillReport()
+        progress: dict[tuple, SeriesProgress] = {}
+        queue: asyncio.Queue[Page] = asyncio.Queue()
+        for period in periods:
+            for instrument in instruments:
+                pages = self.plan(instrument, period, start, end)
+                progress[(instrument, period)] = SeriesProgress(pages)
+                for page in pages:
+                    queue.put_nowait(page)
+        report.pages = queue.qsize()
+        logger.info(
+            "Backfilling %s pages for %s series"
+            % (report.pages, len(progress))
+        )
+
+        started = time.perf_counter()
+        workers = [
+            asyncio.create_task(self._worker(queue, progress, report))
+            for _ in range(min(self.concurrency, report.pages))
+        ]
+        try:
+            await asyncio.gather(*workers)
+        finally:
+            for worker in workers:
+                worker.cancel()
+        report.seconds = time.perf_counter() - started
+        report.series = {
+            BackfillCheckpoint.key(*key): series.candles
+            for key, series in progress.items()
+        }
+        logger.info(
+            "Backfilled %s candles in %.1fs, %.0f candles/s"
+            % (report.candles, report.seconds, report.candles_per_second)
+        )
+        return report
+
+    async def _worker(
+        self,
+        queue: asyncio.Queue,
+        progress: dict[tuple, SeriesProgress],
+        report: BackfillReport,
+    ) -> None:
+        while not queue.empty():
+            page = queue.get_nowait()
+            response = await self.fetch_candles(
+                page.instrument,
+                page.period,
+                {
+                    "from": to_rfc3339(np.datetime64(page.start, "ns")),
+                    "to": to_rfc3339(np.datetime64(page.end, "ns")),
+                },
+            )
+            report.requests += 1
+            series = progress[(page.instrument, page.period)]
+            series.done[page.index] = response
+            self._write_ready(series, report)
+
+    def _write_ready(
+        self, series: SeriesProgress, report: BackfillReport
+    ) -> None:
+        """Writes the downloaded pages that follow the last written one"""
+        while series.written in series.done:
+            page = series.pages[series.written]
+            response = series.done.pop(series.written)
+            result = self.archive.append_candles(
+                page.instrument, page.period, response
+            )
+            series.candles += result.appended
+            report.candles += result.appended
+            series.written += 1
+            done_until = page.end
+            if page.end > int(self.clock() * NANOSECONDS) - page.step:
+                # the last page ends with a candle that is still forming,
+                # carry on from the last completed one next time
+                last_time = self.archive.series(
+                    page.instrument, page.period
+                ).last_time
+                done_until = page.start
+                if last_time is not None:
+                    done_until = max(
+                        done_until, int(last_time.astype(np.int64)) + page.step
+                    )
+            self.checkpoint.set(page.instrument, page.period, done_until)
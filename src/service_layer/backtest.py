@@ -0,0 +1,449 @@
+"""Replays the technical signal and the trade management over archived
+candles
+
+Every pair is evaluated over its whole history with the signal
+pipeline, each bar taking its fibonacci levels from the SIGNAL_BARS bars
+ending at it as a live cycle does. Trades are then stepped from one exit
+to the next entry: the bars a trade is open for are scanned with array
+operations for the first stop, limit or opposite signal, and the
+trailing stop of manage_trades_handler is a running maximum over them.
+
+history = load_history(archive, pairs, PeriodEnum.MINUTE_5, start, end)
+result = await Backtester(spread_pips=1.2).run(history)
+result.summary()
+"""
+import asyncio
+from typing import Mapping, Optional, Union
+
+import numpy as np
+from pandas import DataFrame, concat
+
+from src.adapters.database.candle_archive import CandleArchive
+from src.config import CurrencyEnum, ForexPairEnum, PeriodEnum, PositionEnum
+from src.domain.trade import Trade
+from src.logger import get_logger
+from src.service_layer.compute_pool import ComputePool
+from src.service_layer.conversion_rates import get_pip_size
+from src.service_layer.signals import (
+    SIGNAL_BARS,
+    SPREAD_BUFFER,
+    StrategyParameters,
+    evaluate_signal,
+    signal_indicators,
+)
+from src.utils import count_decimal_places
+
+logger = get_logger(__name__)
+
+STOP = "stop"
+TRAILING_STOP = "trailing_stop"
+LIMIT = "limit"
+SIGNAL = "signal"
+END = "end"
+EXIT_REASONS = (STOP, TRAILING_STOP, LIMIT, SIGNAL, END)
+
+TRADE_COLUMNS = [
+    "trade_id",
+    "units",
+    "close",
+    "stop",
+    "limit",
+    "is_buy",
+    "base_currency",
+    "quote_currency",
+    "forex_currency_pair",
+    "half_spread_cost",
+    "new_close",
+    "realised_pl",
+    "is_winner",
+    "initiated_date",
+    "position",
+    "sl_pips",
+    "exit_date",
+    "exit_reason",
+    "pips",
+    "bars",
+]
+
+# bars scanned for the exit of a trade before the window is doubled
+FIRST_SCAN = 64
+
+
+def load_history(
+    archive: CandleArchive,
+    forex_pairs: list[ForexPairEnum],
+    period: PeriodEnum = PeriodEnum.MINUTE_5,
+    start=None,
+    end=None,
+) -> dict[ForexPairEnum, DataFrame]:
+    """The archived candles of each pair with start <= time < end"""
+    history = {}
+    for forex_pair in forex_pairs:
+        frame = archive.read(forex_pair, period, start, end)
+        if len(frame):
+            history[forex_pair] = frame
+        else:
+            logger.warning(
+                "No archived %s candles for %s" % (period, forex_pair)
+            )
+    return history
+
+
+def signed_prices(
+    arrays: dict[str, np.ndarray], direction: int
+) -> dict[str, np.ndarray]:
+    """The prices of a trade in direction multiplied by it, so a sell is
+    checked as a buy: the low is its adverse price and the high its
+    favourable one"""
+    return {
+        "open": direction * arrays["open"],
+        "close": direction * arrays["close"],
+        "adverse": direction * arrays["low" if direction > 0 else "high"],
+        "favourable": direction * arrays["high" if direction > 0 else "low"],
+        "atr": arrays["atr"],
+    }
+
+
+class BacktestResult:
+    """The trades of a backtest, one row per trade shaped like Trade
+    with the exit date, exit reason, pips and bars held added
+
+    realised_pl and half_spread_cost are in the quote currency. A trade
+    still open at the end of the history is valued at the last close.
+    """
+
+    def __init__(self, trades: DataFrame) -> None:
+        self.trades = trades
+
+    def to_trades(self) -> list[Trade]:
+        return [
+            Trade(
+                **{
+                    name: getattr(row, name)
+                    for name in TRADE_COLUMNS
+                    if name in Trade.__dataclass_fields__
+                }
+            )
+            for row in self.trades.itertuples(index=False)
+        ]
+
+    def summary(self) -> dict:
+        """Statistics of all the trades"""
+        return summarise(self.trades)
+
+    def summary_by_pair(self) -> dict[ForexPairEnum, dict]:
+        return {
+            forex_pair: summarise(trades)
+            for forex_pair, trades in self.trades.groupby(
+                "forex_currency_pair", sort=False
+            )
+        }
+
+
+def summarise(trades: DataFrame) -> dict:
+    """Number of trades, win rate, pips, profit factor and the largest
+    drawdown in pips of the trades taken in exit order"""
+    pips = trades.sort_values("exit_date")["pips"].to_numpy(np.float64)
+    won = pips[pips > 0].sum()
+    lost = -pips[pips < 0].sum()
+    equity = np.cumsum(pips)
+    drawdown = np.maximum.accumulate(np.maximum(equity, 0)) - equity
+    return {
+        "trades": len(pips),
+        "win_rate": float((pips > 0).mean()) if len(pips) else 0.0,
+        "total_pips": float(equity[-1]) if len(pips) else 0.0,
+        "average_pips": float(pips.mean()) if len(pips) else 0.0,
+        "won_pips": float(won),
+        "lost_pips": float(lost),
+        "profit_factor": float(won / lost) if lost else float("inf"),
+        "max_drawdown_pips": float(drawdown.max()) if len(pips) else 0.0,
+        "realised_pl": float(trades["realised_pl"].sum()),
+        "average_bars": float(trades["bars"].mean()) if len(pips) else 0.0,
+        "exit_reasons": {
+            reason: int((trades["exit_reason"] == reason).sum())
+            for reason in EXIT_REASONS
+        },
+    }
+
+
+class Backtester:
+    """Runs the technical signal and the trailing stop over history
+
+    A signal opens a trade at the close of its bar, as
+    open_trade_handler does, unless one is already open for the pair.
+    An opposite signal closes it at the close and opens the reverse
+    trade. The stop and limit are checked against the low and high of
+    every later bar, a bar gapping through them fills at its open, and
+    the stop trails at trailing_atr times the atr of the closed bars.
+    Both legs pay half of spread_pips.
+
+    Every trade is for units, or with a balance sized as
+    get_trade_parameters does to risk its share of the balance at the
+    stop, taking the balance in the quote currency.
+    """
+
+    def __init__(
+        self,
+        spread_pips: Union[float, Mapping[ForexPairEnum, float]] = 1.0,
+        units: int = 10_000,
+        window: int = SIGNAL_BARS,
+        trailing: bool = True,
+        parameters: StrategyParameters = StrategyParameters(),
+        balance: Optional[float] = None,
+        pool: Optional[ComputePool] = None,
+    ) -> None:
+        self.spread_pips = spread_pips
+        self.units = units
+        self.window = window
+        self.trailing = trailing
+        self.parameters = parameters
+        self.balance = balance
+        self.indicators = signal_indicators(
+            window=window, ma_period=parameters.ma_period
+        )
+        self.pool = pool
+
+    def __getstate__(self) -> dict:
+        # the workers only simulate, they do not need the pool
+        state = self.__dict__.copy()
+        state["pool"] = None
+        return state
+
+    def with_parameters(self, parameters: StrategyParameters) -> "Backtester":
+        """A backtester with the same costs for other parameters"""
+        return Backtester(
+            spread_pips=self.spread_pips,
+            units=self.units,
+            window=self.window,
+            trailing=self.trailing,
+            parameters=parameters,
+            balance=self.balance,
+        )
+
+    def get_spread_pips(self, forex_pair: ForexPairEnum) -> float:
+        if isinstance(self.spread_pips, Mapping):
+            return self.spread_pips[forex_pair]
+        return self.spread_pips
+
+    async def run(
+        self, history: Mapping[ForexPairEnum, DataFrame]
+    ) -> BacktestResult:
+        """Backtests every pair, on the compute pool when there is one"""
+        if self.pool is None:
+            results = [
+                self.simulate(forex_pair, data)
+                for forex_pair, data in history.items()
+            ]
+        else:
+            results = await asyncio.gather(
+                *[
+                    self.pool.run(self.simulate, forex_pair, data)
+                    for forex_pair, data in history.items()
+                ]
+            )
+        frames = [trades for trades in results if len(trades)]
+        if not frames:
+            return BacktestResult(DataFrame(columns=TRADE_COLUMNS))
+        return BacktestResult(concat(frames, ignore_index=True))
+
+    def evaluate(self, data: DataFrame) -> DataFrame:
+        """The candles of data with the indicators and signal columns"""
+        data = data.reset_index(drop=True)
+        for name, values in self.indicators.evaluate(data).items():
+            data[name] = values
+        return evaluate_signal(data, parameters=self.parameters)
+
+    def simulate(
+        self, forex_pair: ForexPairEnum, data: DataFrame
+    ) -> DataFrame:
+        """The trades of one pair over its candles"""
+        return self.trades(forex_pair, self.evaluate(data))
+
+    def trades(
+        self, forex_pair: ForexPairEnum, data: DataFrame, first_bar: int = 0
+    ) -> DataFrame:
+        """The trades of one pair entered from first_bar on, data has the
+        columns of evaluate"""
+        pip_value = get_pip_size(forex_pair)
+        decimals = count_decimal_places(pip_value)
+        half_spread = self.get_spread_pips(forex_pair) / 2 * pip_value
+        arrays = {
+            name: data[name].to_numpy(dtype=np.float64)
+            for name in ("open", "high", "low", "close", "atr")
+        }
+        sides = {
+            direction: signed_prices(arrays, direction)
+            for direction in (1, -1)
+        }
+        signal = data["Signal"].to_numpy()
+        stops = data["ATR_Stop"].to_numpy(dtype=np.float64)
+        limits = data["ATR_Limit"].to_numpy(dtype=np.float64)
+        entries = np.flatnonzero((signal != 0) & np.isfinite(stops))
+        dates = (
+            data["date"].to_numpy() if "date" in data else np.arange(len(data))
+        )
+
+        rows = []
+        bar = first_bar
+        while True:
+            found = np.searchsorted(entries, bar)
+            if found == len(entries):
+                break
+            entry = int(entries[found])
+            direction = int(signal[entry])
+            close = arrays["close"][entry]
+            entry_price = close + direction * half_spread
+            stop = round(stops[entry], decimals)
+            limit = round(limits[entry], decimals)
+            exit_bar, exit_price, reason, final_stop = self.find_exit(
+                sides[direction],
+                signal,
+                entry,
+                direction,
+                entry_price,
+                stop,
+                limit,
+                half_spread * SPREAD_BUFFER,
+            )
+            exit_price -= direction * half_spread
+            rows.append(
+                (
+                    entry,
+                    exit_bar,
+                    direction,
+                    entry_price,
+                    exit_price,
+                    final_stop,
+                    limit,
+                    abs(close - stop) / pip_value,
+                    reason,
+                )
+            )
+            if reason == END:
+                break
+            bar = exit_bar
+        return self.to_frame(forex_pair, rows, dates, pip_value, half_spread)
+
+    def find_exit(
+        self,
+        prices: dict[str, np.ndarray],
+        signal: np.ndarray,
+        entry: int,
+        direction: int,
+        entry_price: float,
+        stop: float,
+        limit: float,
+        buffer: float,
+    ) -> tuple[int, float, str, float]:
+        """The bar, price, reason and stop of the exit of a trade opened
+        at the close of bar entry
+
+        prices are signed by direction, see signed_prices, so the stop
+        only ever rises. Within a bar the stop is taken before the limit
+        and both before the signal at its close.
+        """
+        close, atr = prices["close"], prices["atr"]
+        opens, adverse = prices["open"], prices["adverse"]
+        favourable = prices["favourable"]
+        bars = len(close)
+        initial = current = direction * stop
+        target = direction * limit
+        floor = direction * entry_price + buffer
+        start, size = entry + 1, FIRST_SCAN
+        while start < bars:
+            end = min(bars, start + size)
+            if self.trailing:
+                # the stop of a bar comes from the bars closed before it
+                before = slice(start - 1, end - 1)
+                moved = (
+                    close[before] - self.parameters.trailing_atr * atr[before]
+                )
+                moved[~(moved > floor)] = -np.inf
+                in_effect = np.maximum.accumulate(moved)
+                np.maximum(in_effect, current, out=in_effect)
+            else:
+                in_effect = np.full(end - start, current)
+            stop_hit = adverse[start:end] <= in_effect
+            limit_hit = favourable[start:end] >= target
+            reversed_ = signal[start:end] == -direction
+            hits = stop_hit | limit_hit | reversed_
+            if hits.any():
+                found = int(hits.argmax())
+                bar = start + found
+                level = in_effect[found]
+                if stop_hit[found]:
+                    price = min(opens[bar], level)
+                    reason = TRAILING_STOP if level > initial else STOP
+                elif limit_hit[found]:
+                    price = max(opens[bar], target)
+                    reason = LIMIT
+                else:
+                    price = close[bar]
+                    reason = SIGNAL
+                return bar, direction * price, reason, direction * level
+            current = in_effect[-1]
+            start, size = end, size * 2
+        return bars - 1, direction * close[-1], END, direction * current
+
+    def to_frame(
+        self,
+        forex_pair: ForexPairEnum,
+        rows: list[tuple],
+        dates: np.ndarray,
+        pip_value: float,
+        half_spread: float,
+    ) -> DataFrame:
+        """The trades of a pair shaped like Trade"""
+        if not rows:
+            return DataFrame(columns=TRADE_COLUMNS)
+        (
+            entry,
+            exit_bar,
+            direction,
+            entry_price,
+            exit_price,
+            stop,
+            limit,
+            sl_pips,
+            reason,
+        ) = (np.array(values) for values in zip(*rows))
+        pips = direction * (exit_price - entry_price) / pip_value
+        units = np.full(len(rows), self.units)
+        if self.balance is not None:
+            risked = self.balance * self.parameters.risk
+            with np.errstate(divide="ignore"):
+                units = np.floor(risked / (sl_pips * pip_value))
+            units = np.nan_to_num(units, posinf=0).astype(np.int64)
+        realised_pl = pips * pip_value * units
+        base, quote = forex_pair.value.split("/")
+        return DataFrame(
+            {
+                "trade_id": [
+                    "%s-%s" % (forex_pair.value, index)
+                    for index in range(len(rows))
+                ],
+                "units": units,
+                "close": entry_price,
+                "stop": stop,
+                "limit": limit,
+                "is_buy": direction > 0,
+                "base_currency": CurrencyEnum(base),
+                "quote_currency": CurrencyEnum(quote),
+                "forex_currency_pair": forex_pair,
+                "half_spread_cost": half_spread * units,
+                "new_close": exit_price,
+                "realised_pl": realised_pl,
+                "is_winner": realised_pl > 0,
+                "initiated_date": dates[entry],
+                "position": [
+                    PositionEnum.OPEN if value == END else PositionEnum.CLOSED
+                    for value in reason
+                ],
+                "sl_pips": sl_pips,
+                "exit_date": dates[exit_bar],
+                "exit_reason": reason,
+                "pips": pips,
+                "bars": exit_bar - entry,
+            },
+            columns=TRADE_COLUMNS,
+        )
@@ -0,0 +1,42 @@
+"""The time the scheduler jobs and the handlers read
+
+It is the wall clock, unless a replay has set a virtual time, which
+then only moves when the replay moves it and makes sleeping instant.
+"""
+import asyncio
+from datetime import datetime, timezone, tzinfo
+from typing import Optional
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.virtual_time: Optional[datetime] = None
+
+    @property
+    def is_virtual(self) -> bool:
+        return self.virtual_time is not None
+
+    def now(self, tz: Optional[tzinfo] = None) -> datetime:
+        """Like datetime.now, local and naive without tz"""
+        if self.virtual_time is None:
+            return datetime.now(tz)
+        if tz is None:
+            return self.virtual_time.astimezone().replace(tzinfo=None)
+        return self.virtual_time.astimezone(tz)
+
+    async def sleep(self, seconds: float) -> None:
+        if self.virtual_time is None:
+            await asyncio.sleep(seconds)
+
+    def set_time(self, time: datetime) -> None:
+        """Moves the virtual time, a naive time is taken as utc"""
+        if time.tzinfo is None:
+            time = time.replace(tzinfo=timezone.utc)
+        self.virtual_time = time
+
+    def reset(self) -> None:
+        """Back to the wall clock"""
+        self.virtual_time = None
+
+
+clock = Clock()
@@ -0,0 +1,253 @@
+"""Runs the cpu bound indicator and signal work off the event loop
+
+COMPUTE_POOL_MODE chooses where the work runs: process (default), thread
+or inline on the event loop. COMPUTE_POOL_WORKERS sets the number of
+workers.
+
+Panels go to the worker processes through a shared memory block holding
+their candle columns and room for the outputs, the worker writes its
+results into the block, so only the pipeline and the block's name are
+pickled. SharedArrays does the same for any read only arrays, such as
+the candle history a parameter sweep reads from every task.
+"""
+import asyncio
+import inspect
+import multiprocessing
+import os
+from contextlib import contextmanager
+from concurrent.futures import Executor, ProcessPoolExecutor
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, Callable, Iterator, Mapping, Optional
+
+import numpy as np
+from pandas import DataFrame
+
+from src.logger import get_logger
+from src.service_layer.indicator_panel import CandlePanel
+
+logger = get_logger(__name__)
+
+PROCESS = "process"
+THREAD = "thread"
+INLINE = "inline"
+MODES = (PROCESS, THREAD, INLINE)
+
+
+class SharedPanel:
+    """The columns of a panel and its outputs in one shared memory block
+
+    The block is laid out as (columns, pairs, bars) float64, the inputs
+    first then the outputs.
+    """
+
+    def __init__(self, panel: CandlePanel, outputs: list[str]) -> None:
+        self.inputs = list(panel.columns)
+        self.outputs = list(outputs)
+        pairs, bars = panel.shape
+        self.shape = (len(self.inputs) + len(self.outputs), pairs, bars)
+        size = int(np.prod(self.shape)) * 8
+        self.memory = SharedMemory(create=True, size=max(size, 1))
+        self.array = np.ndarray(
+            self.shape, dtype=np.float64, buffer=self.memory.buf
+        )
+        for index, name in enumerate(self.inputs):
+            self.array[index] = panel[name]
+
+    @property
+    def descriptor(self) -> tuple:
+        """What a worker needs to attach to the block"""
+        return self.memory.name, self.shape, self.inputs, self.outputs
+
+    def results(self) -> dict[str, np.ndarray]:
+        """Copies of the outputs the worker wrote"""
+        first = len(self.inputs)
+        return {
+            name: self.array[first + index].copy()
+            for index, name in enumerate(self.outputs)
+        }
+
+    def close(self) -> None:
+        del self.array
+        self.memory.close()
+        self.memory.unlink()
+
+    def __enter__(self) -> "SharedPanel":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+class SharedArrays:
+    """Arrays copied once into a shared memory block, for workers to
+    read in place with attach_arrays"""
+
+    def __init__(self, arrays: Mapping[str, np.ndarray]) -> None:
+        arrays = {
+            name: np.ascontiguousarray(values)
+            for name, values in arrays.items()
+        }
+        self.layout = []
+        size = 0
+        for name, values in arrays.items():
+            self.layout.append((name, values.dtype.str, values.shape, size))
+            # keeps every array aligned to 8 bytes
+            size += -(-values.nbytes // 8) * 8
+        self.memory = SharedMemory(create=True, size=max(size, 1))
+        for (name, dtype, shape, offset), values in zip(
+            self.layout, arrays.values()
+        ):
+            view = np.ndarray(
+                shape, dtype=dtype, buffer=self.memory.buf, offset=offset
+            )
+            view[...] = values
+            del view
+
+    @property
+    def descriptor(self) -> tuple:
+        """What a worker needs to attach to the block"""
+        return self.memory.name, self.layout
+
+    def close(self) -> None:
+        self.memory.close()
+        self.memory.unlink()
+
+    def __enter__(self) -> "SharedArrays":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+@contextmanager
+def attach_arrays(descriptor: tuple) -> Iterator[dict[str, np.ndarray]]:
+    """Read only views of the arrays of a SharedArrays block, valid until
+    the block is left"""
+    name, layout = descriptor
+    memory = SharedMemory(name=name)
+    arrays = {}
+    try:
+        for key, dtype, shape, offset in layout:
+            arrays[key] = np.ndarray(
+                shape, dtype=dtype, buffer=memory.buf, offset=offset
+            )
+            arrays[key].flags.writeable = False
+        yield arrays
+    finally:
+        arrays.clear()
+        memory.close()
+
+
+def evaluate_shared(pipeline, descriptor: tuple) -> None:
+    """Evaluates pipeline on the panel in a shared block, in a worker"""
+    name, shape, inputs, outputs = descriptor
+    # spawned workers share the resource tracker of the pool's process,
+    # which unlinks the block
+    memory = SharedMemory(name=name)
+    try:
+        array = np.ndarray(shape, dtype=np.float64, buffer=memory.buf)
+        panel = CandlePanel(
+            range(shape[1]), dict(zip(inputs, array[: len(inputs)]))
+        )
+        results = pipeline.evaluate(panel)
+        for index, output in enumerate(outputs):
+            array[len(inputs) + index] = results[output]
+        del array, panel
+    finally:
+        memory.close()
+
+
+def call(func: Callable, *args) -> Any:
+    """Calls func in a worker, running it to completion when it is a
+    coroutine function"""
+    if inspect.iscoroutinefunction(func):
+        return asyncio.run(func(*args))
+    return func(*args)
+
+
+class ComputePool:
+    """Pool of workers for the indicator pipelines and signals
+
+    Every call returns an awaitable, so the event loop keeps serving
+    requests and events while the workers compute.
+    """
+
+    def __init__(
+        self,
+        mode: Optional[str] = None,
+        workers: Optional[int] = None,
+    ) -> None:
+        self.mode = mode or os.environ.get("COMPUTE_POOL_MODE", PROCESS)
+        if self.mode not in MODES:
+            raise ValueError("Unknown compute pool mode: %s" % self.mode)
+        if workers is None:
+            workers = int(
+                os.environ.get(
+                    "COMPUTE_POOL_WORKERS", min(4, os.cpu_count() or 1)
+                )
+            )
+        self.workers = max(workers, 1)
+        self._executor: Optional[Executor] = None
+
+    @property
+    def executor(self) -> Optional[Executor]:
+        """The executor, started on first use"""
+        if self.mode == INLINE:
+            return None
+        if self._executor is None:
+            if self.mode == PROCESS:
+                # spawned workers do not inherit the threads and sockets
+                # of the app
+                self._executor = ProcessPoolExecutor(
+                    self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            else:
+                self._executor = ThreadPoolExecutor(
+                    self.workers, thread_name_prefix="compute"
+                )
+            logger.info(
+                "Started a %s compute pool with %s workers"
+                % (self.mode, self.workers)
+            )
+        return self._executor
+
+    async def start(self) -> None:
+        """Starts the workers ahead of the first cycle"""
+        if self.executor is not None:
+            await asyncio.gather(
+                *[self.run(os.getpid) for _ in range(self.workers)]
+            )
+
+    async def run(self, func: Callable, *args) -> Any:
+        """Runs func(*args) on a worker, func and args are pickled when
+        the workers are processes"""
+        if self.executor is None:
+            result = func(*args)
+            if inspect.isawaitable(result):
+                result = await result
+            return result
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, call, func, *args)
+
+    async def evaluate(
+        self, pipeline, source: CandlePanel | DataFrame
+    ) -> dict[str, np.ndarray]:
+        """The outputs of pipeline for source"""
+        if self.mode != PROCESS or not isinstance(source, CandlePanel):
+            return await self.run(pipeline.evaluate, source)
+        with SharedPanel(source, list(pipeline.columns)) as shared:
+            await self.run(evaluate_shared, pipeline, shared.descriptor)
+            return shared.results()
+
+    async def shutdown(self) -> None:
+        """Stops the workers, cancelling the work still queued"""
+        if self._executor is None:
+            return
+        executor, self._executor = self._executor, None
+        await asyncio.get_running_loop().run_in_executor(
+            None,
+            lambda: executor.shutdown(wait=True, cancel_futures=True),
+        )
+        logger.info("Stopped the %s compute pool" % self.mode)
@@ -0,0 +1,131 @@
+import asyncio
+import time
+from typing import Iterable, Optional
+
+import numpy as np
+
+from src.adapters.fxcm_connect.base_trade_connect import BaseTradeConnect
+from src.config import CurrencyEnum, ForexPairEnum, GBPConversionMapEnum
+from src.logger import get_logger
+
+logger = get_logger(__name__)
+
+STANDARD_LOT = 100000
+
+
+def get_pip_size(forex_pair: str) -> float:
+    """The size of a pip, 0.01 for yen pairs and 0.0001 otherwise"""
+    return 0.01 if "JPY" in forex_pair else 0.0001
+
+
+class ConversionRateService:
+    """Converts pip values into the account currency
+
+    The rates of every account currency cross are fetched together in
+    one batched pricing request and reused for ttl seconds, so sizing a
+    trade or trailing the stops of many pairs costs at most one round
+    trip to the broker.
+    """
+
+    def __init__(
+        self,
+        fxcm_connection: BaseTradeConnect,
+        ttl: float = 5.0,
+        account_currency: CurrencyEnum = CurrencyEnum.GBP,
+        instruments: Optional[Iterable[GBPConversionMapEnum]] = None,
+    ) -> None:
+        self.fxcm_connection = fxcm_connection
+        self.ttl = ttl
+        self.account_currency = account_currency.value
+        self.instruments = list(instruments or GBPConversionMapEnum)
+        self._rates: dict[str, float] = {}
+        self._fetched_at: Optional[float] = None
+        self._lock = asyncio.Lock()
+        self.refreshes = 0
+
+    def is_expired(self) -> bool:
+        """Whether the rates need to be fetched again"""
+        return (
+            self._fetched_at is None
+            or time.monotonic() - self._fetched_at >= self.ttl
+        )
+
+    def invalidate(self) -> None:
+        """Force the next lookup to fetch the rates"""
+        self._fetched_at = None
+
+    async def get_rates(self) -> dict[str, float]:
+        """Returns the cross rates, refreshing them once expired"""
+        if not self.is_expired():
+            return self._rates
+        async with self._lock:
+            # another caller may have refreshed while we waited
+            if self.is_expired():
+                self._rates = await self.fxcm_connection.get_prices(
+                    self.instruments
+                )
+                self._fetched_at = time.monotonic()
+                self.refreshes += 1
+                logger.info(
+                    "Refreshed %s conversion rates" % len(self._rates)
+                )
+        return self._rates
+
+    def get_conversion_factor(
+        self, currency: str, rates: dict[str, float]
+    ) -> float:
+        """Converts an amount in currency into the account currency"""
+        if currency == self.account_currency:
+            return 1.0
+        direct = "%s/%s" % (self.account_currency, currency)
+        if direct in rates:
+            return 1 / rates[direct]
+        inverse = "%s/%s" % (currency, self.account_currency)
+        if inverse in rates:
+            return rates[inverse]
+        raise KeyError(
+            "No conversion rate from %s to %s"
+            % (currency, self.account_currency)
+        )
+
+    async def get_pip_values(
+        self,
+        forex_pairs: Iterable[ForexPairEnum],
+        lot_size: int = STANDARD_LOT,
+    ) -> np.ndarray:
+        """The value of a pip per lot in the account currency, one per
+        pair"""
+        rates = await self.get_rates()
+        pairs = [pair.value for pair in forex_pairs]
+        pip_sizes = np.array([get_pip_size(pair) for pair in pairs])
+        factors = np.array(
+            [
+                self.get_conversion_factor(pair.split("/")[1], rates)
+                for pair in pairs
+            ]
+        )
+        return lot_size * pip_sizes * factors
+
+    async def get_pip_value(
+        self, forex_pair: ForexPairEnum, lot_size: int = STANDARD_LOT
+    ) -> float:
+        """The value of a pip per lot in the account currency"""
+        return float((await self.get_pip_values([forex_pair], lot_size))[0])
+
+    async def get_units(
+        self,
+        forex_pairs: Iterable[ForexPairEnum],
+        stop_loss_pips: Iterable[float],
+        risk_amount: float,
+        units_per_lot: int = 10000,
+    ) -> np.ndarray:
+        """The units to trade so that hitting the stop loses risk_amount
+
+        units = risk_amount / (stop loss in pips * pip value per lot)
+        scaled by the units traded per lot.
+        """
+        pip_values = await self.get_pip_values(forex_pairs)
+        lots = risk_amount / (
+            np.asarray(stop_loss_pips, dtype=np.float64) * pip_values
+        )
+        return lots * units_per_lot
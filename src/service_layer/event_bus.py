@@ -1,16 +1,94 @@
 import abc
 import asyncio
+import contextvars
+import zlib
 
 from src.logger import get_logger
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Hashable, Optional
 
 if TYPE_CHECKING:
     from src.service_layer.uow import MongoUnitOfWork
 
-from src.domain.events import Event
+from src.domain.events import (
+    CloseForexPairEvent,
+    CloseTradeEvent,
+    Event,
+    FundamentalEvent,
+    OpenTradeEvent,
+    TechnicalEvent,
+    TradeClosedEvent,
+)
 
 logger = get_logger(__name__)
 
+# the partition of the worker running the current handler, if any
+_partition: contextvars.ContextVar = contextvars.ContextVar(
+    "event_bus_partition", default=None
+)
+
+
+def partition_key(event: Event) -> Optional[Hashable]:
+    """The key whose events are handled in order, the instrument of an
+    event or the currency for the currency wide ones"""
+    if isinstance(event, (OpenTradeEvent, CloseForexPairEvent)):
+        return event.forex_pair.value
+    if isinstance(event, (CloseTradeEvent, FundamentalEvent, TechnicalEvent)):
+        return event.currency.value
+    if isinstance(event, TradeClosedEvent):
+        return event.trade_id
+    return None
+
+
+class Partition:
+    """The queue of a worker, bounded by maxsize for the publishers
+    outside the handlers"""
+
+    def __init__(self, index: int, maxsize: int) -> None:
+        self.index = index
+        self.maxsize = maxsize
+        self.queue = asyncio.Queue()  # type: ignore
+        self.slots = asyncio.Semaphore(maxsize) if maxsize > 0 else None
+        self.max_depth = 0
+        self.handled = 0
+        self.failed = 0
+        self.blocked = 0
+
+    async def put(self, event: Event, bounded: bool = True) -> None:
+        # a handler publishing into its own full partition would wait on
+        # itself, so the handlers never wait on a bound
+        bounded = (
+            bounded and self.slots is not None and _partition.get() is None
+        )
+        if bounded:
+            if self.slots.locked():
+                self.blocked += 1
+            await self.slots.acquire()
+        self.queue.put_nowait((event, bounded))
+        self.max_depth = max(self.max_depth, self.queue.qsize())
+
+    def get_nowait(self) -> Event:
+        event, bounded = self.queue.get_nowait()
+        if bounded:
+            self.slots.release()
+        return event
+
+    async def get(self) -> Event:
+        event, bounded = await self.queue.get()
+        if bounded:
+            self.slots.release()
+        return event
+
+    def metrics(self) -> dict:
+        return {
+            "partition": self.index,
+            "depth": self.queue.qsize(),
+            "max_depth": self.max_depth,
+            "maxsize": self.maxsize,
+            "handled": self.handled,
+            "failed": self.failed,
+            "blocked": self.blocked,
+        }
+
 
 class EventBus(abc.ABC):
     @abc.abstractmethod
@@ -25,6 +103,13 @@ class EventBus(abc.ABC):
 class TradingEventBus(EventBus):
     """Unified event bus for trading events
 
+    With partitions the events are handed to that many workers by the
+    hash of their partition_key, so the events of an instrument, or of
+    a currency, are handled in the order they were published while the
+    others run concurrently. While the bus runs, a publish outside the
+    handlers waits while the queue of its partition holds maxsize
+    events.
+
     Args:
         EventBus (_type_): _description_
     """
@@ -32,11 +117,27 @@ class TradingEventBus(EventBus):
     class StopEvent:
         """Unique class used as a sentinel to stop the event loop."""
 
-    def __init__(self, uow: "MongoUnitOfWork"):
+    def __init__(
+        self,
+        uow: "MongoUnitOfWork",
+        partitions: int = 0,
+        maxsize: int = 100,
+    ):
         self.handlers = {}  # type: ignore
         self.queue = asyncio.Queue()  # type: ignore
         self.running = False
         self.uow = uow
+        self.partitions = [
+            Partition(index, maxsize) for index in range(partitions)
+        ]
+
+    def partition(self, event: Event) -> Partition:
+        key = partition_key(event)
+        if key is None:
+            return self.partitions[0]
+        # crc32 rather than hash, which changes between processes
+        index = zlib.crc32(str(key).encode()) % len(self.partitions)
+        return self.partitions[index]
 
     async def publish(self, event: Event) -> None:  # type: ignore
         """Publish an event to the event bus
@@ -44,7 +145,12 @@ class TradingEventBus(EventBus):
         Args:
             event (_type_): _description_
         """
-        await self.queue.put(event)
+        if self.partitions and not isinstance(event, self.StopEvent):
+            # without workers nothing would free a slot, so the bound
+            # only holds while the bus runs
+            await self.partition(event).put(event, bounded=self.running)
+        else:
+            await self.queue.put(event)
 
     def subscribe(self, event_type, handler) -> None:  # type: ignore
         """Subscribe to an event -
@@ -60,20 +166,94 @@ class TradingEventBus(EventBus):
 
         logger.info("Event loop for event bus started")
         self.running = True
+        if self.partitions:
+            await self.run_partitions()
+            self.running = False
+            return
+
         while True:
             event = await self.queue.get()
             if isinstance(event, self.StopEvent):
                 break
 
-            event_type = type(event)
-
-            if event_type in self.handlers:
-                for handler in self.handlers[event_type]:
-                    async with self.uow:
-                        await handler(event, self.uow)
+            await self.dispatch(event)
 
         self.running = False
 
+    async def dispatch(self, event: Event) -> None:
+        """Runs the handlers of an event in turn"""
+        event_type = type(event)
+
+        if event_type in self.handlers:
+            for handler in self.handlers[event_type]:
+                async with self.uow:
+                    await handler(event, self.uow)
+
+    async def run_partitions(self) -> None:
+        """Runs a worker per partition until a StopEvent, then lets them
+        handle what was published before it"""
+        workers = [
+            asyncio.create_task(self.work(partition))
+            for partition in self.partitions
+        ]
+        try:
+            while not isinstance(await self.queue.get(), self.StopEvent):
+                pass
+            await asyncio.gather(
+                *(partition.queue.join() for partition in self.partitions)
+            )
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+    async def work(self, partition: Partition) -> None:
+        """Handles the events of a partition in turn, an error is logged
+        so the events behind it are still handled"""
+        _partition.set(partition.index)
+        while True:
+            event = await partition.get()
+            try:
+                await self.dispatch(event)
+                partition.handled += 1
+            except Exception as e:
+                partition.failed += 1
+                logger.error(
+                    "Partition %s failed to handle %r: %r"
+                    % (partition.index, event, e)
+                )
+            finally:
+                partition.queue.task_done()
+
+    def metrics(self) -> list[dict]:
+        """The depth and counts of each partition"""
+        return [partition.metrics() for partition in self.partitions]
+
+    async def drain(self) -> int:
+        """Handles the queued events, and any they publish, until the
+        queues are empty, for a caller stepping the bus instead of
+        starting it. Returns the number of events handled."""
+        handled = 0
+        while not self.queue.empty():
+            event = self.queue.get_nowait()
+            if isinstance(event, self.StopEvent):
+                continue
+            await self.dispatch(event)
+            handled += 1
+        while any(not p.queue.empty() for p in self.partitions):
+            for partition in self.partitions:
+                while not partition.queue.empty():
+                    event = partition.get_nowait()
+                    token = _partition.set(partition.index)
+                    try:
+                        await self.dispatch(event)
+                    finally:
+                        _partition.reset(token)
+                        partition.queue.task_done()
+                    partition.handled += 1
+                    handled += 1
+        return handled
+
     async def stop(self) -> None:  # type: ignore
         """Stops the event loop by putting a StopEvent in the queue."""
         await self.queue.put(self.StopEvent())
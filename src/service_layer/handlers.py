@@ -3,20 +3,20 @@ from src.config import (
     CurrencyEnum,
     PositionEnum,
     SentimentEnum,
-    conversion_map,
 )
 from src.domain import events
 from typing import TYPE_CHECKING
 from src.domain.fundamental import FundamentalData
 
 from src.domain.trade import Trade
+from src.service_layer.clock import clock
+from src.service_layer.signals import RISK
 from src.utils import close_trade_in_oanda_util, count_decimal_places
 
 if TYPE_CHECKING:
     from src.service_layer.uow import MongoUnitOfWork
 
 from src.logger import get_logger
-from datetime import datetime
 
 
 logger = get_logger(__name__)
@@ -199,7 +199,7 @@ async def open_trade_handler(
                 quote_currency=CurrencyEnum(currencies[1]),
                 forex_currency_pair=event.forex_pair,
                 is_winner=False,
-                initiated_date=datetime.now(),
+                initiated_date=clock.now(),
                 position=PositionEnum.OPEN,
                 close=entry_price,
                 sl_pips=stop_loss_in_pips,
@@ -242,21 +242,17 @@ async def get_trade_parameters(
     is_buy = True if event.sentiment == SentimentEnum.BULLISH else False
 
     pip_value = 0.0001 if "JPY" not in currencies else 0.01
-    risk = 2 / 100
+    risk = RISK
 
     stop_loss_pips = abs(event.close - event.stop) / pip_value
 
-    quoted_currency_exchange_rate = await uow.fxcm_connection.get_latest_close(
-        conversion_map[event.forex_pair]
-    )
-
     balance = float(await uow.fxcm_connection.get_account_balance())
     risk_amount = balance * risk
-    adjusted_pip_value = 100000 * pip_value * 1 / quoted_currency_exchange_rate
-    stop_loss_in_account_currency = stop_loss_pips * adjusted_pip_value
-    desired_trade_size = risk_amount / stop_loss_in_account_currency
-
-    units = desired_trade_size * 10000  # trading a mini lot
+    units = (
+        await uow.conversion_rates.get_units(
+            [event.forex_pair], [stop_loss_pips], risk_amount
+        )
+    )[0]  # trading a mini lot
 
     stop_loss = round(event.stop, count_decimal_places(pip_value))
 
@@ -285,8 +281,31 @@ async def close_forex_pair_handler(
             await uow.trade_repository.save(trade)
 
 
+async def trade_closed_handler(
+    event: events.TradeClosedEvent, uow: MongoUnitOfWork
+):
+    """Marks a trade the broker closed as closed"""
+    trade = await uow.trade_repository.get_trade_by_trade_id(event.trade_id)
+    if trade is None:
+        logger.warning(
+            "Broker closed trade %s which is not tracked" % event.trade_id
+        )
+        return
+    if trade.position == PositionEnum.CLOSED and trade.realised_pl is not None:
+        return
+    trade.position = PositionEnum.CLOSED
+    trade.realised_pl = event.realised_pl
+    trade.is_winner = True if event.realised_pl > 0 else False
+    await uow.trade_repository.save(trade)
+    logger.warning(
+        "Trade %s closed by %s with a realised pl of %s"
+        % (event.trade_id, event.reason, event.realised_pl)
+    )
+
+
 handlers = {
     events.CloseTradeEvent: close_trade_handler,
     events.OpenTradeEvent: open_trade_handler,
     events.CloseForexPairEvent: close_forex_pair_handler,
+    events.TradeClosedEvent: trade_closed_handler,
 }
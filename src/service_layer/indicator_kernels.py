@@ -0,0 +1,346 @@
+"""NumPy implementations of the indicators on float64 arrays
+
+Each kernel reproduces the pandas calculation in Indicators, including
+where the leading values are missing, without building intermediate
+Series. Recursive filters are evaluated in blocks with cumulative sums.
+Kernels work along the last axis, so a (pairs, bars) panel is computed
+for every pair in one pass.
+"""
+
+import numpy as np
+
+# keeps beta ** -block well inside the float64 range
+_MAX_SCALE = 1e100
+
+
+def as_array(values) -> np.ndarray:
+    """values as a contiguous float64 array, copied only when needed"""
+    return np.ascontiguousarray(values, dtype=np.float64)
+
+
+def shift(values: np.ndarray, periods: int = 1) -> np.ndarray:
+    out = np.empty_like(values)
+    out[..., :periods] = np.nan
+    out[..., periods:] = values[..., :-periods]
+    return out
+
+
+def diff(values: np.ndarray) -> np.ndarray:
+    out = np.empty_like(values)
+    if values.shape[-1] == 0:
+        return out
+    out[..., 0] = np.nan
+    np.subtract(values[..., 1:], values[..., :-1], out=out[..., 1:])
+    return out
+
+
+def linear_filter(values: np.ndarray, beta: float, initial=0.0) -> np.ndarray:
+    """s[t] = beta * s[t - 1] + values[t] with s[-1] = initial
+
+    Within a block s[t] = beta ** t * (initial * beta + cumsum(values[j]
+    * beta ** -j)), the blocks are kept short enough for the scale
+    factors to stay finite and the state is carried between them.
+    """
+    number = values.shape[-1]
+    out = np.empty(values.shape)
+    if number == 0:
+        return out
+    if beta <= 0:
+        out[:] = values
+        out[..., 0] += beta * initial
+        return out
+    block = number
+    if beta < 1:
+        block = max(1, int(np.log(_MAX_SCALE) / -np.log(beta)))
+    block = min(block, number)
+    powers = beta ** np.arange(block)
+    inverse = 1 / powers
+    state = initial
+    for start in range(0, number, block):
+        size = min(block, number - start)
+        chunk = out[..., start : start + size]
+        np.multiply(
+            values[..., start : start + size], inverse[:size], out=chunk
+        )
+        np.cumsum(chunk, axis=-1, out=chunk)
+        chunk += np.multiply(state, beta)[..., np.newaxis]
+        chunk *= powers[:size]
+        state = chunk[..., -1]
+    return out
+
+
+def _ewm_sequential(
+    values: np.ndarray, alpha: float, adjust: bool, min_periods: int
+) -> np.ndarray:
+    """The pandas recurrence one value at a time, for missing values
+    after the first observation"""
+    out = np.empty(len(values))
+    beta = 1 - alpha
+    new_wt = 1.0 if adjust else alpha
+    weighted = values[0]
+    nobs = int(weighted == weighted)
+    old_wt = 1.0
+    out[0] = weighted if nobs >= min_periods else np.nan
+    for i in range(1, len(values)):
+        cur = values[i]
+        is_observation = cur == cur
+        nobs += is_observation
+        if weighted == weighted:
+            old_wt *= beta
+            if is_observation:
+                if weighted != cur:
+                    weighted = (old_wt * weighted + new_wt * cur) / (
+                        old_wt + new_wt
+                    )
+                old_wt = old_wt + new_wt if adjust else 1.0
+        elif is_observation:
+            weighted = cur
+        out[i] = weighted if nobs >= min_periods else np.nan
+    return out
+
+
+def ewm_mean(
+    values: np.ndarray,
+    alpha: float,
+    adjust: bool = True,
+    min_periods: int = 0,
+) -> np.ndarray:
+    """pandas Series.ewm(alpha=alpha, adjust=adjust).mean()"""
+    values = as_array(values)
+    if values.ndim > 1:
+        return _ewm_panel(values, alpha, adjust, min_periods)
+    missing = np.isnan(values)
+    first = int(np.argmin(missing)) if len(values) else 0
+    if len(values) == 0 or missing[first]:
+        return np.full(len(values), np.nan)
+    if missing[first:].any():
+        return _ewm_sequential(values, alpha, adjust, min_periods)
+    out = np.full(len(values), np.nan)
+    out[first:] = _ewm_observed(values[first:], alpha, adjust)
+    out[first : first + max(min_periods, 1) - 1] = np.nan
+    return out
+
+
+def _ewm_observed(
+    observed: np.ndarray, alpha: float, adjust: bool
+) -> np.ndarray:
+    """The ewm along the last axis of values without missing ones"""
+    beta = 1 - alpha
+    if adjust:
+        numerator = linear_filter(observed, beta)
+        # the filter of a constant one is a geometric series
+        steps = np.arange(1, observed.shape[-1] + 1)
+        if beta < 1:
+            denominator = -np.expm1(steps * np.log(beta)) / alpha
+        else:
+            denominator = steps.astype(np.float64)
+        return numerator / denominator
+    out = linear_filter(alpha * observed, beta, initial=observed[..., 0])
+    out[..., 0] = observed[..., 0]
+    return out
+
+
+def _ewm_panel(
+    values: np.ndarray, alpha: float, adjust: bool, min_periods: int
+) -> np.ndarray:
+    """Rows that start together and have no gaps are filtered at once,
+    the others one at a time"""
+    rows = values.reshape(-1, values.shape[-1])
+    out = np.full(rows.shape, np.nan)
+    missing = np.isnan(rows)
+    if rows.size == 0:
+        return out.reshape(values.shape)
+    first = np.argmin(missing, axis=1)
+    observed = np.arange(rows.shape[1]) >= first[:, np.newaxis]
+    regular = ~(missing & observed).any(axis=1)
+    for start in np.unique(first[regular]):
+        group = regular & (first == start)
+        out[group, start:] = _ewm_observed(rows[group, start:], alpha, adjust)
+        out[group, start : start + max(min_periods, 1) - 1] = np.nan
+    for row in np.flatnonzero(~regular):
+        out[row] = ewm_mean(rows[row], alpha, adjust, min_periods)
+    return out.reshape(values.shape)
+
+
+def _window(values: np.ndarray, period: int, reduce) -> np.ndarray:
+    """reduce over each trailing window, accumulated one lag at a time
+    so every pass runs over contiguous memory"""
+    out = np.full(values.shape, np.nan)
+    number = values.shape[-1]
+    if period < 1 or number < period:
+        return out
+    window = out[..., period - 1 :]
+    window[:] = values[..., period - 1 :]
+    for lag in range(1, period):
+        reduce(window, values[..., period - 1 - lag : number - lag], window)
+    return out
+
+
+def rolling_sum(values: np.ndarray, period: int) -> np.ndarray:
+    """pandas Series.rolling(period).sum()"""
+    return _window(as_array(values), period, np.add)
+
+
+def rolling_mean(values: np.ndarray, period: int) -> np.ndarray:
+    """pandas Series.rolling(period).mean()"""
+    return rolling_sum(values, period) / period
+
+
+def rolling_std(
+    values: np.ndarray, period: int, mean: np.ndarray = None
+) -> np.ndarray:
+    """pandas Series.rolling(period).std(), mean is the rolling mean
+    when it is already known"""
+    values = as_array(values)
+    if mean is None:
+        mean = rolling_mean(values, period)
+    squares = np.full(values.shape, np.nan)
+    number = values.shape[-1]
+    if number >= period:
+        total = squares[..., period - 1 :]
+        total[:] = 0.0
+        deviation = np.empty(total.shape)
+        for lag in range(period):
+            window = values[..., period - 1 - lag : number - lag]
+            np.subtract(window, mean[..., period - 1 :], out=deviation)
+            deviation *= deviation
+            total += deviation
+    return np.sqrt(squares / (period - 1))
+
+
+def _extreme(values: np.ndarray, period: int, reduce, identity) -> np.ndarray:
+    """reduce over each trailing window in a fixed number of passes
+
+    The bars are cut into blocks of period, each window spans the end of
+    one block and the start of the next, so it is reduced from the
+    running value of the first block taken backwards and of the second
+    taken forwards.
+    """
+    out = np.full(values.shape, np.nan)
+    number = values.shape[-1]
+    if period < 1 or number < period:
+        return out
+    blocks = -(-number // period)
+    padded = np.full(values.shape[:-1] + (blocks * period,), identity)
+    padded[..., :number] = values
+    shaped = padded.reshape(values.shape[:-1] + (blocks, period))
+    forward = reduce.accumulate(shaped, axis=-1).reshape(padded.shape)
+    backward = reduce.accumulate(shaped[..., ::-1], axis=-1)[..., ::-1]
+    backward = backward.reshape(padded.shape)
+    reduce(
+        backward[..., : number - period + 1],
+        forward[..., period - 1 : number],
+        out=out[..., period - 1 :],
+    )
+    return out
+
+
+def rolling_max(values: np.ndarray, period: int) -> np.ndarray:
+    """pandas Series.rolling(period).max()"""
+    return _extreme(as_array(values), period, np.maximum, -np.inf)
+
+
+def rolling_min(values: np.ndarray, period: int) -> np.ndarray:
+    """pandas Series.rolling(period).min()"""
+    return _extreme(as_array(values), period, np.minimum, np.inf)
+
+
+def true_range(
+    high: np.ndarray, low: np.ndarray, close: np.ndarray
+) -> np.ndarray:
+    """The largest of the three ranges, the first bar has only the high
+    low range"""
+    prev_close = shift(close)
+    out = high - low
+    np.fmax(out, np.abs(high - prev_close), out=out)
+    np.fmax(out, np.abs(low - prev_close), out=out)
+    return out
+
+
+def macd(
+    close: np.ndarray, fast: int = 12, slow: int = 26, signal: int = 9
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Returns the macd, its histogram and its signal line"""
+    # the pandas version uses fixed min_periods whatever the spans
+    slow_ema = ewm_mean(close, 2 / (slow + 1), False, 26)
+    fast_ema = ewm_mean(close, 2 / (fast + 1), False, 12)
+    line = fast_ema - slow_ema
+    signal_line = ewm_mean(line, 2 / (signal + 1), False, 9)
+    return line, line - signal_line, signal_line
+
+
+def stochastic(
+    high: np.ndarray,
+    low: np.ndarray,
+    close: np.ndarray,
+    period: int = 14,
+    d_period: int = 3,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Returns %K and %D"""
+    highest = rolling_max(high, period)
+    lowest = rolling_min(low, period)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        k = (close - lowest) * 100 / (highest - lowest)
+    return k, rolling_mean(k, d_period)
+
+
+def rsi(close: np.ndarray, period: int = 14, ema: bool = True) -> np.ndarray:
+    delta = diff(as_array(close))
+    up = np.where(delta > 0, delta, np.where(np.isnan(delta), np.nan, 0.0))
+    down = np.where(delta < 0, -delta, np.where(np.isnan(delta), np.nan, 0.0))
+    if ema:
+        ma_up = ewm_mean(up, 1 / period, True, period)
+        ma_down = ewm_mean(down, 1 / period, True, period)
+    else:
+        ma_up = rolling_mean(up, period)
+        ma_down = rolling_mean(down, period)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return 100 - (100 / (1 + ma_up / ma_down))
+
+
+def atr(
+    high: np.ndarray, low: np.ndarray, close: np.ndarray, period: int = 14
+) -> np.ndarray:
+    return rolling_mean(true_range(high, low, close), period)
+
+
+def adx(
+    high: np.ndarray, low: np.ndarray, close: np.ndarray, period: int = 20
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Returns the +DI, -DI and smoothed ADX"""
+    plus_dm = diff(high)
+    minus_dm = diff(low)
+    plus_dm[plus_dm < 0] = 0
+    minus_dm[minus_dm > 0] = 0
+    average_range = atr(high, low, close, period)
+    alpha = 1 / period
+    with np.errstate(divide="ignore", invalid="ignore"):
+        plus_di = 100 * (ewm_mean(plus_dm, alpha) / average_range)
+        minus_di = np.abs(100 * (ewm_mean(minus_dm, alpha) / average_range))
+        dx = (np.abs(plus_di - minus_di) / np.abs(plus_di + minus_di)) * 100
+    raw = (shift(dx) * (period - 1) + dx) / period
+    return plus_di, minus_di, ewm_mean(raw, alpha)
+
+
+def obv(close: np.ndarray, volume: np.ndarray) -> np.ndarray:
+    flow = np.sign(diff(as_array(close))) * volume
+    flow[np.isnan(flow)] = 0
+    return np.cumsum(flow, axis=-1)
+
+
+def accumulation_distribution(
+    high: np.ndarray, low: np.ndarray, close: np.ndarray, volume: np.ndarray
+) -> np.ndarray:
+    with np.errstate(divide="ignore", invalid="ignore"):
+        flow = ((low - close) - (high - close)) / (high - low) * volume
+    return np.cumsum(flow, axis=-1)
+
+
+def fibonacci_levels(
+    high: np.ndarray, low: np.ndarray, ratios=(0.236, 0.382, 0.5, 0.618)
+) -> np.ndarray:
+    """Retracements from the highest high of each row, shaped (ratios,
+    rows)"""
+    recent_high = np.nanmax(high, axis=-1)
+    span = recent_high - np.nanmin(low, axis=-1)
+    return recent_high - np.multiply.outer(ratios, span)
@@ -0,0 +1,90 @@
+from typing import Iterable, Mapping
+
+import numpy as np
+from pandas import DataFrame
+
+from src.config import ForexPairEnum
+
+OHLCV = ("open", "high", "low", "close", "volume")
+
+
+class CandlePanel:
+    """Candles of several pairs aligned bar by bar
+
+    Every column is a (pairs, bars) float64 array, so an indicator runs
+    once along the bar axis for all the pairs. Rows are sliced back into
+    the per pair DataFrames the signals work on.
+    """
+
+    def __init__(
+        self,
+        pairs: Iterable[ForexPairEnum],
+        columns: Mapping[str, np.ndarray],
+        dates: np.ndarray = None,
+    ) -> None:
+        self.pairs = list(pairs)
+        self.rows = {pair: row for row, pair in enumerate(self.pairs)}
+        self.columns: dict[str, np.ndarray] = {}
+        self.dates = dates
+        for name, values in columns.items():
+            self[name] = values
+
+    @classmethod
+    def from_frames(
+        cls, frames: Mapping[ForexPairEnum, DataFrame]
+    ) -> "CandlePanel":
+        """Stacks the candles of each pair, keeping the latest bars that
+        every pair has"""
+        bars = min((len(frame) for frame in frames.values()), default=0)
+        columns = {
+            name: (
+                np.stack(
+                    [
+                        frame[name].to_numpy()[-bars:]
+                        for frame in frames.values()
+                    ]
+                ).astype(np.float64)
+                if bars
+                else np.empty((len(frames), 0))
+            )
+            for name in OHLCV
+        }
+        dates = None
+        if bars and all("date" in frame for frame in frames.values()):
+            dates = np.stack(
+                [frame["date"].to_numpy()[-bars:] for frame in frames.values()]
+            )
+        return cls(frames.keys(), columns, dates)
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        bars = next(iter(self.columns.values())).shape[-1]
+        return len(self.pairs), bars
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.columns
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.columns[name]
+
+    def __setitem__(self, name: str, values: np.ndarray) -> None:
+        values = np.asarray(values, dtype=np.float64)
+        if values.ndim < 2:
+            # one value per pair, as the fibonacci levels
+            values = values.reshape(len(self.pairs), -1)
+        if self.columns:
+            values = np.broadcast_to(values, self.shape)
+        self.columns[name] = values
+
+    def frame(self, pair: ForexPairEnum) -> DataFrame:
+        """The bars and indicators of one pair"""
+        row = self.rows[pair]
+        data = {}
+        if self.dates is not None:
+            data["date"] = self.dates[row]
+        for name, values in self.columns.items():
+            data[name] = values[row]
+        return DataFrame(data)
+
+    def frames(self) -> dict[ForexPairEnum, DataFrame]:
+        return {pair: self.frame(pair) for pair in self.pairs}
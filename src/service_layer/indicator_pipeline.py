@@ -0,0 +1,483 @@
+"""Declarative indicator pipeline
+
+A strategy lists the indicators it needs, each one a mapping of output
+columns to nodes. Nodes are keyed by their kind, parameters and inputs,
+so intermediates such as the close difference, the true range or a
+rolling sum are shared between indicators and computed once per frame.
+
+pipeline = IndicatorPipeline(sma(5, name="MA"), rsi(14), atr(14), adx(14))
+frame = await pipeline.run(frame, instrument, granularity)
+"""
+from collections import OrderedDict
+from functools import partial
+from typing import Callable, Hashable, Optional, Union
+
+import numpy as np
+from pandas import DataFrame
+
+from src.service_layer import indicator_kernels as kernels
+from src.service_layer.indicator_panel import OHLCV, CandlePanel
+
+Source = Union[DataFrame, CandlePanel]
+Outputs = dict[str, "Node"]
+
+
+class Node:
+    """One array of the pipeline, computed by func from its inputs"""
+
+    __slots__ = ("kind", "params", "inputs", "func", "key")
+
+    def __init__(
+        self,
+        kind: str,
+        func: Callable[..., np.ndarray],
+        inputs: tuple["Node", ...] = (),
+        params: tuple = (),
+    ) -> None:
+        self.kind = kind
+        self.func = func
+        self.inputs = inputs
+        self.params = params
+        self.key = (kind, params, tuple(node.key for node in inputs))
+
+    def __repr__(self) -> str:
+        return "Node%s" % (self.key,)
+
+
+# node functions live at module level, with their parameters bound by
+# partial, so a pipeline can be pickled to a worker process
+
+
+def _read_column(name: str, source: Source) -> np.ndarray:
+    return kernels.as_array(np.asarray(source[name]))
+
+
+def _shift(periods: int, values: np.ndarray) -> np.ndarray:
+    return kernels.shift(values, periods)
+
+
+def _rolling_sum(period: int, values: np.ndarray) -> np.ndarray:
+    return kernels.rolling_sum(values, period)
+
+
+def _divide(period: int, total: np.ndarray) -> np.ndarray:
+    return total / period
+
+
+def _rolling_std(
+    period: int, values: np.ndarray, mean: np.ndarray
+) -> np.ndarray:
+    return kernels.rolling_std(values, period, mean)
+
+
+def _rolling_extreme(
+    highest: bool, period: int, values: np.ndarray
+) -> np.ndarray:
+    if highest:
+        return kernels.rolling_max(values, period)
+    return kernels.rolling_min(values, period)
+
+
+def _ewm(
+    alpha: float, adjust: bool, min_periods: int, values: np.ndarray
+) -> np.ndarray:
+    return kernels.ewm_mean(values, alpha, adjust, min_periods)
+
+
+def _gains(rising: bool, delta: np.ndarray) -> np.ndarray:
+    out = np.where(np.isnan(delta), np.nan, 0.0)
+    moved = delta > 0 if rising else delta < 0
+    out[moved] = np.abs(delta[moved])
+    return out
+
+
+def _relative_strength(up: np.ndarray, down: np.ndarray) -> np.ndarray:
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return 100 - (100 / (1 + up / down))
+
+
+def _percent_k(
+    close: np.ndarray, highest: np.ndarray, lowest: np.ndarray
+) -> np.ndarray:
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return (close - lowest) * 100 / (highest - lowest)
+
+
+def _band(width: float, values: np.ndarray, std: np.ndarray) -> np.ndarray:
+    return values + std * width
+
+
+def _clip(upper: bool, values: np.ndarray) -> np.ndarray:
+    if upper:
+        return np.where(values > 0, 0, values)
+    return np.where(values < 0, 0, values)
+
+
+def _directional_index(
+    movement: np.ndarray, average_range: np.ndarray
+) -> np.ndarray:
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.abs(100 * (movement / average_range))
+
+
+def _smoothed_dx(
+    period: int, plus_di: np.ndarray, minus_di: np.ndarray
+) -> np.ndarray:
+    with np.errstate(divide="ignore", invalid="ignore"):
+        dx = np.abs(plus_di - minus_di) / np.abs(plus_di + minus_di) * 100
+    return (kernels.shift(dx) * (period - 1) + dx) / period
+
+
+def _retrace(
+    ratio: float, high: np.ndarray, low: np.ndarray, close: np.ndarray
+) -> np.ndarray:
+    value = kernels.fibonacci_levels(high, low, (ratio,))[0]
+    return np.broadcast_to(np.expand_dims(value, -1), close.shape)
+
+
+def _rolling_retrace(
+    ratio: float, highest: np.ndarray, lowest: np.ndarray
+) -> np.ndarray:
+    return highest - ratio * (highest - lowest)
+
+
+def column(name: str) -> Node:
+    return Node("column", partial(_read_column, name), params=(name,))
+
+
+def difference(node: Node) -> Node:
+    return Node("diff", kernels.diff, (node,))
+
+
+def shifted(node: Node, periods: int = 1) -> Node:
+    return Node("shift", partial(_shift, periods), (node,), (periods,))
+
+
+def true_range() -> Node:
+    return Node(
+        "true_range",
+        kernels.true_range,
+        (column("high"), column("low"), column("close")),
+    )
+
+
+def rolling_sum(node: Node, period: int) -> Node:
+    return Node(
+        "rolling_sum", partial(_rolling_sum, period), (node,), (period,)
+    )
+
+
+def rolling_mean(node: Node, period: int) -> Node:
+    return Node(
+        "rolling_mean",
+        partial(_divide, period),
+        (rolling_sum(node, period),),
+        (period,),
+    )
+
+
+def rolling_std(node: Node, period: int) -> Node:
+    return Node(
+        "rolling_std",
+        partial(_rolling_std, period),
+        (node, rolling_mean(node, period)),
+        (period,),
+    )
+
+
+def rolling_extreme(node: Node, period: int, highest: bool) -> Node:
+    return Node(
+        "rolling_max" if highest else "rolling_min",
+        partial(_rolling_extreme, highest, period),
+        (node,),
+        (period,),
+    )
+
+
+def ewm(
+    node: Node, alpha: float, adjust: bool = True, min_periods: int = 0
+) -> Node:
+    return Node(
+        "ewm",
+        partial(_ewm, alpha, adjust, min_periods),
+        (node,),
+        (alpha, adjust, min_periods),
+    )
+
+
+def gains(node: Node, rising: bool) -> Node:
+    """The rises, or the falls as positive values, of node"""
+    return Node(
+        "gains", partial(_gains, rising), (difference(node),), (rising,)
+    )
+
+
+def sma(
+    period: int, col: str = "close", name: Optional[str] = None
+) -> Outputs:
+    return {name or "SMA" + str(period): rolling_mean(column(col), period)}
+
+
+def ema(period: int, col: str = "close") -> Outputs:
+    return {"EMA" + str(period): ewm(column(col), 1 / (1 + period))}
+
+
+def rsi(period: int = 14, use_ema: bool = True) -> Outputs:
+    close = column("close")
+    up, down = gains(close, True), gains(close, False)
+    if use_ema:
+        ma_up = ewm(up, 1 / period, True, period)
+        ma_down = ewm(down, 1 / period, True, period)
+    else:
+        ma_up = rolling_mean(up, period)
+        ma_down = rolling_mean(down, period)
+    return {"rsi": Node("rsi", _relative_strength, (ma_up, ma_down))}
+
+
+def macd(
+    col: str = "close", fast: int = 12, slow: int = 26, signal: int = 9
+) -> Outputs:
+    close = column(col)
+    # the batch version uses fixed min_periods whatever the spans
+    line = Node(
+        "subtract",
+        np.subtract,
+        (
+            ewm(close, 2 / (fast + 1), False, 12),
+            ewm(close, 2 / (slow + 1), False, 26),
+        ),
+    )
+    signal_line = ewm(line, 2 / (signal + 1), False, 9)
+    return {
+        "macd": line,
+        "macd_h": Node("subtract", np.subtract, (line, signal_line)),
+        "macd_s": signal_line,
+    }
+
+
+def stochastic(period: int = 14, d_period: int = 3) -> Outputs:
+    k = Node(
+        "stochastic_k",
+        _percent_k,
+        (
+            column("close"),
+            rolling_extreme(column("high"), period, True),
+            rolling_extreme(column("low"), period, False),
+        ),
+    )
+    return {"%K": k, "%D": rolling_mean(k, d_period)}
+
+
+def bollinger(period: int = 20, col: str = "close") -> Outputs:
+    values = column(col)
+    std = rolling_std(values, period)
+    return {
+        "SMA" + str(period): rolling_mean(values, period),
+        "bollinger_up": Node("band", partial(_band, 2), (values, std), (2,)),
+        "bollinger_down": Node(
+            "band", partial(_band, -2), (values, std), (-2,)
+        ),
+    }
+
+
+def average_true_range(period: int = 14) -> Node:
+    return rolling_mean(true_range(), period)
+
+
+def atr(period: int = 14) -> Outputs:
+    return {"atr": average_true_range(period)}
+
+
+def adx(period: int = 20) -> Outputs:
+    alpha = 1 / period
+    plus_dm = Node(
+        "clip", partial(_clip, False), (difference(column("high")),), (0,)
+    )
+    minus_dm = Node(
+        "clip", partial(_clip, True), (difference(column("low")),), (1,)
+    )
+    average_range = average_true_range(period)
+    plus_di = Node(
+        "di", _directional_index, (ewm(plus_dm, alpha), average_range)
+    )
+    minus_di = Node(
+        "di", _directional_index, (ewm(minus_dm, alpha), average_range)
+    )
+    raw = Node(
+        "dx", partial(_smoothed_dx, period), (plus_di, minus_di), (period,)
+    )
+    return {"plus_di": plus_di, "minus_di": minus_di, "adx": ewm(raw, alpha)}
+
+
+def obv() -> Outputs:
+    return {
+        "obv": Node("obv", kernels.obv, (column("close"), column("volume")))
+    }
+
+
+def fibonacci(
+    ratios=(0.236, 0.382, 0.5, 0.618), window: Optional[int] = None
+) -> Outputs:
+    """Retracements from the highest high over the whole frame, or with
+    window over the window bars ending at each bar"""
+    high, low, close = column("high"), column("low"), column("close")
+    if window is not None:
+        highest = rolling_extreme(high, window, True)
+        lowest = rolling_extreme(low, window, False)
+        return {
+            "Fib_%.1f"
+            % (ratio * 100): Node(
+                "rolling_fibonacci",
+                partial(_rolling_retrace, ratio),
+                (highest, lowest),
+                (ratio,),
+            )
+            for ratio in ratios
+        }
+    return {
+        "Fib_%.1f"
+        % (ratio * 100): Node(
+            "fibonacci",
+            partial(_retrace, ratio),
+            (high, low, close),
+            (ratio,),
+        )
+        for ratio in ratios
+    }
+
+
+def prev_close() -> Outputs:
+    return {"prev_close": shifted(column("close"))}
+
+
+class IndicatorCache:
+    """Least recently used pipeline results"""
+
+    def __init__(self, maxsize: int = 256) -> None:
+        self.maxsize = maxsize
+        self._results: OrderedDict[Hashable, dict] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[dict[str, np.ndarray]]:
+        results = self._results.get(key)
+        if results is None:
+            self.misses += 1
+            return None
+        self._results.move_to_end(key)
+        self.hits += 1
+        return results
+
+    def set(self, key: Hashable, results: dict[str, np.ndarray]) -> None:
+        for values in results.values():
+            values.flags.writeable = False
+        self._results[key] = results
+        self._results.move_to_end(key)
+        while len(self._results) > self.maxsize:
+            self._results.popitem(last=False)
+
+    def clear(self) -> None:
+        self._results.clear()
+
+
+def last_bar(source: Source) -> Optional[tuple]:
+    """The time and values of the newest bar, with the number of bars,
+    none when the source has no dates"""
+    if isinstance(source, CandlePanel):
+        if source.dates is None:
+            return None
+        times = tuple(source.dates[:, -1].tolist())
+        bars = source.shape[-1]
+    else:
+        if "date" not in source or len(source) == 0:
+            return None
+        times = source["date"].iloc[-1]
+        bars = len(source)
+    # the forming bar keeps its time while its prices move
+    values = tuple(
+        np.asarray(source[name])[..., -1].tobytes()
+        for name in OHLCV
+        if name in source
+    )
+    return times, bars, values
+
+
+class IndicatorPipeline:
+    """Computes a set of indicators over their shared intermediates"""
+
+    def __init__(
+        self, *outputs: Outputs, cache: Optional[IndicatorCache] = None
+    ) -> None:
+        self.columns: Outputs = {}
+        for output in outputs:
+            self.columns.update(output)
+        self.cache = cache
+        self.nodes = self._resolve()
+        self.parameters = tuple(
+            (name, node.key) for name, node in self.columns.items()
+        )
+
+    def __getstate__(self) -> dict:
+        # the cache stays with the process that owns the pipeline
+        return {**self.__dict__, "cache": None}
+
+    def _resolve(self) -> list[Node]:
+        """Every node once, each after its inputs"""
+        order: dict[tuple, Node] = {}
+
+        def visit(node: Node) -> None:
+            if node.key in order:
+                return
+            for child in node.inputs:
+                visit(child)
+            order[node.key] = node
+
+        for node in self.columns.values():
+            visit(node)
+        return list(order.values())
+
+    def evaluate(self, source: Source) -> dict[str, np.ndarray]:
+        """Computes the output columns of source"""
+        values: dict[tuple, np.ndarray] = {}
+        for node in self.nodes:
+            if node.kind == "column":
+                values[node.key] = node.func(source)
+            else:
+                values[node.key] = node.func(
+                    *[values[child.key] for child in node.inputs]
+                )
+        return {name: values[node.key] for name, node in self.columns.items()}
+
+    async def run(
+        self,
+        source: Source,
+        instrument: Hashable = None,
+        granularity: Hashable = None,
+        pool=None,
+    ) -> Source:
+        """Adds the output columns to source, reusing the cached results
+        of the same bars when an instrument is given
+
+        With a ComputePool the outputs are computed by its workers.
+        """
+        key = None
+        results = None
+        if self.cache is not None and instrument is not None:
+            bar = last_bar(source)
+            if bar is not None:
+                key = (instrument, granularity, bar, self.parameters)
+                results = self.cache.get(key)
+        if results is None:
+            if pool is None:
+                results = self.evaluate(source)
+            else:
+                results = await pool.evaluate(self, source)
+            if key is not None:
+                self.cache.set(key, results)
+        for name, values in results.items():
+            # cached and broadcast arrays are read only, the source gets
+            # its own copy of those
+            if not values.flags.writeable:
+                values = np.array(values)
+            source[name] = values
+        return source
@@ -1,10 +1,80 @@
+import inspect
+import os
+
 import numpy as np
 from pandas import DataFrame, concat
-from typing import Optional
+from typing import Any, Callable, Optional
+
+from src.service_layer import indicator_kernels as kernels
+from src.service_layer.compute_pool import ComputePool
+from src.service_layer.indicator_panel import CandlePanel
+from src.service_layer.indicator_pipeline import IndicatorPipeline, Source
+
+PANDAS = "pandas"
+NUMPY = "numpy"
+BACKENDS = (PANDAS, NUMPY)
+
+_default_backend = os.environ.get("INDICATOR_BACKEND", PANDAS)
+
+
+def set_default_backend(backend: str) -> None:
+    """Choose the backend used when neither the instance nor the call
+    names one"""
+    global _default_backend
+    if backend not in BACKENDS:
+        raise ValueError("Unknown indicator backend: %s" % backend)
+    _default_backend = backend
+
+
+def get_default_backend() -> str:
+    return _default_backend
+
+
+def _column(data: DataFrame, col: str) -> np.ndarray:
+    return kernels.as_array(data[col].to_numpy())
 
 
 class Indicators:
-    """Class for calculating indicators"""
+    """Class for calculating indicators
+
+    Every indicator runs on pandas or, with backend="numpy", on the
+    NumPy kernels, chosen per call, per instance or globally with
+    set_default_backend or the INDICATOR_BACKEND variable.
+    """
+
+    def __init__(
+        self, backend: Optional[str] = None, pool: Optional[ComputePool] = None
+    ) -> None:
+        if backend is not None and backend not in BACKENDS:
+            raise ValueError("Unknown indicator backend: %s" % backend)
+        self.backend = backend
+        self.pool = pool
+
+    async def offload(self, func: Callable, *args) -> Any:
+        """Runs func(*args) on the compute pool, or on the event loop
+        without one"""
+        if self.pool is None:
+            result = func(*args)
+            return await result if inspect.isawaitable(result) else result
+        return await self.pool.run(func, *args)
+
+    def use_numpy(self, backend: Optional[str] = None) -> bool:
+        """Whether a call with backend runs on the NumPy kernels"""
+        backend = backend or self.backend or _default_backend
+        if backend not in BACKENDS:
+            raise ValueError("Unknown indicator backend: %s" % backend)
+        return backend == NUMPY
+
+    async def run_pipeline(
+        self,
+        pipeline: IndicatorPipeline,
+        data: Source,
+        instrument=None,
+        granularity=None,
+    ) -> Source:
+        """Adds the outputs of an indicator pipeline, see
+        indicator_pipeline"""
+        return await pipeline.run(data, instrument, granularity, self.pool)
 
     async def get_simple_moving_average(
         self,
@@ -12,6 +82,7 @@ class Indicators:
         period: int,
         col: str,
         column_name: Optional[str] = None,
+        backend: Optional[str] = None,
     ) -> DataFrame:
         """Calculate the moving average"""
 
@@ -19,13 +90,25 @@ class Indicators:
             name = column_name
         else:
             name = "SMA" + str(period)
+        if self.use_numpy(backend):
+            data[name] = kernels.rolling_mean(_column(data, col), period)
+            return data
         data[name] = data[col].rolling(period).mean()
         return data
 
     async def get_exponential_moving_average(
-        self, data: DataFrame, period: int, col: str
+        self,
+        data: DataFrame,
+        period: int,
+        col: str,
+        backend: Optional[str] = None,
     ) -> DataFrame:
         """Calculate the moving average"""
+        if self.use_numpy(backend):
+            data["EMA" + str(period)] = kernels.ewm_mean(
+                _column(data, col), 1 / (1 + period)
+            )
+            return data
         data["EMA" + str(period)] = data[col].ewm(period).mean()
         return data
 
@@ -36,8 +119,17 @@ class Indicators:
         fast: int = 12,
         slow: int = 26,
         signal: int = 9,
+        backend: Optional[str] = None,
     ) -> DataFrame:
         """Calculate the macd"""
+        if self.use_numpy(backend):
+            macd, macd_h, macd_s = kernels.macd(
+                _column(data, col), fast, slow, signal
+            )
+            data["macd"] = macd
+            data["macd_h"] = macd_h
+            data["macd_s"] = macd_s
+            return data
         d = data[col].ewm(span=slow, adjust=False, min_periods=26).mean()
         k = data[col].ewm(span=fast, adjust=False, min_periods=12).mean()
 
@@ -57,8 +149,18 @@ class Indicators:
         high_col: str = "high",
         low_col: str = "low",
         close_col: str = "close",
+        backend: Optional[str] = None,
     ) -> DataFrame:
         """Calculate the stocastic"""
+        if self.use_numpy(backend):
+            data["%K"], data["%D"] = kernels.stochastic(
+                _column(data, high_col),
+                _column(data, low_col),
+                _column(data, close_col),
+                period,
+                d_cal_period,
+            )
+            return data
         high = data[high_col].rolling(period).max()
         low = data[low_col].rolling(period).min()
         data["%K"] = (data[close_col] - low) * 100 / (high - low)
@@ -66,9 +168,16 @@ class Indicators:
         return data
 
     async def get_rsi(
-        self, data: DataFrame, period: int = 14, ema: bool = True
+        self,
+        data: DataFrame,
+        period: int = 14,
+        ema: bool = True,
+        backend: Optional[str] = None,
     ) -> DataFrame:
         """Calculate the rsi"""
+        if self.use_numpy(backend):
+            data["rsi"] = kernels.rsi(_column(data, "close"), period, ema)
+            return data
         close_delta = data["close"].diff()
 
         # Make two series: one for lower closes and one for higher closes
@@ -94,9 +203,21 @@ class Indicators:
         return data
 
     async def get_bollinger(
-        self, data: DataFrame, period: int = 20, col: str = "close"
+        self,
+        data: DataFrame,
+        period: int = 20,
+        col: str = "close",
+        backend: Optional[str] = None,
     ) -> DataFrame:
         """get the bollinger bands"""
+        if self.use_numpy(backend):
+            values = _column(data, col)
+            mean = kernels.rolling_mean(values, period)
+            data["SMA" + str(period)] = mean
+            std = kernels.rolling_std(values, period, mean)
+            data["bollinger_up"] = values + std * 2
+            data["bollinger_down"] = values - std * 2
+            return data
         sma = await self.get_simple_moving_average(
             data=data, period=period, col=col
         )
@@ -114,8 +235,20 @@ class Indicators:
         close: str = "close",
         high: str = "high",
         low: str = "low",
+        backend: Optional[str] = None,
     ) -> DataFrame:
         """Get the adx"""
+        if self.use_numpy(backend):
+            plus_di, minus_di, adx = kernels.adx(
+                _column(data, high),
+                _column(data, low),
+                _column(data, close),
+                period,
+            )
+            data["plus_di"] = plus_di
+            data["minus_di"] = minus_di
+            data["adx"] = adx
+            return data
         plus_dm = data[high].diff()
         minus_dm = data[low].diff()
         plus_dm[plus_dm < 0] = 0
@@ -145,8 +278,17 @@ class Indicators:
         close: str = "close",
         high: str = "high",
         low: str = "low",
+        backend: Optional[str] = None,
     ) -> DataFrame:
         """Get the atr"""
+        if self.use_numpy(backend):
+            data["atr"] = kernels.atr(
+                _column(data, high),
+                _column(data, low),
+                _column(data, close),
+                period,
+            )
+            return data
         high_low = data[high] - data[low]
         high_close = np.abs(data[high] - data[close].shift())
         low_close = np.abs(data[low] - data[close].shift())
@@ -160,9 +302,18 @@ class Indicators:
         return data
 
     async def get_obv(
-        self, data: DataFrame, close: str = "close", volume: str = "volume"
+        self,
+        data: DataFrame,
+        close: str = "close",
+        volume: str = "volume",
+        backend: Optional[str] = None,
     ) -> DataFrame:
         """Get the obv"""
+        if self.use_numpy(backend):
+            data["obv"] = kernels.obv(
+                _column(data, close), _column(data, volume)
+            )
+            return data
         obv = (np.sign(data[close].diff()) * data[volume]).fillna(0).cumsum()
         data["obv"] = obv
         return data
@@ -174,8 +325,17 @@ class Indicators:
         low: str = "low",
         close: str = "close",
         volume: str = "volume",
+        backend: Optional[str] = None,
     ) -> DataFrame:
         """Get the ad"""
+        if self.use_numpy(backend):
+            data["ad"] = kernels.accumulation_distribution(
+                _column(data, high),
+                _column(data, low),
+                _column(data, close),
+                _column(data, volume),
+            )
+            return data
         # Current money flow volume
         high_low = data[high] - data[low]
         CMFV = np.multiply(
@@ -233,3 +393,69 @@ class Indicators:
         frame["Fib_61.8"] = recent_high - 0.618 * diff
 
         return frame
+
+    async def get_panel_simple_moving_average(
+        self,
+        panel: CandlePanel,
+        period: int,
+        col: str = "close",
+        column_name: Optional[str] = None,
+    ) -> CandlePanel:
+        """Calculate the moving average of every pair in the panel"""
+        name = column_name or "SMA" + str(period)
+        panel[name] = kernels.rolling_mean(panel[col], period)
+        return panel
+
+    async def get_panel_rsi(
+        self, panel: CandlePanel, period: int = 14, ema: bool = True
+    ) -> CandlePanel:
+        """Calculate the rsi of every pair in the panel"""
+        panel["rsi"] = kernels.rsi(panel["close"], period, ema)
+        return panel
+
+    async def get_panel_macd(
+        self,
+        panel: CandlePanel,
+        col: str = "close",
+        fast: int = 12,
+        slow: int = 26,
+        signal: int = 9,
+    ) -> CandlePanel:
+        """Calculate the macd of every pair in the panel"""
+        macd, macd_h, macd_s = kernels.macd(panel[col], fast, slow, signal)
+        panel["macd"] = macd
+        panel["macd_h"] = macd_h
+        panel["macd_s"] = macd_s
+        return panel
+
+    async def get_panel_atr(
+        self, panel: CandlePanel, period: int = 14
+    ) -> CandlePanel:
+        """Calculate the atr of every pair in the panel"""
+        panel["atr"] = kernels.atr(
+            panel["high"], panel["low"], panel["close"], period
+        )
+        return panel
+
+    async def get_panel_adx(
+        self, panel: CandlePanel, period: int = 20
+    ) -> CandlePanel:
+        """Calculate the adx of every pair in the panel"""
+        plus_di, minus_di, adx = kernels.adx(
+            panel["high"], panel["low"], panel["close"], period
+        )
+        panel["plus_di"] = plus_di
+        panel["minus_di"] = minus_di
+        panel["adx"] = adx
+        return panel
+
+    async def get_panel_fibonacci_retracements(
+        self, panel: CandlePanel
+    ) -> CandlePanel:
+        """Calculate the fibonacci levels of every pair in the panel"""
+        levels = kernels.fibonacci_levels(panel["high"], panel["low"])
+        for name, level in zip(
+            ["Fib_23.6", "Fib_38.2", "Fib_50.0", "Fib_61.8"], levels
+        ):
+            panel[name] = level[:, np.newaxis]
+        return panel
@@ -0,0 +1,383 @@
+"""Sweeps the strategy parameters over pairs and walk-forward windows
+
+Every pair and window is one task on the compute pool. The candles are
+copied once into shared memory, so a task only pickles its pair, its
+window and the parameters it tries. Within a task the indicators that
+no swept parameter changes are computed once, a moving average once per
+period, and only the signal masks and the trades are redone for each
+set of parameters.
+
+With walk-forward splits the parameters are ranked on each training
+window and the best of them is then backtested on the test window that
+follows it.
+
+parameters = grid(adx_trend=[20, 25, 30], stop_atr=[2, 3, 4])
+splits = walk_forward_splits(start, end, train="180D", test="30D")
+result = await ParameterSweep(history, parameters, splits, pool=pool).run()
+result.save("sweeps/adx_stop")
+"""
+import asyncio
+import itertools
+import os
+from dataclasses import asdict, dataclass, fields
+from typing import Mapping, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+from src.config import ForexPairEnum
+from src.logger import get_logger
+from src.service_layer import indicator_pipeline as pipeline
+from src.service_layer.backtest import Backtester, summarise
+from src.service_layer.compute_pool import (
+    ComputePool,
+    SharedArrays,
+    attach_arrays,
+)
+from src.service_layer.indicator_panel import OHLCV
+from src.service_layer.signals import (
+    FIB_LEVELS,
+    StrategyParameters,
+    signal_arrays,
+)
+
+logger = get_logger(__name__)
+
+SWEPT = [parameter.name for parameter in fields(StrategyParameters)]
+# statistics of each pair that add up over the pairs
+ADDITIVE = ["trades", "total_pips", "won_pips", "lost_pips", "realised_pl"]
+# bars before a window the indicators are computed over
+WARMUP = 1_000
+
+TimeLike = Union[str, pd.Timestamp, None]
+
+
+def grid(**values: Sequence) -> list[StrategyParameters]:
+    """Every combination of the values given for each parameter, the
+    others keep their default"""
+    unknown = set(values) - set(SWEPT)
+    if unknown:
+        raise ValueError("Unknown strategy parameters: %s" % sorted(unknown))
+    names = list(values)
+    return [
+        StrategyParameters(**dict(zip(names, combination)))
+        for combination in itertools.product(*values.values())
+    ]
+
+
+def random_samples(
+    number: int, seed: int = 0, **ranges: Union[Sequence, tuple]
+) -> list[StrategyParameters]:
+    """number sets of parameters drawn at random
+
+    A list is sampled from, a (low, high) tuple is drawn uniformly,
+    as integers when both ends are.
+    """
+    unknown = set(ranges) - set(SWEPT)
+    if unknown:
+        raise ValueError("Unknown strategy parameters: %s" % sorted(unknown))
+    rng = np.random.default_rng(seed)
+    draws = {}
+    for name, values in ranges.items():
+        if isinstance(values, tuple):
+            low, high = values
+            if isinstance(low, int) and isinstance(high, int):
+                draws[name] = rng.integers(low, high, number, endpoint=True)
+            else:
+                draws[name] = rng.uniform(low, high, number)
+        else:
+            draws[name] = rng.choice(np.asarray(values), number)
+    return [
+        StrategyParameters(
+            **{name: draws[name][index].item() for name in draws}
+        )
+        for index in range(number)
+    ]
+
+
+@dataclass(frozen=True)
+class Split:
+    """A training window and the test window after it, start <= time <
+    end, None is unbounded"""
+
+    index: int
+    train_start: TimeLike
+    train_end: TimeLike
+    test_start: TimeLike = None
+    test_end: TimeLike = None
+
+    @property
+    def has_test(self) -> bool:
+        return self.test_start is not None or self.test_end is not None
+
+
+def walk_forward_splits(
+    start: TimeLike,
+    end: TimeLike,
+    train: Union[str, pd.Timedelta],
+    test: Union[str, pd.Timedelta],
+    step: Union[str, pd.Timedelta, None] = None,
+) -> list[Split]:
+    """Rolling training windows of train, each followed by a test window
+    of test, moved on by step, test by default"""
+    start, end = pd.Timestamp(start), pd.Timestamp(end)
+    train, test = pd.Timedelta(train), pd.Timedelta(test)
+    step = pd.Timedelta(step) if step is not None else test
+    splits = []
+    train_start = start
+    while train_start + train + test <= end:
+        train_end = train_start + train
+        splits.append(
+            Split(
+                len(splits),
+                train_start,
+                train_end,
+                train_end,
+                train_end + test,
+            )
+        )
+        train_start += step
+    return splits
+
+
+def bounds(times: np.ndarray, start: TimeLike, end: TimeLike) -> tuple:
+    """Row range of the times with start <= time < end"""
+    lo = hi = None
+    if start is not None:
+        lo = np.searchsorted(times, pd.Timestamp(start).to_datetime64())
+    if end is not None:
+        hi = np.searchsorted(times, pd.Timestamp(end).to_datetime64())
+    return int(lo or 0), int(len(times) if hi is None else hi)
+
+
+def evaluate_window(
+    descriptor: tuple,
+    forex_pair: ForexPairEnum,
+    start: TimeLike,
+    end: TimeLike,
+    parameters: list[StrategyParameters],
+    backtester: Backtester,
+    warmup: int = WARMUP,
+) -> list[dict]:
+    """The summary of the trades of each set of parameters on one pair
+    entered with start <= time < end, run in a worker"""
+    key = forex_pair.value
+    with attach_arrays(descriptor) as arrays:
+        lo, hi = bounds(arrays[key + "/date"], start, end)
+        first = max(0, lo - warmup)
+        # copies, the views go with the block
+        data = DataFrame(
+            {
+                name: np.array(arrays["%s/%s" % (key, name)][first:hi])
+                for name in ("date", *OHLCV)
+            }
+        )
+    if lo >= hi:
+        return []
+    data = backtester.evaluate(data)
+    moving_averages = {backtester.parameters.ma_period: data["MA"].to_numpy()}
+    for period in {parameter.ma_period for parameter in parameters}:
+        if period not in moving_averages:
+            moving_averages[period] = pipeline.IndicatorPipeline(
+                pipeline.sma(period, name="MA")
+            ).evaluate(data)["MA"]
+    columns = {
+        name: data[name].to_numpy(dtype=np.float64)
+        for name in ("close", "prev_close", "adx", "plus_di", "minus_di")
+    }
+    levels = np.stack([data[name].to_numpy() for name in FIB_LEVELS])
+    atr = data["atr"].to_numpy(dtype=np.float64)
+
+    rows = []
+    for parameter in parameters:
+        frame = data.copy(deep=False)
+        (
+            frame["Signal"],
+            frame["ATR_Stop"],
+            frame["ATR_Limit"],
+        ) = signal_arrays(
+            columns["close"],
+            columns["prev_close"],
+            levels,
+            moving_averages[parameter.ma_period],
+            columns["adx"],
+            columns["plus_di"],
+            columns["minus_di"],
+            atr,
+            parameter,
+        )
+        trades = backtester.with_parameters(parameter).trades(
+            forex_pair, frame, first_bar=lo - first
+        )
+        summary = summarise(trades)
+        del summary["exit_reasons"]
+        rows.append({**asdict(parameter), "pair": key, **summary})
+    return rows
+
+
+def rank(results: DataFrame, metric: str) -> DataFrame:
+    """The statistics of each set of parameters over every pair, best
+    first within each split"""
+    group = ["split", *SWEPT]
+    totals = results.groupby(group, sort=False)[ADDITIVE].sum()
+    totals["pairs"] = results.groupby(group, sort=False)["pair"].nunique()
+    winners = results["win_rate"] * results["trades"]
+    totals["win_rate"] = (
+        winners.groupby([results[name] for name in group], sort=False).sum()
+        / totals["trades"].where(totals["trades"] > 0)
+    ).fillna(0.0)
+    totals["profit_factor"] = totals["won_pips"] / totals["lost_pips"].replace(
+        0, np.nan
+    )
+    totals["worst_drawdown_pips"] = results.groupby(group, sort=False)[
+        "max_drawdown_pips"
+    ].max()
+    totals = totals.reset_index()
+    totals = totals.sort_values(
+        ["split", metric], ascending=[True, False], kind="stable"
+    )
+    totals["rank"] = totals.groupby("split").cumcount() + 1
+    return totals.reset_index(drop=True)
+
+
+class SweepResult:
+    """The statistics of every pair and set of parameters, ranked over
+    the pairs, and the out of sample results of the best of each split"""
+
+    def __init__(
+        self, results: DataFrame, ranking: DataFrame, walk_forward: DataFrame
+    ) -> None:
+        self.results = results
+        self.ranking = ranking
+        self.walk_forward = walk_forward
+
+    def best(self, split: int = 0) -> StrategyParameters:
+        row = self.ranking[self.ranking["split"] == split].iloc[0]
+        return StrategyParameters(
+            **{
+                parameter.name: parameter.type(row[parameter.name])
+                for parameter in fields(StrategyParameters)
+            }
+        )
+
+    def save(self, directory: str) -> dict[str, str]:
+        """Writes the tables as csv files, returns their paths"""
+        os.makedirs(directory, exist_ok=True)
+        paths = {}
+        for name in ("ranking", "results", "walk_forward"):
+            paths[name] = os.path.join(directory, name + ".csv")
+            getattr(self, name).to_csv(paths[name], index=False)
+        return paths
+
+
+class ParameterSweep:
+    """Backtests every set of parameters on every pair and split"""
+
+    def __init__(
+        self,
+        history: Mapping[ForexPairEnum, DataFrame],
+        parameters: list[StrategyParameters],
+        splits: Optional[list[Split]] = None,
+        backtester: Optional[Backtester] = None,
+        metric: str = "total_pips",
+        pool: Optional[ComputePool] = None,
+        warmup: int = WARMUP,
+    ) -> None:
+        if not parameters:
+            raise ValueError("No parameters to sweep")
+        self.history = history
+        self.parameters = list(parameters)
+        self.splits = splits or [Split(0, None, None)]
+        self.backtester = backtester or Backtester()
+        self.metric = metric
+        self.pool = pool or ComputePool("inline")
+        self.warmup = warmup
+
+    def shared_arrays(self) -> SharedArrays:
+        arrays = {}
+        for forex_pair, frame in self.history.items():
+            key = forex_pair.value
+            arrays[key + "/date"] = frame["date"].to_numpy("datetime64[ns]")
+            for name in OHLCV:
+                arrays["%s/%s" % (key, name)] = frame[name].to_numpy(
+                    np.float64
+                )
+        return SharedArrays(arrays)
+
+    async def evaluate(
+        self,
+        descriptor: tuple,
+        windows: list[tuple[int, TimeLike, TimeLike]],
+        parameters: Mapping[int, list[StrategyParameters]],
+        phase: str,
+    ) -> DataFrame:
+        """The summaries of each pair on each (split, start, end) window"""
+        tasks = []
+        for split, start, end in windows:
+            for forex_pair in self.history:
+                tasks.append(
+                    (
+                        split,
+                        self.pool.run(
+                            evaluate_window,
+                            descriptor,
+                            forex_pair,
+                            start,
+                            end,
+                            parameters[split],
+                            self.backtester,
+                            self.warmup,
+                        ),
+                    )
+                )
+        rows = []
+        results = await asyncio.gather(*[task for _, task in tasks])
+        for (split, _), summaries in zip(tasks, results):
+            rows.extend(
+                {"split": split, "phase": phase, **summary}
+                for summary in summaries
+            )
+        return DataFrame(rows)
+
+    async def run(self) -> SweepResult:
+        logger.info(
+            "Sweeping %s parameters over %s pairs and %s splits"
+            % (len(self.parameters), len(self.history), len(self.splits))
+        )
+        with self.shared_arrays() as shared:
+            results = await self.evaluate(
+                shared.descriptor,
+                [
+                    (split.index, split.train_start, split.train_end)
+                    for split in self.splits
+                ],
+                {split.index: self.parameters for split in self.splits},
+                "train",
+            )
+            if results.empty:
+                raise ValueError("No candles in the sweep windows")
+            ranking = rank(results, self.metric)
+            tested = [split for split in self.splits if split.has_test]
+            walk_forward = DataFrame()
+            if tested:
+                result = SweepResult(results, ranking, walk_forward)
+                out_of_sample = await self.evaluate(
+                    shared.descriptor,
+                    [
+                        (split.index, split.test_start, split.test_end)
+                        for split in tested
+                    ],
+                    {
+                        split.index: [result.best(split.index)]
+                        for split in tested
+                    },
+                    "test",
+                )
+                walk_forward = rank(out_of_sample, self.metric).drop(
+                    columns="rank"
+                )
+                results = pd.concat(
+                    [results, out_of_sample], ignore_index=True
+                )
+        return SweepResult(results, ranking, walk_forward)
@@ -0,0 +1,242 @@
+"""Monte Carlo drawdown and risk of ruin over the realised trades
+
+Each closed trade is taken as the multiple of what it risked, its R. A
+path draws trades at random from those multiples, with replacement, and
+compounds them with every trade risking RISK of the balance at the
+time, as get_trade_parameters sizes them. The paths run in chunks of
+rows, so that at most chunk_elements steps are held at once however
+many paths there are.
+
+report = simulate(r_multiples(trades, balance), paths=200_000)
+"""
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from typing import Optional, Sequence
+
+import numpy as np
+from pandas import DataFrame
+
+from src.domain.errors.errors import NotFound
+from src.domain.trade import Trade
+from src.logger import get_logger
+from src.service_layer.compute_pool import ComputePool
+from src.service_layer.signals import RISK
+from src.service_layer.uow import MongoUnitOfWork
+
+logger = get_logger(__name__)
+
+PERCENTILES = (50, 75, 90, 95, 99)
+# ruined once half the starting balance is lost
+RUIN = 0.5
+# a path holds a row of this many trades at once however small the chunk
+MAX_TRADES = 10_000
+CHUNK_ELEMENTS = 1 << 20
+
+
+def r_multiples(
+    trades: Sequence[Trade], balance: float, risk: float = RISK
+) -> np.ndarray:
+    """The R of each closed trade in the order they were opened, its
+    realised pl over risk of the balance before it, the balances being
+    rebuilt backwards from the current one"""
+    closed = sorted(
+        (trade for trade in trades if trade.realised_pl is not None),
+        key=lambda trade: trade.initiated_date,
+    )
+    pl = np.array([trade.realised_pl for trade in closed], dtype=np.float64)
+    before = balance - np.cumsum(pl[::-1])[::-1]
+    if (before <= 0).any():
+        raise ValueError(
+            "The realised pl of the trades is more than the balance"
+        )
+    return pl / (risk * before)
+
+
+def backtest_r_multiples(trades: DataFrame) -> np.ndarray:
+    """The R of each backtested trade, its pips over its stop loss pips"""
+    trades = trades.sort_values("exit_date")
+    r = (trades["pips"] / trades["sl_pips"]).to_numpy(np.float64)
+    return r[np.isfinite(r)]
+
+
+def trades_per_day(trades: Sequence[Trade]) -> Optional[float]:
+    """The rate the closed trades were opened at, None without a span"""
+    dates = sorted(
+        trade.initiated_date
+        for trade in trades
+        if trade.realised_pl is not None
+    )
+    if len(dates) < 2:
+        return None
+    days = (dates[-1] - dates[0]).total_seconds() / 86400
+    return (len(dates) - 1) / days if days > 0 else None
+
+
+@dataclass
+class RiskReport:
+    """Drawdowns are fractions of the peak balance, recoveries the
+    trades from a peak until the balance is back at it, or to the end
+    of the path, and the returns fractions of the starting balance"""
+
+    paths: int
+    trades: int
+    sampled_trades: int
+    risk: float
+    ruin: float
+    risk_of_ruin: float
+    unrecovered: float
+    max_drawdown: dict[int, float]
+    recovery_trades: dict[int, float]
+    final_return: dict[int, float]
+    recovery_days: Optional[dict[int, float]] = None
+    version: Optional[str] = None
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+def percentiles(values: np.ndarray) -> dict[int, float]:
+    return dict(zip(PERCENTILES, np.percentile(values, PERCENTILES).tolist()))
+
+
+def simulate_paths(
+    growth: np.ndarray,
+    rows: int,
+    trades: int,
+    rng: np.random.Generator,
+    ruin_level: float,
+) -> tuple[np.ndarray, ...]:
+    """Max drawdown, ruin, longest recovery, whether it ended below its
+    peak and the final log balance of rows paths"""
+    log_balance = np.cumsum(
+        growth[rng.integers(0, len(growth), (rows, trades))], axis=1
+    )
+    # the starting balance is the first peak
+    peak = np.maximum(np.maximum.accumulate(log_balance, axis=1), 0.0)
+    below = log_balance - peak
+    max_drawdown = -np.expm1(below.min(axis=1))
+    ruined = log_balance.min(axis=1) <= ruin_level
+    underwater = below < 0
+    steps = np.arange(1, trades + 1, dtype=np.int32)
+    last_peak = np.maximum.accumulate(
+        np.where(underwater, 0, steps).astype(np.int32), axis=1
+    )
+    longest = (steps - last_peak).max(axis=1)
+    return (
+        max_drawdown,
+        ruined,
+        longest,
+        underwater[:, -1],
+        log_balance[:, -1],
+    )
+
+
+def simulate(
+    r: np.ndarray,
+    paths: int = 100_000,
+    trades: Optional[int] = None,
+    risk: float = RISK,
+    ruin: float = RUIN,
+    seed: int = 0,
+    per_day: Optional[float] = None,
+    chunk_elements: int = CHUNK_ELEMENTS,
+) -> RiskReport:
+    """Bootstraps paths of trades from the R multiples r, as many
+    trades as r by default"""
+    r = np.asarray(r, dtype=np.float64)
+    if len(r) == 0:
+        raise ValueError("No trades to simulate")
+    if paths < 1:
+        raise ValueError("paths must be positive")
+    trades = trades or len(r)
+    with np.errstate(divide="ignore"):
+        # a trade losing more than the balance ruins the path for good
+        growth = np.log(np.maximum(1 + risk * r, 0.0))
+    ruin_level = np.log(1 - ruin) if ruin < 1 else -np.inf
+    rng = np.random.default_rng(seed)
+    rows = max(1, chunk_elements // trades)
+    results = [[] for _ in range(5)]
+    for start in range(0, paths, rows):
+        chunk = simulate_paths(
+            growth, min(rows, paths - start), trades, rng, ruin_level
+        )
+        for result, values in zip(results, chunk):
+            result.append(values)
+    (
+        max_drawdown,
+        ruined,
+        longest,
+        unrecovered,
+        log_final,
+    ) = (np.concatenate(result) for result in results)
+    recovery_days = None
+    if per_day:
+        recovery_days = percentiles(longest / per_day)
+    return RiskReport(
+        paths=paths,
+        trades=trades,
+        sampled_trades=len(r),
+        risk=risk,
+        ruin=ruin,
+        risk_of_ruin=float(ruined.mean()),
+        unrecovered=float(unrecovered.mean()),
+        max_drawdown=percentiles(max_drawdown),
+        recovery_trades=percentiles(longest),
+        final_return=percentiles(np.expm1(log_final)),
+        recovery_days=recovery_days,
+    )
+
+
+class RiskSimulationService:
+    """Simulates the closed trades, the reports and the account balance
+    they are rebuilt from are cached on the version of the trade history
+    so a repeated request only costs the version lookup. A balance moved
+    by financing alone is read again once the next trade closes."""
+
+    def __init__(
+        self,
+        uow: MongoUnitOfWork,
+        pool: Optional[ComputePool] = None,
+        cache_size: int = 32,
+    ) -> None:
+        self._uow: MongoUnitOfWork = uow
+        self.pool = pool
+        self.cache_size = cache_size
+        self._cache: OrderedDict = OrderedDict()
+        self._balance: Optional[tuple[str, float]] = None
+
+    async def simulate(
+        self,
+        paths: int = 100_000,
+        trades: Optional[int] = None,
+        ruin: float = RUIN,
+        seed: int = 0,
+    ) -> RiskReport:
+        version = await self._uow.trade_repository.get_history_version()
+        if self._balance is None or self._balance[0] != version:
+            balance = await self._uow.fxcm_connection.get_account_balance()
+            self._balance = (version, float(balance))
+        balance = self._balance[1]
+        key = (version, paths, trades, ruin, seed)
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            return self._cache[key]
+        history = await self._uow.trade_repository.get_all()
+        r = r_multiples(history, balance)
+        if len(r) == 0:
+            raise NotFound("No closed trades to simulate")
+        arguments = (r, paths, trades, RISK, ruin, seed)
+        arguments += (trades_per_day(history),)
+        if self.pool is not None:
+            report = await self.pool.run(simulate, *arguments)
+        else:
+            report = simulate(*arguments)
+        report.version = version
+        logger.info(
+            "Simulated %s paths of %s trades for trade history %s"
+            % (report.paths, report.trades, version)
+        )
+        self._cache[key] = report
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return report
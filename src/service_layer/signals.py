@@ -0,0 +1,145 @@
+"""Fibonacci, moving average and adx signal on arrays
+
+evaluate_signal gives the Signal, ATR_Stop and ATR_Limit columns of a
+frame. With tail it evaluates only the newest bars, which is all a live
+cycle reads, without it the whole history as a replay needs. Both go
+through the same masks, so the bars they share get the same values.
+"""
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+from pandas import DataFrame
+
+from src.service_layer import indicator_pipeline as pipeline
+
+FIB_LEVELS = ["Fib_23.6", "Fib_38.2", "Fib_50.0", "Fib_61.8"]
+SIGNAL_INPUTS = [
+    "close",
+    "prev_close",
+    "MA",
+    "adx",
+    "plus_di",
+    "minus_di",
+    "atr",
+    *FIB_LEVELS,
+]
+SIGNAL_COLUMNS = ["Signal", "ATR_Stop", "ATR_Limit"]
+
+# bars of candles a live cycle evaluates the signal on
+SIGNAL_BARS = 250
+
+MA_PERIOD = 5
+STOP_ATR = 3
+LIMIT_ATR = 4
+ADX_TREND = 25
+# the trailing stop of manage_trades_handler, moved only once it clears
+# the entry by the half spread times the buffer
+TRAILING_ATR = 2
+SPREAD_BUFFER = 1.25
+# share of the balance a trade risks at its stop
+RISK = 2 / 100
+
+
+@dataclass(frozen=True)
+class StrategyParameters:
+    """The constants of the signal, the trailing stop and the sizing"""
+
+    ma_period: int = MA_PERIOD
+    adx_trend: float = ADX_TREND
+    stop_atr: float = STOP_ATR
+    limit_atr: float = LIMIT_ATR
+    trailing_atr: float = TRAILING_ATR
+    risk: float = RISK
+
+
+def signal_indicators(
+    window: Optional[int] = None,
+    cache: Optional[pipeline.IndicatorCache] = None,
+    ma_period: int = MA_PERIOD,
+) -> pipeline.IndicatorPipeline:
+    """The indicators the signal reads
+
+    A live cycle takes the fibonacci levels over the bars it fetched,
+    with window each bar takes them over the window bars ending at it,
+    as a replay of the whole history needs.
+    """
+    return pipeline.IndicatorPipeline(
+        pipeline.sma(ma_period, name="MA"),
+        pipeline.fibonacci(window=window),
+        pipeline.rsi(14),
+        pipeline.macd(),
+        pipeline.atr(14),
+        pipeline.adx(14),
+        pipeline.prev_close(),
+        cache=cache,
+    )
+
+
+def signal_arrays(
+    close: np.ndarray,
+    prev_close: np.ndarray,
+    levels: np.ndarray,
+    ma: np.ndarray,
+    adx: np.ndarray,
+    plus_di: np.ndarray,
+    minus_di: np.ndarray,
+    atr: np.ndarray,
+    parameters: StrategyParameters = StrategyParameters(),
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """The signal, stop and limit of every bar, levels is shaped
+    (levels, bars)"""
+    crossed_up = ((prev_close <= levels) & (close > levels)).any(axis=0)
+    crossed_down = ((prev_close >= levels) & (close < levels)).any(axis=0)
+    trending = adx > parameters.adx_trend
+    bullish = (
+        crossed_up
+        & (close > levels[0])
+        & (close > ma)
+        & trending
+        & (plus_di > minus_di)
+    )
+    bearish = crossed_down & (close < ma) & trending & (plus_di < minus_di)
+    # a bearish crossing is traded as a buy, a bullish one as a sell
+    signal = bearish.astype(np.int64) - bullish.astype(np.int64)
+    buy, sell = signal == 1, signal == -1
+    stop_atr = parameters.stop_atr * atr
+    limit_atr = parameters.limit_atr * atr
+    stop = np.select([buy, sell], [close - stop_atr, close + stop_atr], np.nan)
+    limit = np.select(
+        [buy, sell], [close + limit_atr, close - limit_atr], np.nan
+    )
+    return signal, stop, limit
+
+
+def evaluate_signal(
+    data: DataFrame,
+    tail: Optional[int] = None,
+    parameters: StrategyParameters = StrategyParameters(),
+) -> DataFrame:
+    """Adds the signal columns to data, or with tail returns the last
+    tail bars of data with their signal columns
+
+    Bars without a signal have a missing stop and limit.
+    """
+    if tail is not None:
+        data = data.iloc[-tail:].copy()
+    columns = {
+        name: data[name].to_numpy(dtype=np.float64) for name in SIGNAL_INPUTS
+    }
+    levels = np.stack([columns[name] for name in FIB_LEVELS])
+    signal, stop, limit = signal_arrays(
+        columns["close"],
+        columns["prev_close"],
+        levels,
+        columns["MA"],
+        columns["adx"],
+        columns["plus_di"],
+        columns["minus_di"],
+        columns["atr"],
+        parameters,
+    )
+    data["Signal"] = signal
+    data["ATR_Stop"] = stop
+    data["ATR_Limit"] = limit
+    return data
@@ -0,0 +1,519 @@
+import math
+from collections import deque
+from typing import Any, Mapping, Optional
+
+NAN = float("nan")
+
+
+def _divide(a: float, b: float) -> float:
+    """Divides the way numpy does, inf or nan instead of raising"""
+    if b == 0:
+        if a == 0 or math.isnan(a):
+            return NAN
+        return math.copysign(math.inf, a) * math.copysign(1.0, b)
+    return a / b
+
+
+def _sign(value: float) -> float:
+    if math.isnan(value):
+        return NAN
+    return float((value > 0) - (value < 0))
+
+
+class ExponentialMean:
+    """Running pandas ewm(...).mean() with ignore_na=False
+
+    Follows the pandas recurrence step for step, so the results match
+    the batch calculation including the handling of missing values and
+    min_periods.
+    """
+
+    def __init__(
+        self, alpha: float, adjust: bool = True, min_periods: int = 0
+    ) -> None:
+        self.alpha = alpha
+        self.adjust = adjust
+        self.min_periods = min_periods
+        self.weighted = NAN
+        self.old_wt = 1.0
+        self.nobs = 0
+        self.count = 0
+
+    def _step(self, value: float) -> tuple[float, float, int]:
+        is_observation = not math.isnan(value)
+        nobs = self.nobs + is_observation
+        if self.count == 0:
+            return value, 1.0, nobs
+        weighted, old_wt = self.weighted, self.old_wt
+        if not math.isnan(weighted):
+            old_wt *= 1 - self.alpha
+            if is_observation:
+                new_wt = 1.0 if self.adjust else self.alpha
+                if weighted != value:
+                    weighted = (old_wt * weighted + new_wt * value) / (
+                        old_wt + new_wt
+                    )
+                old_wt = old_wt + new_wt if self.adjust else 1.0
+        elif is_observation:
+            weighted = value
+        return weighted, old_wt, nobs
+
+    def update(self, value: float, complete: bool = True) -> float:
+        """Adds a value, an incomplete one is not kept"""
+        weighted, old_wt, nobs = self._step(value)
+        if complete:
+            self.weighted, self.old_wt, self.nobs = weighted, old_wt, nobs
+            self.count += 1
+        return weighted if nobs >= self.min_periods else NAN
+
+    def to_dict(self) -> dict:
+        return {
+            "weighted": self.weighted,
+            "old_wt": self.old_wt,
+            "nobs": self.nobs,
+            "count": self.count,
+        }
+
+    def load(self, state: dict) -> None:
+        self.__dict__.update(state)
+
+
+class RollingMean:
+    """Running pandas rolling(window).mean()
+
+    Keeps the values in the window and their sum, which is summed again
+    from scratch every so often so rounding errors cannot build up.
+    """
+
+    RESUM_EVERY = 1000
+
+    def __init__(self, window: int) -> None:
+        self.window = window
+        self.values: deque = deque(maxlen=window)
+        self.total = 0.0
+        self.missing = 0
+        self.updates = 0
+
+    def _window_sum(self, value: float) -> tuple[float, int, int]:
+        """Sum, missing values and size of the window after value"""
+        total, missing = self.total, self.missing
+        size = len(self.values)
+        if size == self.window:
+            oldest = self.values[0]
+            if math.isnan(oldest):
+                missing -= 1
+            else:
+                total -= oldest
+            size -= 1
+        if math.isnan(value):
+            missing += 1
+        else:
+            total += value
+        return total, missing, size + 1
+
+    def update(self, value: float, complete: bool = True) -> float:
+        """Adds a value, an incomplete one is not kept"""
+        total, missing, size = self._window_sum(value)
+        if complete:
+            self.values.append(value)
+            self.updates += 1
+            if self.updates % self.RESUM_EVERY == 0:
+                total = math.fsum(v for v in self.values if not math.isnan(v))
+            self.total, self.missing = total, missing
+        if size < self.window or missing:
+            return NAN
+        return total / self.window
+
+    def to_dict(self) -> dict:
+        return {"values": list(self.values), "updates": self.updates}
+
+    def load(self, state: dict) -> None:
+        self.values = deque(state["values"], maxlen=self.window)
+        self.updates = state["updates"]
+        self.total = math.fsum(v for v in self.values if not math.isnan(v))
+        self.missing = sum(math.isnan(v) for v in self.values)
+
+
+class RollingExtreme:
+    """Running pandas rolling(window).max() or .min()
+
+    A monotonic deque of (index, value) holds the candidates, the front
+    is the extreme of the window, so every update is amortised O(1).
+    """
+
+    def __init__(self, window: int, highest: bool = True) -> None:
+        self.window = window
+        self.highest = highest
+        self.candidates: deque = deque()
+        self.missing: deque = deque()
+        self.index = 0
+
+    def _beats(self, a: float, b: float) -> bool:
+        return a >= b if self.highest else a <= b
+
+    def update(self, value: float, complete: bool = True) -> float:
+        """Adds a value, an incomplete one is not kept"""
+        index = self.index
+        first = index - self.window + 1
+        if complete:
+            if math.isnan(value):
+                self.missing.append(index)
+            else:
+                while self.candidates and self._beats(
+                    value, self.candidates[-1][1]
+                ):
+                    self.candidates.pop()
+                self.candidates.append((index, value))
+            while self.candidates and self.candidates[0][0] < first:
+                self.candidates.popleft()
+            while self.missing and self.missing[0] < first:
+                self.missing.popleft()
+            self.index += 1
+            if index + 1 < self.window or self.missing:
+                return NAN
+            return self.candidates[0][1]
+
+        # an incomplete value competes with the kept values still in
+        # the window without changing them
+        if index + 1 < self.window or math.isnan(value):
+            return NAN
+        if self.missing and self.missing[-1] >= first:
+            return NAN
+        for i, kept in self.candidates:
+            if i >= first:
+                return kept if self._beats(kept, value) else value
+        return value
+
+    def to_dict(self) -> dict:
+        return {
+            "candidates": [list(c) for c in self.candidates],
+            "missing": list(self.missing),
+            "index": self.index,
+        }
+
+    def load(self, state: dict) -> None:
+        self.candidates = deque(tuple(c) for c in state["candidates"])
+        self.missing = deque(state["missing"])
+        self.index = state["index"]
+
+
+class StreamingIndicator:
+    """Base of the incremental indicators
+
+    update takes one bar, a mapping with open, high, low, close and
+    volume, and returns the new values keyed by the column names the
+    batch Indicators use. A bar with complete=False is the still
+    forming candle, its values are returned but nothing is kept, so it
+    can be updated as often as needed before the completed bar is
+    added.
+    """
+
+    def __init__(self, **params: Any) -> None:
+        self.params = params
+
+    def update(
+        self, bar: Mapping[str, float], complete: bool = True
+    ) -> dict[str, float]:
+        raise NotImplementedError
+
+    def _parts(self) -> dict[str, Any]:
+        """The running calculations that make up the state"""
+        return {
+            name: value
+            for name, value in vars(self).items()
+            if hasattr(value, "to_dict")
+        }
+
+    def _scalars(self) -> dict[str, Any]:
+        return {}
+
+    def to_dict(self) -> dict:
+        """Serialises the indicator into json friendly values"""
+        return {
+            "type": type(self).__name__,
+            "params": self.params,
+            "state": {
+                **{n: p.to_dict() for n, p in self._parts().items()},
+                **self._scalars(),
+            },
+        }
+
+    def load(self, state: dict) -> None:
+        for name, part in self._parts().items():
+            part.load(state[name])
+        for name in self._scalars():
+            setattr(self, name, state[name])
+
+    @staticmethod
+    def from_dict(data: dict) -> "StreamingIndicator":
+        """Rebuilds an indicator from to_dict"""
+        indicator = STREAMING_INDICATORS[data["type"]](**data["params"])
+        indicator.load(data["state"])
+        return indicator
+
+
+class StreamingSMA(StreamingIndicator):
+    def __init__(
+        self,
+        period: int,
+        col: str = "close",
+        column_name: Optional[str] = None,
+    ) -> None:
+        super().__init__(period=period, col=col, column_name=column_name)
+        self.col = col
+        self.name = column_name or "SMA" + str(period)
+        self.mean = RollingMean(period)
+
+    def update(self, bar, complete=True):
+        return {self.name: self.mean.update(bar[self.col], complete)}
+
+
+class StreamingEMA(StreamingIndicator):
+    """Matches get_exponential_moving_average, whose period is the
+    centre of mass of the pandas ewm"""
+
+    def __init__(self, period: int, col: str = "close") -> None:
+        super().__init__(period=period, col=col)
+        self.col = col
+        self.name = "EMA" + str(period)
+        self.mean = ExponentialMean(1 / (1 + period))
+
+    def update(self, bar, complete=True):
+        return {self.name: self.mean.update(bar[self.col], complete)}
+
+
+class StreamingMACD(StreamingIndicator):
+    def __init__(
+        self,
+        col: str = "close",
+        fast: int = 12,
+        slow: int = 26,
+        signal: int = 9,
+    ) -> None:
+        super().__init__(col=col, fast=fast, slow=slow, signal=signal)
+        self.col = col
+        self.fast = ExponentialMean(2 / (fast + 1), False, fast)
+        self.slow = ExponentialMean(2 / (slow + 1), False, slow)
+        self.signal = ExponentialMean(2 / (signal + 1), False, signal)
+
+    def update(self, bar, complete=True):
+        value = bar[self.col]
+        macd = self.fast.update(value, complete) - self.slow.update(
+            value, complete
+        )
+        macd_s = self.signal.update(macd, complete)
+        return {"macd": macd, "macd_h": macd - macd_s, "macd_s": macd_s}
+
+
+class StreamingStochastic(StreamingIndicator):
+    def __init__(
+        self,
+        period: int = 14,
+        d_cal_period: int = 3,
+        high_col: str = "high",
+        low_col: str = "low",
+        close_col: str = "close",
+    ) -> None:
+        super().__init__(
+            period=period,
+            d_cal_period=d_cal_period,
+            high_col=high_col,
+            low_col=low_col,
+            close_col=close_col,
+        )
+        self.cols = (high_col, low_col, close_col)
+        self.high = RollingExtreme(period, highest=True)
+        self.low = RollingExtreme(period, highest=False)
+        self.d = RollingMean(d_cal_period)
+
+    def update(self, bar, complete=True):
+        high_col, low_col, close_col = self.cols
+        high = self.high.update(bar[high_col], complete)
+        low = self.low.update(bar[low_col], complete)
+        k = _divide((bar[close_col] - low) * 100, high - low)
+        return {"%K": k, "%D": self.d.update(k, complete)}
+
+
+class StreamingRSI(StreamingIndicator):
+    def __init__(self, period: int = 14, ema: bool = True) -> None:
+        super().__init__(period=period, ema=ema)
+        if ema:
+            self.up = ExponentialMean(1 / period, True, period)
+            self.down = ExponentialMean(1 / period, True, period)
+        else:
+            self.up = RollingMean(period)
+            self.down = RollingMean(period)
+        self.prev_close = NAN
+
+    def _scalars(self):
+        return {"prev_close": self.prev_close}
+
+    def update(self, bar, complete=True):
+        delta = bar["close"] - self.prev_close
+        up = self.up.update(
+            max(delta, 0.0) if delta == delta else NAN, complete
+        )
+        down = self.down.update(
+            -min(delta, 0.0) if delta == delta else NAN, complete
+        )
+        if complete:
+            self.prev_close = bar["close"]
+        return {"rsi": 100 - 100 / (1 + _divide(up, down))}
+
+
+def _true_range(high: float, low: float, prev_close: float) -> float:
+    """The largest of the ranges, skipping the ones without a previous
+    close like DataFrame.max does"""
+    if math.isnan(prev_close):
+        return high - low
+    return max(high - low, abs(high - prev_close), abs(low - prev_close))
+
+
+class StreamingATR(StreamingIndicator):
+    def __init__(
+        self,
+        period: int = 14,
+        close: str = "close",
+        high: str = "high",
+        low: str = "low",
+    ) -> None:
+        super().__init__(period=period, close=close, high=high, low=low)
+        self.cols = (high, low, close)
+        self.mean = RollingMean(period)
+        self.prev_close = NAN
+
+    def _scalars(self):
+        return {"prev_close": self.prev_close}
+
+    def update(self, bar, complete=True):
+        high_col, low_col, close_col = self.cols
+        true_range = _true_range(bar[high_col], bar[low_col], self.prev_close)
+        atr = self.mean.update(true_range, complete)
+        if complete:
+            self.prev_close = bar[close_col]
+        return {"atr": atr}
+
+
+class StreamingADX(StreamingIndicator):
+    def __init__(
+        self,
+        period: int = 20,
+        close: str = "close",
+        high: str = "high",
+        low: str = "low",
+    ) -> None:
+        super().__init__(period=period, close=close, high=high, low=low)
+        self.period = period
+        self.cols = (high, low, close)
+        self.atr = RollingMean(period)
+        self.plus_dm = ExponentialMean(1 / period)
+        self.minus_dm = ExponentialMean(1 / period)
+        self.adx = ExponentialMean(1 / period)
+        self.prev = (NAN, NAN, NAN)
+        self.prev_dx = NAN
+
+    def _scalars(self):
+        return {"prev": list(self.prev), "prev_dx": self.prev_dx}
+
+    def load(self, state):
+        super().load(state)
+        self.prev = tuple(self.prev)
+
+    def update(self, bar, complete=True):
+        high_col, low_col, close_col = self.cols
+        high, low, close = bar[high_col], bar[low_col], bar[close_col]
+        prev_high, prev_low, prev_close = self.prev
+        plus_dm = high - prev_high
+        minus_dm = low - prev_low
+        if plus_dm < 0:
+            plus_dm = 0.0
+        if minus_dm > 0:
+            minus_dm = 0.0
+
+        atr = self.atr.update(_true_range(high, low, prev_close), complete)
+        plus_di = 100 * _divide(self.plus_dm.update(plus_dm, complete), atr)
+        minus_di = abs(
+            100 * _divide(self.minus_dm.update(minus_dm, complete), atr)
+        )
+        dx = _divide(abs(plus_di - minus_di), abs(plus_di + minus_di)) * 100
+        adx = (self.prev_dx * (self.period - 1) + dx) / self.period
+        adx_smooth = self.adx.update(adx, complete)
+        if complete:
+            self.prev = (high, low, close)
+            self.prev_dx = dx
+        return {"plus_di": plus_di, "minus_di": minus_di, "adx": adx_smooth}
+
+
+class StreamingOBV(StreamingIndicator):
+    def __init__(self, close: str = "close", volume: str = "volume") -> None:
+        super().__init__(close=close, volume=volume)
+        self.cols = (close, volume)
+        self.obv = 0.0
+        self.prev_close = NAN
+
+    def _scalars(self):
+        return {"obv": self.obv, "prev_close": self.prev_close}
+
+    def update(self, bar, complete=True):
+        close_col, volume_col = self.cols
+        step = _sign(bar[close_col] - self.prev_close) * bar[volume_col]
+        obv = self.obv + (0.0 if math.isnan(step) else step)
+        if complete:
+            self.obv = obv
+            self.prev_close = bar[close_col]
+        return {"obv": obv}
+
+
+STREAMING_INDICATORS: dict[str, type[StreamingIndicator]] = {
+    cls.__name__: cls
+    for cls in (
+        StreamingSMA,
+        StreamingEMA,
+        StreamingMACD,
+        StreamingStochastic,
+        StreamingRSI,
+        StreamingATR,
+        StreamingADX,
+        StreamingOBV,
+    )
+}
+
+
+class StreamingIndicatorSet:
+    """The incremental indicators of one instrument and period
+
+    Remembers the time of the last completed bar, so after restoring
+    the state only the bars after it need to be added.
+    """
+
+    def __init__(self, indicators: list[StreamingIndicator]) -> None:
+        self.indicators = indicators
+        self.last_time: Optional[str] = None
+
+    def update(
+        self,
+        bar: Mapping[str, float],
+        complete: bool = True,
+        time: Optional[str] = None,
+    ) -> dict[str, float]:
+        """Adds a bar to every indicator, returns all their values"""
+        values: dict[str, float] = {}
+        for indicator in self.indicators:
+            values.update(indicator.update(bar, complete))
+        if complete and time is not None:
+            self.last_time = str(time)
+        return values
+
+    def to_dict(self) -> dict:
+        return {
+            "last_time": self.last_time,
+            "indicators": [i.to_dict() for i in self.indicators],
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "StreamingIndicatorSet":
+        indicator_set = cls(
+            [StreamingIndicator.from_dict(i) for i in data["indicators"]]
+        )
+        indicator_set.last_time = data["last_time"]
+        return indicator_set
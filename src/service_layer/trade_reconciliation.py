@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING
+
+from src.config import PositionEnum
+from src.domain.trade import Trade
+from src.logger import get_logger
+
+if TYPE_CHECKING:
+    from src.service_layer.uow import MongoUnitOfWork
+
+logger = get_logger(__name__)
+
+
+@dataclass
+class ReconciliationReport:
+    tracked: int = 0
+    still_open: int = 0
+    closed: list[str] = field(default_factory=list)
+    missing_at_broker: list[str] = field(default_factory=list)
+    untracked_at_broker: list[str] = field(default_factory=list)
+    failed: list[str] = field(default_factory=list)
+    updated: int = 0
+    duration: float = 0.0
+
+    @property
+    def drift(self) -> int:
+        """Number of trades only one side knows about"""
+        return len(self.missing_at_broker) + len(self.untracked_at_broker)
+
+
+class TradeReconciler:
+    """Brings the stored trades in line with the broker
+
+    The state of every tracked trade is fetched in one filtered request
+    per cycle, joined on trade id against the open trades in the
+    repository and the closed ones are written back in a single bulk
+    update.
+    """
+
+    def __init__(self, uow: MongoUnitOfWork) -> None:
+        self.uow = uow
+
+    async def reconcile(self) -> ReconciliationReport:
+        """Reconcile the open trades, returns what changed"""
+        started = time.perf_counter()
+        report = ReconciliationReport()
+        open_trades: list[Trade] = (
+            await self.uow.trade_repository.get_open_trades()
+        )
+        tracked = {str(trade.trade_id): trade for trade in open_trades}
+        report.tracked = len(tracked)
+
+        broker_trades = (
+            await self.uow.fxcm_connection.get_trades_by_ids(list(tracked))
+            if tracked
+            else {}
+        )
+
+        closed_trades = []
+        for trade_id, trade in tracked.items():
+            if trade_id not in broker_trades:
+                report.missing_at_broker.append(trade_id)
+                continue
+            # one bad broker record must not hold back the other trades
+            try:
+                state, realised_pl = broker_trades[trade_id]
+                if state == "OPEN":
+                    report.still_open += 1
+                    continue
+                is_winner = True if realised_pl > 0 else False
+            except Exception as e:
+                report.failed.append(trade_id)
+                logger.error(
+                    "Failed to reconcile trade %s from %r: %r"
+                    % (trade_id, broker_trades[trade_id], e)
+                )
+                continue
+            trade.position = PositionEnum.CLOSED
+            trade.realised_pl = realised_pl
+            trade.is_winner = is_winner
+            closed_trades.append(trade)
+            report.closed.append(trade_id)
+            logger.warning("Trade %s closed" % trade_id)
+
+        report.updated = (
+            await self.uow.trade_repository.bulk_update_closed_trades(
+                closed_trades
+            )
+        )
+
+        open_at_broker = await self.uow.fxcm_connection.get_open_trade_ids()
+        if open_at_broker is not None:
+            report.untracked_at_broker = sorted(
+                open_at_broker - tracked.keys()
+            )
+
+        report.duration = time.perf_counter() - started
+        logger.info(
+            "Reconciled %s trades in %.3fs: %s closed, %s open, "
+            "%s missing at broker, %s untracked at broker, %s failed"
+            % (
+                report.tracked,
+                report.duration,
+                len(report.closed),
+                report.still_open,
+                len(report.missing_at_broker),
+                len(report.untracked_at_broker),
+                len(report.failed),
+            )
+        )
+        return report
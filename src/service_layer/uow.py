@@ -6,8 +6,13 @@ from src.adapters.database.repositories.fundamental_repository import (
     FundamentalDataRepository,
 )
 from src.adapters.database.repositories.trade_repository import TradeRepository
+from src.adapters.database.repositories.memory_repository import (
+    InMemoryFundamentalDataRepository,
+    InMemoryTradeRepository,
+)
 from src.adapters.fxcm_connect.base_trade_connect import BaseTradeConnect
 
+from src.service_layer.conversion_rates import ConversionRateService
 from src.service_layer.event_bus import TradingEventBus
 from src.service_layer.handlers import handlers
 from typing import TYPE_CHECKING
@@ -68,14 +73,25 @@ class MongoUnitOfWork(AbstractUnitOfWork):
         else:
             logger.info("Using local MongoDB")
             self.host = f"mongodb://localhost"
-        self.event_bus = TradingEventBus(uow=self)
+        self.event_bus = TradingEventBus(
+            uow=self,
+            partitions=int(os.environ.get("EVENT_BUS_PARTITIONS", 0)),
+            maxsize=int(os.environ.get("EVENT_BUS_QUEUE_SIZE", 100)),
+        )
         self.fundamental_data_repository: FundamentalDataRepository = (
             FundamentalDataRepository()
         )
 
         self.trade_repository: TradeRepository = TradeRepository()
         self.fxcm_connection: BaseTradeConnect = fxcm_connection
+        self.conversion_rates = ConversionRateService(
+            fxcm_connection,
+            ttl=float(os.environ.get("CONVERSION_RATE_TTL", 5)),
+        )
         self.scraper: "BaseScraper" = scraper
+        # the handlers of a partitioned event bus enter concurrently, the
+        # last one out disconnects
+        self.entered = 0
 
     def refresh_connection_id(self):
         while True:
@@ -90,10 +106,47 @@ class MongoUnitOfWork(AbstractUnitOfWork):
             time.sleep(30 * 60)
 
     async def __aenter__(self):
-        self.client = connect(self.db_name, host=self.host)
+        if self.entered == 0:
+            self.client = connect(self.db_name, host=self.host)
+        self.entered += 1
+
+    async def __aexit__(self, *args):
+        self.entered -= 1
+        if self.entered == 0:
+            disconnect()
+
+    async def publish(self, event):
+        await self.event_bus.publish(event)
+
+
+class InMemoryUnitOfWork(AbstractUnitOfWork):
+    """A unit of work over repositories kept in memory, for running the
+    handlers without a database"""
+
+    def __init__(
+        self,
+        fxcm_connection: BaseTradeConnect,
+        scraper: "BaseScraper",
+        handlers: dict = handlers,
+        conversion_rate_ttl: float = 0,
+    ):
+        self.event_bus = TradingEventBus(uow=self)
+        self.fundamental_data_repository = InMemoryFundamentalDataRepository()
+        self.trade_repository = InMemoryTradeRepository()
+        self.fxcm_connection: BaseTradeConnect = fxcm_connection
+        self.conversion_rates = ConversionRateService(
+            fxcm_connection, ttl=conversion_rate_ttl
+        )
+        self.scraper: "BaseScraper" = scraper
+
+        for event, handler in handlers.items():
+            self.event_bus.subscribe(event, handler)
+
+    async def __aenter__(self):
+        return self
 
     async def __aexit__(self, *args):
-        disconnect()
+        pass
 
     async def publish(self, event):
         await self.event_bus.publish(event)
@@ -0,0 +1,64 @@
+"""Backtest of every pair over years of five minute candles
+
+The candles are random walks with a date column, each pair is
+simulated inline and on a process pool.
+
+Run with python -m test.benchmarks.bench_backtest --years 3
+"""
+import argparse
+import asyncio
+import time
+
+import pandas as pd
+
+from src.config import ForexPairEnum
+from src.service_layer.backtest import Backtester
+from src.service_layer.compute_pool import ComputePool
+from test.benchmarks.bench_indicators import random_walk
+
+# five minute bars in a year of trading days
+BARS_PER_YEAR = 52 * 5 * 288
+
+
+def history(years: float) -> dict[ForexPairEnum, pd.DataFrame]:
+    bars = int(years * BARS_PER_YEAR)
+    frames = {}
+    for seed, pair in enumerate(ForexPairEnum):
+        frame = random_walk(bars, seed)
+        frame.insert(
+            0, "date", pd.date_range("2020-01-01", periods=bars, freq="5min")
+        )
+        frames[pair] = frame
+    return frames
+
+
+async def measure(mode: str, candles: dict) -> tuple[float, dict]:
+    pool = None
+    if mode != "inline":
+        pool = ComputePool(mode)
+        await pool.start()
+    started = time.perf_counter()
+    result = await Backtester(spread_pips=1.0, pool=pool).run(candles)
+    elapsed = time.perf_counter() - started
+    if pool is not None:
+        await pool.shutdown()
+    return elapsed, result.summary()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--years", type=float, default=3)
+    args = parser.parse_args()
+    candles = history(args.years)
+    bars = sum(len(frame) for frame in candles.values())
+    print("%s pairs, %s bars" % (len(candles), bars))
+    for mode in ("inline", "process"):
+        elapsed, summary = asyncio.run(measure(mode, candles))
+        print(
+            "%-8s %8.2fs %12.0f bars/s %7s trades"
+            % (mode, elapsed, bars / elapsed, summary["trades"])
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""Compares the columnar candle parser with the row by row refinement
+
+Run with python -m test.benchmarks.bench_candle_parser
+"""
+import json
+import timeit
+
+from src.adapters.fxcm_connect.candle_parser import parse_candles
+from test.candle_reference import refine_with_dicts
+
+SIZES = [250, 5_000, 50_000]
+SOURCES = ["test/data.json", "test/oanda_data.json"]
+
+
+def tile(candles: list[dict], number: int) -> dict:
+    """Repeats the sample candles up to number candles"""
+    repeats = number // len(candles) + 1
+    return {"candles": (candles * repeats)[:number]}
+
+
+def best_of(func, data: dict, repeat: int = 5) -> float:
+    """The fastest of repeat runs in milliseconds"""
+    number = max(1, 5_000 // len(data["candles"]))
+    runs = timeit.repeat(lambda: func(data), number=number, repeat=repeat)
+    return min(runs) / number * 1000
+
+
+def main() -> None:
+    print("%-22s %8s %10s %10s %8s" % ("", "n", "dicts", "columns", "x"))
+    for source in SOURCES:
+        with open(source) as f:
+            candles = json.load(f)["candles"]
+        for size in SIZES:
+            data = tile(candles, size)
+            rows = best_of(refine_with_dicts, data)
+            columns = best_of(parse_candles, data)
+            print(
+                "%-22s %8s %8.2fms %8.2fms %7.1fx"
+                % (source, size, rows, columns, rows / columns)
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Api latency while a technical signal cycle computes its indicators
+
+The cycle runs inline on the event loop, on a thread pool and on a
+process pool while requests keep arriving, the latency middleware
+records how long each took.
+
+Run with python -m test.benchmarks.bench_compute_pool
+"""
+import asyncio
+import time
+
+from fastapi import FastAPI
+
+from src.config import ForexPairEnum
+from src.entry_points.latency import LatencyRecorder, add_latency_middleware
+from src.entry_points.scheduler.get_technical_signal import SIGNAL_INDICATORS
+from src.service_layer.compute_pool import ComputePool
+from src.service_layer.indicator_panel import CandlePanel
+from src.service_layer.indicators import Indicators
+from test.benchmarks.bench_indicators import random_walk
+from test.test_entry_points.test_latency import get
+
+BARS = 50_000
+CYCLES = 5
+
+
+async def measure(mode: str, panel: CandlePanel) -> tuple[float, dict]:
+    recorder = LatencyRecorder()
+    app = FastAPI()
+    add_latency_middleware(app, recorder)
+
+    @app.get("/ping")
+    async def ping():
+        return "pong"
+
+    pool = ComputePool(mode)
+    await pool.start()
+    indicators = Indicators(pool=pool)
+
+    async def cycles() -> None:
+        for _ in range(CYCLES):
+            await indicators.run_pipeline(SIGNAL_INDICATORS, panel)
+
+    started = time.perf_counter()
+    work = asyncio.create_task(cycles())
+    while not work.done():
+        await get(app, "/ping")
+        await asyncio.sleep(0.001)
+    await work
+    elapsed = time.perf_counter() - started
+    await pool.shutdown()
+    return elapsed, recorder.summary()
+
+
+def main() -> None:
+    panel = CandlePanel.from_frames(
+        {
+            pair: random_walk(BARS, seed)
+            for seed, pair in enumerate(ForexPairEnum)
+        }
+    )
+    print("%s pairs x %s bars, %s cycles" % (len(panel.pairs), BARS, CYCLES))
+    print(
+        "%-8s %8s %9s %9s %9s %9s"
+        % ("", "cycles", "requests", "p50", "p99", "max")
+    )
+    for mode in ("inline", "thread", "process"):
+        elapsed, summary = asyncio.run(measure(mode, panel))
+        print(
+            "%-8s %7.2fs %9s %7.2fms %7.2fms %7.2fms"
+            % (
+                mode,
+                elapsed,
+                summary["count"],
+                summary["p50"],
+                summary["p99"],
+                summary["max"],
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
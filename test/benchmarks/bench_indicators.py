@@ -0,0 +1,123 @@
+"""Compares the pandas and numpy indicator backends
+
+Run with python -m test.benchmarks.bench_indicators
+"""
+
+import asyncio
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.config import ForexPairEnum
+from src.entry_points.scheduler.get_technical_signal import add_indicators
+from src.service_layer.indicator_panel import CandlePanel
+from src.service_layer.indicators import Indicators
+
+SIZES = [250, 1_000_000]
+METHODS = [
+    ("get_simple_moving_average", (20, "close")),
+    ("get_exponential_moving_average", (20, "close")),
+    ("get_macd", ("close",)),
+    ("get_stocastic", ()),
+    ("get_rsi", ()),
+    ("get_bollinger", ()),
+    ("get_adx", ()),
+    ("get_atr", ()),
+    ("get_obv", ()),
+    ("get_accumulation_distribution", ()),
+]
+
+
+def random_walk(number: int, seed: int = 0) -> pd.DataFrame:
+    """Candles around a random walk close"""
+    rng = np.random.default_rng(seed)
+    close = 1.1 + np.cumsum(rng.normal(0, 0.0005, number))
+    spread = np.abs(rng.normal(0, 0.0003, (2, number)))
+    return pd.DataFrame(
+        {
+            "open": np.roll(close, 1),
+            "high": close + spread[0],
+            "low": close - spread[1],
+            "close": close,
+            "volume": rng.integers(1, 1_000, number).astype(float),
+        }
+    )
+
+
+def best_of(method, data: pd.DataFrame, args, backend: str) -> float:
+    """The fastest run in milliseconds"""
+    loop = asyncio.new_event_loop()
+    repeat = max(3, min(200, 200_000 // len(data)))
+    runs = []
+    for _ in range(repeat):
+        frame = data.copy()
+        started = time.perf_counter()
+        loop.run_until_complete(method(frame, *args, backend=backend))
+        runs.append(time.perf_counter() - started)
+    loop.close()
+    return min(runs) * 1000
+
+
+def main() -> None:
+    indicators = Indicators()
+    print("%-32s %9s %10s %10s %8s" % ("", "n", "pandas", "numpy", "x"))
+    for size in SIZES:
+        data = random_walk(size)
+        for name, args in METHODS:
+            method = getattr(indicators, name)
+            if name == "get_accumulation_distribution" and size > 100_000:
+                # the pandas version loops in python over every row
+                pandas_ms = float("nan")
+            else:
+                pandas_ms = best_of(method, data, args, "pandas")
+            numpy_ms = best_of(method, data, args, "numpy")
+            print(
+                "%-32s %9s %8.2fms %8.2fms %7.1fx"
+                % (name, size, pandas_ms, numpy_ms, pandas_ms / numpy_ms)
+            )
+
+    # the indicators of a technical signal cycle, pair by pair on pandas
+    # against every pair at once on a panel
+    frames = {
+        pair: random_walk(250, seed) for seed, pair in enumerate(ForexPairEnum)
+    }
+    loop = asyncio.new_event_loop()
+
+    async def per_pair() -> None:
+        for frame in frames.values():
+            frame = frame.copy()
+            frame = await indicators.get_simple_moving_average(
+                frame, 5, "close"
+            )
+            frame = await indicators.fibonacci_retracements(frame)
+            frame = await indicators.get_rsi(frame, period=14)
+            frame = await indicators.get_macd(frame, "close")
+            frame = await indicators.get_atr(frame, period=14)
+            await indicators.get_adx(frame, period=14)
+
+    async def panel() -> None:
+        await add_indicators(indicators, CandlePanel.from_frames(frames))
+
+    timings = []
+    for cycle in (per_pair, panel):
+        runs = []
+        for _ in range(20):
+            started = time.perf_counter()
+            loop.run_until_complete(cycle())
+            runs.append(time.perf_counter() - started)
+        timings.append(min(runs) * 1000)
+    loop.close()
+    print(
+        "%-32s %9s %8.2fms %8.2fms %7.1fx"
+        % (
+            "signal cycle, pairs x 250",
+            len(frames),
+            *timings,
+            timings[0] / timings[1],
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
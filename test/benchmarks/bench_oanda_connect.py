@@ -0,0 +1,66 @@
+"""Drives the Oanda connection against the local fake v20 api
+
+Fetches candles for every pair concurrently, the way the scheduler jobs
+do, under the configured latency and error rate, and prints the
+throughput with the latency and throttle counters of the governor.
+
+Run with python -m test.benchmarks.bench_oanda_connect
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+
+from src.adapters.fxcm_connect.oanda_connect import OandaConnect
+from src.config import ForexPairEnum, PeriodEnum
+from test.fake_v20_server import FakeV20Config, FakeV20Server
+
+
+async def run(config: FakeV20Config, rounds: int, count: int) -> None:
+    async with FakeV20Server(config) as server:
+        os.environ.setdefault("OANDA_TOKEN", "token")
+        os.environ["OANDA_ACCOUNT_ID"] = server.account_id
+        os.environ["OANDA_API_URL"] = server.url
+        connection = OandaConnect()
+        started = time.perf_counter()
+        for _ in range(rounds):
+            await asyncio.gather(
+                *[
+                    connection.request_candles(
+                        pair, PeriodEnum.MINUTE_5, {"count": count}
+                    )
+                    for pair in ForexPairEnum
+                ]
+            )
+        elapsed = time.perf_counter() - started
+        requests = rounds * len(ForexPairEnum)
+        print(
+            "%s requests in %.2fs, %.1f requests/s"
+            % (requests, elapsed, requests / elapsed)
+        )
+        print("server %s" % json.dumps(dict(server.requests), indent=2))
+        print("governor %s" % json.dumps(connection.client.stats(), indent=2))
+        await connection.close_connection()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--count", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--jitter", type=float, default=0.02)
+    parser.add_argument("--error-rate", type=float, default=0.01)
+    parser.add_argument("--rate-limit", type=float, default=None)
+    args = parser.parse_args()
+    config = FakeV20Config(
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        rate_limit=args.rate_limit,
+    )
+    asyncio.run(run(config, args.rounds, args.count))
+
+
+if __name__ == "__main__":
+    main()
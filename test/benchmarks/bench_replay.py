@@ -0,0 +1,44 @@
+"""Replay of the scheduler jobs and the handlers over every pair
+
+The candles are random walks and every currency has flat processed
+fundamental data, the report gives the simulated days per second and
+where the time went.
+
+Run with python -m test.benchmarks.bench_replay --days 2
+"""
+
+import argparse
+import asyncio
+import logging
+from datetime import datetime
+
+from src.config import CurrencyEnum
+from src.domain.fundamental import FundamentalData
+from src.entry_points.scheduler.replay import Replay
+from test.benchmarks.bench_backtest import BARS_PER_YEAR, history
+
+# five minute bars in a day
+BARS_PER_DAY = 288
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--days", type=float, default=2)
+    args = parser.parse_args()
+    # the jobs log every cycle
+    logging.disable(logging.WARNING)
+    candles = history((args.days + 1) * BARS_PER_DAY / BARS_PER_YEAR)
+    fundamental_data = [
+        FundamentalData(
+            currency=currency,
+            last_updated=datetime(2019, 12, 31),
+            processed=True,
+        )
+        for currency in CurrencyEnum
+    ]
+    report = asyncio.run(Replay(candles, fundamental_data).run())
+    print(report.summary())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+"""Times the risk simulation against the paths and the chunk size
+
+Run with python -m test.benchmarks.bench_risk_simulation
+"""
+import timeit
+
+import numpy as np
+
+from src.service_layer.risk_simulation import CHUNK_ELEMENTS, simulate
+
+PATHS = [10_000, 100_000, 500_000]
+CHUNKS = [1 << 16, CHUNK_ELEMENTS, 1 << 24]
+
+
+def best_of(func, repeat: int = 3) -> float:
+    """The fastest of repeat runs in milliseconds"""
+    return min(timeit.repeat(func, number=1, repeat=repeat)) * 1000
+
+
+def main() -> None:
+    # a 45% winner at 2R and losers at 1R, as the signal trades
+    rng = np.random.default_rng(0)
+    r = np.where(rng.random(200) < 0.45, 2.0, -1.0)
+    print("%8s %10s %10s" % ("paths", "chunk", "time"))
+    for paths in PATHS:
+        for chunk in CHUNKS:
+            elapsed = best_of(
+                lambda: simulate(r, paths=paths, chunk_elements=chunk)
+            )
+            print("%8s %10s %8.0fms" % (paths, chunk, elapsed))
+
+
+if __name__ == "__main__":
+    main()
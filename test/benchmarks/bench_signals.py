@@ -0,0 +1,48 @@
+"""Compares the row by row signal with the vectorised and tail modes
+
+Run with python -m test.benchmarks.bench_signals
+"""
+import timeit
+
+from src.config import ForexPairEnum
+from src.service_layer.signals import evaluate_signal
+from test.test_service_layer.test_signals import (
+    random_signal_inputs,
+    signal_with_apply,
+)
+
+SIZES = [250, 20_000]
+
+
+def best_of(func, repeat: int = 5) -> float:
+    """The fastest of repeat runs in milliseconds"""
+    return min(timeit.repeat(func, number=1, repeat=repeat)) * 1000
+
+
+def main() -> None:
+    print("%-10s %8s %10s %10s %10s" % ("", "n", "apply", "vector", "tail"))
+    for size in SIZES:
+        data = random_signal_inputs(size)
+        rows = best_of(lambda: signal_with_apply(data.copy()))
+        vector = best_of(lambda: evaluate_signal(data.copy()))
+        tail = best_of(lambda: evaluate_signal(data, 1))
+        print(
+            "%-10s %8s %8.2fms %8.2fms %8.2fms"
+            % ("one pair", size, rows, vector, tail)
+        )
+
+    # a live cycle evaluates every pair on 250 bars and reads the last
+    frames = [
+        random_signal_inputs(250, seed) for seed, _ in enumerate(ForexPairEnum)
+    ]
+    rows = best_of(lambda: [signal_with_apply(f.copy()) for f in frames])
+    vector = best_of(lambda: [evaluate_signal(f.copy()) for f in frames])
+    tail = best_of(lambda: [evaluate_signal(f, 1) for f in frames])
+    print(
+        "%-10s %8s %8.2fms %8.2fms %8.2fms"
+        % ("cycle", len(frames), rows, vector, tail)
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+"""Times every indicator and the per pair signal pipeline at growing sizes
+
+The candles of test/data.json, tiled to size, and a random walk are
+timed at each size on both indicator backends. Each result has the best
+time and the peak memory allocated while it ran. The results are saved
+as json, and a previous file can be compared against them.
+
+python -m test.benchmarks.bench_suite --sizes 250 10000 100000 1000000
+python -m test.benchmarks.bench_suite --compare results/<commit>.json
+"""
+import argparse
+import asyncio
+import inspect
+import json
+import os
+import platform
+import subprocess
+import time
+import tracemalloc
+from typing import Callable, Optional
+
+import numpy as np
+import pandas as pd
+
+from src.adapters.fxcm_connect.candle_parser import parse_candles
+from src.config import ForexPairEnum
+from src.entry_points.scheduler.get_technical_signal import (
+    SIGNAL_INDICATORS,
+    get_signal,
+)
+from src.service_layer.indicators import BACKENDS, PANDAS, Indicators
+from test.benchmarks.bench_candle_parser import tile
+from test.benchmarks.bench_indicators import random_walk
+
+SIZES = [250, 10_000, 100_000, 1_000_000]
+RESULTS = os.path.join(os.path.dirname(__file__), "results")
+# a result this much slower than the compared one is a regression
+REGRESSION = 1.25
+
+ARGS = {
+    "get_simple_moving_average": (20, "close"),
+    "get_exponential_moving_average": (20, "close"),
+    "get_macd": ("close",),
+}
+# the pandas version loops over the rows in python
+PANDAS_LIMITS = {"get_accumulation_distribution": 100_000}
+# methods without a backend choice run once
+SINGLE_BACKEND = {"calculate_pivot_points", "fibonacci_retracements"}
+
+
+def indicator_methods() -> list[str]:
+    """The frame indicators of Indicators"""
+    return [
+        name
+        for name, method in inspect.getmembers(Indicators)
+        if inspect.iscoroutinefunction(method)
+        and (name.startswith("get_") or name in SINGLE_BACKEND)
+        and not name.startswith("get_panel_")
+    ]
+
+
+def sources(size: int) -> dict[str, pd.DataFrame]:
+    with open("test/data.json") as f:
+        candles = json.load(f)["candles"]
+    sample = parse_candles(tile(candles, size))
+    walk = random_walk(size)
+    walk.insert(
+        0, "date", pd.date_range("2023-01-02", periods=size, freq="5min")
+    )
+    return {"data.json": sample, "random_walk": walk}
+
+
+def measure(run: Callable, data: pd.DataFrame) -> tuple[float, int]:
+    """The best time in seconds and the peak bytes allocated by run on a
+    copy of data"""
+    loop = asyncio.new_event_loop()
+    repeat = max(3, min(50, 100_000 // len(data)))
+    times = []
+    for _ in range(repeat):
+        frame = data.copy()
+        started = time.perf_counter()
+        loop.run_until_complete(run(frame))
+        times.append(time.perf_counter() - started)
+    frame = data.copy()
+    tracemalloc.start()
+    loop.run_until_complete(run(frame))
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    loop.close()
+    return min(times), peak
+
+
+async def signal_pipeline(frame: pd.DataFrame) -> pd.DataFrame:
+    """The work get_technical_signal does for one pair once its candles
+    are fetched"""
+    frame = await SIGNAL_INDICATORS.run(frame)
+    return await get_signal(frame, 1)
+
+
+def benchmarks(
+    methods: list[str],
+) -> list[tuple[str, str, Optional[Callable]]]:
+    """(name, backend, run) of everything timed"""
+    indicators = Indicators()
+    runs = []
+    for name in methods:
+        method = getattr(indicators, name)
+        args = ARGS.get(name, ())
+        backends = ["-"] if name in SINGLE_BACKEND else BACKENDS
+        for backend in backends:
+            kwargs = {} if backend == "-" else {"backend": backend}
+
+            async def run(frame, method=method, args=args, kwargs=kwargs):
+                return await method(frame, *args, **kwargs)
+
+            runs.append((name, backend, run))
+    runs.append(("signal_pipeline", "numpy", signal_pipeline))
+    return runs
+
+
+def commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(sizes: list[int], methods: list[str]) -> dict:
+    results = []
+    print(
+        "%-32s %-7s %-12s %9s %11s %11s"
+        % ("", "backend", "source", "bars", "time", "peak")
+    )
+    for size in sizes:
+        for source, data in sources(size).items():
+            for name, backend, run in benchmarks(methods):
+                if backend == PANDAS and size > PANDAS_LIMITS.get(name, size):
+                    continue
+                seconds, peak = measure(run, data)
+                results.append(
+                    {
+                        "name": name,
+                        "backend": backend,
+                        "source": source,
+                        "bars": size,
+                        "seconds": seconds,
+                        "peak_bytes": peak,
+                    }
+                )
+                print(
+                    "%-32s %-7s %-12s %9s %9.3fms %9.2fMB"
+                    % (
+                        name,
+                        backend,
+                        source,
+                        size,
+                        seconds * 1000,
+                        peak / 2**20,
+                    )
+                )
+    return {
+        "commit": commit(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "pairs": len(ForexPairEnum),
+        "results": results,
+    }
+
+
+def compare(report: dict, previous: dict) -> int:
+    """Prints the time ratio of each result to the previous report,
+    returns the number of regressions"""
+
+    def key(result: dict) -> tuple:
+        return (
+            result["name"],
+            result["backend"],
+            result["source"],
+            result["bars"],
+        )
+
+    before = {key(result): result for result in previous["results"]}
+    regressions = 0
+    print(
+        "\ncompared with %s"
+        % (previous.get("commit") or "the previous results")
+    )
+    for result in report["results"]:
+        old = before.get(key(result))
+        if old is None:
+            continue
+        ratio = result["seconds"] / old["seconds"]
+        flag = ""
+        if ratio > REGRESSION:
+            regressions += 1
+            flag = "  slower"
+        print("%-32s %-7s %-12s %9s %7.2fx%s" % (*key(result), ratio, flag))
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", nargs="+", type=int, default=SIZES)
+    parser.add_argument(
+        "--methods",
+        nargs="+",
+        default=None,
+        help="indicator methods to time, every one by default",
+    )
+    parser.add_argument("--output", default=None)
+    parser.add_argument("--compare", default=None)
+    args = parser.parse_args()
+
+    report = run_suite(args.sizes, args.methods or indicator_methods())
+    output = args.output or os.path.join(
+        RESULTS, "%s.json" % (report["commit"] or "results")
+    )
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print("\nsaved %s" % output)
+    if args.compare:
+        with open(args.compare) as f:
+            if compare(report, json.load(f)):
+                raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,21 @@
+"""The row by row candle refinement the columnar parser replaced, kept
+as the reference the parser is tested and benchmarked against"""
+
+import pandas as pd
+
+
+def refine_with_dicts(data: dict) -> pd.DataFrame:
+    """The original row by row refinement"""
+    list_of_candles = []
+    for i in data["candles"]:
+        list_of_candles.append(
+            {
+                "date": i["time"],
+                "open": float(i["mid"]["o"]),
+                "high": float(i["mid"]["h"]),
+                "low": float(i["mid"]["l"]),
+                "close": float(i["mid"]["c"]),
+                "volume": float(i["volume"]),
+            }
+        )
+    return pd.DataFrame(list_of_candles)
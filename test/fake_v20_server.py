@@ -0,0 +1,999 @@
+"""Local stand-in for the Oanda v20 REST and streaming api
+
+Serves candles, pricing, the pricing and transaction streams, orders,
+trades, the account and its changes from deterministic synthetic
+prices, with configurable latency, jitter, error rate and rate limit.
+
+Run on its own with python -m test.fake_v20_server --port 8081 and point
+the app at it with OANDA_API_URL=http://127.0.0.1:8081
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import re
+import time
+import zlib
+from collections import Counter
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Callable, Optional
+from urllib.parse import parse_qsl, unquote, urlsplit
+
+import numpy as np
+
+GRANULARITIES = {
+    "S5": 5,
+    "S10": 10,
+    "S15": 15,
+    "S30": 30,
+    "M1": 60,
+    "M2": 120,
+    "M4": 240,
+    "M5": 300,
+    "M10": 600,
+    "M15": 900,
+    "M30": 1800,
+    "H1": 3600,
+    "H2": 7200,
+    "H3": 10800,
+    "H4": 14400,
+    "H6": 21600,
+    "H8": 28800,
+    "H12": 43200,
+    "D": 86400,
+    "W": 604800,
+    "M": 2592000,
+}
+
+# rough value of each currency in dollars, a pair starts at their ratio
+USD_VALUES = {
+    "USD": 1.0,
+    "EUR": 1.09,
+    "GBP": 1.27,
+    "AUD": 0.67,
+    "NZD": 0.61,
+    "CAD": 0.74,
+    "CHF": 1.12,
+    "JPY": 0.0070,
+}
+
+USER_ID = 1234567
+
+
+@dataclass
+class FakeV20Config:
+    latency: float = 0.0
+    jitter: float = 0.0
+    error_rate: float = 0.0
+    rate_limit: Optional[float] = None
+    seed: int = 0
+    price_interval: float = 0.5
+    heartbeat_interval: float = 5.0
+    balance: float = 100000.0
+    currency: str = "GBP"
+    spread_pips: float = 1.2
+
+
+def pip_size(instrument: str) -> float:
+    return 0.01 if "JPY" in instrument else 0.0001
+
+
+def format_price(instrument: str, price: float) -> str:
+    return "%.3f" % price if "JPY" in instrument else "%.5f" % price
+
+
+def format_time(seconds: float) -> str:
+    """RFC3339 with nanoseconds, the way the v20 api writes times"""
+    moment = datetime.fromtimestamp(seconds, tz=timezone.utc)
+    return moment.strftime("%Y-%m-%dT%H:%M:%S.%f") + "000Z"
+
+
+def parse_time(value: str) -> float:
+    """Parses an RFC3339 or UNIX time into seconds"""
+    if "T" not in value:
+        return float(value)
+    return float(np.datetime64(value.rstrip("Z"), "ns").astype(np.int64) / 1e9)
+
+
+def _uniform(keys: np.ndarray) -> np.ndarray:
+    """Hashes integers into uniform floats in [0, 1), splitmix64"""
+    z = keys.astype(np.uint64) + np.uint64(0x9E3779B97F4A7C15)
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    z = z ^ (z >> np.uint64(31))
+    return (z >> np.uint64(11)).astype(np.float64) / float(1 << 53)
+
+
+class PriceModel:
+    """Deterministic synthetic mid prices addressable by time
+
+    A price is a function of the instrument, the seed and the 5 second
+    step it falls in: a few slow waves plus hashed noise, so any window
+    can be produced without generating the history before it.
+    """
+
+    STEP = 5
+
+    def __init__(self, seed: int = 0) -> None:
+        self.seed = seed
+
+    def _salt(self, instrument: str) -> int:
+        return zlib.crc32(instrument.encode()) ^ (self.seed * 0x9E3779B1)
+
+    def base_price(self, instrument: str) -> float:
+        base, quote = instrument.split("_")
+        return USD_VALUES[base] / USD_VALUES[quote]
+
+    def mid(self, instrument: str, seconds) -> np.ndarray:
+        steps = np.asarray(seconds, dtype=np.float64) // self.STEP
+        salt = self._salt(instrument)
+        phases = _uniform(np.array([salt, salt + 1, salt + 2])) * 2 * np.pi
+        log_move = (
+            0.006 * np.sin(2 * np.pi * steps / 17280 + phases[0])
+            + 0.002 * np.sin(2 * np.pi * steps / 720 + phases[1])
+            + 0.0006 * np.sin(2 * np.pi * steps / 61 + phases[2])
+            + 0.0003
+            * (_uniform(steps.astype(np.int64) * 2654435761 + salt) - 0.5)
+        )
+        return self.base_price(instrument) * np.exp(log_move)
+
+    def quote(
+        self, instrument: str, seconds: float, spread_pips: float
+    ) -> tuple[float, float]:
+        """Returns the bid and ask at a time"""
+        mid = float(self.mid(instrument, [seconds])[0])
+        half_spread = spread_pips * pip_size(instrument) / 2
+        return mid - half_spread, mid + half_spread
+
+    def candles(
+        self,
+        instrument: str,
+        granularity: str,
+        starts: np.ndarray,
+        now: float,
+        components: str = "M",
+        spread_pips: float = 1.2,
+    ) -> list[dict]:
+        """Builds the candles starting at starts, the one holding now is
+        still forming"""
+        size = GRANULARITIES[granularity]
+        samples = max(1, min(size // self.STEP, 60))
+        offsets = np.linspace(0, size - self.STEP, samples)
+        grid = np.minimum(starts[:, None] + offsets[None, :], now)
+        path = self.mid(instrument, grid)
+        ohlc = np.stack(
+            [path[:, 0], path.max(axis=1), path.min(axis=1), path[:, -1]],
+            axis=1,
+        )
+        volumes = 20 + (
+            _uniform(starts.astype(np.int64) + self._salt(instrument)) * 400
+        ).astype(np.int64)
+        half_spread = spread_pips * pip_size(instrument) / 2
+        sides = {
+            "M": ("mid", 0.0),
+            "B": ("bid", -half_spread),
+            "A": ("ask", half_spread),
+        }
+        candles = []
+        for start, row, volume in zip(starts, ohlc, volumes):
+            candle = {
+                "complete": bool(start + size <= now),
+                "volume": int(volume),
+                "time": format_time(float(start)),
+            }
+            for key, (name, shift) in sides.items():
+                if key in components:
+                    candle[name] = {
+                        k: format_price(instrument, v + shift)
+                        for k, v in zip("ohlc", row)
+                    }
+            candles.append(candle)
+        return candles
+
+
+class FakeV20Server:
+    """Local v20 api served over plain http on 127.0.0.1"""
+
+    def __init__(
+        self,
+        config: Optional[FakeV20Config] = None,
+        account_id: str = "101-004-1234567-001",
+        clock: Callable[[], float] = time.time,
+        port: int = 0,
+    ) -> None:
+        self.config = config or FakeV20Config()
+        self.account_id = account_id
+        self.clock = clock
+        self.port = port
+        self.prices = PriceModel(self.config.seed)
+        self.random = random.Random(self.config.seed)
+        self.balance = self.config.balance
+        self.trades: dict[str, dict] = {}
+        self.orders: dict[str, dict] = {}
+        self.transactions: list[dict] = []
+        self.last_transaction_id = 1
+        self.requests: Counter = Counter()
+        self.errors_injected = 0
+        self.throttled = 0
+        self._tokens = self.config.rate_limit or 0.0
+        self._refilled = time.monotonic()
+        self._subscribers: set[asyncio.Queue] = set()
+        self._handlers: set[asyncio.Task] = set()
+        self._routes = [
+            ("GET", r"/v3/instruments/(\w+)/candles", self._candles),
+            ("GET", r"/v3/accounts/[^/]+/pricing/stream", None),
+            ("GET", r"/v3/accounts/[^/]+/pricing", self._pricing),
+            ("GET", r"/v3/accounts/[^/]+/transactions/stream", None),
+            (
+                "GET",
+                r"/v3/accounts/[^/]+/transactions/sinceid",
+                self._transactions_since,
+            ),
+            ("GET", r"/v3/accounts/[^/]+/changes", self._changes),
+            ("GET", r"/v3/accounts/[^/]+/summary", self._summary),
+            ("GET", r"/v3/accounts/[^/]+/openTrades", self._open_trades),
+            ("GET", r"/v3/accounts/[^/]+/trades", self._list_trades),
+            ("PUT", r"/v3/accounts/[^/]+/trades/(\w+)/close", self._close),
+            ("PUT", r"/v3/accounts/[^/]+/trades/(\w+)/orders", self._crcdo),
+            ("GET", r"/v3/accounts/[^/]+/orders", self._list_orders),
+            ("POST", r"/v3/accounts/[^/]+/orders", self._create_order),
+            (
+                "PUT",
+                r"/v3/accounts/[^/]+/orders/(\w+)/cancel",
+                self._cancel_order,
+            ),
+            ("GET", r"/v3/accounts/[^/]+", self._account),
+        ]
+
+    async def __aenter__(self) -> "FakeV20Server":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        await self.stop()
+
+    async def start(self) -> None:
+        self.server = await asyncio.start_server(
+            self._handle, "127.0.0.1", self.port
+        )
+        self.port = self.server.sockets[0].getsockname()[1]
+        self.url = "http://127.0.0.1:%s" % self.port
+
+    async def stop(self) -> None:
+        self.server.close()
+        for task in self._handlers:
+            task.cancel()
+        await asyncio.gather(*self._handlers, return_exceptions=True)
+
+    def now(self) -> float:
+        return self.clock()
+
+    # http plumbing
+
+    async def _handle(self, reader, writer) -> None:
+        self._handlers.add(asyncio.current_task())
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, _ = request_line.decode().split(" ")
+                headers = {}
+                while (line := await reader.readline()) != b"\r\n":
+                    key, _, value = line.decode().partition(":")
+                    headers[key.strip().lower()] = value.strip()
+                body = await reader.readexactly(
+                    int(headers.get("content-length", 0))
+                )
+                if not await self._dispatch(method, target, body, writer):
+                    break
+        except (
+            ConnectionError,
+            asyncio.IncompleteReadError,
+            asyncio.CancelledError,
+        ):
+            pass
+        finally:
+            self._handlers.discard(asyncio.current_task())
+            writer.close()
+
+    async def _dispatch(self, method, target, body, writer) -> bool:
+        """Answers one request, returns whether to keep the connection"""
+        parts = urlsplit(target)
+        path = unquote(parts.path)
+        params = dict(parse_qsl(parts.query))
+        for route_method, pattern, handler in self._routes:
+            match = re.fullmatch(pattern, path)
+            if route_method == method and match:
+                break
+        else:
+            self._respond(writer, 404, {"errorMessage": "Not found"})
+            return True
+
+        name = pattern
+        self.requests[name] += 1
+        if not self._take_token():
+            self.throttled += 1
+            self._respond(
+                writer, 429, {"errorMessage": "Requests are being throttled"}
+            )
+            return True
+        await self._delay()
+        if self.random.random() < self.config.error_rate:
+            self.errors_injected += 1
+            self._respond(writer, 503, {"errorMessage": "Service unavailable"})
+            return True
+
+        self._check_triggers()
+        if handler is None:
+            if "pricing" in path:
+                await self._stream(writer, self._pricing_stream(params))
+            else:
+                await self._stream(writer, self._transaction_stream())
+            return False
+        data = json.loads(body) if body else {}
+        try:
+            status, payload = handler(*match.groups(), params, data)
+        except KeyError as e:
+            status, payload = 400, {"errorMessage": "Invalid value %s" % e}
+        self._respond(writer, status, payload)
+        await writer.drain()
+        return True
+
+    def _take_token(self) -> bool:
+        rate = self.config.rate_limit
+        if not rate:
+            return True
+        now = time.monotonic()
+        self._tokens = min(rate, self._tokens + (now - self._refilled) * rate)
+        self._refilled = now
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+    async def _delay(self) -> None:
+        delay = self.config.latency
+        if self.config.jitter:
+            delay += self.random.uniform(
+                -self.config.jitter, self.config.jitter
+            )
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def _respond(self, writer, status: int, payload: dict) -> None:
+        body = json.dumps(payload).encode()
+        writer.write(
+            b"HTTP/1.1 %d OK\r\n" % status
+            + b"Content-Type: application/json\r\n"
+            + b"Content-Length: %d\r\n\r\n" % len(body)
+            + body
+        )
+
+    async def _stream(self, writer, messages) -> None:
+        writer.write(
+            b"HTTP/1.1 200 OK\r\n"
+            b"Content-Type: application/octet-stream\r\n"
+            b"Transfer-Encoding: chunked\r\n\r\n"
+        )
+        try:
+            async for message in messages:
+                line = json.dumps(message).encode() + b"\n"
+                writer.write(b"%x\r\n%s\r\n" % (len(line), line))
+                await writer.drain()
+        finally:
+            await messages.aclose()
+
+    # market
+
+    def _price(self, instrument: str, seconds: float) -> dict:
+        bid, ask = self.prices.quote(
+            instrument, seconds, self.config.spread_pips
+        )
+        return {
+            "type": "PRICE",
+            "instrument": instrument,
+            "time": format_time(seconds),
+            "tradeable": True,
+            "bids": [
+                {"price": format_price(instrument, bid), "liquidity": 1000000}
+            ],
+            "asks": [
+                {"price": format_price(instrument, ask), "liquidity": 1000000}
+            ],
+            "closeoutBid": format_price(instrument, bid),
+            "closeoutAsk": format_price(instrument, ask),
+        }
+
+    def _candles(self, instrument, params, data):
+        granularity = params.get("granularity", "S5")
+        size = GRANULARITIES[granularity]
+        count = int(params.get("count", 5000 if "to" in params else 500))
+        now = self.now()
+        if "from" in params:
+            start = parse_time(params["from"]) // size * size
+            if params.get("includeFirst", "true") == "false":
+                start += size
+            last = min(now // size * size, start + size * (count - 1))
+            if "to" in params:
+                # candles starting before to
+                last = min(
+                    last, -(-parse_time(params["to"]) // size) * size - size
+                )
+            starts = np.arange(start, last + 1, size, dtype=np.float64)
+        else:
+            last = now // size * size
+            starts = last - size * np.arange(count - 1, -1, -1, dtype=float)
+        if len(starts) > 5000:
+            return 400, {"errorMessage": "Maximum value for 'count' exceeded"}
+        candles = self.prices.candles(
+            instrument,
+            granularity,
+            starts,
+            now,
+            params.get("price", "M"),
+            self.config.spread_pips,
+        )
+        return 200, {
+            "instrument": instrument,
+            "granularity": granularity,
+            "candles": candles,
+        }
+
+    def _pricing(self, params, data):
+        now = self.now()
+        return 200, {
+            "prices": [
+                self._price(instrument, now)
+                for instrument in params["instruments"].split(",")
+            ],
+            "time": format_time(now),
+        }
+
+    async def _pricing_stream(self, params):
+        instruments = params["instruments"].split(",")
+        last_heartbeat = time.monotonic()
+        while True:
+            now = self.now()
+            for instrument in instruments:
+                yield self._price(instrument, now)
+            if (
+                time.monotonic() - last_heartbeat
+                >= self.config.heartbeat_interval
+            ):
+                last_heartbeat = time.monotonic()
+                yield {"type": "HEARTBEAT", "time": format_time(now)}
+            self._check_triggers()
+            await asyncio.sleep(self.config.price_interval)
+
+    def _home_factor(self, currency: str, seconds: float) -> float:
+        """Converts an amount in currency into the account currency"""
+        if currency == self.config.currency:
+            return 1.0
+        cross = "%s_%s" % (currency, self.config.currency)
+        return float(self.prices.mid(cross, [seconds])[0])
+
+    # transactions
+
+    def _transaction(self, type_: str, **fields) -> dict:
+        self.last_transaction_id += 1
+        transaction = {
+            "id": str(self.last_transaction_id),
+            "accountID": self.account_id,
+            "userID": USER_ID,
+            "batchID": str(self.last_transaction_id),
+            "requestID": str(self.random.getrandbits(60)),
+            "time": format_time(self.now()),
+            "type": type_,
+            **fields,
+        }
+        self.transactions.append(transaction)
+        for queue in self._subscribers:
+            queue.put_nowait(transaction)
+        return transaction
+
+    def _transactions_since(self, params, data):
+        since = int(params["id"])
+        return 200, {
+            "transactions": [
+                t for t in self.transactions if int(t["id"]) > since
+            ],
+            "lastTransactionID": str(self.last_transaction_id),
+        }
+
+    async def _transaction_stream(self):
+        queue: asyncio.Queue = asyncio.Queue()
+        self._subscribers.add(queue)
+        try:
+            while True:
+                try:
+                    yield await asyncio.wait_for(
+                        queue.get(), timeout=self.config.heartbeat_interval
+                    )
+                except asyncio.TimeoutError:
+                    yield {
+                        "type": "HEARTBEAT",
+                        "lastTransactionID": str(self.last_transaction_id),
+                        "time": format_time(self.now()),
+                    }
+        finally:
+            self._subscribers.discard(queue)
+
+    # orders and trades
+
+    def _create_order(self, params, data):
+        order = data["order"]
+        instrument = order["instrument"]
+        units = int(float(order["units"]))
+        now = self.now()
+        bid, ask = self.prices.quote(instrument, now, self.config.spread_pips)
+        price = ask if units > 0 else bid
+        quote_currency = instrument.split("_")[1]
+        half_spread_cost = (
+            (ask - bid)
+            / 2
+            * abs(units)
+            * self._home_factor(quote_currency, now)
+        )
+        stop_loss = None
+        if "stopLossOnFill" in order:
+            stop_loss = {
+                **order["stopLossOnFill"],
+                "triggerMode": "TOP_OF_BOOK",
+            }
+        create = self._transaction(
+            "MARKET_ORDER",
+            instrument=instrument,
+            units=str(units),
+            timeInForce=order.get("timeInForce", "FOK"),
+            positionFill=order.get("positionFill", "DEFAULT"),
+            reason="CLIENT_ORDER",
+            stopLossOnFill=stop_loss,
+        )
+        fill = self._fill(
+            create,
+            instrument,
+            units,
+            price,
+            bid,
+            ask,
+            reason="MARKET_ORDER",
+            halfSpreadCost="%.4f" % half_spread_cost,
+        )
+        trade_id = fill["id"]
+        fill["tradeOpened"] = {
+            "price": format_price(instrument, price),
+            "tradeID": trade_id,
+            "units": str(units),
+            "guaranteedExecutionFee": "0.0",
+            "quoteGuaranteedExecutionFee": "0",
+            "halfSpreadCost": "%.4f" % half_spread_cost,
+            "initialMarginRequired": "%.4f" % (abs(units) * 0.0333),
+        }
+        self.trades[trade_id] = {
+            "id": trade_id,
+            "instrument": instrument,
+            "price": format_price(instrument, price),
+            "openTime": fill["time"],
+            "initialUnits": str(units),
+            "initialMarginRequired": "%.4f" % (abs(units) * 0.0333),
+            "state": "OPEN",
+            "currentUnits": str(units),
+            "realizedPL": "0.0000",
+            "financing": "0.0000",
+            "dividendAdjustment": "0.0000",
+            "unrealizedPL": "0.0000",
+            "marginUsed": "%.4f" % (abs(units) * 0.0333),
+        }
+        related = [create["id"], fill["id"]]
+        for key, type_ in (
+            ("stopLossOnFill", "STOP_LOSS_ORDER"),
+            ("takeProfitOnFill", "TAKE_PROFIT_ORDER"),
+        ):
+            if key in order:
+                dependent = self._dependent_order(
+                    trade_id, type_, order[key], "ON_FILL"
+                )
+                related.append(dependent["id"])
+        return 201, {
+            "orderCreateTransaction": create,
+            "orderFillTransaction": fill,
+            "relatedTransactionIDs": related,
+            "lastTransactionID": str(self.last_transaction_id),
+        }
+
+    def _fill(self, create, instrument, units, price, bid, ask, **fields):
+        return self._transaction(
+            "ORDER_FILL",
+            orderID=create["id"],
+            instrument=instrument,
+            units=str(units),
+            requestedUnits=str(units),
+            price=format_price(instrument, price),
+            pl=fields.pop("pl", "0.0000"),
+            quotePL="0",
+            financing="0.0000",
+            baseFinancing="0",
+            commission="0.0000",
+            accountBalance="%.4f" % self.balance,
+            gainQuoteHomeConversionFactor="1",
+            lossQuoteHomeConversionFactor="1",
+            guaranteedExecutionFee="0.0000",
+            quoteGuaranteedExecutionFee="0",
+            halfSpreadCost=fields.pop("halfSpreadCost", "0.0000"),
+            fullVWAP=format_price(instrument, price),
+            fullPrice={
+                "closeoutBid": format_price(instrument, bid),
+                "closeoutAsk": format_price(instrument, ask),
+                "timestamp": format_time(self.now()),
+                "bids": [
+                    {
+                        "price": format_price(instrument, bid),
+                        "liquidity": "1000000",
+                    }
+                ],
+                "asks": [
+                    {
+                        "price": format_price(instrument, ask),
+                        "liquidity": "1000000",
+                    }
+                ],
+            },
+            homeConversionFactors={
+                key: {"factor": "1"}
+                for key in (
+                    "gainQuoteHome",
+                    "lossQuoteHome",
+                    "gainBaseHome",
+                    "lossBaseHome",
+                )
+            },
+            **fields,
+        )
+
+    def _dependent_order(self, trade_id, type_, details, reason) -> dict:
+        transaction = self._transaction(
+            type_,
+            tradeID=trade_id,
+            price=details["price"],
+            timeInForce=details.get("timeInForce", "GTC"),
+            triggerCondition="DEFAULT",
+            triggerMode="TOP_OF_BOOK",
+            reason=reason,
+        )
+        order = {
+            "id": transaction["id"],
+            "createTime": transaction["time"],
+            "type": type_,
+            "tradeID": trade_id,
+            "price": details["price"],
+            "timeInForce": transaction["timeInForce"],
+            "triggerCondition": "DEFAULT",
+            "triggerMode": "TOP_OF_BOOK",
+            "state": "PENDING",
+        }
+        self.orders[order["id"]] = order
+        key = (
+            "stopLossOrder"
+            if type_ == "STOP_LOSS_ORDER"
+            else "takeProfitOrder"
+        )
+        self.trades[trade_id][key] = order
+        return transaction
+
+    def _cancel(self, order_id: str, reason: str) -> dict:
+        order = self.orders.pop(order_id)
+        order["state"] = "CANCELLED"
+        return self._transaction(
+            "ORDER_CANCEL", orderID=order_id, reason=reason
+        )
+
+    def close_trade(self, trade_id: str, reason: str) -> tuple[dict, dict]:
+        """Closes a trade at the current price"""
+        trade = self.trades[trade_id]
+        instrument = trade["instrument"]
+        units = int(trade["currentUnits"])
+        now = self.now()
+        bid, ask = self.prices.quote(instrument, now, self.config.spread_pips)
+        price = bid if units > 0 else ask
+        pl = (
+            (price - float(trade["price"]))
+            * units
+            * self._home_factor(instrument.split("_")[1], now)
+        )
+        self.balance += pl
+        create = self._transaction(
+            "MARKET_ORDER",
+            instrument=instrument,
+            units=str(-units),
+            timeInForce="FOK",
+            positionFill="REDUCE_ONLY",
+            reason=reason,
+        )
+        for key in ("stopLossOrder", "takeProfitOrder"):
+            if key in trade and trade[key]["id"] in self.orders:
+                self._cancel(trade[key]["id"], "LINKED_TRADE_CLOSED")
+        fill_reason = {
+            "TRADE_CLOSE": "MARKET_ORDER_TRADE_CLOSE",
+            "STOP_LOSS": "STOP_LOSS_ORDER",
+            "TAKE_PROFIT": "TAKE_PROFIT_ORDER",
+        }[reason]
+        fill = self._fill(
+            create,
+            instrument,
+            -units,
+            price,
+            bid,
+            ask,
+            reason=fill_reason,
+            pl="%.4f" % pl,
+            tradesClosed=[
+                {
+                    "tradeID": trade_id,
+                    "units": str(-units),
+                    "realizedPL": "%.4f" % pl,
+                    "financing": "0.0000",
+                    "price": format_price(instrument, price),
+                }
+            ],
+        )
+        trade.update(
+            state="CLOSED",
+            currentUnits="0",
+            realizedPL="%.4f" % pl,
+            closeTime=fill["time"],
+            averageClosePrice=format_price(instrument, price),
+        )
+        return create, fill
+
+    def _check_triggers(self) -> None:
+        """Closes the trades whose stop loss or take profit was hit"""
+        now = self.now()
+        for trade_id, trade in list(self.trades.items()):
+            if trade["state"] != "OPEN":
+                continue
+            bid, ask = self.prices.quote(
+                trade["instrument"], now, self.config.spread_pips
+            )
+            is_buy = int(trade["currentUnits"]) > 0
+            price = bid if is_buy else ask
+            stop = trade.get("stopLossOrder")
+            limit = trade.get("takeProfitOrder")
+            if stop and (
+                price <= float(stop["price"])
+                if is_buy
+                else price >= float(stop["price"])
+            ):
+                self.close_trade(trade_id, "STOP_LOSS")
+            elif limit and (
+                price >= float(limit["price"])
+                if is_buy
+                else price <= float(limit["price"])
+            ):
+                self.close_trade(trade_id, "TAKE_PROFIT")
+
+    def _close(self, trade_id, params, data):
+        if trade_id not in self.trades:
+            return 404, {
+                "errorCode": "TRADE_DOESNT_EXIST",
+                "errorMessage": "The Trade specified does not exist",
+                "lastTransactionID": str(self.last_transaction_id),
+            }
+        if self.trades[trade_id]["state"] != "OPEN":
+            return 400, {"errorMessage": "Trade is already closed"}
+        create, fill = self.close_trade(trade_id, "TRADE_CLOSE")
+        return 200, {
+            "orderCreateTransaction": create,
+            "orderFillTransaction": fill,
+            "relatedTransactionIDs": [create["id"], fill["id"]],
+            "lastTransactionID": str(self.last_transaction_id),
+        }
+
+    def _crcdo(self, trade_id, params, data):
+        trade = self.trades.get(trade_id)
+        if trade is None or trade["state"] != "OPEN":
+            return 404, {"errorMessage": "The Trade specified does not exist"}
+        response = {}
+        if "stopLoss" in data:
+            old = trade.get("stopLossOrder")
+            if old and old["id"] in self.orders:
+                response["stopLossOrderCancelTransaction"] = self._cancel(
+                    old["id"], "CLIENT_REQUEST_REPLACED"
+                )
+            response["stopLossOrderTransaction"] = self._dependent_order(
+                trade_id, "STOP_LOSS_ORDER", data["stopLoss"], "REPLACEMENT"
+            )
+        response["relatedTransactionIDs"] = [
+            t["id"] for t in response.values()
+        ]
+        response["lastTransactionID"] = str(self.last_transaction_id)
+        return 200, response
+
+    def _list_trades(self, params, data):
+        trades = list(self.trades.values())
+        if "ids" in params:
+            ids = set(params["ids"].split(","))
+            trades = [t for t in trades if t["id"] in ids]
+        state = params.get("state", "OPEN")
+        if state != "ALL":
+            trades = [t for t in trades if t["state"] == state]
+        trades = sorted(trades, key=lambda t: int(t["id"]), reverse=True)
+        return 200, {
+            "trades": trades[: int(params.get("count", 50))],
+            "lastTransactionID": str(self.last_transaction_id),
+        }
+
+    def _open_trades(self, params, data):
+        return self._list_trades({"state": "OPEN", "count": 5000}, data)
+
+    def _list_orders(self, params, data):
+        return 200, {
+            "orders": list(self.orders.values()),
+            "lastTransactionID": str(self.last_transaction_id),
+        }
+
+    def _cancel_order(self, order_id, params, data):
+        if order_id not in self.orders:
+            return 404, {"errorMessage": "The Order specified does not exist"}
+        return 200, {
+            "orderCancelTransaction": self._cancel(order_id, "CLIENT_REQUEST"),
+            "relatedTransactionIDs": [str(self.last_transaction_id)],
+            "lastTransactionID": str(self.last_transaction_id),
+        }
+
+    # account
+
+    def _state(self) -> dict:
+        now = self.now()
+        unrealized = 0.0
+        margin_used = 0.0
+        for trade in self.trades.values():
+            if trade["state"] != "OPEN":
+                continue
+            instrument = trade["instrument"]
+            units = int(trade["currentUnits"])
+            bid, ask = self.prices.quote(
+                instrument, now, self.config.spread_pips
+            )
+            price = bid if units > 0 else ask
+            pl = (
+                (price - float(trade["price"]))
+                * units
+                * self._home_factor(instrument.split("_")[1], now)
+            )
+            trade["unrealizedPL"] = "%.4f" % pl
+            unrealized += pl
+            margin_used += float(trade["marginUsed"])
+        nav = self.balance + unrealized
+        return {
+            "balance": "%.4f" % self.balance,
+            "NAV": "%.4f" % nav,
+            "unrealizedPL": "%.4f" % unrealized,
+            "marginUsed": "%.4f" % margin_used,
+            "marginAvailable": "%.4f" % (nav - margin_used),
+            "positionValue": "%.4f" % (margin_used * 30),
+            "withdrawalLimit": "%.4f" % (nav - margin_used),
+            "marginCloseoutUnrealizedPL": "%.4f" % unrealized,
+            "marginCloseoutNAV": "%.4f" % nav,
+            "marginCloseoutMarginUsed": "%.4f" % margin_used,
+            "marginCloseoutPositionValue": "%.4f" % (margin_used * 30),
+            "marginCloseoutPercent": "%.5f" % (margin_used / nav / 2),
+            "marginCallMarginUsed": "%.4f" % margin_used,
+            "marginCallPercent": "%.5f" % (margin_used / nav),
+        }
+
+    def _account_body(self) -> dict:
+        open_trades = [t for t in self.trades.values() if t["state"] == "OPEN"]
+        return {
+            "guaranteedStopLossOrderMode": "DISABLED",
+            "hedgingEnabled": False,
+            "id": self.account_id,
+            "createdTime": format_time(0),
+            "currency": self.config.currency,
+            "createdByUserID": USER_ID,
+            "alias": "Primary",
+            "marginRate": "0.0333",
+            "lastTransactionID": str(self.last_transaction_id),
+            "openTradeCount": len(open_trades),
+            "openPositionCount": len({t["instrument"] for t in open_trades}),
+            "pendingOrderCount": len(self.orders),
+            "pl": "%.4f" % (self.balance - self.config.balance),
+            "resettablePL": "%.4f" % (self.balance - self.config.balance),
+            "resettablePLTime": "0",
+            "financing": "0.0000",
+            "commission": "0.0000",
+            "dividendAdjustment": "0",
+            "guaranteedExecutionFees": "0.0000",
+            "orders": list(self.orders.values()),
+            "positions": [],
+            "trades": open_trades,
+            **self._state(),
+        }
+
+    def _account(self, params, data):
+        return 200, {
+            "account": self._account_body(),
+            "lastTransactionID": str(self.last_transaction_id),
+        }
+
+    def _summary(self, params, data):
+        body = self._account_body()
+        for key in ("orders", "positions", "trades"):
+            body.pop(key)
+        return 200, {
+            "account": body,
+            "lastTransactionID": str(self.last_transaction_id),
+        }
+
+    def _changes(self, params, data):
+        since = int(params["sinceTransactionID"])
+        transactions = [t for t in self.transactions if int(t["id"]) > since]
+        changes = {
+            "ordersCreated": [],
+            "ordersCancelled": [],
+            "ordersFilled": [],
+            "ordersTriggered": [],
+            "tradesOpened": [],
+            "tradesReduced": [],
+            "tradesClosed": [],
+            "positions": [],
+            "transactions": transactions,
+        }
+        for transaction in transactions:
+            if transaction["type"] in ("STOP_LOSS_ORDER", "TAKE_PROFIT_ORDER"):
+                changes["ordersCreated"].append(
+                    {"id": transaction["id"], "type": transaction["type"]}
+                )
+            elif transaction["type"] == "ORDER_CANCEL":
+                changes["ordersCancelled"].append(
+                    {"id": transaction["orderID"]}
+                )
+            elif transaction["type"] == "ORDER_FILL":
+                if "tradeOpened" in transaction:
+                    trade_id = transaction["tradeOpened"]["tradeID"]
+                    changes["tradesOpened"].append(self.trades[trade_id])
+                for closed in transaction.get("tradesClosed", []):
+                    changes["tradesClosed"].append(
+                        self.trades[closed["tradeID"]]
+                    )
+        return 200, {
+            "changes": changes,
+            "state": self._state(),
+            "lastTransactionID": str(self.last_transaction_id),
+        }
+
+
+async def serve(config: FakeV20Config, port: int) -> None:
+    """Run the server until interrupted"""
+    server = FakeV20Server(config, port=port)
+    await server.start()
+    print("Fake v20 api listening on %s" % server.url)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit", type=float, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    config = FakeV20Config(
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        rate_limit=args.rate_limit,
+        seed=args.seed,
+    )
+    asyncio.run(serve(config, args.port))
+
+
+if __name__ == "__main__":
+    main()
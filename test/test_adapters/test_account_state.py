@@ -0,0 +1,100 @@
+import pytest
+from oandapyV20.endpoints.accounts import AccountChanges, AccountDetails
+from oandapyV20.exceptions import V20Error
+
+from src.adapters.fxcm_connect.account_state import AccountStateCache
+
+ACCOUNT = {
+    "account": {
+        "id": "123",
+        "balance": "100000.0000",
+        "NAV": "100012.5000",
+        "unrealizedPL": "12.5000",
+        "marginUsed": "3300.0000",
+        "marginAvailable": "96712.5000",
+        "trades": [{"id": "10"}, {"id": "11"}],
+        "orders": [{"id": "12"}, {"id": "13"}],
+    },
+    "lastTransactionID": "13",
+}
+
+CHANGES = {
+    "changes": {
+        "tradesOpened": [{"id": "20"}],
+        "tradesClosed": [{"id": "10"}],
+        "ordersCreated": [{"id": "21"}],
+        "ordersCancelled": [{"id": "12"}],
+        "transactions": [
+            {"id": "19", "type": "ORDER_FILL", "accountBalance": "100040.0"},
+            {"id": "20", "type": "ORDER_FILL", "accountBalance": "100035.5"},
+            {"id": "21", "type": "STOP_LOSS_ORDER"},
+        ],
+    },
+    "state": {
+        "NAV": "100050.0000",
+        "unrealizedPL": "14.5000",
+        "marginUsed": "3400.0000",
+        "marginAvailable": "96650.0000",
+    },
+    "lastTransactionID": "21",
+}
+
+
+class FakeClient:
+    """Answers account endpoints from canned responses"""
+
+    def __init__(self, changes=None) -> None:
+        self.changes = changes or CHANGES
+        self.requests: list = []
+
+    async def request(self, endpoint):
+        self.requests.append(endpoint)
+        if isinstance(endpoint, AccountDetails):
+            endpoint.response = ACCOUNT
+        elif isinstance(endpoint, AccountChanges):
+            if isinstance(self.changes, Exception):
+                raise self.changes
+            endpoint.response = self.changes
+        return endpoint.response
+
+
+class TestAccountStateCache:
+    @pytest.mark.asyncio
+    async def test_first_lookup_loads_the_full_account(self):
+        """Test the account is downloaded once and then served"""
+        client = FakeClient()
+        cache = AccountStateCache(client, "123", max_age=60)
+
+        assert await cache.get_balance() == 100000.0
+        assert await cache.get_nav() == 100012.5
+        assert await cache.get_open_trade_count() == 2
+        assert len(client.requests) == 1
+        assert cache.snapshot.last_transaction_id == "13"
+
+    @pytest.mark.asyncio
+    async def test_stale_state_applies_the_changes(self):
+        """Test later lookups only request changes since the last id"""
+        client = FakeClient()
+        cache = AccountStateCache(client, "123", max_age=0)
+        await cache.get_snapshot()
+
+        snapshot = await cache.get_snapshot()
+
+        assert isinstance(client.requests[1], AccountChanges)
+        assert client.requests[1].params == {"sinceTransactionID": "13"}
+        assert snapshot.balance == 100035.5
+        assert snapshot.nav == 100050.0
+        assert snapshot.margin_available == 96650.0
+        assert snapshot.open_trade_count == 2
+        assert snapshot.pending_order_count == 2
+        assert snapshot.last_transaction_id == "21"
+        assert cache.full_loads == 1 and cache.polls == 1
+
+    @pytest.mark.asyncio
+    async def test_failed_poll_reloads_the_account(self):
+        """Test an error from the changes endpoint falls back to a load"""
+        client = FakeClient(changes=V20Error(416, "too old"))
+        cache = AccountStateCache(client, "123", max_age=0)
+        await cache.get_snapshot()
+        await cache.get_snapshot()
+        assert cache.full_loads == 2
@@ -0,0 +1,151 @@
+import asyncio
+import gzip
+import json
+
+import oandapyV20.endpoints.instruments as instruments
+import oandapyV20.endpoints.orders as orders
+import pytest
+from oandapyV20.exceptions import V20Error
+
+from src.adapters.fxcm_connect.async_transport import AsyncV20API
+
+
+class LocalServer:
+    """Minimal keep-alive http server used to exercise the transport"""
+
+    def __init__(self, delay: float = 0, status: int = 200) -> None:
+        self.delay = delay
+        self.status = status
+        self.connections = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.requests: list[tuple[str, str, bytes]] = []
+        self.handlers: set[asyncio.Task] = set()
+
+    async def __aenter__(self) -> "LocalServer":
+        self.server = await asyncio.start_server(
+            self.handle, "127.0.0.1", 0
+        )
+        port = self.server.sockets[0].getsockname()[1]
+        self.url = "http://127.0.0.1:%s" % port
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        self.server.close()
+        for task in self.handlers:
+            task.cancel()
+        await asyncio.gather(*self.handlers, return_exceptions=True)
+
+    async def handle(self, reader, writer) -> None:
+        self.connections += 1
+        self.handlers.add(asyncio.current_task())
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, _ = request_line.decode().split(" ")
+                headers = {}
+                while (line := await reader.readline()) != b"\r\n":
+                    key, _, value = line.decode().partition(":")
+                    headers[key.lower()] = value.strip()
+                body = await reader.readexactly(
+                    int(headers.get("content-length", 0))
+                )
+                self.requests.append((method, target, body))
+                self.in_flight += 1
+                self.max_in_flight = max(self.max_in_flight, self.in_flight)
+                await asyncio.sleep(self.delay)
+                self.in_flight -= 1
+                payload = gzip.compress(
+                    json.dumps({"target": target}).encode()
+                )
+                writer.write(
+                    b"HTTP/1.1 %d OK\r\n" % self.status
+                    + b"Content-Encoding: gzip\r\n"
+                    + b"Content-Length: %d\r\n\r\n" % len(payload)
+                    + payload
+                )
+                await writer.drain()
+        finally:
+            writer.close()
+
+
+def candles_endpoint() -> instruments.InstrumentsCandles:
+    return instruments.InstrumentsCandles(
+        instrument="EUR_USD", params={"count": 5, "granularity": "M5"}
+    )
+
+
+class TestAsyncV20API:
+    @pytest.mark.asyncio
+    async def test_request_populates_endpoint_response(self):
+        """Test the response is decoded and set on the endpoint"""
+        async with LocalServer() as server:
+            client = AsyncV20API("token", api_url=server.url)
+            endpoint = candles_endpoint()
+            response = await client.request(endpoint)
+            assert response == endpoint.response
+            assert response["target"] == (
+                "/v3/instruments/EUR_USD/candles?count=5&granularity=M5"
+            )
+            await client.close()
+
+    @pytest.mark.asyncio
+    async def test_connections_are_kept_alive(self):
+        """Test sequential requests reuse the same connection"""
+        async with LocalServer() as server:
+            client = AsyncV20API("token", api_url=server.url)
+            for _ in range(5):
+                await client.request(candles_endpoint())
+            assert server.connections == 1
+            assert len(server.requests) == 5
+            await client.close()
+
+    @pytest.mark.asyncio
+    async def test_requests_overlap_up_to_the_host_limit(self):
+        """Test concurrent requests are bounded per host"""
+        async with LocalServer(delay=0.05) as server:
+            client = AsyncV20API(
+                "token", api_url=server.url, max_connections_per_host=3
+            )
+            await asyncio.gather(
+                *[client.request(candles_endpoint()) for _ in range(9)]
+            )
+            assert server.max_in_flight == 3
+            assert server.connections == 3
+            await client.close()
+
+    @pytest.mark.asyncio
+    async def test_post_sends_json_body(self):
+        """Test the endpoint data is sent as the request body"""
+        async with LocalServer() as server:
+            client = AsyncV20API("token", api_url=server.url)
+            data = {"order": {"instrument": "EUR_USD", "units": "10"}}
+            endpoint = orders.OrderCreate("123", data)
+            endpoint._expected_status = 200
+            await client.request(endpoint)
+            method, target, body = server.requests[0]
+            assert method == "POST"
+            assert target == "/v3/accounts/123/orders"
+            assert json.loads(body) == data
+            await client.close()
+
+    @pytest.mark.asyncio
+    async def test_error_status_raises_v20_error(self):
+        """Test responses >= 400 raise a V20Error"""
+        async with LocalServer(status=404) as server:
+            client = AsyncV20API("token", api_url=server.url)
+            with pytest.raises(V20Error) as e:
+                await client.request(candles_endpoint())
+            assert e.value.code == 404
+            await client.close()
+
+    @pytest.mark.asyncio
+    async def test_request_times_out(self):
+        """Test a slow response raises a timeout"""
+        async with LocalServer(delay=0.5) as server:
+            client = AsyncV20API("token", api_url=server.url, timeout=0.05)
+            with pytest.raises(TimeoutError):
+                await client.request(candles_endpoint())
+            await client.close()
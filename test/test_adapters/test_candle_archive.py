@@ -0,0 +1,126 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.adapters.database.candle_archive import CandleArchive
+from src.adapters.fxcm_connect.candle_parser import parse_candles
+from src.config import ForexPairEnum, PeriodEnum
+
+# a Monday
+START = np.datetime64("2023-01-02T00:00:00", "ns")
+HOUR = np.timedelta64(1, "h")
+
+
+def candles(start: int, number: int) -> tuple[np.ndarray, np.ndarray]:
+    """Hourly candles from start hours after START"""
+    times = START + (start + np.arange(number)) * HOUR
+    values = np.column_stack(
+        [np.arange(start, start + number) + offset for offset in range(5)]
+    ).astype(float)
+    return times, values
+
+
+@pytest.fixture
+def archive(tmp_path):
+    return CandleArchive(str(tmp_path))
+
+
+class TestCandleArchive:
+    def test_append_and_read(self, archive):
+        """the archive returns what was stored in the refined shape"""
+        times, values = candles(0, 48)
+        result = archive.append(
+            ForexPairEnum.EURUSD, PeriodEnum.HOUR_1, times, values
+        )
+        df = archive.read(ForexPairEnum.EURUSD, PeriodEnum.HOUR_1)
+        assert result.appended == 48 and result.gaps == []
+        assert list(df.columns) == [
+            "date",
+            "open",
+            "high",
+            "low",
+            "close",
+            "volume",
+        ]
+        assert df["date"].dtype == "datetime64[ns]"
+        np.testing.assert_array_equal(df["date"].values, times)
+        np.testing.assert_array_equal(df.iloc[:, 1:].values, values)
+
+    def test_same_shape_as_refined_data(self, archive):
+        """a v20 response reads back like parse_candles"""
+        with open("test/oanda_data.json") as f:
+            data = json.load(f)
+        archive.append_candles("EUR_USD", PeriodEnum.MINUTE_5, data)
+        stored = archive.read(ForexPairEnum.EURUSD, PeriodEnum.MINUTE_5)
+        expected = parse_candles(data, complete_only=True)
+        pd.testing.assert_frame_equal(stored, expected)
+
+    def test_time_range(self, archive):
+        """reads are sliced to start <= time < end"""
+        archive.append("EUR_USD", PeriodEnum.HOUR_1, *candles(0, 100))
+        df = archive.read(
+            "EUR_USD",
+            PeriodEnum.HOUR_1,
+            "2023-01-02T10:00:00Z",
+            "2023-01-02T20:00:00",
+        )
+        assert len(df) == 10
+        assert df["open"].iloc[0] == 10
+        series = archive.series("EUR_USD", PeriodEnum.HOUR_1)
+        assert [len(c) for c in series.iter_chunks(40)] == [40, 40, 20]
+        assert series.tail(3)["open"].tolist() == [97, 98, 99]
+
+    def test_duplicates_are_dropped(self, archive):
+        """overlapping appends only store the new candles"""
+        archive.append("EUR_USD", PeriodEnum.HOUR_1, *candles(0, 10))
+        result = archive.append("EUR_USD", PeriodEnum.HOUR_1, *candles(5, 10))
+        df = archive.read("EUR_USD", PeriodEnum.HOUR_1)
+        assert (result.appended, result.duplicates) == (5, 5)
+        assert not result.rewritten
+        assert df["open"].tolist() == list(range(15))
+
+    def test_older_candles_are_merged(self, archive):
+        """candles before the stored ones are merged in order"""
+        archive.append("EUR_USD", PeriodEnum.HOUR_1, *candles(10, 10))
+        result = archive.append("EUR_USD", PeriodEnum.HOUR_1, *candles(0, 12))
+        df = archive.read("EUR_USD", PeriodEnum.HOUR_1)
+        assert result.rewritten and result.appended == 10
+        assert df["open"].tolist() == list(range(20))
+
+    def test_gaps(self, archive):
+        """missing candles are reported, the weekend close is not"""
+        archive.append("EUR_USD", PeriodEnum.HOUR_1, *candles(0, 10))
+        result = archive.append("EUR_USD", PeriodEnum.HOUR_1, *candles(13, 5))
+        assert [gap.missing for gap in result.gaps] == [3]
+        assert result.gaps[0].after == START + 9 * HOUR
+
+        # friday 21:00 to sunday 22:00
+        friday = 4 * 24 + 21
+        archive.append("EUR_USD", PeriodEnum.HOUR_1, *candles(friday, 1))
+        result = archive.append(
+            "EUR_USD", PeriodEnum.HOUR_1, *candles(friday + 49, 2)
+        )
+        assert result.gaps == []
+
+    def test_reopen(self, archive, tmp_path):
+        """a new archive on the same directory sees the stored series"""
+        archive.append("EUR_USD", PeriodEnum.HOUR_1, *candles(0, 10))
+        archive.append("GBP/USD", PeriodEnum.DAY, *candles(0, 1))
+        reopened = CandleArchive(str(tmp_path))
+        assert len(reopened.read("EUR_USD", PeriodEnum.HOUR_1)) == 10
+        assert reopened.list_series() == [
+            ("EUR_USD", PeriodEnum.HOUR_1),
+            ("GBP_USD", PeriodEnum.DAY),
+        ]
+
+    def test_torn_append_is_discarded(self, archive, tmp_path):
+        """rows written after the last commit are ignored and replaced"""
+        archive.append("EUR_USD", PeriodEnum.HOUR_1, *candles(0, 10))
+        with open(tmp_path / "EUR_USD" / "H1" / "open.bin", "ab") as f:
+            f.write(b"\x00" * 12)
+        reopened = CandleArchive(str(tmp_path))
+        reopened.append("EUR_USD", PeriodEnum.HOUR_1, *candles(10, 2))
+        df = reopened.read("EUR_USD", PeriodEnum.HOUR_1)
+        assert df["open"].tolist() == list(range(12))
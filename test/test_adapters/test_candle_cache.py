@@ -0,0 +1,157 @@
+import numpy as np
+import pytest
+
+from src.adapters.fxcm_connect.candle_cache import (
+    CandleCache,
+    CandleRingBuffer,
+)
+from src.config import ForexPairEnum, PeriodEnum
+
+
+class FakeBroker:
+    """Serves M5 candles up to a moving clock, the newest is incomplete"""
+
+    def __init__(self, bars: int) -> None:
+        self.bars = bars
+        self.forming_close = 0.0
+        self.requests: list[dict] = []
+        self.start = np.datetime64("2023-06-22T00:00:00", "ns")
+
+    def candle(self, index: int) -> dict:
+        complete = index < self.bars - 1
+        close = index + (0 if complete else self.forming_close)
+        time = self.start + np.timedelta64(5 * index, "m")
+        return {
+            "complete": complete,
+            "volume": 10,
+            "time": str(time) + "Z",
+            "mid": {"o": index, "h": close + 1, "l": index - 1, "c": close},
+        }
+
+    async def fetch(self, instrument, period, params) -> dict:
+        self.requests.append(params)
+        indices = range(self.bars)
+        if "from" in params:
+            since = np.datetime64(params["from"].rstrip("Z"), "ns")
+            indices = [
+                i
+                for i in indices
+                if self.start + np.timedelta64(5 * i, "m") > since
+            ]
+        indices = list(indices)[-params["count"] :]
+        return {"candles": [self.candle(i) for i in indices]}
+
+
+class TestCandleRingBuffer:
+    def test_window_is_ordered_after_wrapping(self):
+        """Test the window is oldest first once the buffer wraps"""
+        buffer = CandleRingBuffer(3)
+        start = np.datetime64("2023-01-01", "ns")
+        for i in range(5):
+            buffer.append(start + np.timedelta64(i, "m"), np.full(5, i))
+        window = buffer.window(3)
+        assert list(window["close"]) == [2, 3, 4]
+        assert buffer.size == 3
+
+    def test_same_time_replaces_the_newest_candle(self):
+        """Test a forming candle is replaced rather than appended"""
+        buffer = CandleRingBuffer(3)
+        time = np.datetime64("2023-01-01", "ns")
+        buffer.append(time, np.full(5, 1.0))
+        buffer.append(time, np.full(5, 2.0))
+        assert buffer.size == 1
+        assert buffer.window(1).iloc[-1]["close"] == 2.0
+
+
+class TestCandleCache:
+    @pytest.mark.asyncio
+    async def test_cold_call_downloads_the_window(self):
+        """Test the first call returns the requested number of candles"""
+        broker = FakeBroker(bars=600)
+        cache = CandleCache(broker.fetch, capacity=500)
+        data = await cache.get_candle_data(
+            ForexPairEnum.EURUSD, PeriodEnum.MINUTE_5, 250
+        )
+        assert len(data) == 250
+        assert list(data.columns) == [
+            "date",
+            "open",
+            "high",
+            "low",
+            "close",
+            "volume",
+        ]
+        assert data.iloc[-1]["close"] == 599
+        assert broker.requests == [{"count": 500}]
+
+    @pytest.mark.asyncio
+    async def test_warm_call_only_fetches_new_candles(self):
+        """Test later calls fetch after the last completed candle"""
+        broker = FakeBroker(bars=600)
+        cache = CandleCache(broker.fetch, capacity=500)
+        await cache.get_candle_data(
+            ForexPairEnum.EURUSD, PeriodEnum.MINUTE_5, 250
+        )
+        broker.bars = 602
+        broker.forming_close = 0.5
+        data = await cache.get_candle_data(
+            ForexPairEnum.EURUSD, PeriodEnum.MINUTE_5, 250
+        )
+        assert broker.requests[-1]["includeFirst"] == "false"
+        # the forming candle 599 completed, 600 completed and 601 formed
+        assert cache.candles_downloaded == 500 + 3
+        assert list(data["close"].tail(3)) == [599, 600, 601.5]
+        assert data["date"].is_monotonic_increasing
+        assert len(data) == 250
+
+    @pytest.mark.asyncio
+    async def test_short_history_is_served_from_the_cache(self):
+        """Test a broker with fewer candles than asked for is not asked
+        for the full window again on every call"""
+        broker = FakeBroker(bars=100)
+        cache = CandleCache(broker.fetch, capacity=500)
+        for _ in range(3):
+            data = await cache.get_candle_data(
+                ForexPairEnum.EURUSD, PeriodEnum.MINUTE_5, 250
+            )
+        assert len(data) == 100
+        assert broker.requests[0] == {"count": 500}
+        assert all("from" in params for params in broker.requests[1:])
+
+        broker.bars = 101
+        data = await cache.get_candle_data(
+            ForexPairEnum.EURUSD, PeriodEnum.MINUTE_5, 250
+        )
+        assert len(data) == 101
+        assert "from" in broker.requests[-1]
+
+    @pytest.mark.asyncio
+    async def test_forming_candle_is_replaced(self):
+        """Test the still forming candle is updated in place"""
+        broker = FakeBroker(bars=100)
+        cache = CandleCache(broker.fetch, capacity=500)
+        await cache.get_candle_data(
+            ForexPairEnum.EURUSD, PeriodEnum.MINUTE_5, 20
+        )
+        broker.forming_close = 0.25
+        data = await cache.get_candle_data(
+            ForexPairEnum.EURUSD, PeriodEnum.MINUTE_5, 20
+        )
+        assert data.iloc[-1]["close"] == 99.25
+        assert data.iloc[-2]["close"] == 98
+        assert len(data) == 20
+
+    @pytest.mark.asyncio
+    async def test_large_gap_refreshes_the_window(self):
+        """Test falling further behind than the buffer refreshes"""
+        broker = FakeBroker(bars=100)
+        cache = CandleCache(broker.fetch, capacity=50)
+        await cache.get_candle_data(
+            ForexPairEnum.EURUSD, PeriodEnum.MINUTE_5, 20
+        )
+        broker.bars = 400
+        data = await cache.get_candle_data(
+            ForexPairEnum.EURUSD, PeriodEnum.MINUTE_5, 20
+        )
+        assert broker.requests[-1] == {"count": 50}
+        assert data.iloc[-1]["close"] == 399
@@ -0,0 +1,66 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.adapters.fxcm_connect.candle_parser import (
+    parse_candle_arrays,
+    parse_candles,
+    parse_times,
+)
+from test.candle_reference import refine_with_dicts
+
+
+def load(path: str) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+
+class TestCandleParser:
+    @pytest.mark.parametrize(
+        "path", ["test/data.json", "test/oanda_data.json"]
+    )
+    def test_matches_the_row_by_row_refinement(self, path):
+        """Test the columnar parser gives the same frame as before"""
+        data = load(path)
+        expected = refine_with_dicts(data)
+        expected["date"] = pd.to_datetime(expected["date"].str.rstrip("Z"))
+        result = parse_candles(data)
+        pd.testing.assert_frame_equal(result, expected)
+
+    def test_skips_incomplete_candles(self):
+        """Test incomplete candles can be dropped"""
+        data = load("test/data.json")
+        data["candles"][-1]["complete"] = False
+        result = parse_candles(data, complete_only=True)
+        assert len(result) == len(data["candles"]) - 1
+        assert result["date"].iloc[-1] == np.datetime64(
+            data["candles"][-2]["time"].rstrip("Z")
+        )
+
+    def test_parses_unix_times(self):
+        """Test the UNIX datetime format is understood"""
+        times = parse_times(["1687425900.000000000", "1687426200.5"])
+        assert times[0] == np.datetime64("2023-06-22T09:25:00")
+        assert times[1] == np.datetime64("2023-06-22T09:30:00.500")
+
+    def test_parses_mixed_precision_times(self):
+        """Test times with different fractional precision parse"""
+        times = parse_times(
+            ["2023-06-22T09:25:00Z", "2023-06-22T09:30:00.000000000Z"]
+        )
+        assert times[1] - times[0] == np.timedelta64(5, "m")
+
+    def test_empty_payload(self):
+        """Test an empty response gives an empty frame"""
+        times, values, complete = parse_candle_arrays([])
+        assert times.shape == (0,) and values.shape == (0, 5)
+        assert list(parse_candles({"candles": []}).columns) == [
+            "date",
+            "open",
+            "high",
+            "low",
+            "close",
+            "volume",
+        ]
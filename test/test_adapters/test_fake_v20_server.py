@@ -0,0 +1,188 @@
+import asyncio
+
+import numpy as np
+import pytest
+from oandapyV20.exceptions import V20Error
+
+from src.adapters.fxcm_connect.oanda_connect import OandaConnect
+from src.config import ForexPairEnum, PeriodEnum
+from src.domain.events import TradeClosedEvent
+from test.fake_v20_server import FakeV20Config, FakeV20Server, PriceModel
+
+ACCOUNT_ID = "101-004-1234567-001"
+START = 1_700_000_000.0
+
+
+class Clock:
+    def __init__(self, now: float = START) -> None:
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def connect(server: FakeV20Server, monkeypatch, **env) -> OandaConnect:
+    monkeypatch.setenv("OANDA_TOKEN", "token")
+    monkeypatch.setenv("OANDA_ACCOUNT_ID", ACCOUNT_ID)
+    monkeypatch.setenv("OANDA_API_URL", server.url)
+    monkeypatch.setenv("OANDA_ACCOUNT_MAX_AGE", "0")
+    for key, value in env.items():
+        monkeypatch.setenv(key, value)
+    return OandaConnect()
+
+
+class TestPriceModel:
+    def test_prices_are_deterministic(self):
+        """the same seed and time give the same price"""
+        times = START + np.arange(100) * 5
+        first = PriceModel(seed=1).mid("EUR_USD", times)
+        second = PriceModel(seed=1).mid("EUR_USD", times)
+        other = PriceModel(seed=2).mid("EUR_USD", times)
+        np.testing.assert_array_equal(first, second)
+        assert not np.array_equal(first, other)
+        assert np.all(np.abs(first / 1.09 - 1) < 0.02)
+
+    def test_candles_are_consistent(self):
+        """high and low bound the open and close"""
+        starts = START + np.arange(50) * 300.0
+        candles = PriceModel().candles(
+            "USD_JPY", "M5", starts, starts[-1] + 10
+        )
+        assert [c["complete"] for c in candles] == [True] * 49 + [False]
+        for candle in candles:
+            o, h, l, c = (float(candle["mid"][k]) for k in "ohlc")
+            assert l <= min(o, c) <= max(o, c) <= h
+
+
+class TestFakeV20Server:
+    @pytest.mark.asyncio
+    async def test_candles(self, monkeypatch):
+        """the connection parses candles served by the fake api"""
+        async with FakeV20Server(clock=Clock()) as server:
+            connection = connect(server, monkeypatch)
+            df = await connection.get_candle_data(
+                ForexPairEnum.EURUSD, PeriodEnum.MINUTE_5, 200
+            )
+            again = await connection.request_candles(
+                ForexPairEnum.EURUSD, PeriodEnum.MINUTE_5, {"count": 200}
+            )
+            await connection.close_connection()
+        assert len(df) == 200
+        assert list(df.columns[:5]) == ["date", "open", "high", "low", "close"]
+        assert float(again["candles"][-1]["mid"]["c"]) == df["close"].iloc[-1]
+
+    @pytest.mark.asyncio
+    async def test_open_and_close_trade(self, monkeypatch):
+        """a trade is opened, reported open and closed with its pl"""
+        clock = Clock()
+        async with FakeV20Server(clock=clock) as server:
+            connection = connect(server, monkeypatch)
+            trade_id, price, _ = await connection.open_trade(
+                ForexPairEnum.GBPUSD, True, 1.0, 2.0, 10000
+            )
+            assert await connection.get_trade_state(trade_id) == (
+                "OPEN",
+                0.0,
+            )
+            pending = await connection.get_pending_orders()
+            clock.now += 600
+            status, pl = await connection.close_trade(trade_id, 10000)
+            states = await connection.get_trades_by_ids([trade_id])
+            balance = float(await connection.get_account_balance())
+            await connection.close_connection()
+        assert price > 1
+        assert [order.state for order in pending] == ["PENDING"] * 2
+        assert status == "CLOSED"
+        assert states == {trade_id: ("CLOSED", pl)}
+        assert balance == pytest.approx(100000 + pl, abs=1e-3)
+
+    @pytest.mark.asyncio
+    async def test_stop_loss_is_triggered(self, monkeypatch):
+        """a stop loss above the market closes a buy on the next tick"""
+        async with FakeV20Server(clock=Clock()) as server:
+            connection = connect(server, monkeypatch)
+            trade_id, price, _ = await connection.open_trade(
+                ForexPairEnum.EURUSD, True, None, None, 1000
+            )
+            await connection.modify_trade(trade_id, price + 0.1)
+            state, pl = await connection.get_trade_state(trade_id)
+            await connection.close_connection()
+        assert state == "CLOSED"
+        assert pl < 0
+
+    @pytest.mark.asyncio
+    async def test_spread(self, monkeypatch):
+        """the spread matches the configured number of pips"""
+        config = FakeV20Config(spread_pips=2.0)
+        async with FakeV20Server(config, clock=Clock()) as server:
+            connection = connect(server, monkeypatch)
+            spread = await connection.get_spread(ForexPairEnum.USDJPY)
+            await connection.close_connection()
+        assert spread == pytest.approx(2.0, abs=0.11)
+
+    @pytest.mark.asyncio
+    async def test_injected_errors_are_retried(self, monkeypatch):
+        """503s are retried by the request governor"""
+        config = FakeV20Config(error_rate=0.5, seed=3)
+        async with FakeV20Server(config, clock=Clock()) as server:
+            connection = connect(server, monkeypatch, OANDA_MAX_RETRIES="10")
+            connection.client.backoff = 0.001
+            for _ in range(10):
+                await connection.request_candles(
+                    ForexPairEnum.EURUSD, PeriodEnum.HOUR_1, {"count": 10}
+                )
+            stats = connection.client.stats()["InstrumentsCandles"]
+            await connection.close_connection()
+        assert server.errors_injected > 0
+        assert stats["retries"] == server.errors_injected
+
+    @pytest.mark.asyncio
+    async def test_rate_limit(self, monkeypatch):
+        """requests above the rate limit are refused with a 429"""
+        config = FakeV20Config(rate_limit=5)
+        async with FakeV20Server(config, clock=Clock()) as server:
+            connection = connect(server, monkeypatch, OANDA_MAX_RETRIES="0")
+            results = []
+            for _ in range(10):
+                try:
+                    results.append(await connection.get_account_details())
+                except V20Error as e:
+                    results.append(e)
+            await connection.close_connection()
+        errors = [r for r in results if isinstance(r, V20Error)]
+        assert errors and all(e.code == 429 for e in errors)
+        assert server.throttled == len(errors)
+
+    @pytest.mark.asyncio
+    async def test_transaction_stream(self, monkeypatch):
+        """closing a trade publishes a trade closed event"""
+        events = []
+        closed = asyncio.Event()
+
+        async def publish(event):
+            events.append(event)
+            closed.set()
+
+        config = FakeV20Config(heartbeat_interval=0.05)
+        async with FakeV20Server(config, clock=Clock()) as server:
+            connection = connect(server, monkeypatch)
+            trade_id, _, _ = await connection.open_trade(
+                ForexPairEnum.AUDUSD, False, 1.0, 0.1, 5000
+            )
+            task = asyncio.create_task(
+                connection.start_transaction_stream(publish)
+            )
+            await asyncio.sleep(0.2)
+            _, pl = await connection.close_trade(trade_id, 5000)
+            await asyncio.wait_for(closed.wait(), timeout=2)
+            await connection.close_connection()
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        assert events == [
+            TradeClosedEvent(
+                trade_id=trade_id,
+                realised_pl=pl,
+                reason="MARKET_ORDER_TRADE_CLOSE",
+                transaction_id=events[0].transaction_id,
+            )
+        ]
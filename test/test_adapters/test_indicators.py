@@ -1,8 +1,12 @@
 import os
 
+import numpy as np
 import pandas as pd
 from src.adapters.fxcm_connect.mock_trade_connect import MockTradeConnect
-from src.service_layer.indicators import Indicators
+from src.config import ForexPairEnum
+from src.service_layer import indicator_kernels as kernels
+from src.service_layer.indicator_panel import OHLCV, CandlePanel
+from src.service_layer.indicators import Indicators, set_default_backend
 import pytest
 
 file = os.path.abspath(os.curdir) + "/test/data.csv"
@@ -131,3 +135,124 @@ class TestIndicators:
         data = await indicators.get_accumulation_distribution(refined_data)
         assert "ad" in data
         assert len(data.columns) == 7
+
+
+NUMPY_CASES = [
+    ("get_simple_moving_average", (10, "close")),
+    ("get_exponential_moving_average", (10, "close")),
+    ("get_macd", ("close",)),
+    ("get_stocastic", ()),
+    ("get_rsi", ()),
+    ("get_rsi", (14, False)),
+    ("get_bollinger", ()),
+    ("get_adx", ()),
+    ("get_atr", ()),
+    ("get_obv", ()),
+    ("get_accumulation_distribution", ()),
+]
+
+
+class TestNumpyBackend:
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("method, args", NUMPY_CASES)
+    async def test_matches_pandas(self, method, args):
+        """the numpy kernels give the pandas columns and values"""
+        data = await connect.get_candle_data()
+        expected = await getattr(Indicators(), method)(data.copy(), *args)
+        result = await getattr(Indicators(), method)(
+            data.copy(), *args, backend="numpy"
+        )
+        assert list(result.columns) == list(expected.columns)
+        for column in expected.columns:
+            np.testing.assert_allclose(
+                result[column].values.astype(float),
+                expected[column].values.astype(float),
+                rtol=1e-9,
+                atol=1e-9,
+            )
+
+    @pytest.mark.asyncio
+    async def test_backend_selection(self):
+        """the call overrides the instance which overrides the default"""
+        data = await connect.get_candle_data()
+        assert not Indicators().use_numpy()
+        assert Indicators("numpy").use_numpy()
+        assert not Indicators("numpy").use_numpy("pandas")
+        set_default_backend("numpy")
+        try:
+            assert Indicators().use_numpy()
+            result = await Indicators().get_rsi(data.copy())
+        finally:
+            set_default_backend("pandas")
+        expected = await Indicators().get_rsi(data.copy())
+        np.testing.assert_allclose(result["rsi"], expected["rsi"])
+        with pytest.raises(ValueError):
+            Indicators("fortran")
+
+    def test_ewm_with_gaps(self):
+        """missing values inside the series follow pandas"""
+        values = np.array([np.nan, 1.0, 2.0, np.nan, 4.0, 3.0, np.nan, 5.0])
+        for adjust in (True, False):
+            expected = pd.Series(values).ewm(alpha=0.3, adjust=adjust).mean()
+            np.testing.assert_allclose(
+                kernels.ewm_mean(values, 0.3, adjust), expected.values
+            )
+
+    def test_long_linear_filter(self):
+        """the blocked cumulative sum stays finite over long histories"""
+        values = np.random.default_rng(1).normal(size=100_000)
+        expected = pd.Series(values).ewm(alpha=0.5, adjust=False).mean()
+        np.testing.assert_allclose(
+            kernels.ewm_mean(values, 0.5, False), expected.values, atol=1e-9
+        )
+
+
+class TestPanel:
+    @pytest.mark.asyncio
+    async def test_panel_matches_frames(self):
+        """each pair of the panel matches its own dataframe"""
+        data = await connect.get_candle_data()
+        frames = {
+            ForexPairEnum.EURUSD: data.iloc[:400].reset_index(drop=True),
+            ForexPairEnum.GBPUSD: data.iloc[300:700].reset_index(drop=True),
+            ForexPairEnum.USDJPY: data.iloc[600:].reset_index(drop=True),
+        }
+        indicators = Indicators()
+        panel = CandlePanel.from_frames(frames)
+        assert panel.shape == (3, 400)
+        panel = await indicators.get_panel_simple_moving_average(panel, 5)
+        panel = await indicators.get_panel_fibonacci_retracements(panel)
+        panel = await indicators.get_panel_rsi(panel)
+        panel = await indicators.get_panel_macd(panel)
+        panel = await indicators.get_panel_atr(panel, 14)
+        panel = await indicators.get_panel_adx(panel, 14)
+        for pair, frame in frames.items():
+            expected = await indicators.get_simple_moving_average(
+                frame, 5, "close"
+            )
+            expected = await indicators.fibonacci_retracements(expected)
+            expected = await indicators.get_rsi(expected)
+            expected = await indicators.get_macd(expected, "close")
+            expected = await indicators.get_atr(expected, 14)
+            expected = await indicators.get_adx(expected, 14)
+            result = panel.frame(pair)
+            assert list(result.columns) == list(expected.columns)
+            assert (result["date"] == expected["date"]).all()
+            for column in expected.columns.drop("date"):
+                np.testing.assert_allclose(
+                    result[column], expected[column], rtol=1e-9, atol=1e-9
+                )
+
+    def test_uneven_history(self):
+        """pairs are aligned on their latest bars"""
+        frames = {
+            ForexPairEnum.EURUSD: pd.DataFrame(
+                {name: [1.0, 2.0, 3.0] for name in OHLCV}
+            ),
+            ForexPairEnum.GBPUSD: pd.DataFrame(
+                {name: [5.0, 6.0] for name in OHLCV}
+            ),
+        }
+        panel = CandlePanel.from_frames(frames)
+        assert panel.shape == (2, 2)
+        assert list(panel.frame(ForexPairEnum.EURUSD)["close"]) == [2.0, 3.0]
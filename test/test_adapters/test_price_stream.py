@@ -0,0 +1,206 @@
+import asyncio
+import json
+
+import pytest
+
+from src.adapters.fxcm_connect.async_transport import AsyncV20API
+from src.adapters.fxcm_connect.price_stream import (
+    PriceBook,
+    PricingStreamSubscriber,
+)
+
+
+def price(instrument: str, bid: float, ask: float) -> dict:
+    return {
+        "type": "PRICE",
+        "instrument": instrument,
+        "time": "2023-06-22T08:25:00.000000000Z",
+        "bids": [{"price": str(bid), "liquidity": 1000000}],
+        "asks": [{"price": str(ask), "liquidity": 1000000}],
+    }
+
+
+HEARTBEAT = {"type": "HEARTBEAT", "time": "2023-06-22T08:25:05.000000000Z"}
+
+
+class FakeStreamServer:
+    """Streams chunked json lines, one list of messages per connection"""
+
+    def __init__(self, sessions: list[list[dict]], hold: bool = True):
+        self.sessions = sessions
+        self.hold = hold
+        self.connections = 0
+        self.targets: list[str] = []
+        self.handlers: set[asyncio.Task] = set()
+
+    async def __aenter__(self) -> "FakeStreamServer":
+        self.server = await asyncio.start_server(self.handle, "127.0.0.1", 0)
+        port = self.server.sockets[0].getsockname()[1]
+        self.url = "http://127.0.0.1:%s" % port
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        self.server.close()
+        for task in self.handlers:
+            task.cancel()
+        await asyncio.gather(*self.handlers, return_exceptions=True)
+
+    async def handle(self, reader, writer) -> None:
+        self.handlers.add(asyncio.current_task())
+        session = self.connections
+        self.connections += 1
+        try:
+            request_line = await reader.readline()
+            self.targets.append(request_line.decode().split(" ")[1])
+            while await reader.readline() != b"\r\n":
+                pass
+            writer.write(
+                b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n"
+            )
+            messages = self.sessions[min(session, len(self.sessions) - 1)]
+            for message in messages:
+                line = json.dumps(message).encode() + b"\n"
+                writer.write(b"%x\r\n%s\r\n" % (len(line), line))
+                await writer.drain()
+            if self.hold and session == len(self.sessions) - 1:
+                await asyncio.sleep(3600)
+            writer.write(b"0\r\n\r\n")
+            await writer.drain()
+        finally:
+            writer.close()
+
+
+async def wait_for(condition, timeout: float = 2.0) -> None:
+    async with asyncio.timeout(timeout):
+        while not condition():
+            await asyncio.sleep(0.01)
+
+
+class TestPriceBook:
+    def test_quote_is_served_while_fresh(self):
+        """Test a fresh quote is returned with its mid and spread"""
+        book = PriceBook(max_age=10)
+        book.update("EUR_USD", 1.1000, 1.1002, "2023-06-22T08:25:00Z")
+        quote = book.get("EUR/USD")
+        assert quote.mid == pytest.approx(1.1001)
+        assert quote.spread == pytest.approx(2)
+
+    def test_jpy_spread_uses_the_jpy_pip(self):
+        """Test the spread of a yen pair is in yen pips"""
+        book = PriceBook(max_age=10)
+        book.update("USD_JPY", 140.00, 140.03, "2023-06-22T08:25:00Z")
+        assert book.get("USD/JPY").spread == pytest.approx(3)
+
+    def test_quote_goes_stale_without_heartbeats(self):
+        """Test an old quote is not served once heartbeats stop"""
+        book = PriceBook(max_age=0)
+        book.update("EUR_USD", 1.1000, 1.1002, "2023-06-22T08:25:00Z")
+        book.disconnected()
+        assert book.is_stale("EUR/USD")
+        assert book.get("EUR/USD") is None
+
+    def test_unknown_instrument_is_stale(self):
+        """Test an instrument without a quote is stale"""
+        assert PriceBook().get("EUR/USD") is None
+
+
+class TestPricingStreamSubscriber:
+    @pytest.mark.asyncio
+    async def test_prices_and_heartbeats_update_the_book(self):
+        """Test streamed prices land in the book"""
+        messages = [
+            price("EUR_USD", 1.1, 1.1002),
+            HEARTBEAT,
+            price("GBP_USD", 1.27, 1.2702),
+        ]
+        async with FakeStreamServer([messages]) as server:
+            client = AsyncV20API("token", api_url=server.url)
+            book = PriceBook()
+            subscriber = PricingStreamSubscriber(
+                client, "123", ["GBP/USD", "EUR/USD", "EUR/USD"], book
+            )
+            task = asyncio.create_task(subscriber.start())
+            await wait_for(lambda: subscriber.prices_received == 2)
+
+            assert book.get("GBP/USD").bid == 1.27
+            assert book.last_heartbeat is not None
+            assert server.targets[0] == (
+                "/v3/accounts/123/pricing/stream"
+                "?instruments=EUR_USD%2CGBP_USD"
+            )
+            await asyncio.wait_for(subscriber.stop(), 1)
+            assert task.done()
+
+    @pytest.mark.asyncio
+    async def test_reconnects_when_the_stream_drops(self):
+        """Test the subscriber reconnects after the server closes"""
+        sessions = [
+            [price("EUR_USD", 1.1, 1.1002)],
+            [price("EUR_USD", 1.2, 1.2002), HEARTBEAT],
+        ]
+        async with FakeStreamServer(sessions) as server:
+            client = AsyncV20API("token", api_url=server.url)
+            book = PriceBook()
+            subscriber = PricingStreamSubscriber(
+                client, "123", ["EUR/USD"], book, reconnect_delay=0.01
+            )
+            task = asyncio.create_task(subscriber.start())
+            await wait_for(lambda: subscriber.prices_received == 2)
+
+            assert subscriber.reconnects == 1
+            assert server.connections == 2
+            assert book.get("EUR/USD").bid == 1.2
+            await asyncio.wait_for(subscriber.stop(), 1)
+            assert task.done()
+
+    @pytest.mark.asyncio
+    async def test_reconnects_when_heartbeats_stop(self):
+        """Test a silent stream is treated as dead"""
+        async with FakeStreamServer([[HEARTBEAT]]) as server:
+            client = AsyncV20API("token", api_url=server.url)
+            subscriber = PricingStreamSubscriber(
+                client,
+                "123",
+                ["EUR/USD"],
+                PriceBook(),
+                heartbeat_timeout=0.05,
+                reconnect_delay=0.01,
+            )
+            task = asyncio.create_task(subscriber.start())
+            await wait_for(lambda: server.connections >= 2)
+
+            assert subscriber.reconnects >= 1
+            await asyncio.wait_for(subscriber.stop(), 1)
+            assert task.done()
+
+    @pytest.mark.asyncio
+    async def test_stop_interrupts_a_blocked_read(self):
+        """Test stop returns at once while the stream is silent and the
+        heartbeat timeout is still far off"""
+        async with FakeStreamServer([[HEARTBEAT]]) as server:
+            client = AsyncV20API("token", api_url=server.url)
+            subscriber = PricingStreamSubscriber(
+                client, "123", ["EUR/USD"], PriceBook(), heartbeat_timeout=60
+            )
+            task = asyncio.create_task(subscriber.start())
+            await wait_for(lambda: subscriber.connected)
+
+            await asyncio.wait_for(subscriber.stop(), 1)
+            assert task.done()
+            assert not subscriber.running
+            assert subscriber.reconnects == 0
+
+    @pytest.mark.asyncio
+    async def test_stop_interrupts_the_reconnect_delay(self):
+        """Test stop does not wait out the backoff"""
+        async with FakeStreamServer([[HEARTBEAT]], hold=False) as server:
+            client = AsyncV20API("token", api_url=server.url)
+            subscriber = PricingStreamSubscriber(
+                client, "123", ["EUR/USD"], PriceBook(), reconnect_delay=60
+            )
+            task = asyncio.create_task(subscriber.start())
+            await wait_for(lambda: subscriber.reconnects == 1)
+
+            await asyncio.wait_for(subscriber.stop(), 1)
+            assert task.done()
+            assert server.connections == 1
@@ -0,0 +1,135 @@
+import asyncio
+
+import pytest
+from oandapyV20.endpoints.orders import OrderCreate
+from oandapyV20.endpoints.pricing import PricingInfo
+from oandapyV20.exceptions import V20Error
+
+from src.adapters.fxcm_connect.request_governor import (
+    RequestGovernor,
+    RetryBudget,
+    TokenBucket,
+)
+
+
+class FakeClient:
+    """Fails the first number of calls then answers after a delay"""
+
+    def __init__(self, failures=(), delay: float = 0.01) -> None:
+        self.failures = list(failures)
+        self.delay = delay
+        self.calls = 0
+
+    async def request(self, endpoint):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.failures:
+            raise self.failures.pop(0)
+        endpoint.response = {"call": self.calls}
+        endpoint.status_code = 200
+        return endpoint.response
+
+
+def pricing(instruments: str = "EUR_USD") -> PricingInfo:
+    return PricingInfo(accountID="123", params={"instruments": instruments})
+
+
+class TestTokenBucket:
+    @pytest.mark.asyncio
+    async def test_requests_above_the_rate_wait(self):
+        """Test a burst larger than the bucket is spread out"""
+        bucket = TokenBucket(rate=100, capacity=1)
+        waits = [await bucket.acquire() for _ in range(5)]
+        assert waits[0] == 0
+        assert sum(waits) == pytest.approx(0.04, abs=0.01)
+
+
+class TestRequestGovernor:
+    @pytest.mark.asyncio
+    async def test_identical_gets_in_flight_are_coalesced(self):
+        """Test concurrent identical reads share one request"""
+        client = FakeClient()
+        governor = RequestGovernor(client)
+        endpoints = [pricing() for _ in range(10)]
+        responses = await asyncio.gather(
+            *[governor.request(endpoint) for endpoint in endpoints]
+        )
+        assert client.calls == 1
+        assert all(r == {"call": 1} for r in responses)
+        assert all(e.response == {"call": 1} for e in endpoints)
+        assert governor.stats()["PricingInfo"]["coalesced"] == 9
+
+    @pytest.mark.asyncio
+    async def test_cancelled_leader_does_not_cancel_waiters(self):
+        """Test a waiter makes the read itself when the request it was
+        coalesced onto is cancelled"""
+        client = FakeClient(delay=0.05)
+        governor = RequestGovernor(client)
+        leader = asyncio.create_task(governor.request(pricing()))
+        await asyncio.sleep(0.01)
+        waiter = asyncio.create_task(governor.request(pricing()))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        assert await waiter == {"call": 2}
+        assert leader.cancelled()
+        assert client.calls == 2
+        assert governor.stats()["PricingInfo"]["coalesced"] == 1
+
+    @pytest.mark.asyncio
+    async def test_different_params_are_not_coalesced(self):
+        """Test reads for different instruments go out separately"""
+        client = FakeClient()
+        governor = RequestGovernor(client)
+        await asyncio.gather(
+            governor.request(pricing("EUR_USD")),
+            governor.request(pricing("GBP_USD")),
+        )
+        assert client.calls == 2
+
+    @pytest.mark.asyncio
+    async def test_server_errors_on_reads_are_retried(self):
+        """Test a read is retried after a 503 and a timeout"""
+        client = FakeClient(failures=[V20Error(503, "busy"), TimeoutError()])
+        governor = RequestGovernor(client, backoff=0.001)
+        assert await governor.request(pricing()) == {"call": 3}
+        stats = governor.stats()["PricingInfo"]
+        assert stats["retries"] == 2 and stats["errors"] == 2
+        assert stats["latency_p50"] is not None
+
+    @pytest.mark.asyncio
+    async def test_client_errors_and_writes_are_not_retried(self):
+        """Test a 400 and a failed order are raised straight away"""
+        client = FakeClient(failures=[V20Error(400, "bad")])
+        governor = RequestGovernor(client, backoff=0.001)
+        with pytest.raises(V20Error):
+            await governor.request(pricing())
+
+        client = FakeClient(failures=[V20Error(503, "busy")])
+        governor = RequestGovernor(client, backoff=0.001)
+        with pytest.raises(V20Error):
+            await governor.request(OrderCreate("123", data={"order": {}}))
+        assert client.calls == 1
+
+    @pytest.mark.asyncio
+    async def test_retry_budget_limits_retries(self):
+        """Test retries stop once the budget is spent"""
+        client = FakeClient(failures=[V20Error(429, "slow down")] * 10)
+        governor = RequestGovernor(
+            client,
+            max_retries=10,
+            backoff=0.001,
+            retry_budget=RetryBudget(ratio=0, reserve=2),
+        )
+        with pytest.raises(V20Error):
+            await governor.request(pricing())
+        assert client.calls == 3
+        assert governor.stats()["PricingInfo"]["rate_limited"] == 3
+
+    @pytest.mark.asyncio
+    async def test_endpoint_classes_are_throttled(self):
+        """Test each endpoint class is held to its own rate"""
+        client = FakeClient(delay=0)
+        governor = RequestGovernor(client, rate=100, burst=1)
+        for instrument in ["EUR_USD", "GBP_USD", "USD_JPY"]:
+            await governor.request(pricing(instrument))
+        assert governor.stats()["PricingInfo"]["throttled"] == 2
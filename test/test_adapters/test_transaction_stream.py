@@ -0,0 +1,146 @@
+import asyncio
+
+import pytest
+from oandapyV20.endpoints.transactions import (
+    TransactionsSinceID,
+    TransactionsStream,
+)
+
+from src.adapters.fxcm_connect.transaction_stream import (
+    TransactionStreamSubscriber,
+    to_events,
+)
+from src.domain.events import TradeClosedEvent
+
+
+def fill(transaction_id: int, trade_id: str, pl: str, reason: str) -> dict:
+    return {
+        "id": str(transaction_id),
+        "type": "ORDER_FILL",
+        "reason": reason,
+        "tradesClosed": [{"tradeID": trade_id, "realizedPL": pl}],
+    }
+
+
+def heartbeat(last_id: int) -> dict:
+    return {"type": "HEARTBEAT", "lastTransactionID": str(last_id)}
+
+
+class FakeClient:
+    """Scripted stream sessions plus a transactions since id lookup"""
+
+    def __init__(self, sessions: list[list[dict]], history: list[dict]):
+        self.sessions = sessions
+        self.history = history
+        self.streams_opened = 0
+        self.since_ids: list[str] = []
+
+    async def request(self, endpoint):
+        if isinstance(endpoint, TransactionsSinceID):
+            since = int(endpoint.params["id"])
+            self.since_ids.append(endpoint.params["id"])
+            return {
+                "transactions": [
+                    t for t in self.history if int(t["id"]) > since
+                ]
+            }
+        assert isinstance(endpoint, TransactionsStream)
+        session = self.sessions[
+            min(self.streams_opened, len(self.sessions) - 1)
+        ]
+        hold = self.streams_opened >= len(self.sessions) - 1
+        self.streams_opened += 1
+        return self._stream(session, hold)
+
+    async def _stream(self, messages, hold):
+        for message in messages:
+            yield message
+        if hold:
+            await asyncio.sleep(3600)
+
+
+async def wait_for(condition, timeout: float = 2.0) -> None:
+    async with asyncio.timeout(timeout):
+        while not condition():
+            await asyncio.sleep(0.01)
+
+
+class TestToEvents:
+    def test_stop_loss_fill_closes_the_trade(self):
+        """Test a stop loss fill becomes a trade closed event"""
+        events = to_events(fill(7, "3", "-12.5", "STOP_LOSS_ORDER"))
+        assert events == [
+            TradeClosedEvent(
+                trade_id="3",
+                realised_pl=-12.5,
+                reason="STOP_LOSS_ORDER",
+                transaction_id="7",
+            )
+        ]
+
+    def test_other_transactions_are_ignored(self):
+        """Test transactions that close nothing publish nothing"""
+        assert to_events({"id": "8", "type": "STOP_LOSS_ORDER"}) == []
+        assert to_events({"id": "9", "type": "ORDER_FILL"}) == []
+
+
+class TestTransactionStreamSubscriber:
+    @pytest.mark.asyncio
+    async def test_fills_are_published_as_they_stream(self):
+        """Test streamed fills reach the event bus"""
+        published = []
+
+        async def publish(event):
+            published.append(event)
+
+        client = FakeClient(
+            [[heartbeat(5), fill(6, "1", "10.0", "TAKE_PROFIT_ORDER")]],
+            history=[],
+        )
+        subscriber = TransactionStreamSubscriber(client, "123", publish)
+        task = asyncio.create_task(subscriber.start())
+        await wait_for(lambda: len(published) == 1)
+
+        assert published[0].trade_id == "1"
+        assert published[0].reason == "TAKE_PROFIT_ORDER"
+        assert subscriber.last_transaction_id == "6"
+        # the stream is held open, stop interrupts the blocked read
+        await asyncio.wait_for(subscriber.stop(), 1)
+        assert task.done()
+
+    @pytest.mark.asyncio
+    async def test_missed_transactions_are_caught_up_after_a_reconnect(
+        self,
+    ):
+        """Test fills made while disconnected are fetched once"""
+        published = []
+
+        async def publish(event):
+            published.append(event)
+
+        history = [
+            fill(6, "1", "10.0", "TAKE_PROFIT_ORDER"),
+            fill(7, "2", "-4.0", "STOP_LOSS_ORDER"),
+            fill(8, "3", "2.0", "MARKET_ORDER_TRADE_CLOSE"),
+        ]
+        client = FakeClient(
+            [
+                [heartbeat(5), history[0]],
+                # the stream dropped while 7 and 8 happened
+                [heartbeat(8), history[2]],
+            ],
+            history=history,
+        )
+        subscriber = TransactionStreamSubscriber(
+            client, "123", publish, reconnect_delay=0.01
+        )
+        task = asyncio.create_task(subscriber.start())
+        await wait_for(lambda: len(published) == 3)
+        await asyncio.sleep(0.05)
+
+        assert [event.trade_id for event in published] == ["1", "2", "3"]
+        assert client.since_ids[0] == "6"
+        assert subscriber.reconnects == 1
+        # the stream is held open, stop interrupts the blocked read
+        await asyncio.wait_for(subscriber.stop(), 1)
+        assert task.done()
@@ -1,6 +1,8 @@
+import asyncio
+
 import pandas as pd
 from src.adapters.fxcm_connect.mock_trade_connect import MockTradeConnect
-from src.config import SentimentEnum
+from src.config import ForexPairEnum, SentimentEnum
 from src.domain.events import CloseForexPairEvent, OpenTradeEvent
 from src.entry_points.scheduler.get_technical_signal import (
     get_signal,
@@ -116,3 +118,113 @@ class TestGetTechnicalSignal:
             event = await uow.event_bus.queue.get()
             assert isinstance(event, OpenTradeEvent)
             assert event.sentiment == SentimentEnum.BEARISH
+
+
+class TestGetTechnicalSignalFanOut:
+    @pytest.mark.asyncio
+    async def test_pairs_run_concurrently_up_to_the_limit(self) -> None:
+        """Test every pair runs with at most concurrency in flight"""
+        connection = MockTradeConnect()
+        uow = MongoUnitOfWork(
+            fxcm_connection=connection,
+            scraper=mock.MagicMock(),
+            db_name="test_fan_out",
+        )
+        original = connection.get_candle_data
+        in_flight = 0
+        max_in_flight = 0
+
+        async def slow_candle_data(**kwargs):
+            nonlocal in_flight, max_in_flight
+            in_flight += 1
+            max_in_flight = max(max_in_flight, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            return await original(**kwargs)
+
+        with mock.patch.object(
+            connection, "get_candle_data", side_effect=slow_candle_data
+        ):
+            timings = await get_technical_signal(
+                uow=uow, indicator=Indicators(), concurrency=4
+            )
+
+        assert max_in_flight == 4
+        assert set(timings) == set(ForexPairEnum)
+        assert all(elapsed > 0 for elapsed in timings.values())
+
+    @pytest.mark.asyncio
+    async def test_failing_pair_does_not_stop_the_cycle(self) -> None:
+        """Test one pair failing still evaluates the other pairs"""
+        connection = MockTradeConnect()
+        uow = MongoUnitOfWork(
+            fxcm_connection=connection,
+            scraper=mock.MagicMock(),
+            db_name="test_fan_out",
+        )
+        original = connection.get_candle_data
+
+        async def failing_candle_data(instrument, **kwargs):
+            if instrument == ForexPairEnum.EURUSD:
+                raise ValueError("broker unavailable")
+            return await original(instrument=instrument, **kwargs)
+
+        with mock.patch.object(
+            connection, "get_candle_data", side_effect=failing_candle_data
+        ):
+            timings = await get_technical_signal(
+                uow=uow, indicator=Indicators(), concurrency=8
+            )
+
+        assert len(timings) == len(ForexPairEnum)
+
+    @pytest.mark.asyncio
+    async def test_slow_pair_does_not_hold_the_others(self) -> None:
+        """Test a pair publishes its signal while another is still
+        fetching its candles"""
+        connection = MockTradeConnect()
+        uow = MongoUnitOfWork(
+            fxcm_connection=connection,
+            scraper=mock.MagicMock(),
+            db_name="test_fan_out",
+        )
+        original = connection.get_candle_data
+        opened = asyncio.Event()
+        published = []
+
+        async def slow_candle_data(instrument, **kwargs):
+            if instrument == ForexPairEnum.EURUSD:
+                # only returns once another pair has opened its trade
+                await asyncio.wait_for(opened.wait(), 1)
+            return await original(instrument=instrument, **kwargs)
+
+        async def publish(event):
+            published.append(event)
+            if isinstance(event, OpenTradeEvent):
+                opened.set()
+
+        async def bullish(refined_data, tail=None):
+            refined_data = refined_data.copy()
+            refined_data["Signal"] = 1
+            refined_data["ATR_Stop"] = refined_data["close"] - 0.01
+            refined_data["ATR_Limit"] = refined_data["close"] + 0.01
+            return refined_data
+
+        with mock.patch.object(
+            connection, "get_candle_data", side_effect=slow_candle_data
+        ), mock.patch.object(uow, "publish", side_effect=publish), mock.patch(
+            "src.entry_points.scheduler.get_technical_signal.get_signal",
+            side_effect=bullish,
+        ):
+            timings = await get_technical_signal(
+                uow=uow, indicator=Indicators(), concurrency=8
+            )
+
+        opens = [
+            event.forex_pair
+            for event in published
+            if isinstance(event, OpenTradeEvent)
+        ]
+        assert opens[0] != ForexPairEnum.EURUSD
+        assert ForexPairEnum.EURUSD in opens
+        assert set(timings) == set(ForexPairEnum)
@@ -0,0 +1,76 @@
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+
+from src.entry_points.latency import LatencyRecorder, add_latency_middleware
+
+
+async def get(app: FastAPI, path: str) -> int:
+    """Sends a get request straight to the asgi app, returns the status"""
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": b"",
+        "headers": [],
+        "client": ("test", 1),
+        "server": ("test", 80),
+    }
+    messages = []
+    requested = False
+    finished = asyncio.Event()
+
+    async def receive():
+        nonlocal requested
+        if not requested:
+            requested = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await finished.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        messages.append(message)
+        if not message.get("more_body", True):
+            finished.set()
+
+    await app(scope, receive, send)
+    return messages[0]["status"]
+
+
+class TestLatency:
+    def test_summary(self):
+        """percentiles cover the whole buffer or the requests since a mark"""
+        recorder = LatencyRecorder(size=100)
+        assert recorder.summary() == {"count": 0}
+        for _ in range(150):
+            recorder.record(0.001)
+        mark = recorder.mark()
+        for _ in range(10):
+            recorder.record(0.1)
+        assert recorder.summary()["count"] == 100
+        summary = recorder.summary(since=mark)
+        assert summary["count"] == 10
+        assert summary["p99"] == pytest.approx(100)
+
+    @pytest.mark.asyncio
+    async def test_middleware(self):
+        """every request served by the app is recorded"""
+        recorder = LatencyRecorder()
+        app = FastAPI()
+        add_latency_middleware(app, recorder)
+
+        @app.get("/slow")
+        async def slow():
+            await asyncio.sleep(0.05)
+            return "done"
+
+        assert await get(app, "/slow") == 200
+        assert await get(app, "/missing") == 404
+        assert recorder.count == 2
+        assert recorder.durations().max() >= 0.05
@@ -0,0 +1,228 @@
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.adapters.fxcm_connect.replay_trade_connect import (
+    STOP_LOSS,
+    TAKE_PROFIT,
+    ReplayTradeConnect,
+)
+from src.config import (
+    CurrencyEnum,
+    ForexPairEnum,
+    PositionEnum,
+    SentimentEnum,
+)
+from src.domain.events import TradeClosedEvent
+from src.domain.fundamental import CalendarEvent, FundamentalData
+from src.entry_points.scheduler.replay import Replay, Timings
+from src.service_layer.clock import Clock, clock
+from test.test_service_layer.test_backtest import random_candles
+
+RATES = {"GBP/USD": 1.25}
+
+
+def flat_fundamentals() -> list[FundamentalData]:
+    """Processed flat data for every currency, so signals can trade"""
+    return [
+        FundamentalData(
+            currency=currency,
+            last_updated=datetime(2019, 12, 31),
+            processed=True,
+        )
+        for currency in CurrencyEnum
+    ]
+
+
+def candles(
+    closes: list[float], lows=None, highs=None, opens=None
+) -> pd.DataFrame:
+    closes = np.asarray(closes, dtype=float)
+    return pd.DataFrame(
+        {
+            "date": pd.date_range(
+                "2020-01-01", periods=len(closes), freq="5min"
+            ),
+            "open": closes if opens is None else opens,
+            "high": closes if highs is None else highs,
+            "low": closes if lows is None else lows,
+            "close": closes,
+            "volume": np.ones(len(closes)),
+        }
+    )
+
+
+class TestReplayTradeConnect:
+    @pytest.mark.asyncio
+    async def test_candles_complete_at_the_clock(self):
+        """only candles that closed by the clock's time are served"""
+        replay_clock = Clock()
+        broker = ReplayTradeConnect(
+            {ForexPairEnum.EURUSD: candles([1.1, 1.2, 1.3, 1.4])},
+            clock=replay_clock,
+        )
+        replay_clock.set_time(datetime(2020, 1, 1, 0, 14))
+        data = await broker.get_candle_data(ForexPairEnum.EURUSD, number=5)
+        assert list(data["close"]) == [1.1, 1.2]
+        replay_clock.set_time(datetime(2020, 1, 1, 0, 15))
+        data = await broker.get_candle_data(ForexPairEnum.EURUSD, number=2)
+        assert list(data["close"]) == [1.2, 1.3]
+        assert await broker.get_latest_close(ForexPairEnum.EURUSD) == 1.3
+
+    @pytest.mark.asyncio
+    async def test_stop_and_limit(self):
+        """a stop fills at the stop, or the open when gapped through, a
+        limit at the limit, and both are published"""
+        replay_clock = Clock()
+        opens = [1.1, 1.1, 1.095, 1.1, 1.1]
+        lows = [1.1, 1.1, 1.095, 1.1, 1.1]
+        highs = [1.1, 1.1, 1.1, 1.1, 1.12]
+        broker = ReplayTradeConnect(
+            {
+                ForexPairEnum.EURUSD: candles([1.1] * 5, lows, highs, opens),
+                ForexPairEnum.GBPUSD: candles([1.25] * 5),
+            },
+            spread_pips=2,
+            clock=replay_clock,
+        )
+        published = []
+
+        async def publish(event):
+            published.append(event)
+
+        await broker.start_transaction_stream(publish)
+        replay_clock.set_time(datetime(2020, 1, 1, 0, 10))
+        stopped, price, half_spread_cost = await broker.open_trade(
+            ForexPairEnum.EURUSD, True, stop=1.098, limit=1.2, amount=10_000
+        )
+        assert price == pytest.approx(1.1001)
+        assert half_spread_cost == pytest.approx(0.0001 * 10_000 / 1.25)
+        limited, _, _ = await broker.open_trade(
+            ForexPairEnum.EURUSD, True, stop=1.09, limit=1.11, amount=10_000
+        )
+        replay_clock.set_time(datetime(2020, 1, 1, 0, 30))
+        closed = await broker.fill_orders()
+        assert [trade.trade_id for trade in closed] == [stopped, limited]
+        assert [event.reason for event in published] == [
+            STOP_LOSS,
+            TAKE_PROFIT,
+        ]
+        assert all(isinstance(event, TradeClosedEvent) for event in published)
+        # bought at 1.1001, sold at the open the stop gapped through or
+        # at the limit, less half the spread
+        assert broker.trades[stopped].realised_pl == pytest.approx(
+            (1.0949 - 1.1001) * 10_000 / 1.25
+        )
+        assert broker.trades[limited].realised_pl == pytest.approx(
+            (1.1099 - 1.1001) * 10_000 / 1.25
+        )
+        assert broker.balance == pytest.approx(
+            10_000 + sum(event.realised_pl for event in published)
+        )
+        assert await broker.close_trade(stopped, 10_000) == (None, None)
+
+
+class TestReplay:
+    def test_timings(self):
+        """time spent in an inner call is not the outer call's own"""
+        timings = Timings()
+        with timings.measure("outer"):
+            with timings.measure("inner"):
+                sum(range(100_000))
+        assert timings.calls == {"outer": 1, "inner": 1}
+        assert timings.own_seconds["outer"] < timings.seconds["outer"]
+        assert timings.seconds["outer"] >= timings.seconds["inner"]
+        frame = timings.to_frame(timings.seconds["outer"])
+        assert frame["share"].sum() == pytest.approx(1)
+
+    @pytest.mark.asyncio
+    async def test_run(self):
+        """the jobs fire on their triggers and the trades they open are
+        closed by their stop, their limit or the jobs"""
+        history = {
+            ForexPairEnum.EURUSD: random_candles(900, seed=1),
+            ForexPairEnum.GBPUSD: random_candles(900, seed=2),
+        }
+        replay = Replay(
+            history,
+            flat_fundamentals(),
+            end="2020-01-03 00:00",
+            rates=RATES,
+        )
+        report = await replay.run()
+        assert not clock.is_virtual
+        hours = (report.end - report.start) / timedelta(hours=1)
+        assert report.fired["manage_trades"] == pytest.approx(
+            hours * 12, abs=1
+        )
+        assert report.fired["manage_closed_trades_job"] == pytest.approx(
+            hours * 2, abs=1
+        )
+        assert report.days_per_second > 0
+        assert not report.errors
+        for name in (
+            "job.get_fundamental_technical_data",
+            "handler.open_trade_handler",
+            "broker.get_candle_data",
+            "indicators.run_pipeline",
+            "replay",
+        ):
+            assert name in report.timings.index
+        assert report.timings["share"].sum() == pytest.approx(1)
+
+        assert report.trades
+        broker_trades = replay.broker.trades
+        for trade in report.trades:
+            assert broker_trades[trade.trade_id].is_buy == trade.is_buy
+            if trade.position == PositionEnum.CLOSED:
+                assert trade.realised_pl == pytest.approx(
+                    broker_trades[trade.trade_id].realised_pl
+                )
+        assert replay.broker.balance == pytest.approx(
+            10_000
+            + sum(
+                trade.realised_pl
+                for trade in broker_trades.values()
+                if trade.state == "CLOSED"
+            )
+        )
+
+    @pytest.mark.asyncio
+    async def test_fundamental_data_released(self):
+        """stored data reaches process_data once the clock passes its
+        last update and is scored and processed"""
+        released = FundamentalData(
+            currency=CurrencyEnum.USD,
+            last_updated=datetime(2020, 1, 1, 23, 30),
+            calendar_events=[
+                CalendarEvent(
+                    calendar_event="Non-Farm Employment Change",
+                    sentiment=SentimentEnum.BULLISH,
+                    forecast=180.0,
+                    actual=220.0,
+                    previous=150.0,
+                )
+            ],
+        )
+        replay = Replay(
+            {ForexPairEnum.EURUSD: random_candles(600, seed=3)},
+            [*flat_fundamentals(), released],
+            end="2020-01-02 01:00",
+            jobs=["get_fundamental_trend_data", "process_fundamental_events"],
+        )
+        report = await replay.run()
+        assert set(report.fired) == {
+            "get_fundamental_trend_data",
+            "process_fundamental_events",
+        }
+        stored = (
+            await replay.uow.fundamental_data_repository.get_fundamental_data(
+                CurrencyEnum.USD,
+                datetime(2020, 1, 1, 23, 30, tzinfo=timezone.utc),
+            )
+        )
+        assert stored.processed
+        assert stored.aggregate_sentiment == SentimentEnum.BULLISH
+        assert report.timings.loc["handler.close_trade_handler", "calls"] == 1
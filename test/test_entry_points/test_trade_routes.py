@@ -0,0 +1,59 @@
+import pytest
+from fastapi import HTTPException
+
+from src.service_layer.risk_simulation import RiskSimulationService
+from src.service_layer.uow import InMemoryUnitOfWork
+from test.test_service_layer.test_risk_simulation import (
+    FakeConnection,
+    closed_trade,
+)
+
+trade_routes = pytest.importorskip("src.entry_points.routes.trade_routes")
+
+
+async def trade_risk(balance: float, pls: list[float]):
+    uow = InMemoryUnitOfWork(FakeConnection(balance), None, handlers={})
+    for day, pl in enumerate(pls):
+        await uow.trade_repository.save(closed_trade(str(day), pl, day))
+    return trade_routes.TradeRisk(
+        risk_service=RiskSimulationService(uow), uow=uow
+    )
+
+
+class TestTradeRisk:
+    @pytest.mark.asyncio
+    async def test_report(self):
+        resource = await trade_risk(10_000, [150, -100, 220])
+        report = await resource.get(paths=200)
+        assert report.paths == 200
+        assert report.trades == 3
+
+    @pytest.mark.asyncio
+    async def test_balance_below_the_realised_pl(self):
+        """a history with a withdrawal cannot be rebuilt from the balance,
+        it is refused rather than failing with a 500"""
+        resource = await trade_risk(400, [500])
+        with pytest.raises(HTTPException) as e:
+            await resource.get(paths=200)
+        assert e.value.status_code == 422
+
+    @pytest.mark.asyncio
+    async def test_invalid_paths(self):
+        resource = await trade_risk(10_000, [150])
+        with pytest.raises(HTTPException) as e:
+            await resource.get(paths=0)
+        assert e.value.status_code == 400
+
+    @pytest.mark.asyncio
+    async def test_too_many_trades(self):
+        resource = await trade_risk(10_000, [150])
+        with pytest.raises(HTTPException) as e:
+            await resource.get(paths=200, trades=10_000_000)
+        assert e.value.status_code == 400
+
+    @pytest.mark.asyncio
+    async def test_no_closed_trades(self):
+        resource = await trade_risk(10_000, [])
+        with pytest.raises(HTTPException) as e:
+            await resource.get(paths=200)
+        assert e.value.status_code == 404
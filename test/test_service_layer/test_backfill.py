@@ -0,0 +1,114 @@
+import numpy as np
+import pytest
+
+from src.adapters.database.candle_archive import CandleArchive
+from src.config import ForexPairEnum, PeriodEnum
+from src.service_layer.backfill import BackfillCheckpoint, CandleBackfill
+
+START = np.datetime64("2023-01-02T00:00:00", "ns")
+NOW = (
+    (START + np.timedelta64(1000, "h") + np.timedelta64(30, "m"))
+    .astype("datetime64[s]")
+    .astype(float)
+)
+
+
+class FakeCandles:
+    """Hourly candles for the requested range, failing on request fail_at"""
+
+    def __init__(self, fail_at: int = None) -> None:
+        self.fail_at = fail_at
+        self.requests = []
+
+    async def __call__(self, instrument, period, params):
+        if len(self.requests) == self.fail_at:
+            raise ConnectionError("broker went away")
+        self.requests.append(params)
+        start = np.datetime64(params["from"][:-1], "ns")
+        end = np.datetime64(params["to"][:-1], "ns")
+        times = np.arange(start, end, np.timedelta64(1, "h"))
+        return {
+            "candles": [
+                {
+                    "time": str(time) + "Z",
+                    "complete": time + np.timedelta64(1, "h")
+                    <= np.datetime64(int(NOW), "s"),
+                    "volume": 1,
+                    "mid": {k: "1.1" for k in "ohlc"},
+                }
+                for time in times
+            ]
+        }
+
+
+def make_backfill(tmp_path, fetch, **kwargs) -> CandleBackfill:
+    return CandleBackfill(
+        fetch,
+        CandleArchive(str(tmp_path)),
+        BackfillCheckpoint(str(tmp_path / "checkpoint.json")),
+        clock=lambda: NOW,
+        **kwargs,
+    )
+
+
+class TestCandleBackfill:
+    def test_plan(self, tmp_path):
+        """the range is split into pages of page_size candles"""
+        backfill = make_backfill(tmp_path, FakeCandles(), page_size=300)
+        pages = backfill.plan(ForexPairEnum.EURUSD, PeriodEnum.HOUR_1, START)
+        assert len(pages) == 4
+        assert pages[1].start - pages[0].start == 300 * 3600 * 10**9
+        assert pages[-1].end == int(NOW * 10**9)
+
+    def test_periods_without_a_fixed_step(self, tmp_path):
+        """v20 has no D1 or W1 granularity and M1 is its minute"""
+        backfill = make_backfill(tmp_path, FakeCandles())
+        for period in (PeriodEnum.DAY, PeriodEnum.WEEK, PeriodEnum.MONTH):
+            with pytest.raises(ValueError):
+                backfill.plan(ForexPairEnum.EURUSD, period, START)
+
+    @pytest.mark.asyncio
+    async def test_run(self, tmp_path):
+        """every completed candle of every series ends up in the archive"""
+        fetch = FakeCandles()
+        backfill = make_backfill(tmp_path, fetch, page_size=100, concurrency=4)
+        report = await backfill.run(
+            [ForexPairEnum.EURUSD, ForexPairEnum.GBPUSD],
+            [PeriodEnum.HOUR_1],
+            START,
+        )
+        df = backfill.archive.read("EUR_USD", PeriodEnum.HOUR_1)
+        assert report.pages == report.requests == 22
+        assert report.candles == 2000
+        assert report.series == {"EUR_USD:H1": 1000, "GBP_USD:H1": 1000}
+        assert report.candles_per_second > 0
+        assert len(df) == 1000 and df["date"].is_monotonic_increasing
+        assert backfill.archive.find_gaps("EUR_USD", PeriodEnum.HOUR_1) == []
+
+    @pytest.mark.asyncio
+    async def test_resume(self, tmp_path):
+        """an interrupted run carries on after the last written page"""
+        backfill = make_backfill(
+            tmp_path, FakeCandles(fail_at=3), page_size=100, concurrency=1
+        )
+        with pytest.raises(ConnectionError):
+            await backfill.run(
+                [ForexPairEnum.EURUSD], [PeriodEnum.HOUR_1], START
+            )
+        assert len(backfill.archive.read("EUR_USD", PeriodEnum.HOUR_1)) == 300
+
+        fetch = FakeCandles()
+        resumed = make_backfill(tmp_path, fetch, page_size=100)
+        report = await resumed.run(
+            [ForexPairEnum.EURUSD], [PeriodEnum.HOUR_1], START
+        )
+        assert report.requests == 8
+        assert fetch.requests[0]["from"].startswith("2023-01-14T12:00")
+        assert len(resumed.archive.read("EUR_USD", PeriodEnum.HOUR_1)) == 1000
+
+        # a finished series only asks for the still forming candle
+        again = make_backfill(tmp_path, FakeCandles(), page_size=100)
+        report = await again.run(
+            [ForexPairEnum.EURUSD], [PeriodEnum.HOUR_1], START
+        )
+        assert (report.requests, report.candles) == (1, 0)
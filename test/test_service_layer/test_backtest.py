@@ -0,0 +1,220 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.config import ForexPairEnum, PositionEnum
+from src.domain.trade import Trade
+from src.service_layer.backtest import (
+    END,
+    EXIT_REASONS,
+    TRADE_COLUMNS,
+    Backtester,
+)
+from src.service_layer.compute_pool import ComputePool
+from src.service_layer.conversion_rates import get_pip_size
+from src.service_layer.signals import SPREAD_BUFFER, TRAILING_ATR
+
+
+def random_candles(number: int, seed: int = 0) -> pd.DataFrame:
+    """Five minute candles of a random walk with wicks"""
+    rng = np.random.default_rng(seed)
+    close = 1.1 + np.cumsum(rng.normal(0, 0.0004, number))
+    open_ = np.concatenate([close[:1], close[:-1]])
+    # some bars open away from the previous close
+    open_ += np.where(rng.random(number) < 0.05, rng.normal(0, 0.002), 0)
+    wick = rng.uniform(0.0001, 0.0008, number)
+    return pd.DataFrame(
+        {
+            "date": pd.date_range("2020-01-01", periods=number, freq="5min"),
+            "open": open_,
+            "high": np.maximum(open_, close) + wick,
+            "low": np.minimum(open_, close) - wick,
+            "close": close,
+            "volume": rng.integers(1, 100, number).astype(float),
+        }
+    )
+
+
+def backtest_with_loop(
+    data: pd.DataFrame,
+    forex_pair: ForexPairEnum,
+    spread_pips: float,
+    trailing: bool = True,
+) -> list[tuple]:
+    """The rules of the backtest stepped bar by bar, kept as the
+    reference: (entry, exit, is buy, reason, stop, pips) of each trade"""
+    pip_value = get_pip_size(forex_pair)
+    half_spread = spread_pips / 2 * pip_value
+    buffer = half_spread * SPREAD_BUFFER
+    columns = {name: data[name].to_numpy() for name in data}
+    trades, trade = [], None
+    for bar in range(len(data)):
+        open_, high, low, close, atr, signal = (
+            columns[name][bar]
+            for name in ("open", "high", "low", "close", "atr", "Signal")
+        )
+        if trade is not None:
+            is_buy, stop, limit = (
+                trade["is_buy"],
+                trade["stop"],
+                trade["limit"],
+            )
+            exit_price = reason = None
+            if (is_buy and low <= stop) or (not is_buy and high >= stop):
+                gapped = open_ <= stop if is_buy else open_ >= stop
+                exit_price = open_ if gapped else stop
+                reason = (
+                    "trailing_stop" if stop != trade["initial"] else "stop"
+                )
+            elif (is_buy and high >= limit) or (not is_buy and low <= limit):
+                gapped = open_ >= limit if is_buy else open_ <= limit
+                exit_price = open_ if gapped else limit
+                reason = "limit"
+            elif signal == (-1 if is_buy else 1):
+                exit_price, reason = close, "signal"
+            if reason is not None:
+                trades.append(close_trade(trade, bar, exit_price, reason))
+                trade = None
+        if trade is None and signal != 0:
+            decimals = 2 if "JPY" in forex_pair.value else 4
+            trade = {
+                "entry": bar,
+                "is_buy": signal > 0,
+                "price": close + signal * half_spread,
+                "stop": round(columns["ATR_Stop"][bar], decimals),
+                "limit": round(columns["ATR_Limit"][bar], decimals),
+                "pip_value": pip_value,
+                "half_spread": half_spread,
+            }
+            trade["initial"] = trade["stop"]
+        if trade is not None and trailing:
+            # manage_trades_handler at the close of the bar
+            if trade["is_buy"]:
+                new_stop = close - TRAILING_ATR * atr
+                if new_stop > trade["stop"] and new_stop > (
+                    trade["price"] + buffer
+                ):
+                    trade["stop"] = new_stop
+            else:
+                new_stop = close + TRAILING_ATR * atr
+                if new_stop < trade["stop"] and new_stop < (
+                    trade["price"] - buffer
+                ):
+                    trade["stop"] = new_stop
+    if trade is not None:
+        trades.append(
+            close_trade(trade, len(data) - 1, columns["close"][-1], END)
+        )
+    return trades
+
+
+def close_trade(trade: dict, bar: int, price: float, reason: str) -> tuple:
+    direction = 1 if trade["is_buy"] else -1
+    price -= direction * trade["half_spread"]
+    pips = direction * (price - trade["price"]) / trade["pip_value"]
+    return trade["entry"], bar, trade["is_buy"], reason, trade["stop"], pips
+
+
+def assert_same_trades(result: pd.DataFrame, expected: list[tuple]):
+    assert len(result) == len(expected)
+    entry, exit_bar, is_buy, reason, stop, pips = zip(*expected)
+    np.testing.assert_array_equal(result["is_buy"], is_buy)
+    np.testing.assert_array_equal(result["exit_reason"], reason)
+    np.testing.assert_array_equal(
+        result["bars"], np.array(exit_bar) - np.array(entry)
+    )
+    np.testing.assert_allclose(result["stop"].astype(float), stop)
+    np.testing.assert_allclose(result["pips"].astype(float), pips)
+
+
+class TestBacktest:
+    @pytest.mark.parametrize(
+        "forex_pair, trailing",
+        [
+            (ForexPairEnum.EURUSD, True),
+            (ForexPairEnum.EURUSD, False),
+            (ForexPairEnum.USDJPY, True),
+        ],
+    )
+    def test_matches_bar_by_bar(self, forex_pair, trailing):
+        """the array scan takes the trades of the bar by bar rules"""
+        data = random_candles(8_000, seed=len(forex_pair.value))
+        if "JPY" in forex_pair.value:
+            data[["open", "high", "low", "close"]] *= 100
+        backtester = Backtester(spread_pips=1.5, trailing=trailing)
+        expected = backtest_with_loop(
+            backtester.evaluate(data), forex_pair, 1.5, trailing
+        )
+        result = backtester.simulate(forex_pair, data)
+        assert {row[3] for row in expected} & {"stop", "limit"}
+        assert_same_trades(result, expected)
+
+    def test_trades_never_overlap(self):
+        """one trade is open at a time, each entered on a signal bar"""
+        data = random_candles(5_000)
+        backtester = Backtester()
+        signal = backtester.evaluate(data)["Signal"].to_numpy()
+        trades = backtester.simulate(ForexPairEnum.EURUSD, data)
+        entries = data["date"].searchsorted(trades["initiated_date"])
+        exits = data["date"].searchsorted(trades["exit_date"])
+        assert (signal[entries] != 0).all()
+        assert (entries[1:] >= exits[:-1]).all()
+        assert (exits > entries).all()
+        np.testing.assert_array_equal(trades["is_buy"], signal[entries] > 0)
+
+    def test_spread_cost(self):
+        """the spread costs its full width in pips on every trade"""
+        data = random_candles(5_000)
+        free = Backtester(spread_pips=0, trailing=False)
+        paid = Backtester(spread_pips=2, trailing=False)
+        free = free.simulate(ForexPairEnum.EURUSD, data)
+        paid = paid.simulate(ForexPairEnum.EURUSD, data)
+        assert len(free) == len(paid) > 0
+        np.testing.assert_allclose(free["pips"] - paid["pips"], 2)
+
+    @pytest.mark.asyncio
+    async def test_run(self):
+        """the trades of every pair are shaped like Trade with their
+        summary"""
+        history = {
+            ForexPairEnum.EURUSD: random_candles(4_000, seed=1),
+            ForexPairEnum.GBPUSD: random_candles(4_000, seed=2),
+        }
+        result = await Backtester().run(history)
+        assert list(result.trades.columns) == TRADE_COLUMNS
+        assert set(result.trades["forex_currency_pair"]) == set(history)
+        trades = result.to_trades()
+        assert all(isinstance(trade, Trade) for trade in trades)
+        assert trades[0].position in (PositionEnum.OPEN, PositionEnum.CLOSED)
+        summary = result.summary()
+        assert summary["trades"] == len(trades)
+        assert sum(summary["exit_reasons"].values()) == len(trades)
+        assert set(summary["exit_reasons"]) == set(EXIT_REASONS)
+        np.testing.assert_allclose(
+            summary["total_pips"], result.trades["pips"].sum()
+        )
+        assert set(result.summary_by_pair()) == set(history)
+
+    @pytest.mark.asyncio
+    async def test_run_on_pool(self):
+        """the pairs simulated on a compute pool give the same trades"""
+        history = {
+            ForexPairEnum.EURUSD: random_candles(3_000, seed=3),
+            ForexPairEnum.AUDUSD: random_candles(3_000, seed=4),
+        }
+        expected = await Backtester().run(history)
+        pool = ComputePool(mode="thread", workers=2)
+        try:
+            result = await Backtester(pool=pool).run(history)
+        finally:
+            await pool.shutdown()
+        pd.testing.assert_frame_equal(result.trades, expected.trades)
+
+    @pytest.mark.asyncio
+    async def test_no_trades(self):
+        """flat candles give an empty result"""
+        data = random_candles(500)
+        data[["open", "high", "low", "close"]] = 1.0
+        result = await Backtester().run({ForexPairEnum.EURUSD: data})
+        assert result.trades.empty
+        assert result.summary()["trades"] == 0
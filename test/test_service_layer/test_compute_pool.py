@@ -0,0 +1,144 @@
+import asyncio
+import time
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+import pytest
+
+from src.adapters.fxcm_connect.mock_trade_connect import MockTradeConnect
+from src.config import ForexPairEnum
+from src.entry_points.scheduler.get_technical_signal import (
+    SIGNAL_INDICATORS,
+    get_signal,
+)
+from src.service_layer.compute_pool import (
+    ComputePool,
+    SharedArrays,
+    SharedPanel,
+    attach_arrays,
+)
+from src.service_layer.indicator_panel import CandlePanel
+from src.service_layer.indicators import Indicators
+
+
+async def make_panel() -> CandlePanel:
+    data = await MockTradeConnect().get_candle_data()
+    return CandlePanel.from_frames(
+        {
+            ForexPairEnum.EURUSD: data.iloc[:500].reset_index(drop=True),
+            ForexPairEnum.GBPUSD: data.iloc[500:].reset_index(drop=True),
+        }
+    )
+
+
+def read_shared(descriptor: tuple) -> dict:
+    """Copies of the shared arrays read in a worker, which are read only
+    there"""
+    with attach_arrays(descriptor) as arrays:
+        assert not any(values.flags.writeable for values in arrays.values())
+        return {name: values.copy() for name, values in arrays.items()}
+
+
+def busy(seconds: float) -> int:
+    """Keeps a worker busy, as an indicator cycle does"""
+    end = time.perf_counter() + seconds
+    count = 0
+    while time.perf_counter() < end:
+        count += 1
+    return count
+
+
+class TestComputePool:
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("mode", ["inline", "thread", "process"])
+    async def test_pipeline(self, mode):
+        """every mode gives the values computed on the event loop"""
+        panel = await make_panel()
+        expected = SIGNAL_INDICATORS.evaluate(panel)
+        pool = ComputePool(mode, workers=2)
+        try:
+            results = await pool.evaluate(SIGNAL_INDICATORS, panel)
+        finally:
+            await pool.shutdown()
+        assert set(results) == set(expected)
+        for name, values in expected.items():
+            np.testing.assert_array_equal(results[name], values)
+
+    @pytest.mark.asyncio
+    async def test_signal_in_a_worker(self):
+        """coroutine functions run to completion in the workers"""
+        data = await MockTradeConnect().get_candle_data()
+        frame = await SIGNAL_INDICATORS.run(data)
+        indicators = Indicators(pool=ComputePool("process", workers=1))
+        try:
+            result = await indicators.offload(get_signal, frame.copy())
+        finally:
+            await indicators.pool.shutdown()
+        expected = await get_signal(frame.copy())
+        assert list(result["Signal"]) == list(expected["Signal"])
+
+    @pytest.mark.asyncio
+    async def test_loop_stays_responsive(self):
+        """the loop keeps ticking while a worker computes"""
+        pool = ComputePool("process", workers=1)
+        await pool.start()
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        ticker = asyncio.create_task(tick())
+        try:
+            await pool.run(busy, 0.5)
+        finally:
+            ticker.cancel()
+            await pool.shutdown()
+        assert ticks >= 20
+
+    @pytest.mark.asyncio
+    async def test_shared_memory_is_released(self):
+        """the shared block is unlinked once the results are back"""
+        panel = await make_panel()
+        with SharedPanel(panel, ["out"]) as shared:
+            name = shared.memory.name
+            np.testing.assert_array_equal(
+                shared.array[shared.inputs.index("close")], panel["close"]
+            )
+        with pytest.raises(FileNotFoundError):
+            SharedMemory(name=name)
+
+    @pytest.mark.asyncio
+    async def test_shared_arrays(self):
+        """workers read arrays of any shape and type in place"""
+        arrays = {
+            "close": np.linspace(1.0, 2.0, 1001),
+            "volume": np.arange(7, dtype=np.int32),
+            "date": np.arange(3).astype("datetime64[ns]"),
+        }
+        pool = ComputePool("process", workers=1)
+        try:
+            with SharedArrays(arrays) as shared:
+                name = shared.memory.name
+                result = await pool.run(read_shared, shared.descriptor)
+        finally:
+            await pool.shutdown()
+        for key, values in arrays.items():
+            np.testing.assert_array_equal(result[key], values)
+            assert result[key].dtype == values.dtype
+        with pytest.raises(FileNotFoundError):
+            SharedMemory(name=name)
+
+    @pytest.mark.asyncio
+    async def test_shutdown(self):
+        """shutting down twice is fine and a new call starts the pool"""
+        pool = ComputePool("thread", workers=1)
+        assert await pool.run(sum, [1, 2]) == 3
+        await pool.shutdown()
+        await pool.shutdown()
+        assert await pool.run(sum, [3, 4]) == 7
+        await pool.shutdown()
+        with pytest.raises(ValueError):
+            ComputePool("gpu")
@@ -0,0 +1,100 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from src.config import ForexPairEnum
+from src.service_layer.conversion_rates import ConversionRateService
+
+RATES = {
+    "GBP/USD": 1.25,
+    "GBP/JPY": 180.0,
+    "GBP/AUD": 1.9,
+    "GBP/CAD": 1.7,
+    "GBP/CHF": 1.1,
+    "GBP/NZD": 2.0,
+    "EUR/GBP": 0.86,
+}
+
+
+class FakeConnection:
+    """Serves fixed rates and counts the batched requests"""
+
+    def __init__(self) -> None:
+        self.requests = 0
+
+    async def get_prices(self, instruments) -> dict[str, float]:
+        self.requests += 1
+        await asyncio.sleep(0)
+        return {i.value: RATES[i.value] for i in instruments}
+
+
+class TestConversionRateService:
+    @pytest.mark.asyncio
+    async def test_rates_are_fetched_once_per_ttl(self):
+        """Test lookups within the ttl share one batched request"""
+        connection = FakeConnection()
+        service = ConversionRateService(connection, ttl=60)
+        await asyncio.gather(
+            *[
+                service.get_pip_value(pair)
+                for pair in [ForexPairEnum.EURUSD, ForexPairEnum.USDJPY] * 5
+            ]
+        )
+        assert connection.requests == 1
+
+        service.invalidate()
+        await service.get_pip_value(ForexPairEnum.EURUSD)
+        assert connection.requests == 2
+
+    @pytest.mark.asyncio
+    async def test_expired_rates_are_refreshed(self):
+        """Test a zero ttl fetches on every lookup"""
+        connection = FakeConnection()
+        service = ConversionRateService(connection, ttl=0)
+        await service.get_rates()
+        await service.get_rates()
+        assert connection.requests == 2
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize(
+        "forex_pair, expected",
+        [
+            (ForexPairEnum.EURUSD, 10 / 1.25),
+            (ForexPairEnum.USDJPY, 1000 / 180.0),
+            (ForexPairEnum.GBPCHF, 10 / 1.1),
+            (ForexPairEnum.AUDNZD, 10 / 2.0),
+            (ForexPairEnum.EURGBP, 10.0),
+        ],
+    )
+    async def test_pip_value_in_account_currency(self, forex_pair, expected):
+        """Test the pip value of a standard lot is converted into GBP"""
+        service = ConversionRateService(FakeConnection())
+        assert await service.get_pip_value(forex_pair) == pytest.approx(
+            expected
+        )
+
+    @pytest.mark.asyncio
+    async def test_inverse_cross_is_used_for_euro(self):
+        """Test euro amounts are converted with the EUR/GBP rate"""
+        service = ConversionRateService(FakeConnection())
+        rates = await service.get_rates()
+        assert service.get_conversion_factor("EUR", rates) == 0.86
+
+    @pytest.mark.asyncio
+    async def test_vectorised_units_match_the_single_pair_maths(self):
+        """Test units for many pairs at once equal the scalar formula"""
+        service = ConversionRateService(FakeConnection())
+        pairs = [
+            ForexPairEnum.USDCAD,
+            ForexPairEnum.USDJPY,
+            ForexPairEnum.EURGBP,
+        ]
+        stop_loss_pips = [20.0, 6.2, 15.0]
+        units = await service.get_units(pairs, stop_loss_pips, 2000)
+
+        expected = [
+            2000 / (pips * await service.get_pip_value(pair)) * 10000
+            for pair, pips in zip(pairs, stop_loss_pips)
+        ]
+        np.testing.assert_allclose(units, expected)
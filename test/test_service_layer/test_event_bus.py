@@ -0,0 +1,162 @@
+import asyncio
+
+import pytest
+
+from src.config import CurrencyEnum, ForexPairEnum, SentimentEnum
+from src.domain.events import CloseTradeEvent, OpenTradeEvent
+from src.service_layer.event_bus import TradingEventBus, partition_key
+
+
+class FakeUnitOfWork:
+    def __init__(self) -> None:
+        self.entered = 0
+
+    async def __aenter__(self):
+        self.entered += 1
+
+    async def __aexit__(self, *args):
+        self.entered -= 1
+
+
+def open_event(forex_pair: ForexPairEnum, close: float) -> OpenTradeEvent:
+    return OpenTradeEvent(
+        forex_pair=forex_pair,
+        sentiment=SentimentEnum.BULLISH,
+        stop=close - 0.01,
+        close=close,
+    )
+
+
+def close_event(currency: CurrencyEnum) -> CloseTradeEvent:
+    return CloseTradeEvent(currency=currency, sentiment=SentimentEnum.BEARISH)
+
+
+def pairs_in_other_partitions(bus: TradingEventBus):
+    """A pair and a currency whose events go to different partitions"""
+    for forex_pair in ForexPairEnum:
+        for currency in CurrencyEnum:
+            if bus.partition(open_event(forex_pair, 1)) is not bus.partition(
+                close_event(currency)
+            ):
+                return forex_pair, currency
+
+
+class TestPartitionKey:
+    def test_keys(self):
+        assert partition_key(open_event(ForexPairEnum.EURUSD, 1)) == "EUR/USD"
+        assert partition_key(close_event(CurrencyEnum.JPY)) == "JPY"
+        assert partition_key(object()) is None
+
+
+class TestPartitionedEventBus:
+    @pytest.mark.asyncio
+    async def test_slow_handler_does_not_hold_other_partitions(self):
+        """a close in another partition is handled while an open waits,
+        and the opens of one pair are handled in order"""
+        bus = TradingEventBus(FakeUnitOfWork(), partitions=4)
+        forex_pair, currency = pairs_in_other_partitions(bus)
+        release = asyncio.Event()
+        handled = []
+
+        async def open_trade(event, uow):
+            await release.wait()
+            handled.append(event.close)
+
+        async def close_trade(event, uow):
+            handled.append(event.currency)
+            release.set()
+
+        bus.subscribe(OpenTradeEvent, open_trade)
+        bus.subscribe(CloseTradeEvent, close_trade)
+        task = asyncio.create_task(bus.start())
+        for close in (1.0, 2.0, 3.0):
+            await bus.publish(open_event(forex_pair, close))
+        await bus.publish(close_event(currency))
+        await bus.stop()
+        await asyncio.wait_for(task, 1)
+        assert handled == [currency, 1.0, 2.0, 3.0]
+        assert sum(m["handled"] for m in bus.metrics()) == 4
+        assert not bus.running
+
+    @pytest.mark.asyncio
+    async def test_publish_waits_on_a_full_partition(self):
+        bus = TradingEventBus(FakeUnitOfWork(), partitions=2, maxsize=2)
+        release = asyncio.Event()
+
+        async def open_trade(event, uow):
+            await release.wait()
+
+        bus.subscribe(OpenTradeEvent, open_trade)
+        task = asyncio.create_task(bus.start())
+        await asyncio.sleep(0.01)
+        event = open_event(ForexPairEnum.EURUSD, 1)
+        partition = bus.partition(event)
+        # the first is taken by the worker, which waits on release
+        await bus.publish(event)
+        await asyncio.sleep(0.01)
+        for _ in range(2):
+            await bus.publish(event)
+        blocked = asyncio.create_task(bus.publish(event))
+        await asyncio.sleep(0.01)
+        assert not blocked.done()
+        metrics = bus.metrics()[partition.index]
+        assert metrics["depth"] == 2
+        assert metrics["blocked"] == 1
+
+        release.set()
+        await asyncio.wait_for(blocked, 1)
+        await bus.stop()
+        await asyncio.wait_for(task, 1)
+        metrics = bus.metrics()[partition.index]
+        assert metrics["handled"] == 4
+        assert metrics["max_depth"] == 2
+
+    @pytest.mark.asyncio
+    async def test_stopped_bus_does_not_block_publish(self):
+        """nothing frees a slot without the workers, the events queue
+        up for drain or the next start"""
+        bus = TradingEventBus(FakeUnitOfWork(), partitions=2, maxsize=2)
+        event = open_event(ForexPairEnum.EURUSD, 1)
+        for _ in range(3):
+            await asyncio.wait_for(bus.publish(event), 1)
+        assert bus.metrics()[bus.partition(event).index]["depth"] == 3
+        assert await bus.drain() == 3
+
+    @pytest.mark.asyncio
+    async def test_handlers_publish_past_the_bound(self):
+        """a handler publishing into its own full partition would wait on
+        itself"""
+        bus = TradingEventBus(FakeUnitOfWork(), partitions=1, maxsize=1)
+        handled = []
+
+        async def open_trade(event, uow):
+            handled.append(event.close)
+            if event.close < 3:
+                await bus.publish(open_event(event.forex_pair, 3))
+                await bus.publish(open_event(event.forex_pair, 4))
+
+        bus.subscribe(OpenTradeEvent, open_trade)
+        task = asyncio.create_task(bus.start())
+        await bus.publish(open_event(ForexPairEnum.EURUSD, 1))
+        await bus.stop()
+        await asyncio.wait_for(task, 1)
+        assert handled == [1, 3, 4]
+
+    @pytest.mark.asyncio
+    async def test_failed_handler_does_not_stop_the_partition(self):
+        bus = TradingEventBus(FakeUnitOfWork(), partitions=1)
+        handled = []
+
+        async def open_trade(event, uow):
+            if event.close == 1:
+                raise ValueError("broker down")
+            handled.append(event.close)
+
+        bus.subscribe(OpenTradeEvent, open_trade)
+        task = asyncio.create_task(bus.start())
+        await bus.publish(open_event(ForexPairEnum.EURUSD, 1))
+        await bus.publish(open_event(ForexPairEnum.EURUSD, 2))
+        await bus.stop()
+        await asyncio.wait_for(task, 1)
+        assert handled == [2]
+        assert bus.metrics()[0]["failed"] == 1
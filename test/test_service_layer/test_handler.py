@@ -7,6 +7,7 @@ from src.domain.events import (
     CloseForexPairEvent,
     CloseTradeEvent,
     OpenTradeEvent,
+    TradeClosedEvent,
 )
 from src.domain.fundamental import FundamentalData
 from src.service_layer.handlers import (
@@ -15,6 +16,7 @@ from src.service_layer.handlers import (
     get_trade_parameters,
     open_trade_handler,
     get_combined_techincal_and_fundamental_sentiment,
+    trade_closed_handler,
 )
 from src.adapters.fxcm_connect.oanda_connect import OandaConnect
 from src.config import (
@@ -700,3 +702,45 @@ class TestOpenTradeHandler:
             async with uow:
                 trade_repos = await uow.trade_repository.get_open_trades()
                 assert len(trade_repos) == 0
+
+
+class TestTradeClosedHandler:
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize(
+        "realised_pl, is_winner", [(25.0, True), (-4.0, False)]
+    )
+    async def test_trade_closed_by_broker_is_closed(
+        self, get_db, realised_pl, is_winner
+    ):
+        """Test a trade closed by a stop loss or take profit is updated"""
+        uow = MongoUnitOfWork(
+            MockTradeConnect(),
+            scraper=mock.MagicMock(),
+            db_name=get_db,
+        )
+        trade = TradeDomain(
+            trade_id="42",
+            units=1000,
+            close=1.1,
+            stop=1.09,
+            limit=None,
+            is_buy=True,
+            base_currency=CurrencyEnum.EUR,
+            quote_currency=CurrencyEnum.USD,
+            forex_currency_pair=ForexPairEnum.EURUSD,
+            half_spread_cost=0,
+        )
+        async with uow:
+            await uow.trade_repository.save(trade)
+            await trade_closed_handler(
+                TradeClosedEvent(
+                    trade_id="42",
+                    realised_pl=realised_pl,
+                    reason="STOP_LOSS_ORDER",
+                ),
+                uow,
+            )
+            saved = await uow.trade_repository.get_trade_by_trade_id("42")
+            assert saved.position == PositionEnum.CLOSED
+            assert saved.realised_pl == realised_pl
+            assert saved.is_winner == is_winner
@@ -0,0 +1,127 @@
+import numpy as np
+import pytest
+
+from src.adapters.fxcm_connect.mock_trade_connect import MockTradeConnect
+from src.config import ForexPairEnum, PeriodEnum
+from src.service_layer import indicator_pipeline as pipeline
+from src.service_layer.indicator_panel import CandlePanel
+from src.service_layer.indicators import Indicators
+
+CASES = [
+    (pipeline.sma(10), "get_simple_moving_average", (10, "close")),
+    (pipeline.ema(10), "get_exponential_moving_average", (10, "close")),
+    (pipeline.macd(), "get_macd", ("close",)),
+    (pipeline.stochastic(), "get_stocastic", ()),
+    (pipeline.rsi(), "get_rsi", ()),
+    (pipeline.rsi(14, False), "get_rsi", (14, False)),
+    (pipeline.bollinger(), "get_bollinger", ()),
+    (pipeline.atr(), "get_atr", ()),
+    (pipeline.adx(), "get_adx", ()),
+    (pipeline.obv(), "get_obv", ()),
+    (pipeline.fibonacci(), "fibonacci_retracements", ()),
+]
+
+
+def kinds(indicators: pipeline.IndicatorPipeline) -> list[str]:
+    return [node.kind for node in indicators.nodes]
+
+
+class TestIndicatorPipeline:
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("outputs, method, args", CASES)
+    async def test_matches_indicators(self, outputs, method, args):
+        """every output matches the batch indicator"""
+        data = await MockTradeConnect().get_candle_data()
+        expected = await getattr(Indicators(), method)(data.copy(), *args)
+        result = await pipeline.IndicatorPipeline(outputs).run(data.copy())
+        assert list(result.columns) == list(expected.columns)
+        for name in outputs:
+            np.testing.assert_allclose(
+                result[name], expected[name], rtol=1e-9, atol=1e-9
+            )
+
+    def test_shared_intermediates(self):
+        """intermediates common to several indicators are computed once"""
+        indicators = pipeline.IndicatorPipeline(
+            pipeline.atr(14),
+            pipeline.adx(14),
+            pipeline.sma(20),
+            pipeline.bollinger(20),
+            pipeline.rsi(14),
+            pipeline.prev_close(),
+        )
+        assert kinds(indicators).count("true_range") == 1
+        assert kinds(indicators).count("rolling_sum") == 2
+        assert kinds(indicators).count("column") == 3
+        keys = [node.key for node in indicators.nodes]
+        assert len(keys) == len(set(keys))
+
+    @pytest.mark.asyncio
+    async def test_cache(self):
+        """the same bars and parameters are computed once"""
+        data = await MockTradeConnect().get_candle_data()
+        cache = pipeline.IndicatorCache()
+        indicators = pipeline.IndicatorPipeline(
+            pipeline.rsi(14), pipeline.adx(14), cache=cache
+        )
+        first = await indicators.run(
+            data.copy(), ForexPairEnum.EURUSD, PeriodEnum.MINUTE_5
+        )
+        second = await indicators.run(
+            data.copy(), ForexPairEnum.EURUSD, PeriodEnum.MINUTE_5
+        )
+        assert (cache.hits, cache.misses) == (1, 1)
+        np.testing.assert_array_equal(first["adx"], second["adx"])
+        second["adx"] += 1
+
+        await indicators.run(
+            data.copy(), ForexPairEnum.GBPUSD, PeriodEnum.MINUTE_5
+        )
+        forming = data.copy()
+        forming.loc[forming.index[-1], "close"] += 0.001
+        await indicators.run(
+            forming, ForexPairEnum.EURUSD, PeriodEnum.MINUTE_5
+        )
+        await pipeline.IndicatorPipeline(pipeline.rsi(10), cache=cache).run(
+            data.copy(), ForexPairEnum.EURUSD, PeriodEnum.MINUTE_5
+        )
+        assert (cache.hits, cache.misses) == (1, 4)
+
+        third = await indicators.run(
+            data.copy(), ForexPairEnum.EURUSD, PeriodEnum.MINUTE_5
+        )
+        np.testing.assert_array_equal(first["adx"], third["adx"])
+
+    @pytest.mark.asyncio
+    async def test_panel(self):
+        """a panel gets the same values as each of its frames"""
+        data = await MockTradeConnect().get_candle_data()
+        frames = {
+            ForexPairEnum.EURUSD: data.iloc[:500].reset_index(drop=True),
+            ForexPairEnum.GBPUSD: data.iloc[500:].reset_index(drop=True),
+        }
+        indicators = pipeline.IndicatorPipeline(
+            pipeline.fibonacci(), pipeline.adx(14), pipeline.macd()
+        )
+        panel = await indicators.run(CandlePanel.from_frames(frames))
+        for pair, frame in frames.items():
+            expected = await indicators.run(frame)
+            result = panel.frame(pair)
+            for name in indicators.columns:
+                np.testing.assert_allclose(result[name], expected[name])
+
+    @pytest.mark.asyncio
+    async def test_rolling_fibonacci(self):
+        """each bar gets the levels of the window bars ending at it"""
+        data = await MockTradeConnect().get_candle_data()
+        rolling = pipeline.IndicatorPipeline(pipeline.fibonacci(window=50))
+        result = await rolling.run(data.copy())
+        assert result["Fib_61.8"].iloc[:49].isna().all()
+        for end in (50, 120, len(data)):
+            expected = await pipeline.IndicatorPipeline(
+                pipeline.fibonacci()
+            ).run(data.iloc[end - 50 : end].copy())
+            for name in rolling.columns:
+                assert result[name].iloc[end - 1] == pytest.approx(
+                    expected[name].iloc[-1]
+                )
@@ -0,0 +1,119 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.config import ForexPairEnum
+from src.service_layer.backtest import Backtester, summarise
+from src.service_layer.compute_pool import ComputePool
+from src.service_layer.parameter_sweep import (
+    ParameterSweep,
+    grid,
+    random_samples,
+    walk_forward_splits,
+)
+from src.service_layer.signals import StrategyParameters
+from test.test_service_layer.test_backtest import random_candles
+
+HISTORY = {
+    ForexPairEnum.EURUSD: random_candles(6_000, seed=5),
+    ForexPairEnum.GBPUSD: random_candles(6_000, seed=6),
+}
+
+
+class TestParameterSweep:
+    def test_grid(self):
+        """every combination, the other parameters at their default"""
+        parameters = grid(adx_trend=[20, 25], ma_period=[5, 8, 13])
+        assert len(parameters) == 6
+        assert len(set(parameters)) == 6
+        assert {parameter.stop_atr for parameter in parameters} == {3}
+        with pytest.raises(ValueError):
+            grid(adx=[20])
+
+    def test_random_samples(self):
+        """lists are sampled from and ranges drawn within"""
+        parameters = random_samples(
+            50, seed=1, ma_period=(3, 10), stop_atr=(1.5, 4.0), risk=[0.01]
+        )
+        assert parameters == random_samples(
+            50, seed=1, ma_period=(3, 10), stop_atr=(1.5, 4.0), risk=[0.01]
+        )
+        assert all(
+            isinstance(parameter.ma_period, int)
+            and 3 <= parameter.ma_period <= 10
+            and 1.5 <= parameter.stop_atr <= 4.0
+            and parameter.risk == 0.01
+            for parameter in parameters
+        )
+
+    def test_walk_forward_splits(self):
+        """test windows follow their training window and step on"""
+        splits = walk_forward_splits("2020-01-01", "2020-03-01", "20D", "10D")
+        assert len(splits) == 4
+        for split in splits:
+            assert split.train_end == split.test_start
+            assert split.test_end - split.test_start == pd.Timedelta("10D")
+        assert splits[1].train_start - splits[0].train_start == pd.Timedelta(
+            "10D"
+        )
+
+    @pytest.mark.asyncio
+    async def test_matches_backtester(self):
+        """the shared intermediates give the trades of a backtest run
+        with each set of parameters"""
+        parameters = grid(ma_period=[5, 9], adx_trend=[20, 30], stop_atr=[2])
+        result = await ParameterSweep(HISTORY, parameters).run()
+        for parameter in parameters:
+            backtester = Backtester(parameters=parameter)
+            for forex_pair, data in HISTORY.items():
+                expected = summarise(backtester.simulate(forex_pair, data))
+                row = result.results[
+                    (result.results["pair"] == forex_pair.value)
+                    & (result.results["ma_period"] == parameter.ma_period)
+                    & (result.results["adx_trend"] == parameter.adx_trend)
+                ]
+                assert len(row) == 1
+                assert row["trades"].item() == expected["trades"]
+                assert row["total_pips"].item() == pytest.approx(
+                    expected["total_pips"]
+                )
+
+    @pytest.mark.asyncio
+    async def test_walk_forward(self, tmp_path):
+        """each split is ranked on its training window and its best
+        parameters are tested on the window after it"""
+        parameters = grid(adx_trend=[20, 25, 30], stop_atr=[2, 3])
+        splits = walk_forward_splits("2020-01-01", "2020-01-22", "7D", "7D")
+        pool = ComputePool("process", workers=1)
+        try:
+            result = await ParameterSweep(
+                HISTORY, parameters, splits, pool=pool
+            ).run()
+        finally:
+            await pool.shutdown()
+        ranking = result.ranking
+        assert len(ranking) == len(splits) * len(parameters)
+        for split in splits:
+            ranked = ranking[ranking["split"] == split.index]
+            assert list(ranked["rank"]) == list(range(1, len(parameters) + 1))
+            assert ranked["total_pips"].is_monotonic_decreasing
+        assert list(result.walk_forward["split"]) == [0, 1]
+        best = result.best(1)
+        assert isinstance(best, StrategyParameters)
+        tested = result.walk_forward.iloc[1]
+        assert (tested["adx_trend"], tested["stop_atr"]) == (
+            best.adx_trend,
+            best.stop_atr,
+        )
+        assert set(result.results["phase"]) == {"train", "test"}
+
+        paths = result.save(str(tmp_path))
+        saved = pd.read_csv(paths["ranking"])
+        np.testing.assert_allclose(saved["total_pips"], ranking["total_pips"])
+
+    @pytest.mark.asyncio
+    async def test_no_candles(self):
+        """windows outside the history are an error"""
+        splits = walk_forward_splits("2030-01-01", "2030-02-01", "7D", "7D")
+        with pytest.raises(ValueError):
+            await ParameterSweep(HISTORY, grid(), splits).run()
@@ -0,0 +1,147 @@
+from dataclasses import replace
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.config import CurrencyEnum, ForexPairEnum, PositionEnum
+from src.domain.trade import Trade
+from src.service_layer.risk_simulation import (
+    RiskSimulationService,
+    backtest_r_multiples,
+    r_multiples,
+    simulate,
+)
+from src.service_layer.uow import InMemoryUnitOfWork
+
+
+def closed_trade(trade_id: str, realised_pl: float, day: int) -> Trade:
+    return Trade(
+        trade_id=trade_id,
+        units=1000,
+        close=1.1,
+        stop=1.09,
+        limit=1.12,
+        is_buy=True,
+        base_currency=CurrencyEnum.EUR,
+        quote_currency=CurrencyEnum.USD,
+        forex_currency_pair=ForexPairEnum.EURUSD,
+        half_spread_cost=0,
+        realised_pl=realised_pl,
+        is_winner=realised_pl > 0,
+        initiated_date=datetime(2023, 1, 2) + timedelta(days=day),
+        position=PositionEnum.CLOSED,
+    )
+
+
+class FakeConnection:
+    def __init__(self, balance: float) -> None:
+        self.balance = balance
+        self.balance_requests = 0
+
+    async def get_account_balance(self) -> str:
+        self.balance_requests += 1
+        return str(self.balance)
+
+
+class TestRMultiples:
+    def test_balances_are_rebuilt_from_the_current_one(self):
+        """each pl is over 2% of the balance before its trade, in the
+        order the trades were opened"""
+        trades = [closed_trade("2", -200, 1), closed_trade("1", 400, 0)]
+        # 10000 before the winner, 10400 before the loser
+        r = r_multiples(trades, 10_200)
+        assert np.allclose(r, [400 / 200, -200 / 208])
+
+    def test_open_trades_are_skipped(self):
+        trades = [closed_trade("1", 100, 0), closed_trade("2", 0, 1)]
+        trades[1].realised_pl = None
+        assert len(r_multiples(trades, 1000)) == 1
+
+    def test_more_lost_than_the_balance(self):
+        with pytest.raises(ValueError):
+            r_multiples([closed_trade("1", 500, 0)], 400)
+
+    def test_backtest_trades(self):
+        trades = pd.DataFrame(
+            {
+                "exit_date": [2, 1, 3],
+                "pips": [30.0, -10.0, 5.0],
+                "sl_pips": [10.0, 10.0, 0.0],
+            }
+        )
+        assert list(backtest_r_multiples(trades)) == [-1.0, 3.0]
+
+
+class TestSimulate:
+    def test_chunks_do_not_change_the_result(self):
+        """one generator runs through the chunks, so the paths are the
+        same however many are held at once"""
+        r = np.array([2.0, -1.0, -1.0, 1.5, -1.0])
+        whole = simulate(r, paths=1000, trades=50, seed=3)
+        chunked = simulate(
+            r, paths=1000, trades=50, seed=3, chunk_elements=128
+        )
+        assert chunked == whole
+
+    def test_only_winners(self):
+        report = simulate(np.array([1.0, 2.0]), paths=200, trades=20)
+        assert report.risk_of_ruin == 0
+        assert report.unrecovered == 0
+        assert report.max_drawdown[99] == 0
+        assert report.recovery_trades[99] == 0
+        assert report.final_return[50] > 0
+
+    def test_only_losers_compound(self):
+        """thirty losses of 2% leave 0.98 ** 30 of the balance, ruin at
+        half is reached after 35"""
+        r = np.array([-1.0])
+        report = simulate(r, paths=10, trades=30)
+        assert report.max_drawdown[50] == pytest.approx(1 - 0.98**30)
+        assert report.final_return[50] == pytest.approx(0.98**30 - 1)
+        assert report.recovery_trades[50] == 30
+        assert report.unrecovered == 1
+        assert report.risk_of_ruin == 0
+        assert simulate(r, paths=10, trades=35).risk_of_ruin == 1
+
+    def test_recovery_in_days(self):
+        report = simulate(np.array([-1.0]), paths=10, trades=30, per_day=3.0)
+        assert report.recovery_days[50] == pytest.approx(10)
+
+    def test_no_trades(self):
+        with pytest.raises(ValueError):
+            simulate(np.array([]))
+
+
+class TestRiskSimulationService:
+    @pytest.mark.asyncio
+    async def test_cached_until_a_trade_closes(self, monkeypatch):
+        connection = FakeConnection(10_000)
+        uow = InMemoryUnitOfWork(connection, None, handlers={})
+        for day, pl in enumerate([150, -100, 220, -100]):
+            await uow.trade_repository.save(closed_trade(str(day), pl, day))
+        service = RiskSimulationService(uow)
+        runs = []
+
+        def counted(*args):
+            runs.append(args)
+            return simulate(*args)
+
+        monkeypatch.setattr(
+            "src.service_layer.risk_simulation.simulate", counted
+        )
+        first = await service.simulate(paths=500)
+        # a financing charge alone does not miss the cache
+        connection.balance -= 1.5
+        assert await service.simulate(paths=500) is first
+        assert len(runs) == 1
+        assert connection.balance_requests == 1
+        assert first.recovery_days is not None
+
+        trade = await uow.trade_repository.get_trade_by_trade_id("3")
+        await uow.trade_repository.save(replace(trade, realised_pl=-90))
+        second = await service.simulate(paths=500)
+        assert len(runs) == 2
+        assert second.version != first.version
+        assert connection.balance_requests == 2
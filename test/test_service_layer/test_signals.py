@@ -0,0 +1,170 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.adapters.fxcm_connect.mock_trade_connect import MockTradeConnect
+from src.entry_points.scheduler.get_technical_signal import (
+    SIGNAL_INDICATORS,
+    get_signal,
+)
+from src.service_layer.signals import (
+    FIB_LEVELS,
+    SIGNAL_COLUMNS,
+    evaluate_signal,
+)
+
+
+def signal_with_apply(refined_data: pd.DataFrame) -> pd.DataFrame:
+    """The original row by row signal, kept as the reference"""
+
+    # Define divergence conditions
+    bullish_condition = (
+        (
+            (
+                (refined_data["prev_close"] <= refined_data["Fib_23.6"])
+                & (refined_data["close"] > refined_data["Fib_23.6"])
+            )
+            | (
+                (refined_data["prev_close"] <= refined_data["Fib_38.2"])
+                & (refined_data["close"] > refined_data["Fib_38.2"])
+            )
+            | (
+                (refined_data["prev_close"] <= refined_data["Fib_50.0"])
+                & (refined_data["close"] > refined_data["Fib_50.0"])
+            )
+            | (
+                (refined_data["prev_close"] <= refined_data["Fib_61.8"])
+                & (refined_data["close"] > refined_data["Fib_61.8"])
+            )
+        )
+        & (refined_data["close"] > refined_data["Fib_23.6"])
+        & (refined_data["close"] > refined_data["MA"])
+        & (refined_data["adx"] > 25)
+        & (refined_data["plus_di"] > refined_data["minus_di"])
+    )
+
+    bearish_condition = (
+        (
+            (
+                (refined_data["prev_close"] >= refined_data["Fib_23.6"])
+                & (refined_data["close"] < refined_data["Fib_23.6"])
+            )
+            | (
+                (refined_data["prev_close"] >= refined_data["Fib_38.2"])
+                & (refined_data["close"] < refined_data["Fib_38.2"])
+            )
+            | (
+                (refined_data["prev_close"] >= refined_data["Fib_50.0"])
+                & (refined_data["close"] < refined_data["Fib_50.0"])
+            )
+            | (
+                (refined_data["prev_close"] >= refined_data["Fib_61.8"])
+                & (refined_data["close"] < refined_data["Fib_61.8"])
+            )
+        )
+        & (refined_data["close"] < refined_data["MA"])
+        & (refined_data["adx"] > 25)
+        & (refined_data["plus_di"] < refined_data["minus_di"])
+    )
+
+    # Create signals
+    refined_data["Buy_Signal"] = bearish_condition
+    refined_data["Sell_Signal"] = bullish_condition
+
+    # Combine the Buy_Signal and Sell_Signal into a single Signal column
+    refined_data["Signal"] = refined_data["Buy_Signal"].replace(
+        {True: 1, False: 0}
+    ) - refined_data["Sell_Signal"].replace({True: 1, False: 0})
+
+    refined_data = refined_data.drop(columns=["Buy_Signal", "Sell_Signal"])
+
+    def calculate_stop(row):
+        if row["Signal"] == 1:  # Buy
+            return (
+                row["close"] - 3 * row["atr"]
+            )  # Adjust the multiplier as needed
+        elif row["Signal"] == -1:  # Sell
+            return (
+                row["close"] + 3 * row["atr"]
+            )  # Adjust the multiplier as needed
+        else:  # No signal
+            return None
+
+    def calculate_limit(row):
+        if row["Signal"] == 1:  # Buy
+            return (
+                row["close"] + 4 * row["atr"]
+            )  # Adjust the multiplier as needed
+        elif row["Signal"] == -1:  # Sell
+            return (
+                row["close"] - 4 * row["atr"]
+            )  # Adjust the multiplier as needed
+        else:  # No signal
+            return None
+
+    refined_data["ATR_Stop"] = refined_data.apply(calculate_stop, axis=1)
+    refined_data["ATR_Limit"] = refined_data.apply(calculate_limit, axis=1)
+
+    return refined_data
+
+
+def random_signal_inputs(number: int, seed: int = 0) -> pd.DataFrame:
+    """Inputs drawn so that every branch of the signal is taken"""
+    rng = np.random.default_rng(seed)
+    close = 1 + rng.normal(0, 0.01, number)
+    data = pd.DataFrame(
+        {
+            "close": close,
+            "prev_close": np.roll(close, 1),
+            "MA": close + rng.normal(0, 0.01, number),
+            "adx": rng.uniform(0, 50, number),
+            "plus_di": rng.uniform(0, 40, number),
+            "minus_di": rng.uniform(0, 40, number),
+            "atr": rng.uniform(0, 0.01, number),
+        }
+    )
+    for name, level in zip(FIB_LEVELS, [1.01, 1.005, 1.0, 0.995]):
+        data[name] = level
+    data.loc[::7, "adx"] = np.nan
+    return data
+
+
+def assert_same_signal(result: pd.DataFrame, expected: pd.DataFrame):
+    for name in SIGNAL_COLUMNS:
+        np.testing.assert_allclose(
+            result[name].to_numpy(dtype=float),
+            expected[name].to_numpy(dtype=float),
+        )
+
+
+class TestSignals:
+    def test_matches_row_by_row(self):
+        """the masks give the signal, stop and limit of the row wise
+        version"""
+        data = random_signal_inputs(2_000)
+        expected = signal_with_apply(data.copy())
+        result = evaluate_signal(data.copy())
+        assert set(expected["Signal"]) == {-1, 0, 1}
+        assert result["Signal"].dtype == expected["Signal"].dtype
+        assert_same_signal(result, expected)
+
+    @pytest.mark.parametrize("tail", [1, 3])
+    def test_tail(self, tail):
+        """the tail mode matches the last bars of the whole history"""
+        data = random_signal_inputs(500, seed=tail)
+        history = evaluate_signal(data.copy())
+        result = evaluate_signal(data, tail)
+        assert len(result) == tail
+        assert "Signal" not in data
+        assert_same_signal(result, history.iloc[-tail:])
+
+    @pytest.mark.asyncio
+    async def test_get_signal(self):
+        """the signal of the indicator pipeline matches the row by row
+        version"""
+        data = await MockTradeConnect().get_candle_data()
+        data = await SIGNAL_INDICATORS.run(data)
+        expected = signal_with_apply(data.copy())
+        assert_same_signal(await get_signal(data.copy()), expected)
+        last = await get_signal(data.copy(), 1)
+        assert_same_signal(last, expected.iloc[-1:])
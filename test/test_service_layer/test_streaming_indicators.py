@@ -0,0 +1,90 @@
+import json
+
+import numpy as np
+import pytest
+
+from src.adapters.fxcm_connect.candle_parser import parse_candles
+from src.service_layer.indicators import Indicators
+from src.service_layer.streaming_indicators import (
+    StreamingADX,
+    StreamingATR,
+    StreamingEMA,
+    StreamingIndicator,
+    StreamingIndicatorSet,
+    StreamingMACD,
+    StreamingOBV,
+    StreamingRSI,
+    StreamingSMA,
+    StreamingStochastic,
+)
+
+
+def load_candles():
+    with open("test/oanda_data.json") as f:
+        return parse_candles(json.load(f))
+
+
+def stream(indicator: StreamingIndicator, data) -> dict[str, np.ndarray]:
+    rows = [indicator.update(bar) for bar in data.to_dict("records")]
+    return {key: np.array([row[key] for row in rows]) for key in rows[0]}
+
+
+# factories, the indicators keep state between updates
+CASES = [
+    (lambda: StreamingSMA(10), "get_simple_moving_average", (10, "close")),
+    (
+        lambda: StreamingEMA(10),
+        "get_exponential_moving_average",
+        (10, "close"),
+    ),
+    (lambda: StreamingMACD(), "get_macd", ("close",)),
+    (lambda: StreamingStochastic(), "get_stocastic", ()),
+    (lambda: StreamingRSI(), "get_rsi", ()),
+    (lambda: StreamingRSI(ema=False), "get_rsi", (14, False)),
+    (lambda: StreamingATR(), "get_atr", ()),
+    (lambda: StreamingADX(), "get_adx", ()),
+    (lambda: StreamingOBV(), "get_obv", ()),
+]
+
+
+class TestStreamingIndicators:
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("factory, method, args", CASES)
+    async def test_matches_batch(self, factory, method, args):
+        """bar by bar results match the batch indicators"""
+        indicator = factory()
+        data = load_candles()
+        expected = await getattr(Indicators(), method)(data.copy(), *args)
+        for column, values in stream(indicator, data).items():
+            np.testing.assert_allclose(
+                values, expected[column].values, rtol=1e-9, atol=1e-9
+            )
+
+    @pytest.mark.parametrize("factory, method, args", CASES)
+    def test_forming_bar(self, factory, method, args):
+        """a forming bar is reported without being kept"""
+        indicator = factory()
+        reference = StreamingIndicator.from_dict(indicator.to_dict())
+        for bar in load_candles().to_dict("records")[:300]:
+            forming = {**bar, "high": bar["high"] + 0.001, "close": 1.2}
+            indicator.update(forming, complete=False)
+            preview = indicator.update(bar, complete=False)
+            assert preview == pytest.approx(indicator.update(bar), nan_ok=True)
+            reference.update(bar)
+        assert indicator.to_dict() == reference.to_dict()
+
+    def test_serialised_state(self):
+        """restoring the state carries on where it left off"""
+        bars = load_candles().to_dict("records")
+        indicators = StreamingIndicatorSet(
+            [StreamingMACD(), StreamingADX(), StreamingStochastic()]
+        )
+        for index, bar in enumerate(bars[:500]):
+            indicators.update(bar, time=str(index))
+        state = json.loads(json.dumps(indicators.to_dict()))
+        restored = StreamingIndicatorSet.from_dict(state)
+        assert restored.last_time == "499"
+        for bar in bars[500:]:
+            assert restored.update(bar) == pytest.approx(
+                indicators.update(bar), nan_ok=True
+            )
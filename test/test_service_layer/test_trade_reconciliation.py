@@ -0,0 +1,116 @@
+from types import SimpleNamespace
+
+import pytest
+
+from src.config import CurrencyEnum, ForexPairEnum, PositionEnum
+from src.domain.trade import Trade
+from src.service_layer.trade_reconciliation import TradeReconciler
+
+
+def make_trade(trade_id: str) -> Trade:
+    return Trade(
+        trade_id=trade_id,
+        units=1000,
+        close=1.1,
+        stop=1.09,
+        limit=None,
+        is_buy=True,
+        base_currency=CurrencyEnum.EUR,
+        quote_currency=CurrencyEnum.USD,
+        forex_currency_pair=ForexPairEnum.EURUSD,
+        half_spread_cost=0,
+    )
+
+
+class FakeConnection:
+    def __init__(self, trades: dict, open_ids=None) -> None:
+        self.trades = trades
+        self.open_ids = open_ids
+        self.requests: list[list[str]] = []
+
+    async def get_trades_by_ids(self, trade_ids):
+        self.requests.append(trade_ids)
+        return {i: self.trades[i] for i in trade_ids if i in self.trades}
+
+    async def get_open_trade_ids(self):
+        return self.open_ids
+
+
+class FakeTradeRepository:
+    def __init__(self, trades: list[Trade]) -> None:
+        self.trades = trades
+        self.bulk_writes: list[list[Trade]] = []
+
+    async def get_open_trades(self):
+        return self.trades
+
+    async def bulk_update_closed_trades(self, trades):
+        self.bulk_writes.append(trades)
+        return len(trades)
+
+
+class TestTradeReconciler:
+    @pytest.mark.asyncio
+    async def test_closed_trades_are_written_in_one_bulk_update(self):
+        """Test one broker request and one bulk write per cycle"""
+        connection = FakeConnection(
+            {
+                "1": ("OPEN", 0.0),
+                "2": ("CLOSED", 25.5),
+                "3": ("CLOSED", -10.0),
+            },
+            open_ids={"1", "9"},
+        )
+        repository = FakeTradeRepository(
+            [make_trade(i) for i in ["1", "2", "3", "4"]]
+        )
+        uow = SimpleNamespace(
+            fxcm_connection=connection, trade_repository=repository
+        )
+
+        report = await TradeReconciler(uow).reconcile()
+
+        assert connection.requests == [["1", "2", "3", "4"]]
+        assert len(repository.bulk_writes) == 1
+        written = {t.trade_id: t for t in repository.bulk_writes[0]}
+        assert written["2"].position == PositionEnum.CLOSED
+        assert written["2"].is_winner is True
+        assert written["3"].realised_pl == -10.0
+        assert written["3"].is_winner is False
+        assert report.tracked == 4
+        assert report.still_open == 1
+        assert report.closed == ["2", "3"]
+        assert report.missing_at_broker == ["4"]
+        assert report.untracked_at_broker == ["9"]
+        assert report.drift == 2
+
+    @pytest.mark.asyncio
+    async def test_malformed_trade_does_not_abort_the_cycle(self):
+        """Test a broker record without a realised pl is skipped and the
+        other closed trades are still written"""
+        connection = FakeConnection(
+            {"1": ("CLOSED", None), "2": ("CLOSED", 12.0)}
+        )
+        repository = FakeTradeRepository([make_trade(i) for i in ["1", "2"]])
+        uow = SimpleNamespace(
+            fxcm_connection=connection, trade_repository=repository
+        )
+
+        report = await TradeReconciler(uow).reconcile()
+
+        assert [t.trade_id for t in repository.bulk_writes[0]] == ["2"]
+        assert repository.trades[0].position == PositionEnum.OPEN
+        assert report.closed == ["2"]
+        assert report.failed == ["1"]
+
+    @pytest.mark.asyncio
+    async def test_no_tracked_trades_skips_the_broker(self):
+        """Test nothing is requested when there is nothing to reconcile"""
+        connection = FakeConnection({})
+        uow = SimpleNamespace(
+            fxcm_connection=connection,
+            trade_repository=FakeTradeRepository([]),
+        )
+        report = await TradeReconciler(uow).reconcile()
+        assert connection.requests == []
+        assert report.tracked == 0 and report.untracked_at_broker == []
@@ -0,0 +1,27 @@
+from mock import MagicMock
+import pytest
+
+from src.service_layer.uow import MongoUnitOfWork
+
+
+class TestMongoUnitOfWork:
+    @pytest.mark.asyncio
+    async def test_nested_entries_share_a_connection(self, monkeypatch):
+        """the handlers of a partitioned event bus enter concurrently, the
+        connection closes when the last one leaves"""
+        calls = []
+        monkeypatch.setattr(
+            "src.service_layer.uow.connect",
+            lambda *args, **kwargs: calls.append("connect"),
+        )
+        monkeypatch.setattr(
+            "src.service_layer.uow.disconnect",
+            lambda: calls.append("disconnect"),
+        )
+        uow = MongoUnitOfWork(fxcm_connection=MagicMock(), scraper=MagicMock())
+        async with uow:
+            async with uow:
+                assert calls == ["connect"]
+            assert calls == ["connect"]
+        assert calls == ["connect", "disconnect"]
+        assert uow.entered == 0